@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+# Nome do banco de arquivo quando anexado (ATTACH) a uma conexão
+ALIAS_ARQUIVO = "arquivo"
+
+# Estrutura das tabelas no banco de arquivo (sem chaves estrangeiras, pois as
+# tabelas referenciadas ficam apenas no banco principal)
+TABELAS_ARQUIVO = {
+    'log_atividades': (
+        "id INTEGER PRIMARY KEY, usuario_id INTEGER NOT NULL, tipo_acao TEXT NOT NULL, "
+        "descricao TEXT NOT NULL, data_hora TEXT, entidade TEXT, entidade_id INTEGER",
+        ["id", "usuario_id", "tipo_acao", "descricao", "data_hora", "entidade", "entidade_id"],
+        ["usuario_id, data_hora", "data_hora"]
+    ),
+    'notificacoes': (
+        "id INTEGER PRIMARY KEY, usuario_id INTEGER NOT NULL, tipo TEXT NOT NULL, "
+        "titulo TEXT NOT NULL, mensagem TEXT NOT NULL, status TEXT NOT NULL, "
+        "data_criacao TEXT, data_leitura TEXT, link TEXT, entidade TEXT, entidade_id INTEGER",
+        ["id", "usuario_id", "tipo", "titulo", "mensagem", "status", "data_criacao",
+         "data_leitura", "link", "entidade", "entidade_id"],
+        ["usuario_id, data_criacao"]
+    ),
+}
+
+
+class PoliticaRetencao:
+    """Por quantos dias as linhas de uma tabela ficam no banco principal"""
+
+    def __init__(self, tabela: str, coluna_data: str, dias: int, condicao: str = None):
+        self.tabela = tabela
+        self.coluna_data = coluna_data
+        self.dias = dias
+        self.condicao = condicao  # Filtro SQL extra (ex.: não arquivar não lidas)
+
+
+# Políticas padrão
+POLITICAS_PADRAO = [
+    PoliticaRetencao('log_atividades', 'data_hora', 180),
+    PoliticaRetencao('notificacoes', 'data_criacao', 90, "status != 'nao_lida'"),
+]
+
+
+def caminho_arquivo(db_path: str) -> str:
+    """Caminho do banco de arquivo ao lado do banco principal"""
+    base, extensao = os.path.splitext(db_path)
+    return f"{base}_arquivo{extensao or '.db'}"
+
+
+def criar_tabelas_arquivo(connection: sqlite3.Connection) -> None:
+    """Cria as tabelas e índices do banco de arquivo (já anexado) se não existirem"""
+    for tabela, (colunas_ddl, _, indices) in TABELAS_ARQUIVO.items():
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {ALIAS_ARQUIVO}.{tabela} ({colunas_ddl})"
+        )
+        for i, colunas_indice in enumerate(indices):
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {ALIAS_ARQUIVO}.idx_{tabela}_{i} "
+                f"ON {tabela}({colunas_indice})"
+            )
+
+
+def anexar_arquivo(connection: sqlite3.Connection, db_path: str) -> None:
+    """Anexa o banco de arquivo e cria as visões que unem dados atuais e arquivados
+
+    As visões (<tabela>_completo) são temporárias, válidas apenas nesta conexão.
+    """
+    anexados = [row[1] for row in connection.execute("PRAGMA database_list").fetchall()]
+    if ALIAS_ARQUIVO not in anexados:
+        connection.execute(f"ATTACH DATABASE ? AS {ALIAS_ARQUIVO}", (caminho_arquivo(db_path),))
+        # Só tem efeito no banco de arquivo recém-criado, antes das tabelas
+        connection.execute(f"PRAGMA {ALIAS_ARQUIVO}.auto_vacuum = INCREMENTAL")
+    criar_tabelas_arquivo(connection)
+
+    for tabela, (_, colunas, _) in TABELAS_ARQUIVO.items():
+        lista_colunas = ", ".join(colunas)
+        connection.execute(
+            f"CREATE TEMP VIEW IF NOT EXISTS {tabela}_completo AS "
+            f"SELECT {lista_colunas} FROM main.{tabela} "
+            f"UNION ALL SELECT {lista_colunas} FROM {ALIAS_ARQUIVO}.{tabela}"
+        )
+    connection.commit()
+
+
+class ServicoArquivamento:
+    """Move linhas antigas de log_atividades e notificacoes para o banco de arquivo
+
+    Roda em segundo plano, com conexão própria, em lotes pequenos (uma
+    transação por lote), para não bloquear a interface.
+    """
+
+    def __init__(self, db_path: str, politicas: List[PoliticaRetencao] = None,
+                 tamanho_lote: int = 500, pausa_ms: int = 50):
+        self.db_path = db_path
+        self.politicas = politicas if politicas is not None else POLITICAS_PADRAO
+        self.tamanho_lote = tamanho_lote
+        self.pausa = pausa_ms / 1000.0
+        self._parando = threading.Event()
+        self._thread = None
+
+    def arquivar(self) -> Dict[str, int]:
+        """Arquiva as linhas vencidas de todas as políticas; retorna o total por tabela"""
+        resultado = {}
+        try:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+        except sqlite3.Error as e:
+            print(f"Erro ao conectar para arquivamento: {e}")
+            return resultado
+
+        try:
+            anexar_arquivo(connection, self.db_path)
+            for politica in self.politicas:
+                if self._parando.is_set():
+                    break
+                resultado[politica.tabela] = self._arquivar_tabela(connection, politica)
+        except sqlite3.Error as e:
+            print(f"Erro ao arquivar dados antigos: {e}")
+        finally:
+            connection.close()
+        return resultado
+
+    def _arquivar_tabela(self, connection: sqlite3.Connection, politica: PoliticaRetencao) -> int:
+        """Move, em lotes, as linhas mais antigas que a política permite"""
+        _, colunas, _ = TABELAS_ARQUIVO[politica.tabela]
+        lista_colunas = ", ".join(colunas)
+        limite = (datetime.now(timezone.utc) - timedelta(days=politica.dias)).strftime('%Y-%m-%d %H:%M:%S')
+        condicao = f" AND ({politica.condicao})" if politica.condicao else ""
+
+        total = 0
+        while not self._parando.is_set():
+            ids = [row[0] for row in connection.execute(
+                f"SELECT id FROM main.{politica.tabela} "
+                f"WHERE {politica.coluna_data} < ?{condicao} ORDER BY id LIMIT ?",
+                (limite, self.tamanho_lote)
+            ).fetchall()]
+            if not ids:
+                break
+
+            placeholders = ", ".join("?" for _ in ids)
+            with connection:
+                connection.execute(
+                    f"INSERT OR REPLACE INTO {ALIAS_ARQUIVO}.{politica.tabela} ({lista_colunas}) "
+                    f"SELECT {lista_colunas} FROM main.{politica.tabela} WHERE id IN ({placeholders})",
+                    ids
+                )
+                connection.execute(
+                    f"DELETE FROM main.{politica.tabela} WHERE id IN ({placeholders})",
+                    ids
+                )
+            total += len(ids)
+
+            # Dá espaço para as escritas da interface entre um lote e outro
+            time.sleep(self.pausa)
+        return total
+
+    def iniciar(self) -> None:
+        """Executa o arquivamento numa thread em segundo plano"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parando.clear()
+        self._thread = threading.Thread(target=self.arquivar, name="Arquivamento", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: float = 5.0) -> None:
+        """Interrompe o arquivamento após o lote atual"""
+        self._parando.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from database.arquivamento import caminho_arquivo
+
+
+class BackupInterrompido(Exception):
+    """Levantada pelo acompanhamento do backup para abortar a cópia em andamento"""
+
+
+class BackupAdiado(BackupInterrompido):
+    """A cópia recomeçou demais (banco muito alterado); tenta-se de novo mais tarde"""
+
+
+class ServicoBackup:
+    """Faz cópias do banco com a API de backup do SQLite, em segundo plano
+    
+    A cópia anda em passos de paginas_por_passo páginas, com uma pausa entre
+    eles, para as gravações da interface não esperarem. Cada cópia é
+    verificada com PRAGMA integrity_check, compactada (gzip) e só então
+    entra na pasta de backups, que guarda as últimas geracoes cópias.
+    O banco de arquivo (logs e notificações antigos) entra junto.
+    
+    Em modo WAL a cópia lê um instantâneo do banco (uma transação de leitura
+    aberta durante toda a cópia), então as gravações não a fazem recomeçar.
+    Fora do WAL, se ela recomeçar demais, é abandonada e tentada de novo
+    depois de espera_adiado; nunca se copia o banco num passo só, o que
+    travaria as gravações durante a cópia inteira.
+    """
+    
+    # Se o banco for alterado por outra conexão, o SQLite recomeça a cópia;
+    # depois de tantos recomeços, ela é adiada
+    MAXIMO_RECOMECOS = 5
+    
+    # Espera até a nova tentativa de uma cópia adiada (segundos)
+    ESPERA_ADIADO = 600
+    
+    def __init__(self, db_path: str, pasta: str = None, geracoes: int = 7,
+                 intervalo_horas: float = 24, paginas_por_passo: int = 1024, pausa_ms: int = 10):
+        self.db_path = db_path
+        self.pasta = pasta or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+        self.geracoes = geracoes
+        self.intervalo = intervalo_horas * 3600
+        self.paginas_por_passo = paginas_por_passo
+        self.pausa = pausa_ms / 1000.0
+        self._parando = threading.Event()
+        self._executando = threading.Lock()
+        self._thread = None
+        self.adiado = False  # A última cópia foi adiada por recomeçar demais
+    
+    def _nome_base(self, origem: str) -> str:
+        return os.path.splitext(os.path.basename(origem))[0]
+    
+    def listar_backups(self, origem: str = None) -> List[str]:
+        """Backups existentes de um banco (o principal por padrão), do mais recente ao mais antigo"""
+        base = self._nome_base(origem or self.db_path)
+        return sorted(glob.glob(os.path.join(self.pasta, f"{base}_????????_??????.db.gz")), reverse=True)
+    
+    def ultimo_backup(self) -> Optional[datetime]:
+        """Data e hora do último backup do banco principal"""
+        backups = self.listar_backups()
+        if not backups:
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(backups[0]))
+    
+    def fazer_backup(self) -> List[str]:
+        """Copia, verifica, compacta e rotaciona; retorna os arquivos gerados"""
+        gerados = []
+        with self._executando:
+            self.adiado = False
+            os.makedirs(self.pasta, exist_ok=True)
+            carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+            for origem in (self.db_path, caminho_arquivo(self.db_path)):
+                if not os.path.exists(origem) or self._parando.is_set():
+                    continue
+                destino = self._copiar(origem, carimbo)
+                if destino:
+                    gerados.append(destino)
+                    self._rotacionar(origem)
+        return gerados
+    
+    def _copiar(self, origem: str, carimbo: str) -> Optional[str]:
+        base = self._nome_base(origem)
+        temporario = os.path.join(self.pasta, f".{base}_{carimbo}.db.tmp")
+        destino = os.path.join(self.pasta, f"{base}_{carimbo}.db.gz")
+        try:
+            self._copiar_em_passos(origem, temporario)
+            
+            copia = sqlite3.connect(temporario)
+            try:
+                resultado = copia.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                copia.close()
+            if resultado != 'ok':
+                print(f"Backup de {base} descartado: falha na verificação de integridade ({resultado})")
+                return None
+            
+            with open(temporario, 'rb') as entrada, gzip.open(f"{destino}.tmp", 'wb', compresslevel=6) as saida:
+                shutil.copyfileobj(entrada, saida, 1024 * 1024)
+            os.replace(f"{destino}.tmp", destino)
+            return destino
+        except BackupAdiado:
+            print(f"Backup de {base} adiado: o banco foi alterado demais durante a cópia")
+            self.adiado = True
+            return None
+        except BackupInterrompido:
+            return None
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao fazer backup de {base}: {e}")
+            return None
+        finally:
+            for arquivo in (temporario, f"{destino}.tmp"):
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+    
+    def _copiar_em_passos(self, origem: str, temporario: str) -> None:
+        """Cópia online em passos, de um instantâneo (WAL) ou adiada se recomeçar demais"""
+        passos = 0
+        
+        def acompanhar(status, restante, total):
+            nonlocal passos
+            if self._parando.is_set():
+                raise BackupInterrompido()
+            # O recomeço não aparece no total restante; conta-se pelos passos dados
+            passos += 1
+            passos_por_copia = -(-total // self.paginas_por_passo)
+            if passos > passos_por_copia * (self.MAXIMO_RECOMECOS + 1):
+                raise BackupAdiado()
+            # Dá espaço para as gravações da interface entre um passo e outro
+            time.sleep(self.pausa)
+        
+        conexao_origem = sqlite3.connect(origem, timeout=30, isolation_level=None)
+        try:
+            if conexao_origem.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                # A cópia usa a transação de leitura aberta: um instantâneo que
+                # não muda com as gravações (e não as bloqueia, em WAL)
+                conexao_origem.execute("BEGIN")
+                conexao_origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            conexao_destino = sqlite3.connect(temporario)
+            try:
+                conexao_origem.backup(conexao_destino, pages=self.paginas_por_passo,
+                                      progress=acompanhar, sleep=self.pausa)
+            finally:
+                conexao_destino.close()
+        finally:
+            conexao_origem.close()
+    
+    def _rotacionar(self, origem: str) -> None:
+        """Remove os backups além das últimas geracoes"""
+        for antigo in self.listar_backups(origem)[self.geracoes:]:
+            try:
+                os.remove(antigo)
+            except OSError as e:
+                print(f"Erro ao remover backup antigo {antigo}: {e}")
+    
+    @staticmethod
+    def restaurar(backup: str, destino: str) -> bool:
+        """Descompacta um backup em destino (com o sistema fechado), conferindo a integridade"""
+        temporario = f"{destino}.restaurando"
+        try:
+            with gzip.open(backup, 'rb') as entrada, open(temporario, 'wb') as saida:
+                shutil.copyfileobj(entrada, saida, 1024 * 1024)
+            copia = sqlite3.connect(temporario)
+            try:
+                resultado = copia.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                copia.close()
+            if resultado != 'ok':
+                print(f"Backup corrompido: {resultado}")
+                os.remove(temporario)
+                return False
+            os.replace(temporario, destino)
+            return True
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao restaurar backup: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return False
+    
+    def _agendar(self) -> None:
+        """Faz um backup sempre que o último ficar mais antigo que o intervalo"""
+        while not self._parando.is_set():
+            ultimo = self.ultimo_backup()
+            espera = 0.0
+            if ultimo is not None:
+                espera = self.intervalo - (datetime.now() - ultimo).total_seconds()
+            if espera > 0:
+                self._parando.wait(espera)
+                continue
+            self.fazer_backup()
+            if self.ultimo_backup() == ultimo and not self._parando.is_set():
+                # O banco principal não foi copiado: tenta de novo mais tarde, sem insistir em seguida
+                # (mais cedo se a cópia só foi adiada pelo movimento no banco)
+                self._parando.wait(self.ESPERA_ADIADO if self.adiado else min(self.intervalo, 3600))
+    
+    def iniciar(self) -> None:
+        """Executa os backups agendados numa thread em segundo plano"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parando.clear()
+        self._thread = threading.Thread(target=self._agendar, name="Backup", daemon=True)
+        self._thread.start()
+    
+    def parar(self, timeout: float = 5.0) -> None:
+        """Interrompe o agendamento (e a cópia em andamento, descartando-a)"""
+        self._parando.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
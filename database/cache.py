@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import weakref
+from collections import OrderedDict
+
+class MapaIdentidade:
+    """Mapa de identidade com cache LRU para entidades pequenas e muito usadas
+
+    Cada linha do banco tem no máximo um objeto em memória por sessão: o mapa
+    guarda referências fracas a todos os objetos carregados e mantém vivos os
+    mais usados recentemente (até capacidade). Os modelos avisam o mapa quando
+    salvam ou excluem, para que o cache nunca diverja do banco.
+
+    Com ativo=False (banco alterado também por outras sessões), o mapa não
+    guarda nada: cada leitura cria objetos novos com os dados do banco.
+    """
+
+    def __init__(self, capacidade: int = 512, ativo: bool = True):
+        self.capacidade = capacidade
+        self.ativo = ativo
+        self._identidade = weakref.WeakValueDictionary()  # (classe, id) -> objeto
+        self._lru = OrderedDict()                         # (classe, id) -> objeto
+        self._listas = {}                                 # (classe, chave) -> [objetos]
+        self._chaves = {}                                 # (classe, campo, valor) -> id
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def _chave(classe, entidade_id):
+        return (classe.__name__, entidade_id)
+
+    def _tocar(self, chave, objeto) -> None:
+        """Marca o objeto como usado recentemente"""
+        self._lru[chave] = objeto
+        self._lru.move_to_end(chave)
+        while len(self._lru) > self.capacidade:
+            self._lru.popitem(last=False)
+
+    def obter(self, classe, entidade_id):
+        """Retorna o objeto em memória para o ID, ou None se não estiver carregado"""
+        if entidade_id is None or not self.ativo:
+            return None
+        chave = self._chave(classe, entidade_id)
+        objeto = self._identidade.get(chave)
+        if objeto is None:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        self._tocar(chave, objeto)
+        return objeto
+
+    def obter_por_campo(self, classe, campo: str, valor):
+        """Retorna o objeto em memória cujo campo único tem o valor informado"""
+        entidade_id = self._chaves.get((classe.__name__, campo, valor))
+        objeto = self.obter(classe, entidade_id) if entidade_id is not None else None
+        if objeto is not None and getattr(objeto, campo, None) == valor:
+            return objeto
+        if entidade_id is None:
+            self.falhas += 1
+        return None
+
+    def indexar_campo(self, objeto, campo: str) -> None:
+        """Registra um campo único (ex.: email) para buscas com obter_por_campo"""
+        valor = getattr(objeto, campo, None)
+        if valor is not None and self.ativo:
+            self._chaves[(type(objeto).__name__, campo, valor)] = objeto.id
+
+    def carregar(self, classe, row, fabrica):
+        """Retorna o objeto canônico para a linha lida do banco
+
+        Se a linha já estiver em memória, o objeto existente é atualizado com
+        os valores lidos e retornado; caso contrário, é criado com fabrica(row).
+        """
+        novo = fabrica(row)
+        if not self.ativo:
+            return novo
+        chave = self._chave(classe, novo.id)
+        objeto = self._identidade.get(chave)
+        if objeto is None:
+            objeto = novo
+            self._identidade[chave] = objeto
+        else:
+            for campo in row.keys():
+                if hasattr(novo, campo):
+                    setattr(objeto, campo, getattr(novo, campo))
+        self._tocar(chave, objeto)
+        return objeto
+
+    def obter_lista(self, classe, chave: str):
+        """Retorna uma cópia da lista de objetos em cache, ou None"""
+        lista = self._listas.get((classe.__name__, chave)) if self.ativo else None
+        if lista is None:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return list(lista)
+
+    def guardar_lista(self, classe, chave: str, objetos) -> None:
+        """Guarda o resultado de uma consulta de listagem"""
+        if self.ativo:
+            self._listas[(classe.__name__, chave)] = list(objetos)
+
+    def salvo(self, objeto) -> None:
+        """Registra que o objeto foi inserido ou atualizado no banco"""
+        if not self.ativo:
+            return
+        chave = self._chave(type(objeto), objeto.id)
+        canonico = self._identidade.get(chave)
+        if canonico is not None and canonico is not objeto:
+            # Mantém um único objeto por linha: copia os valores salvos
+            canonico.__dict__.update(objeto.__dict__)
+        else:
+            self._identidade[chave] = objeto
+            canonico = objeto
+        self._tocar(chave, canonico)
+        self.invalidar_listas(type(objeto))
+
+    def removido(self, objeto) -> None:
+        """Registra que o objeto foi excluído do banco"""
+        self.descartar(type(objeto), objeto.id)
+
+    def descartar(self, classe, entidade_id) -> None:
+        """Remove a linha do cache (por exemplo, após uma falha ao salvar)"""
+        chave = self._chave(classe, entidade_id)
+        self._identidade.pop(chave, None)
+        self._lru.pop(chave, None)
+        self._chaves = {k: v for k, v in self._chaves.items()
+                        if not (k[0] == classe.__name__ and v == entidade_id)}
+        self.invalidar_listas(classe)
+
+    def invalidar_listas(self, classe) -> None:
+        """Descarta as listagens em cache de uma classe"""
+        nome = classe.__name__
+        for chave in [k for k in self._listas if k[0] == nome]:
+            del self._listas[chave]
+
+    def limpar(self) -> None:
+        """Esvazia todo o cache"""
+        self._identidade.clear()
+        self._lru.clear()
+        self._listas.clear()
+        self._chaves.clear()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import json
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from database.consultas import LEITURAS
+
+
+def _parametros(params):
+    """Parâmetros em formato JSON (sequência vira lista; nomeados ficam como dict)"""
+    return params if isinstance(params, dict) else list(params or ())
+
+
+class LinhaRemota:
+    """Linha de resultado com o mesmo acesso de sqlite3.Row (por índice ou nome da coluna)"""
+    
+    __slots__ = ('_indices', '_valores')
+    
+    def __init__(self, indices: Dict[str, int], valores: list):
+        self._indices = indices
+        self._valores = valores
+    
+    def __getitem__(self, chave):
+        if isinstance(chave, str):
+            indice = self._indices.get(chave)
+            if indice is None:
+                indice = self._indices.get(chave.lower())
+            if indice is None:
+                raise IndexError("No item with that key")
+            return self._valores[indice]
+        return self._valores[chave]
+    
+    def keys(self) -> List[str]:
+        return list(self._indices)
+    
+    def __iter__(self):
+        return iter(self._valores)
+    
+    def __len__(self):
+        return len(self._valores)
+
+
+class CursorRemoto:
+    """Resultado de um comando executado no servidor, com a interface usada dos cursores"""
+    
+    def __init__(self, resultado: Dict):
+        colunas = resultado.get('colunas') or []
+        indices = {}
+        for i, coluna in enumerate(colunas):
+            indices.setdefault(coluna, i)
+            indices.setdefault(coluna.lower(), i)
+        self._linhas = [LinhaRemota(indices, valores) for valores in resultado.get('linhas') or []]
+        self._posicao = 0
+        self.description = tuple((coluna, None, None, None, None, None, None) for coluna in colunas) or None
+        self.lastrowid = resultado.get('lastrowid')
+        self.rowcount = resultado.get('rowcount', -1)
+    
+    def fetchone(self) -> Optional[LinhaRemota]:
+        if self._posicao >= len(self._linhas):
+            return None
+        linha = self._linhas[self._posicao]
+        self._posicao += 1
+        return linha
+    
+    def fetchmany(self, size: int = 1) -> List[LinhaRemota]:
+        linhas = self._linhas[self._posicao:self._posicao + size]
+        self._posicao += len(linhas)
+        return linhas
+    
+    def fetchall(self) -> List[LinhaRemota]:
+        linhas = self._linhas[self._posicao:]
+        self._posicao = len(self._linhas)
+        return linhas
+    
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class ClienteAPI:
+    """Fala com o ServidorAPI em nome do DatabaseManager (modo cliente)
+    
+    Os comandos vão pelo nome no registro (database/consultas.py), nunca como
+    SQL; o servidor recusa o que não estiver no registro. Leituras fora de uma transação vão em lote para os leitores do servidor e
+    ficam em cache com o ETag recebido; enquanto nada mudar no banco, a
+    revalidação volta 304 sem a consulta ser executada. Escritas e leituras
+    dentro de uma transação vão para a fila de escrita, na sessão deste cliente.
+    Fora estado(), tudo exige o login (entrar) de um usuário no servidor.
+    Falhas chegam como sqlite3.Error, tratadas como as do banco local.
+    """
+    
+    def __init__(self, url: str, chave: str = None, timeout: float = 30, capacidade_cache: int = 256):
+        partes = urlsplit(url if '//' in url else f"http://{url}")
+        self.host = partes.hostname
+        self.porta = partes.port or 8780
+        self.chave = chave
+        self.timeout = timeout
+        self.sessao = uuid.uuid4().hex
+        self.token_usuario = None  # Sessão do usuário aberta por entrar()
+        self.em_transacao = False
+        self.capacidade_cache = capacidade_cache
+        self._cache = OrderedDict()  # corpo da leitura -> (etag, resultados)
+        self._conexao = None
+        self._trava = threading.Lock()
+        self.revalidacoes = 0  # Leituras respondidas com 304
+    
+    def _requisitar(self, caminho: str, dados: Dict = None, cabecalhos: Dict = None,
+                    corpo: bytes = None) -> Tuple[int, Dict, Optional[Dict]]:
+        """Envia a requisição pela conexão persistente; reconecta uma vez se ela caiu"""
+        if corpo is None and dados is not None:
+            corpo = json.dumps(dados, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        cabecalhos = dict(cabecalhos or {})
+        cabecalhos['Content-Type'] = 'application/json'
+        if self.chave:
+            cabecalhos['Authorization'] = f"Bearer {self.chave}"
+        if self.token_usuario:
+            cabecalhos['X-Token-Usuario'] = self.token_usuario
+        metodo = 'POST' if corpo is not None else 'GET'
+        
+        for tentativa in range(2):
+            if self._conexao is None:
+                self._conexao = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+            try:
+                self._conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = self._conexao.getresponse()
+                conteudo = resposta.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self._conexao.close()
+                self._conexao = None
+                if tentativa:
+                    raise sqlite3.OperationalError(f"Servidor indisponível: {e}")
+        
+        dados_resposta = json.loads(conteudo.decode('utf-8')) if conteudo else None
+        if resposta.status >= 400:
+            erro = (dados_resposta or {}).get('erro', f"HTTP {resposta.status}")
+            if resposta.status == 400:
+                raise sqlite3.OperationalError(erro)
+            raise sqlite3.DatabaseError(erro)
+        return resposta.status, dict(resposta.getheaders()), dados_resposta
+    
+    def estado(self) -> Dict:
+        """Instância e versão dos dados do servidor (também serve para testar a conexão)"""
+        with self._trava:
+            return self._requisitar('/estado')[2]
+    
+    def entrar(self, email: str, senha: str) -> Optional[Dict]:
+        """Abre a sessão do usuário no servidor, que confere a senha
+        
+        Retorna a linha do usuário (sem o hash da senha), ou None se o email
+        ou a senha não conferirem.
+        """
+        with self._trava:
+            self.token_usuario = None
+            try:
+                dados = self._requisitar('/login', {'email': email, 'senha': senha})[2]
+            except sqlite3.OperationalError:
+                raise  # Servidor indisponível ou pedido inválido
+            except sqlite3.DatabaseError:
+                return None  # 401: credenciais recusadas
+            self.token_usuario = dados['token']
+            self._cache.clear()
+        return dados['usuario']
+    
+    def sair(self) -> None:
+        """Encerra a sessão do usuário no servidor"""
+        with self._trava:
+            if self.token_usuario:
+                try:
+                    self._requisitar('/logout', {})
+                except sqlite3.Error as e:
+                    print(f"Erro ao encerrar a sessão no servidor: {e}")
+            self.token_usuario = None
+            self._cache.clear()
+    
+    @staticmethod
+    def e_leitura(nome: str) -> bool:
+        return nome in LEITURAS
+    
+    def consultar_lote(self, consultas: List[Tuple[str, tuple]]) -> List:
+        """Executa várias leituras (nome, params) em uma só requisição; erros voltam como sqlite3.Error na lista"""
+        corpo = json.dumps(
+            {'consultas': [{'nome': nome, 'params': _parametros(params)} for nome, params in consultas]},
+            ensure_ascii=False, sort_keys=True
+        ).encode('utf-8')
+        
+        with self._trava:
+            em_cache = self._cache.get(corpo)
+            cabecalhos = {'If-None-Match': em_cache[0]} if em_cache else {}
+            status, respostas, dados = self._requisitar('/leitura', cabecalhos=cabecalhos, corpo=corpo)
+            if status == 304 and em_cache:
+                self.revalidacoes += 1
+                self._cache.move_to_end(corpo)
+                resultados = em_cache[1]
+            else:
+                resultados = dados['resultados']
+                etag = respostas.get('ETag') or respostas.get('Etag')
+                if etag and not any('erro' in r for r in resultados):
+                    self._cache[corpo] = (etag, resultados)
+                    while len(self._cache) > self.capacidade_cache:
+                        self._cache.popitem(last=False)
+        
+        return [sqlite3.OperationalError(r['erro']) if 'erro' in r else CursorRemoto(r) for r in resultados]
+    
+    def _escrever(self, caminho: str, dados: Dict) -> Dict:
+        dados['sessao'] = self.sessao
+        with self._trava:
+            # Um erro no comando não desfaz a transação aberta no servidor, só o próprio comando
+            resultado = self._requisitar(caminho, dados)[2]
+            self.em_transacao = resultado.get('em_transacao', False)
+        return resultado
+    
+    def executar(self, nome: str, params=None) -> CursorRemoto:
+        if not self.em_transacao and self.e_leitura(nome):
+            resultado = self.consultar_lote([(nome, params)])[0]
+            if isinstance(resultado, Exception):
+                raise resultado
+            return resultado
+        return CursorRemoto(self._escrever('/escrita', {'nome': nome, 'params': _parametros(params)}))
+    
+    def operar(self, nome: str, args: Dict = None) -> Dict:
+        """Executa no servidor uma operação de modelo (veja OPERACOES em servidor_api)"""
+        return self._escrever('/operacao', {'nome': nome, 'args': args or {}})
+    
+    def commit(self) -> None:
+        # Sem escrita pendente não há o que enviar
+        if self.em_transacao:
+            self._escrever('/commit', {})
+    
+    def rollback(self) -> None:
+        if self.em_transacao:
+            self._escrever('/rollback', {})
+    
+    def fechar(self) -> None:
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, List
+
+# Comandos compilados guardados por conexão (o padrão do módulo sqlite3 é 128)
+TAMANHO_CACHE_COMANDOS = 512
+
+# Colunas e junções comuns às consultas de cada modelo
+SELECT_ATENDIMENTOS = (
+    "SELECT a.*, i.numero as imovel_numero, i.tipo as imovel_tipo, "
+    "r.nome as rua_nome, t.nome as territorio_nome, "
+    "u.numero as unidade_numero "
+    "FROM atendimentos a "
+    "JOIN imoveis i ON a.imovel_id = i.id "
+    "JOIN ruas r ON i.rua_id = r.id "
+    "JOIN territorios t ON r.territorio_id = t.id "
+    "LEFT JOIN unidades u ON a.unidade_id = u.id "
+)
+
+SELECT_DESIGNACOES = (
+    "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
+    "FROM designacoes d "
+    "JOIN territorios t ON d.territorio_id = t.id "
+    "JOIN saidas_campo s ON d.saida_campo_id = s.id "
+)
+
+SELECT_DESIGNACOES_PREDIOS_VILAS = (
+    "SELECT d.*, i.numero as imovel_numero, i.nome as imovel_nome, i.tipo as imovel_tipo, "
+    "s.nome as saida_campo_nome, r.nome as rua_nome, t.nome as territorio_nome "
+    "FROM designacoes_predios_vilas d "
+    "JOIN imoveis i ON d.imovel_id = i.id "
+    "JOIN saidas_campo s ON d.saida_campo_id = s.id "
+    "JOIN ruas r ON i.rua_id = r.id "
+    "JOIN territorios t ON r.territorio_id = t.id "
+)
+
+SELECT_IMOVEIS_CASAS = (
+    "SELECT i.id, i.numero, i.tipo, r.nome as rua_nome, t.nome as territorio_nome "
+    "FROM imoveis i "
+    "JOIN ruas r ON i.rua_id = r.id "
+    "JOIN territorios t ON r.territorio_id = t.id "
+)
+
+# Filtros e paginação das buscas. Cada filtro é opcional (parâmetro nulo = sem
+# filtro), assim o texto do comando não varia com os filtros usados. Listas de
+# IDs vão como um único parâmetro JSON (json_each), sem limite de parâmetros.
+FILTRO_BUSCA_DESIGNACOES = (
+    "WHERE (:status IS NULL OR d.status = :status) "
+    "AND (:territorio_id IS NULL OR {territorio} = :territorio_id) "
+    "AND (:data_inicio IS NULL OR d.data_designacao >= :data_inicio) "
+    "AND (:data_fim IS NULL OR d.data_designacao <= :data_fim) "
+    "AND (:apos_data IS NULL OR d.data_designacao < :apos_data "
+    "OR (d.data_designacao = :apos_data AND d.id < :apos_id)) "
+    "ORDER BY d.data_designacao DESC, d.id DESC LIMIT :limit"
+)
+
+BUSCA_LOG_ATIVIDADES = (
+    "SELECT l.*, u.nome as usuario_nome FROM {tabela} l "
+    "LEFT JOIN usuarios u ON l.usuario_id = u.id "
+    "WHERE (:usuario_id IS NULL OR l.usuario_id = :usuario_id) "
+    "AND (:tipo_acao IS NULL OR l.tipo_acao = :tipo_acao) "
+    "AND (:entidade IS NULL OR l.entidade = :entidade) "
+    "AND (:data_inicio IS NULL OR l.data_hora >= :data_inicio) "
+    "AND (:data_fim IS NULL OR l.data_hora <= :data_fim) "
+    "AND (:apos_data IS NULL OR l.data_hora < :apos_data "
+    "OR (l.data_hora = :apos_data AND l.id < :apos_id)) "
+    "ORDER BY l.data_hora DESC, l.id DESC LIMIT :limit"
+)
+
+NOTIFICACOES_DO_USUARIO = (
+    "SELECT * FROM {tabela} WHERE usuario_id = :usuario_id "
+    "AND (:status IS NULL OR status = :status) ORDER BY data_criacao DESC"
+)
+
+# Registro de comandos nomeados, executados com DatabaseManager.executar_consulta.
+# O texto de cada um é sempre o mesmo (só os parâmetros mudam), então o SQLite
+# reaproveita o comando compilado no cache da conexão.
+CONSULTAS = {
+    'atendimentos.todos':
+        SELECT_ATENDIMENTOS + "ORDER BY a.data DESC",
+    'atendimentos.por_imovel':
+        SELECT_ATENDIMENTOS + "WHERE a.imovel_id = ? ORDER BY a.data DESC",
+    'atendimentos.por_unidade':
+        SELECT_ATENDIMENTOS + "WHERE a.unidade_id = ? ORDER BY a.data DESC",
+    'atendimentos.ultimos':
+        SELECT_ATENDIMENTOS + "ORDER BY a.data_registro DESC LIMIT ?",
+    'atendimentos.total':
+        "SELECT COUNT(*) as total FROM atendimentos",
+    'atendimentos.total_por_resultado':
+        "SELECT resultado, COUNT(*) as total FROM atendimentos GROUP BY resultado",
+    'atendimentos.total_por_tipo_imovel':
+        "SELECT i.tipo, COUNT(*) as total "
+        "FROM atendimentos a "
+        "JOIN imoveis i ON a.imovel_id = i.id "
+        "GROUP BY i.tipo",
+    'atendimentos.total_por_territorio':
+        "SELECT t.nome, COUNT(*) as total "
+        "FROM atendimentos a "
+        "JOIN imoveis i ON a.imovel_id = i.id "
+        "JOIN ruas r ON i.rua_id = r.id "
+        "JOIN territorios t ON r.territorio_id = t.id "
+        "GROUP BY t.id",
+    'atendimentos.inserir':
+        "INSERT INTO atendimentos (imovel_id, unidade_id, data, resultado, observacoes) "
+        "VALUES (?, ?, ?, ?, ?)",
+    'atendimentos.atualizar':
+        "UPDATE atendimentos SET imovel_id = ?, unidade_id = ?, data = ?, "
+        "resultado = ?, observacoes = ? WHERE id = ?",
+    'atendimentos.excluir':
+        "DELETE FROM atendimentos WHERE id = ?",
+    'atendimentos.ultima_data_por_unidade':
+        "SELECT unidade_id, MAX(data) as data FROM atendimentos "
+        "WHERE imovel_id = ? AND unidade_id IS NOT NULL GROUP BY unidade_id",
+    'atendimentos.ultimo_da_unidade':
+        "SELECT * FROM atendimentos WHERE unidade_id = ? ORDER BY data DESC LIMIT 1",
+    'atendimentos.atualizar_visita':
+        "UPDATE atendimentos SET data = ?, resultado = ?, observacoes = ? WHERE id = ?",
+    'atendimentos.das_casas':
+        "SELECT imovel_id, id, data, observacoes FROM atendimentos WHERE unidade_id IS NULL",
+    'atendimentos.atualizar_observacoes':
+        "UPDATE atendimentos SET data = ?, observacoes = ? WHERE id = ?",
+    'atendimentos.inserir_casa':
+        "INSERT INTO atendimentos (imovel_id, data, observacoes) VALUES (?, ?, ?)",
+    'atendimentos.casas_atendidas':
+        "SELECT COUNT(DISTINCT imovel_id) as atendidos FROM atendimentos "
+        "JOIN imoveis ON atendimentos.imovel_id = imoveis.id "
+        "WHERE imoveis.tipo IN ('residencial', 'comercial')",
+    
+    'designacoes.todas':
+        SELECT_DESIGNACOES + "ORDER BY d.data_designacao DESC",
+    'designacoes.ativas':
+        SELECT_DESIGNACOES + "WHERE d.status = 'ativo' ORDER BY d.data_designacao DESC",
+    'designacoes.por_id':
+        SELECT_DESIGNACOES + "WHERE d.id = ?",
+    'designacoes.por_territorio':
+        SELECT_DESIGNACOES + "WHERE d.territorio_id = ? ORDER BY d.data_designacao DESC",
+    'designacoes.ativa_por_territorio':
+        SELECT_DESIGNACOES + "WHERE d.territorio_id = ? AND d.status = 'ativo'",
+    'designacoes.do_dia':
+        SELECT_DESIGNACOES + "WHERE d.data_designacao <= ? AND (d.data_devolucao >= ? OR d.data_devolucao IS NULL) "
+        "AND d.status = 'ativo' ORDER BY d.data_designacao DESC LIMIT 1",
+    'designacoes.territorio_designado':
+        "SELECT 1 FROM designacoes WHERE territorio_id = ? AND status = 'ativo'",
+    'designacoes.concluir_ativa_do_territorio':
+        "UPDATE designacoes SET status = 'concluido' "
+        "WHERE territorio_id = ? AND status = 'ativo' AND id IS NOT ?",
+    'designacoes.inserir':
+        "INSERT INTO designacoes (territorio_id, saida_campo_id, data_designacao, "
+        "data_devolucao, responsavel, status) VALUES (?, ?, ?, ?, ?, ?)",
+    'designacoes.atualizar':
+        "UPDATE designacoes SET territorio_id = ?, saida_campo_id = ?, "
+        "data_designacao = ?, data_devolucao = ?, responsavel = ?, status = ? "
+        "WHERE id = ?",
+    'designacoes.concluir':
+        "UPDATE designacoes SET status = 'concluido' WHERE id = ?",
+    'designacoes.excluir':
+        "DELETE FROM designacoes WHERE id = ?",
+    'designacoes.vencendo_no_periodo':
+        "SELECT d.*, t.nome as territorio_nome FROM designacoes d "
+        "JOIN territorios t ON d.territorio_id = t.id "
+        "WHERE d.status = 'ativo' AND d.data_devolucao BETWEEN ? AND ? "
+        "ORDER BY d.data_devolucao",
+    'designacoes.prazos_ativos':
+        "SELECT 'designacao' as entidade, id, data_devolucao FROM designacoes "
+        "WHERE status = 'ativo' AND data_devolucao >= ? "
+        "UNION ALL "
+        "SELECT 'designacao_predios_vilas' as entidade, id, data_devolucao FROM designacoes_predios_vilas "
+        "WHERE status = 'ativo' AND data_devolucao >= ?",
+    'designacoes.buscar':
+        SELECT_DESIGNACOES + FILTRO_BUSCA_DESIGNACOES.format(territorio='d.territorio_id'),
+    'designacoes.para_cartoes':
+        "SELECT d.*, s.nome as saida_campo_nome "
+        "FROM designacoes d JOIN saidas_campo s ON d.saida_campo_id = s.id "
+        "WHERE (:ids IS NULL OR d.territorio_id IN (SELECT value FROM json_each(:ids))) "
+        "ORDER BY d.data_designacao DESC, d.id DESC",
+    
+    'designacoes_predios_vilas.todas':
+        SELECT_DESIGNACOES_PREDIOS_VILAS + "ORDER BY d.data_designacao DESC",
+    'designacoes_predios_vilas.ativas':
+        SELECT_DESIGNACOES_PREDIOS_VILAS + "WHERE d.status = 'ativo' ORDER BY d.data_designacao DESC",
+    'designacoes_predios_vilas.ativa_por_imovel':
+        SELECT_DESIGNACOES_PREDIOS_VILAS + "WHERE d.imovel_id = ? AND d.status = 'ativo'",
+    'designacoes_predios_vilas.imovel_designado':
+        "SELECT 1 FROM designacoes_predios_vilas WHERE imovel_id = ? AND status = 'ativo'",
+    'designacoes_predios_vilas.concluir_ativa_do_imovel':
+        "UPDATE designacoes_predios_vilas SET status = 'concluido' "
+        "WHERE imovel_id = ? AND status = 'ativo' AND id IS NOT ?",
+    'designacoes_predios_vilas.inserir':
+        "INSERT INTO designacoes_predios_vilas (imovel_id, responsavel, saida_campo_id, "
+        "data_designacao, data_devolucao, status) VALUES (?, ?, ?, ?, ?, ?)",
+    'designacoes_predios_vilas.atualizar':
+        "UPDATE designacoes_predios_vilas SET imovel_id = ?, responsavel = ?, "
+        "saida_campo_id = ?, data_designacao = ?, data_devolucao = ?, status = ? "
+        "WHERE id = ?",
+    'designacoes_predios_vilas.concluir':
+        "UPDATE designacoes_predios_vilas SET status = 'concluido' WHERE id = ?",
+    'designacoes_predios_vilas.excluir':
+        "DELETE FROM designacoes_predios_vilas WHERE id = ?",
+    'designacoes_predios_vilas.vencendo_no_periodo':
+        "SELECT d.*, i.nome as imovel_nome, i.numero, i.tipo "
+        "FROM designacoes_predios_vilas d "
+        "JOIN imoveis i ON d.imovel_id = i.id "
+        "WHERE d.status = 'ativo' AND d.data_devolucao BETWEEN ? AND ? "
+        "ORDER BY d.data_devolucao",
+    'designacoes_predios_vilas.buscar':
+        SELECT_DESIGNACOES_PREDIOS_VILAS + FILTRO_BUSCA_DESIGNACOES.format(territorio='r.territorio_id'),
+    
+    # Casas (residenciais e/ou comerciais): o filtro de tipo recebe dois tipos,
+    # repetidos quando só um estiver marcado
+    'imoveis.casas_por_rua':
+        SELECT_IMOVEIS_CASAS + "WHERE i.rua_id = ? AND i.tipo IN (?, ?) ORDER BY r.nome, i.numero_ordem",
+    'imoveis.casas_por_territorio':
+        SELECT_IMOVEIS_CASAS + "WHERE t.id = ? AND i.tipo IN (?, ?) ORDER BY r.nome, i.numero_ordem",
+    'imoveis.por_id':
+        "SELECT * FROM imoveis WHERE id = ?",
+    'imoveis.por_rua':
+        "SELECT * FROM imoveis WHERE rua_id = ? ORDER BY numero_ordem",
+    'imoveis.por_tipo':
+        "SELECT * FROM imoveis WHERE tipo = ? ORDER BY numero_ordem",
+    'imoveis.predios_vilas':
+        "SELECT i.*, r.nome as rua_nome, t.nome as territorio_nome "
+        "FROM imoveis i "
+        "JOIN ruas r ON i.rua_id = r.id "
+        "JOIN territorios t ON r.territorio_id = t.id "
+        "WHERE i.tipo IN ('predio', 'vila') "
+        "ORDER BY t.nome, r.nome, i.numero_ordem",
+    'imoveis.predios_vilas_sem_faixas':
+        "SELECT * FROM imoveis WHERE tipo IN ('predio', 'prédio', 'vila') AND total_unidades > 0 "
+        "AND NOT EXISTS (SELECT 1 FROM faixas_unidades f WHERE f.imovel_id = imoveis.id)",
+    'imoveis.inserir':
+        "INSERT INTO imoveis (rua_id, numero, numero_ordem, tipo, nome, total_unidades, "
+        "tipo_portaria, tipo_acesso, observacoes) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'imoveis.atualizar':
+        "UPDATE imoveis SET rua_id = ?, numero = ?, numero_ordem = ?, tipo = ?, nome = ?, "
+        "total_unidades = ?, tipo_portaria = ?, tipo_acesso = ?, observacoes = ? "
+        "WHERE id = ?",
+    'imoveis.definir_total_unidades':
+        "UPDATE imoveis SET total_unidades = ? WHERE id = ?",
+    'imoveis.excluir':
+        "DELETE FROM imoveis WHERE id = ?",
+    'imoveis.por_territorio':
+        "SELECT i.id, i.numero, i.tipo, r.nome as rua_nome FROM imoveis i "
+        "JOIN ruas r ON i.rua_id = r.id "
+        "WHERE r.territorio_id = ? ORDER BY r.nome, r.id, i.numero_ordem",
+    'imoveis.descricao':
+        "SELECT i.numero, i.tipo, r.nome as rua_nome "
+        "FROM imoveis i "
+        "JOIN ruas r ON i.rua_id = r.id "
+        "WHERE i.id = ?",
+    'imoveis.total_casas_da_rua':
+        "SELECT COUNT(*) as total FROM imoveis "
+        "WHERE rua_id = ? AND tipo IN ('residencial', 'comercial')",
+    'imoveis.casas_da_rua':
+        "SELECT id, tipo FROM imoveis WHERE rua_id = ? AND tipo IN ('residencial', 'comercial')",
+    'imoveis.total_casas':
+        "SELECT COUNT(*) as total FROM imoveis WHERE tipo IN ('residencial', 'comercial')",
+    'imoveis.para_cartoes':
+        "SELECT i.id, i.rua_id, i.numero, i.tipo, i.nome, i.total_unidades "
+        "FROM imoveis i JOIN ruas r ON i.rua_id = r.id "
+        "WHERE (:ids IS NULL OR r.territorio_id IN (SELECT value FROM json_each(:ids))) "
+        "ORDER BY i.rua_id, i.numero_ordem",
+    
+    'faixas_unidades.por_imovel':
+        "SELECT * FROM faixas_unidades WHERE imovel_id = ? ORDER BY bloco, id",
+    'faixas_unidades.excluir_do_imovel':
+        "DELETE FROM faixas_unidades WHERE imovel_id = ?",
+    'faixas_unidades.inserir':
+        "INSERT INTO faixas_unidades (imovel_id, prefixo, bloco, andar_inicio, andar_fim, "
+        "unidade_inicio, unidade_fim) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    
+    'unidades.por_imovel':
+        "SELECT * FROM unidades WHERE imovel_id = ? ORDER BY numero_ordem",
+    'unidades.total_do_imovel':
+        "SELECT total FROM total_unidades_imovel WHERE imovel_id = ?",
+    'unidades.por_numero':
+        "SELECT * FROM unidades WHERE imovel_id = ? AND numero = ?",
+    'unidades.inserir':
+        "INSERT INTO unidades (imovel_id, numero, numero_ordem, faixa_id) VALUES (?, ?, ?, ?)",
+    # Todas as unidades gravadas do imóvel, com o que impede descartá-las
+    'unidades.do_imovel_com_uso':
+        "SELECT u.id, u.numero, u.observacoes, "
+        "EXISTS (SELECT 1 FROM atendimentos a WHERE a.unidade_id = u.id) as atendida "
+        "FROM unidades u WHERE u.imovel_id = ?",
+    'unidades.excluir':
+        "DELETE FROM unidades WHERE id = ?",
+    'unidades.definir_faixa':
+        "UPDATE unidades SET faixa_id = ? WHERE id = ?",
+    'unidades.total_visitadas':
+        "SELECT COUNT(DISTINCT unidade_id) FROM atendimentos "
+        "WHERE imovel_id = ? AND unidade_id IS NOT NULL",
+    
+    'historico_predios_vilas.inserir':
+        "INSERT INTO historico_predios_vilas (imovel_id, data, descricao) VALUES (?, ?, ?)",
+    'historico_predios_vilas.por_imovel':
+        "SELECT * FROM historico_predios_vilas WHERE imovel_id = ? ORDER BY data DESC",
+    
+    'territorios.todos':
+        "SELECT * FROM territorios ORDER BY nome",
+    'territorios.por_id':
+        "SELECT * FROM territorios WHERE id = ?",
+    'territorios.sugestoes':
+        "SELECT t.id, t.nome, r.ultima_conclusao, r.total_imoveis, r.imoveis_visitados "
+        "FROM territorios t JOIN resumo_territorios r ON r.territorio_id = t.id "
+        "WHERE NOT EXISTS (SELECT 1 FROM designacoes d "
+        "                  WHERE d.territorio_id = t.id AND d.status = 'ativo')",
+    'territorios.inserir':
+        "INSERT INTO territorios (nome, descricao, ultima_visita) VALUES (?, ?, ?)",
+    'territorios.atualizar':
+        "UPDATE territorios SET nome = ?, descricao = ?, ultima_visita = ? WHERE id = ?",
+    'territorios.excluir':
+        "DELETE FROM territorios WHERE id = ?",
+    'territorios.para_cartoes':
+        "SELECT * FROM territorios "
+        "WHERE (:ids IS NULL OR id IN (SELECT value FROM json_each(:ids))) ORDER BY nome",
+    
+    'ruas.todas':
+        "SELECT * FROM ruas ORDER BY nome",
+    'ruas.por_territorio':
+        "SELECT * FROM ruas WHERE territorio_id = ? ORDER BY nome",
+    'ruas.inserir':
+        "INSERT INTO ruas (territorio_id, nome) VALUES (?, ?)",
+    'ruas.atualizar':
+        "UPDATE ruas SET nome = ? WHERE id = ? AND territorio_id = ?",
+    'ruas.excluir':
+        "DELETE FROM ruas WHERE id = ? AND territorio_id = ?",
+    'ruas.nomes_por_territorio':
+        "SELECT id, nome FROM ruas WHERE territorio_id = ? ORDER BY nome",
+    'ruas.para_cartoes':
+        "SELECT * FROM ruas "
+        "WHERE (:ids IS NULL OR territorio_id IN (SELECT value FROM json_each(:ids))) ORDER BY nome",
+    
+    'saidas_campo.todas':
+        "SELECT * FROM saidas_campo ORDER BY data DESC",
+    'saidas_campo.no_periodo':
+        "SELECT * FROM saidas_campo WHERE data BETWEEN ? AND ?",
+    'saidas_campo.por_id':
+        "SELECT * FROM saidas_campo WHERE id = ?",
+    'saidas_campo.inserir_ocorrencia':
+        "INSERT OR IGNORE INTO saidas_campo (nome, data, dia_semana, horario, dirigente, regra_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+    'saidas_campo.por_regra_e_data':
+        "SELECT * FROM saidas_campo WHERE regra_id = ? AND data = ?",
+    'saidas_campo.inserir':
+        "INSERT INTO saidas_campo (nome, data, dia_semana, horario, dirigente) VALUES (?, ?, ?, ?, ?)",
+    'saidas_campo.atualizar':
+        "UPDATE saidas_campo SET nome = ?, data = ?, dia_semana = ?, horario = ?, dirigente = ? WHERE id = ?",
+    'saidas_campo.excluir':
+        "DELETE FROM saidas_campo WHERE id = ?",
+    'saidas_campo.desvincular_regra':
+        "UPDATE saidas_campo SET regra_id = NULL WHERE regra_id = ?",
+    
+    'regras_saida_campo.todas':
+        "SELECT * FROM regras_saida_campo ORDER BY ativa DESC, nome",
+    'regras_saida_campo.por_id':
+        "SELECT * FROM regras_saida_campo WHERE id = ?",
+    'regras_saida_campo.na_janela':
+        "SELECT * FROM regras_saida_campo "
+        "WHERE ativa = 1 AND data_inicio <= ? AND (data_fim IS NULL OR data_fim >= ?)",
+    'regras_saida_campo.inserir':
+        "INSERT INTO regras_saida_campo (nome, frequencia, dia_semana, semana_do_mes, intervalo, "
+        "horario, dirigente, data_inicio, data_fim, ativa) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'regras_saida_campo.atualizar':
+        "UPDATE regras_saida_campo SET nome = ?, frequencia = ?, dia_semana = ?, semana_do_mes = ?, "
+        "intervalo = ?, horario = ?, dirigente = ?, data_inicio = ?, data_fim = ?, ativa = ? "
+        "WHERE id = ?",
+    'regras_saida_campo.excluir':
+        "DELETE FROM regras_saida_campo WHERE id = ?",
+    
+    'excecoes_regra_saida.inserir':
+        "INSERT OR IGNORE INTO excecoes_regra_saida (regra_id, data) VALUES (?, ?)",
+    'excecoes_regra_saida.no_periodo':
+        "SELECT regra_id, data FROM excecoes_regra_saida WHERE data BETWEEN ? AND ?",
+    'excecoes_regra_saida.por_regra':
+        "SELECT regra_id, data FROM excecoes_regra_saida WHERE regra_id = ?",
+    'excecoes_regra_saida.todas':
+        "SELECT regra_id, data FROM excecoes_regra_saida",
+    'excecoes_regra_saida.excluir_da_regra':
+        "DELETE FROM excecoes_regra_saida WHERE regra_id = ?",
+    
+    'usuarios.por_id':
+        "SELECT * FROM usuarios WHERE id = ?",
+    'usuarios.por_email':
+        "SELECT * FROM usuarios WHERE email = ?",
+    'usuarios.inserir':
+        "INSERT INTO usuarios (nome, email, senha_hash, nivel_permissao, ativo) "
+        "VALUES (?, ?, ?, ?, ?)",
+    # senha_hash NULL mantém a senha (no modo cliente o hash não sai do servidor)
+    'usuarios.atualizar':
+        "UPDATE usuarios SET nome = ?, email = ?, senha_hash = COALESCE(?, senha_hash), "
+        "nivel_permissao = ?, ativo = ? WHERE id = ?",
+    'usuarios.excluir':
+        "DELETE FROM usuarios WHERE id = ?",
+    'usuarios.todos':
+        "SELECT * FROM usuarios ORDER BY nome",
+    'usuarios.ativos':
+        "SELECT * FROM usuarios WHERE ativo = 1 ORDER BY nome",
+    
+    'log_atividades.inserir':
+        "INSERT INTO log_atividades (usuario_id, tipo_acao, descricao, entidade, entidade_id) "
+        "VALUES (?, ?, ?, ?, ?)",
+    'log_atividades.inserir_com_data':
+        "INSERT INTO log_atividades (usuario_id, tipo_acao, descricao, "
+        "data_hora, entidade, entidade_id) VALUES (?, ?, ?, ?, ?, ?)",
+    'log_atividades.buscar':
+        BUSCA_LOG_ATIVIDADES.format(tabela='log_atividades'),
+    'log_atividades.buscar_com_arquivo':
+        BUSCA_LOG_ATIVIDADES.format(tabela='log_atividades_completo'),
+    
+    'notificacoes.inserir':
+        "INSERT INTO notificacoes (usuario_id, tipo, titulo, mensagem, status, link, entidade, entidade_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    'notificacoes.total_nao_lidas':
+        "SELECT total FROM notificacoes_nao_lidas WHERE usuario_id = ?",
+    'notificacoes.marcar_lida':
+        "UPDATE notificacoes SET status = ?, data_leitura = CURRENT_TIMESTAMP "
+        "WHERE id = ?",
+    'notificacoes.definir_status':
+        "UPDATE notificacoes SET status = ? WHERE id = ?",
+    'notificacoes.por_usuario':
+        NOTIFICACOES_DO_USUARIO.format(tabela='notificacoes'),
+    'notificacoes.por_usuario_com_arquivo':
+        NOTIFICACOES_DO_USUARIO.format(tabela='notificacoes_completo'),
+    'notificacoes.buscar':
+        "SELECT * FROM notificacoes WHERE usuario_id = :usuario_id "
+        "AND (:status IS NULL OR status IN (SELECT value FROM json_each(:status))) "
+        "AND (:apos_data IS NULL OR data_criacao < :apos_data "
+        "OR (data_criacao = :apos_data AND id < :apos_id)) "
+        "ORDER BY data_criacao DESC, id DESC LIMIT :limit",
+    'notificacoes.criar_para_todos':
+        "INSERT INTO notificacoes (usuario_id, tipo, titulo, mensagem, status, link, entidade, entidade_id) "
+        "SELECT id, :tipo, :titulo, :mensagem, :status, :link, :entidade, :entidade_id "
+        "FROM usuarios WHERE ativo = 1 "
+        "AND (:nivel_minimo IS NULL OR nivel_permissao >= :nivel_minimo) "
+        "AND (NOT :evitar_repetidas OR NOT EXISTS (SELECT 1 FROM notificacoes n "
+        "WHERE n.usuario_id = usuarios.id AND n.entidade = :entidade AND n.entidade_id = :entidade_id "
+        "AND n.status = :status AND n.tipo = :tipo))",
+    'notificacoes.marcar_lidas_em_lote':
+        "UPDATE notificacoes SET status = :status, data_leitura = CURRENT_TIMESTAMP "
+        "WHERE usuario_id = :usuario_id AND status = :status_anterior "
+        "AND (:ids IS NULL OR id IN (SELECT value FROM json_each(:ids)))",
+    'notificacoes.alterar_status_em_lote':
+        "UPDATE notificacoes SET status = :status "
+        "WHERE usuario_id = :usuario_id AND status != :status "
+        "AND (:ids IS NULL OR id IN (SELECT value FROM json_each(:ids)))",
+    
+    # Histórico de desfazer/refazer (database/desfazer.py), de um usuário numa sessão
+    'acoes_desfazer.descartar_desfeitas':
+        "DELETE FROM acoes_desfazer WHERE estado = 'desfeita' AND sessao = ?",
+    'acoes_desfazer.descartar_outras_sessoes':
+        "DELETE FROM acoes_desfazer WHERE sessao IS NOT ? AND data_hora < datetime('now', '-1 day')",
+    'acoes_desfazer.inserir':
+        "INSERT INTO acoes_desfazer (descricao, usuario_id, sessao) VALUES (?, ?, ?)",
+    'acoes_desfazer.excluir_se_vazia':
+        "DELETE FROM acoes_desfazer WHERE id = ? "
+        "AND NOT EXISTS (SELECT 1 FROM imagens_desfazer WHERE acao_id = ?)",
+    'acoes_desfazer.limitar':
+        "DELETE FROM acoes_desfazer WHERE sessao = :sessao AND id NOT IN ("
+        "SELECT id FROM acoes_desfazer WHERE sessao = :sessao ORDER BY id DESC LIMIT :maximo)",
+    'acoes_desfazer.ultima_feita':
+        "SELECT id, descricao FROM acoes_desfazer WHERE estado = 'feita' "
+        "AND usuario_id IS ? AND sessao = ? ORDER BY id DESC LIMIT 1",
+    'acoes_desfazer.primeira_desfeita':
+        "SELECT id, descricao FROM acoes_desfazer WHERE estado = 'desfeita' "
+        "AND usuario_id IS ? AND sessao = ? ORDER BY id ASC LIMIT 1",
+    # A ação (refeita) volta a excluir linhas
+    'acoes_desfazer.exclui_linhas':
+        "SELECT EXISTS (SELECT 1 FROM liquido_desfazer "
+        "WHERE acao_id = ? AND antes IS NOT NULL AND depois IS NULL)",
+    'contexto_desfazer.definir':
+        "INSERT INTO contexto_desfazer (acao_id) VALUES (?)",
+    'contexto_desfazer.limpar':
+        "DELETE FROM contexto_desfazer",
+}
+
+# Comandos do registro que só leem (no modo cliente, vão para os leitores do servidor)
+PADRAO_LEITURA = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+LEITURAS = frozenset(nome for nome, sql in CONSULTAS.items() if PADRAO_LEITURA.match(sql))
+
+
+class EstatisticaConsulta:
+    """Execuções, falhas e tempo (até a primeira linha) de um comando do registro"""
+    
+    __slots__ = ('nome', 'execucoes', 'falhas', 'tempo_total', 'tempo_maximo')
+    
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.execucoes = 0
+        self.falhas = 0
+        self.tempo_total = 0.0
+        self.tempo_maximo = 0.0
+    
+    def registrar(self, tempo: float, falhou: bool) -> None:
+        self.execucoes += 1
+        self.falhas += int(falhou)
+        self.tempo_total += tempo
+        self.tempo_maximo = max(self.tempo_maximo, tempo)
+    
+    @property
+    def tempo_medio(self) -> float:
+        return self.tempo_total / self.execucoes if self.execucoes else 0.0
+
+
+def relatorio(estatisticas: Dict[str, EstatisticaConsulta]) -> List[Dict]:
+    """Estatísticas por comando, do maior tempo total ao menor"""
+    return [
+        {'nome': e.nome, 'execucoes': e.execucoes, 'falhas': e.falhas,
+         'tempo_total': e.tempo_total, 'tempo_medio': e.tempo_medio, 'tempo_maximo': e.tempo_maximo}
+        for e in sorted(estatisticas.values(), key=lambda e: e.tempo_total, reverse=True)
+    ]
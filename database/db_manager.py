@@ -3,22 +3,81 @@
 
 import os
 import sqlite3
+import time
 from datetime import datetime
 
+from database.cache import MapaIdentidade
+from database.arquivamento import anexar_arquivo
+from database.sincronizacao import instalar_diario
+from database.desfazer import HistoricoDesfazer, instalar_desfazer
+from database.cliente_api import ClienteAPI
+from database.manutencao import otimizar_ao_fechar
+from database.consultas import CONSULTAS, TAMANHO_CACHE_COMANDOS, EstatisticaConsulta, relatorio
+
 class DatabaseManager:
     """Classe responsável por gerenciar a conexão com o banco de dados"""
     
-    def __init__(self, db_path):
-        """Inicializa o gerenciador de banco de dados"""
+    # Colunas acrescentadas depois da criação das tabelas: (tabela, coluna, definição)
+    COLUNAS_MIGRACAO = [
+        ("saidas_campo", "regra_id", "INTEGER REFERENCES regras_saida_campo(id) ON DELETE SET NULL"),
+        ("unidades", "faixa_id", "INTEGER REFERENCES faixas_unidades(id) ON DELETE SET NULL"),
+        ("imoveis", "numero_ordem", "TEXT"),  # chave de ordenação natural de numero
+        ("unidades", "numero_ordem", "TEXT"),
+    ]
+    
+    # Índices e visões que dependem das colunas acima (criados depois da migração)
+    ESTRUTURAS_MIGRACAO = [
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_saidas_campo_regra_data "
+        "ON saidas_campo(regra_id, data) WHERE regra_id IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_unidades_imovel_numero ON unidades(imovel_id, numero)",
+        "CREATE INDEX IF NOT EXISTS idx_imoveis_rua_numero_ordem ON imoveis(rua_id, numero_ordem)",
+        "CREATE INDEX IF NOT EXISTS idx_imoveis_tipo_numero_ordem ON imoveis(tipo, numero_ordem)",
+        "CREATE INDEX IF NOT EXISTS idx_unidades_imovel_numero_ordem ON unidades(imovel_id, numero_ordem)",
+        # Total de unidades por imóvel: tamanho das faixas mais as unidades avulsas
+        "CREATE VIEW IF NOT EXISTS total_unidades_imovel AS "
+        "SELECT imovel_id, SUM(total) as total FROM ("
+        "    SELECT imovel_id, (unidade_fim - unidade_inicio + 1) * "
+        "           COALESCE(andar_fim - andar_inicio + 1, 1) as total FROM faixas_unidades "
+        "    UNION ALL "
+        "    SELECT imovel_id, COUNT(*) FROM unidades WHERE faixa_id IS NULL GROUP BY imovel_id"
+        ") GROUP BY imovel_id",
+    ]
+    
+    # Uma única designação ativa por território e por prédio/vila: (tabela, coluna, índice único parcial)
+    DESIGNACOES_ATIVAS = [
+        ("designacoes", "territorio_id", "uq_designacoes_territorio_ativo"),
+        ("designacoes_predios_vilas", "imovel_id", "uq_designacoes_predios_vilas_imovel_ativo"),
+    ]
+    
+    def __init__(self, db_path, servidor=None, chave=None):
+        """Inicializa o gerenciador de banco de dados
+        
+        Com servidor (ex.: "http://192.168.0.10:8780"), trabalha em modo cliente:
+        os comandos são executados pelo ServidorAPI em vez de abrir o arquivo.
+        """
         self.db_path = db_path
         self.connection = None
         self.cursor = None
+        self.cliente = ClienteAPI(servidor, chave) if servidor else None
+        # Mapa de identidade da sessão (territórios, usuários e saídas de campo).
+        # Desligado no modo cliente: outros computadores alteram o banco sem a
+        # sessão saber, e as leituras do servidor já são revalidadas por ETag
+        self.cache = MapaIdentidade(ativo=self.cliente is None)
+        # Último uso do banco (time.monotonic), para a manutenção esperar o sistema ficar ocioso
+        self.ultima_atividade = time.monotonic()
+        # Estatísticas dos comandos do registro (executar_consulta), por nome
+        self.estatisticas_consultas = {}
+        # Desfazer/refazer das ações de cadastro; dentro de uma ação os commits são adiados
+        self.historico = HistoricoDesfazer(self)
+        self.adiar_commit = False
         self.connect()
     
     def connect(self):
         """Estabelece a conexão com o banco de dados"""
+        if self.cliente is not None:
+            return True
         try:
-            self.connection = sqlite3.connect(self.db_path)
+            self.connection = sqlite3.connect(self.db_path, cached_statements=TAMANHO_CACHE_COMANDOS)
             self.connection.row_factory = sqlite3.Row  # Para acessar colunas pelo nome
             self.cursor = self.connection.cursor()
             return True
@@ -26,20 +85,65 @@ class DatabaseManager:
             print(f"Erro ao conectar ao banco de dados: {e}")
             return False
     
+    def anexar_arquivo(self):
+        """Anexa o banco de arquivo, criando as visões log_atividades_completo e notificacoes_completo"""
+        if self.cliente is not None:
+            return True  # Os leitores do servidor já têm o arquivo anexado
+        try:
+            self.connection.commit()
+            anexar_arquivo(self.connection, self.db_path)
+            return True
+        except sqlite3.Error as e:
+            print(f"Erro ao anexar banco de arquivo: {e}")
+            return False
+
     def close(self):
         """Fecha a conexão com o banco de dados"""
+        if self.cliente is not None:
+            self.cliente.fechar()
         if self.connection:
+            otimizar_ao_fechar(self.connection)
             self.connection.close()
+            self.connection = None
     
     def commit(self):
         """Comita as alterações no banco de dados"""
+        if self.adiar_commit:
+            return  # A ação desfazível em andamento comita tudo junto no fim
+        if self.cliente is not None:
+            try:
+                self.cliente.commit()
+            except sqlite3.Error as e:
+                print(f"Erro ao comitar no servidor: {e}")
         if self.connection:
             self.connection.commit()
     
+    def rollback(self):
+        """Desfaz as alterações ainda não comitadas"""
+        if self.cliente is not None:
+            try:
+                self.cliente.rollback()
+            except sqlite3.Error as e:
+                print(f"Erro ao desfazer no servidor: {e}")
+        if self.connection:
+            self.connection.rollback()
+    
     def execute(self, query, params=None):
-        """Executa uma query SQL"""
+        """Executa uma query SQL no banco local
+        
+        No modo cliente o servidor só aceita comandos do registro; use executar_consulta.
+        """
+        if self.cliente is not None:
+            print(f"Comando fora do registro recusado no modo cliente: {query}")
+            return None
+        return self._executar(query, params)
+    
+    def _executar(self, query, params=None, nome=None):
+        self.ultima_atividade = time.monotonic()
         try:
-            if params:
+            if self.cliente is not None:
+                self.cursor = self.cliente.executar(nome, params)
+            elif params:
                 self.cursor.execute(query, params)
             else:
                 self.cursor.execute(query)
@@ -51,7 +155,11 @@ class DatabaseManager:
             return None
     
     def executemany(self, query, params_list):
-        """Executa uma query SQL múltiplas vezes com diferentes parâmetros"""
+        """Executa uma query SQL múltiplas vezes com diferentes parâmetros (só no banco local)"""
+        if self.cliente is not None:
+            print(f"Comando fora do registro recusado no modo cliente: {query}")
+            return None
+        self.ultima_atividade = time.monotonic()
         try:
             self.cursor.executemany(query, params_list)
             return self.cursor
@@ -59,8 +167,51 @@ class DatabaseManager:
             print(f"Erro ao executar query múltipla: {e}")
             return None
     
+    def executar_consulta(self, nome, params=None):
+        """Executa um comando do registro (database/consultas.py) pelo nome"""
+        inicio = time.perf_counter()
+        cursor = self._executar(CONSULTAS[nome], params, nome)
+        estatistica = self.estatisticas_consultas.get(nome)
+        if estatistica is None:
+            estatistica = self.estatisticas_consultas[nome] = EstatisticaConsulta(nome)
+        estatistica.registrar(time.perf_counter() - inicio, cursor is None)
+        return cursor
+    
+    def relatorio_consultas(self):
+        """Execuções e tempos dos comandos do registro, do mais custoso ao menos"""
+        return relatorio(self.estatisticas_consultas)
+    
+    def executar_lote(self, consultas):
+        """Executa várias consultas do registro, dadas como (nome, params); retorna
+        a lista de linhas de cada uma
+        
+        No modo cliente, o lote inteiro vai ao servidor em uma única requisição.
+        """
+        self.ultima_atividade = time.monotonic()
+        try:
+            if self.cliente is not None:
+                resultados = self.cliente.consultar_lote(consultas)
+                for resultado in resultados:
+                    if isinstance(resultado, Exception):
+                        raise resultado
+                return [resultado.fetchall() for resultado in resultados]
+            return [self.connection.execute(CONSULTAS[nome], params or ()).fetchall()
+                    for nome, params in consultas]
+        except sqlite3.Error as e:
+            print(f"Erro ao executar lote de consultas: {e}")
+            return None
+    
     def setup_database(self):
         """Configura o banco de dados com o schema inicial"""
+        if self.cliente is not None:
+            # O schema e as migrações ficam a cargo do servidor
+            try:
+                self.cliente.estado()
+                return True
+            except sqlite3.Error as e:
+                print(f"Erro ao conectar ao servidor: {e}")
+                return False
+        
         # Lê o arquivo de schema principal
         schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
         try:
@@ -70,6 +221,10 @@ class DatabaseManager:
             # Executa o schema principal
             self.cursor.executescript(schema)
             self.connection.commit()
+            self._migrar_colunas()
+            instalar_diario(self.connection)  # Diário de alterações para a sincronização
+            instalar_desfazer(self.connection)  # Histórico para desfazer/refazer
+            repetidas = self._unificar_designacoes_ativas()
             print("Schema principal configurado com sucesso.")
             
             # Configura o schema de usuários
@@ -80,16 +235,94 @@ class DatabaseManager:
             if count == 0:
                 self._criar_dados_exemplo()
             
+            # Converte unidades gravadas uma a uma em faixas (bancos antigos e dados de exemplo)
+            from models.imovel import Imovel
+            Imovel.compactar_unidades(self)
+            self._preencher_chaves_ordenacao()
+            self.connection.commit()
+            
             # Cria um usuário administrador padrão se não existir
             count = self.execute("SELECT COUNT(*) FROM usuarios").fetchone()
             if count and count[0] == 0:
                 self._criar_usuario_admin()
             
+            if repetidas:
+                self._avisar_designacoes_repetidas(repetidas)
+            
             return True
         except Exception as e:
             print(f"Erro ao configurar banco de dados: {e}")
             return False
     
+    def _migrar_colunas(self):
+        """Acrescenta às tabelas existentes as colunas que o schema.sql não consegue criar"""
+        for tabela, coluna, definicao in self.COLUNAS_MIGRACAO:
+            colunas = [row['name'] for row in self.execute(f"PRAGMA table_info({tabela})").fetchall()]
+            if coluna not in colunas:
+                self.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+        for ddl in self.ESTRUTURAS_MIGRACAO:
+            self.execute(ddl)
+        self._preencher_chaves_ordenacao()
+        self.connection.commit()
+    
+    def _unificar_designacoes_ativas(self):
+        """Cria os índices de designação ativa única; retorna as ativas repetidas que concluiu
+        
+        Bancos anteriores aos índices podem ter mais de uma designação ativa do
+        mesmo território ou prédio/vila. Fica ativa a mais recente; as demais
+        são concluídas e informadas, sem apagar nada.
+        """
+        repetidas = []
+        for tabela, coluna, indice in self.DESIGNACOES_ATIVAS:
+            cursor = self.execute(
+                f"SELECT id, {coluna} as chave, data_designacao, responsavel FROM {tabela} "
+                f"WHERE status = 'ativo' AND id NOT IN ("
+                f"    SELECT MAX(id) FROM {tabela} WHERE status = 'ativo' GROUP BY {coluna}"
+                f") ORDER BY {coluna}, id"
+            )
+            linhas = cursor.fetchall() if cursor else []
+            if linhas:
+                self.executemany(f"UPDATE {tabela} SET status = 'concluido' WHERE id = ?",
+                                 [(row['id'],) for row in linhas])
+                for row in linhas:
+                    print(f"Designação ativa repetida concluída: {tabela} #{row['id']} "
+                          f"({coluna} = {row['chave']}, designada em {row['data_designacao']}, "
+                          f"responsável: {row['responsavel'] or '-'})")
+                    repetidas.append((tabela, row['id']))
+            self.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {indice} ON {tabela}({coluna}) WHERE status = 'ativo'")
+        self.connection.commit()
+        return repetidas
+    
+    def _avisar_designacoes_repetidas(self, repetidas):
+        """Notifica os gestores sobre as designações ativas repetidas concluídas na atualização"""
+        from models.usuario import Usuario, Notificacao
+        
+        territorios = [str(id) for tabela, id in repetidas if tabela == "designacoes"]
+        predios_vilas = [str(id) for tabela, id in repetidas if tabela != "designacoes"]
+        detalhes = []
+        if territorios:
+            detalhes.append(f"designações de território nº {', '.join(territorios)}")
+        if predios_vilas:
+            detalhes.append(f"designações de prédios/vilas nº {', '.join(predios_vilas)}")
+        Notificacao.criar_para_todos(
+            self, Notificacao.TIPO_ALERTA, "Designações ativas repetidas concluídas",
+            f"Havia mais de uma designação ativa para o mesmo território ou prédio/vila. "
+            f"Foi mantida a mais recente e concluídas as demais: {'; '.join(detalhes)}. "
+            f"Confira se as datas de devolução estão corretas.",
+            nivel_minimo=Usuario.NIVEL_GESTOR
+        )
+    
+    def _preencher_chaves_ordenacao(self):
+        """Calcula numero_ordem das linhas que ainda não o têm (bancos antigos ou inserções externas)"""
+        from models.imovel import chave_natural
+        
+        for tabela in ("imoveis", "unidades"):
+            cursor = self.execute(f"SELECT id, numero FROM {tabela} WHERE numero_ordem IS NULL")
+            if cursor:
+                pendentes = [(chave_natural(row['numero']), row['id']) for row in cursor.fetchall()]
+                if pendentes:
+                    self.executemany(f"UPDATE {tabela} SET numero_ordem = ? WHERE id = ?", pendentes)
+    
     def setup_usuarios_schema(self):
         """Configura o schema para usuários, logs e notificações"""
         schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_usuarios.sql')
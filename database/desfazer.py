@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from database.sincronizacao import TABELAS_SINCRONIZADAS
+
+# Tabelas cujas alterações podem ser desfeitas, com os pais antes dos filhos
+TABELAS_DESFAZER = list(TABELAS_SINCRONIZADAS)
+
+# Ações guardadas no histórico; as mais antigas são descartadas
+MAXIMO_ACOES = 30
+
+TABELAS_CONTROLE = [
+    # Uma linha por ação do usuário; estado 'desfeita' fica disponível para refazer.
+    # Cada usuário só vê as ações da própria sessão (execução do sistema)
+    "CREATE TABLE IF NOT EXISTS acoes_desfazer ("
+    "    id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "    descricao TEXT NOT NULL,"
+    "    estado TEXT NOT NULL DEFAULT 'feita',"
+    "    data_hora TEXT DEFAULT CURRENT_TIMESTAMP,"
+    "    usuario_id INTEGER,"
+    "    sessao TEXT"
+    ")",
+    "CREATE INDEX IF NOT EXISTS idx_acoes_desfazer_sessao ON acoes_desfazer(sessao, estado, id)",
+    # Imagem (JSON) da linha antes e depois de cada alteração; NULL = não existia / foi excluída
+    "CREATE TABLE IF NOT EXISTS imagens_desfazer ("
+    "    id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "    acao_id INTEGER NOT NULL REFERENCES acoes_desfazer(id) ON DELETE CASCADE,"
+    "    tabela TEXT NOT NULL,"
+    "    linha_id INTEGER NOT NULL,"
+    "    antes TEXT,"
+    "    depois TEXT"
+    ")",
+    "CREATE INDEX IF NOT EXISTS idx_imagens_desfazer_acao ON imagens_desfazer(acao_id, tabela, linha_id)",
+    # Preenchida só durante uma ação, para os gatilhos saberem a que ação a alteração pertence
+    "CREATE TABLE IF NOT EXISTS contexto_desfazer (acao_id INTEGER)",
+    # Efeito líquido da ação em cada linha: a imagem antes da primeira alteração e depois da última
+    "CREATE VIEW IF NOT EXISTS liquido_desfazer AS "
+    "SELECT f.acao_id, f.tabela, f.linha_id, p.antes, u.depois FROM ("
+    "    SELECT acao_id, tabela, linha_id, MIN(id) AS primeira, MAX(id) AS ultima "
+    "    FROM imagens_desfazer GROUP BY acao_id, tabela, linha_id"
+    ") f "
+    "JOIN imagens_desfazer p ON p.id = f.primeira "
+    "JOIN imagens_desfazer u ON u.id = f.ultima",
+]
+
+def _imagem(linha: str, colunas: List[str]) -> str:
+    """Expressão SQL com a linha inteira em JSON"""
+    return "json_object(" + ", ".join(f"'{coluna}', {linha}.{coluna}" for coluna in colunas) + ")"
+
+
+def _gatilhos(tabela: str, colunas: List[str]) -> List[str]:
+    """Gatilhos que guardam as imagens das linhas alteradas durante uma ação"""
+    registrar = (
+        "INSERT INTO imagens_desfazer (acao_id, tabela, linha_id, antes, depois) "
+        f"VALUES ((SELECT acao_id FROM contexto_desfazer LIMIT 1), '{tabela}', {{linha}}.id, {{antes}}, {{depois}});"
+    )
+    durante_acao = "WHEN EXISTS (SELECT 1 FROM contexto_desfazer)"
+    return [
+        f"CREATE TRIGGER trg_desfazer_{tabela}_insert AFTER INSERT ON {tabela} {durante_acao} BEGIN "
+        f"{registrar.format(linha='NEW', antes='NULL', depois=_imagem('NEW', colunas))} END",
+        f"CREATE TRIGGER trg_desfazer_{tabela}_update AFTER UPDATE ON {tabela} {durante_acao} BEGIN "
+        f"{registrar.format(linha='NEW', antes=_imagem('OLD', colunas), depois=_imagem('NEW', colunas))} END",
+        f"CREATE TRIGGER trg_desfazer_{tabela}_delete AFTER DELETE ON {tabela} {durante_acao} BEGIN "
+        f"{registrar.format(linha='OLD', antes=_imagem('OLD', colunas), depois='NULL')} END",
+    ]
+
+
+def instalar_desfazer(connection: sqlite3.Connection) -> None:
+    """Cria as tabelas do histórico e recria os gatilhos com as colunas atuais das tabelas"""
+    for ddl in TABELAS_CONTROLE:
+        connection.execute(ddl)
+    for tabela in TABELAS_DESFAZER:
+        colunas = [row[1] for row in connection.execute(f"PRAGMA table_info({tabela})").fetchall()]
+        for operacao in ('insert', 'update', 'delete'):
+            connection.execute(f"DROP TRIGGER IF EXISTS trg_desfazer_{tabela}_{operacao}")
+        for ddl in _gatilhos(tabela, colunas):
+            connection.execute(ddl)
+    connection.commit()
+
+
+class HistoricoDesfazer:
+    """Desfaz e refaz ações de cadastro sem restaurar o banco inteiro
+    
+    As alterações feitas dentro de acao() entram no histórico como imagens
+    das linhas (antes e depois), gravadas pelos gatilhos, inclusive as
+    exclusões em cascata. Desfazer devolve cada linha ao estado anterior à
+    ação com um comando por tabela, numa só transação, mesmo que a ação
+    tenha excluído milhares de linhas. Se alguma dessas linhas mudou depois
+    da ação, nada é aplicado.
+    
+    O histórico é do usuário logado (usuario_id) e só da sessão atual: cada
+    execução do sistema tem a sua, e as ações de outras sessões não aparecem.
+    """
+    
+    def __init__(self, db_manager, maximo_acoes: int = MAXIMO_ACOES,
+                 usuario_id: int = None, sessao: str = None):
+        self.db_manager = db_manager
+        self.maximo_acoes = maximo_acoes
+        self.usuario_id = usuario_id  # Definido pela janela principal após o login
+        self.sessao = sessao or uuid.uuid4().hex
+        self._colunas = None  # tabela -> colunas, lidas no primeiro uso
+    
+    @contextmanager
+    def acao(self, descricao: str):
+        """Agrupa as alterações feitas no bloco em uma ação que pode ser desfeita
+        
+        Os commits dos modelos são adiados até o fim do bloco, para a ação
+        inteira (e suas imagens) ir numa só transação.
+        """
+        db = self.db_manager
+        if db.adiar_commit:
+            yield  # Dentro de outra ação: faz parte dela
+            return
+        
+        # Uma nova ação descarta o que havia para refazer (e o que sobrou de sessões antigas)
+        db.executar_consulta('acoes_desfazer.descartar_desfeitas', (self.sessao,))
+        db.executar_consulta('acoes_desfazer.descartar_outras_sessoes', (self.sessao,))
+        cursor = db.executar_consulta('acoes_desfazer.inserir', (descricao, self.usuario_id, self.sessao))
+        if not cursor:
+            yield
+            return
+        acao_id = cursor.lastrowid
+        db.executar_consulta('contexto_desfazer.definir', (acao_id,))
+        
+        db.adiar_commit = True
+        try:
+            yield
+        except BaseException:
+            db.adiar_commit = False
+            db.rollback()
+            raise
+        db.adiar_commit = False
+        
+        db.executar_consulta('contexto_desfazer.limpar')
+        # Ação sem alterações (ou desfeita por um rollback do modelo) não entra no histórico
+        db.executar_consulta('acoes_desfazer.excluir_se_vazia', (acao_id, acao_id))
+        db.executar_consulta('acoes_desfazer.limitar', {'sessao': self.sessao, 'maximo': self.maximo_acoes})
+        db.commit()
+    
+    def _proxima(self, estado: str) -> Optional[Dict]:
+        """Próxima ação a desfazer (a última feita) ou a refazer (a primeira desfeita)"""
+        consulta = 'acoes_desfazer.ultima_feita' if estado == 'feita' else 'acoes_desfazer.primeira_desfeita'
+        cursor = self.db_manager.executar_consulta(consulta, (self.usuario_id, self.sessao))
+        row = cursor.fetchone() if cursor else None
+        return {'id': row['id'], 'descricao': row['descricao']} if row else None
+    
+    def descricao_desfazer(self) -> Optional[str]:
+        acao = self._proxima('feita')
+        return acao['descricao'] if acao else None
+    
+    def descricao_refazer(self) -> Optional[str]:
+        acao = self._proxima('desfeita')
+        return acao['descricao'] if acao else None
+    
+    def refazer_exclui(self) -> bool:
+        """Se refazer a próxima ação vai excluir linhas de novo (para pedir confirmação)"""
+        acao = self._proxima('desfeita')
+        if acao is None:
+            return False
+        cursor = self.db_manager.executar_consulta('acoes_desfazer.exclui_linhas', (acao['id'],))
+        return bool(cursor and cursor.fetchone()[0])
+    
+    def desfazer(self) -> Optional[str]:
+        """Desfaz a última ação; retorna a descrição dela (None se não houver o que desfazer)"""
+        if self.db_manager.cliente is not None:
+            return self._no_servidor('historico.desfazer')
+        return self._aplicar('feita', 'antes', 'depois', 'desfeita')
+    
+    def refazer(self) -> Optional[str]:
+        """Refaz a última ação desfeita; retorna a descrição dela"""
+        if self.db_manager.cliente is not None:
+            return self._no_servidor('historico.refazer')
+        return self._aplicar('desfeita', 'depois', 'antes', 'feita')
+    
+    def _no_servidor(self, operacao: str) -> Optional[str]:
+        """Modo cliente: os comandos montados por _aplicar só rodam no servidor"""
+        try:
+            descricao = self.db_manager.cliente.operar(
+                operacao, {'usuario_id': self.usuario_id, 'sessao': self.sessao}
+            ).get('descricao')
+        except sqlite3.Error as e:
+            raise ValueError(str(e))
+        self.db_manager.cache.limpar()
+        return descricao
+    
+    def _colunas_tabelas(self) -> Dict[str, List[str]]:
+        if self._colunas is None:
+            self._colunas = {}
+            for tabela in TABELAS_DESFAZER:
+                cursor = self.db_manager.execute(f"PRAGMA table_info({tabela})")
+                self._colunas[tabela] = [row['name'] for row in cursor.fetchall()] if cursor else []
+        return self._colunas
+    
+    def _aplicar(self, estado: str, alvo: str, atual: str, novo_estado: str) -> Optional[str]:
+        """Leva as linhas da ação da imagem atual para a imagem alvo ('antes' ou 'depois')"""
+        acao = self._proxima(estado)
+        if acao is None:
+            return None
+        db = self.db_manager
+        colunas = self._colunas_tabelas()
+        parametros = (acao['id'],)
+        filtro = f"l.acao_id = ? AND l.tabela = '{{tabela}}'"
+        
+        # Cada linha precisa estar exatamente como a ação (ou o desfazer) a deixou
+        for tabela in TABELAS_DESFAZER:
+            cursor = db.execute(
+                f"SELECT COUNT(*) FROM liquido_desfazer l LEFT JOIN {tabela} x ON x.id = l.linha_id "
+                f"WHERE {filtro.format(tabela=tabela)} AND NOT ("
+                f"(l.{atual} IS NULL AND x.id IS NULL) OR "
+                f"(l.{atual} IS NOT NULL AND x.id IS NOT NULL AND {_imagem('x', colunas[tabela])} = l.{atual}))",
+                parametros
+            )
+            if not cursor:
+                raise ValueError("Não foi possível ler o histórico de alterações.")
+            if cursor.fetchone()[0]:
+                raise ValueError(f"Os dados de '{acao['descricao']}' foram alterados depois; "
+                                 f"a ação não pode mais ser {'desfeita' if estado == 'feita' else 'refeita'}.")
+        
+        # Referências conferidas só no commit: as linhas voltam em qualquer ordem dentro da transação
+        comandos = [("PRAGMA defer_foreign_keys = ON", ())]
+        for tabela in reversed(TABELAS_DESFAZER):
+            comandos.append((
+                f"DELETE FROM {tabela} WHERE id IN (SELECT l.linha_id FROM liquido_desfazer l "
+                f"WHERE {filtro.format(tabela=tabela)} AND l.{alvo} IS NULL AND l.{atual} IS NOT NULL)",
+                parametros
+            ))
+        for tabela in TABELAS_DESFAZER:
+            extrair = {coluna: f"json_extract(l.{alvo}, '$.{coluna}')" for coluna in colunas[tabela]}
+            atribuicoes = ", ".join(f"{coluna} = {expressao}" for coluna, expressao in extrair.items()
+                                    if coluna != 'id')
+            comandos.append((
+                f"UPDATE {tabela} SET {atribuicoes} FROM liquido_desfazer l "
+                f"WHERE {filtro.format(tabela=tabela)} AND l.{alvo} IS NOT NULL AND l.{atual} IS NOT NULL "
+                f"AND {tabela}.id = l.linha_id",
+                parametros
+            ))
+            comandos.append((
+                f"INSERT INTO {tabela} ({', '.join(extrair)}) SELECT {', '.join(extrair.values())} "
+                f"FROM liquido_desfazer l "
+                f"WHERE {filtro.format(tabela=tabela)} AND l.{alvo} IS NOT NULL AND l.{atual} IS NULL "
+                f"ORDER BY l.linha_id",
+                parametros
+            ))
+        comandos.append(("UPDATE acoes_desfazer SET estado = ? WHERE id = ?", (novo_estado, acao['id'])))
+        
+        for sql, params in comandos:
+            if not db.execute(sql, params):
+                db.rollback()
+                raise ValueError(f"Não foi possível {'desfazer' if estado == 'feita' else 'refazer'} "
+                                 f"'{acao['descricao']}'.")
+        try:
+            db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            raise ValueError(f"Não foi possível {'desfazer' if estado == 'feita' else 'refazer'} "
+                             f"'{acao['descricao']}': {e}")
+        db.cache.limpar()
+        return acao['descricao']
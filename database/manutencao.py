@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List
+
+from database.arquivamento import ALIAS_ARQUIVO, anexar_arquivo
+
+# Valores de PRAGMA auto_vacuum
+AUTO_VACUUM_NENHUM = 0
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Cargas com pelo menos tantas linhas alteradas atualizam as estatísticas em seguida
+LIMIAR_ANALYZE = 1000
+
+# Linhas amostradas por índice no ANALYZE feito pelo PRAGMA optimize
+LIMITE_ANALISE = 400
+
+# Registros mantidos em metricas_banco
+MAXIMO_METRICAS = 2000
+
+
+def medir(connection: sqlite3.Connection, esquema: str = 'main') -> Dict:
+    """Tamanho, páginas livres e modo de auto_vacuum de um banco da conexão"""
+    def pragma(nome):
+        return connection.execute(f"PRAGMA {esquema}.{nome}").fetchone()[0]
+    
+    paginas = pragma('page_count')
+    livres = pragma('freelist_count')
+    return {
+        'tamanho_bytes': paginas * pragma('page_size'),
+        'paginas': paginas,
+        'paginas_livres': livres,
+        'fragmentacao': livres / paginas if paginas else 0.0,
+        'auto_vacuum': pragma('auto_vacuum'),
+    }
+
+
+def analisar_apos_carga(connection: sqlite3.Connection, linhas: int) -> bool:
+    """Atualiza as estatísticas do planejador depois de uma carga grande (fora de transação)"""
+    if linhas < LIMIAR_ANALYZE:
+        return False
+    try:
+        connection.execute("ANALYZE")
+        connection.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"Erro ao atualizar estatísticas do banco: {e}")
+        return False
+
+
+def otimizar_ao_fechar(connection: sqlite3.Connection) -> None:
+    """PRAGMA optimize antes de fechar: reanalisa as tabelas consultadas que precisarem"""
+    try:
+        connection.execute(f"PRAGMA analysis_limit = {LIMITE_ANALISE}")
+        connection.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        print(f"Erro ao otimizar banco de dados: {e}")
+
+
+class ServicoManutencao:
+    """Mantém o banco rápido sem intervenção, nos momentos em que o sistema está ocioso
+    
+    A cada ciclo, para o banco principal e o de arquivo: devolve ao disco as
+    páginas livres (exclusões em cascata, arquivamento) com incremental_vacuum,
+    em passos curtos; atualiza as estatísticas do planejador com PRAGMA
+    optimize; e registra tamanho e fragmentação em metricas_banco. Bancos
+    criados antes do auto_vacuum incremental não são tocados nos ciclos: a
+    conversão (um VACUUM completo) fica para converter_auto_vacuum, chamado
+    ao encerrar o sistema.
+    """
+    
+    def __init__(self, db_path: str, ultima_atividade: Callable[[], float] = None,
+                 ociosidade_segundos: float = 120, intervalo_minutos: float = 15,
+                 limite_fragmentacao: float = 0.1, paginas_por_passo: int = 256, pausa_ms: int = 50):
+        self.db_path = db_path
+        # Momento (time.monotonic) do último uso do banco; sem ele, o sistema é tido como ocioso
+        self.ultima_atividade = ultima_atividade
+        self.ociosidade = ociosidade_segundos
+        self.intervalo = intervalo_minutos * 60
+        self.limite_fragmentacao = limite_fragmentacao
+        self.paginas_por_passo = paginas_por_passo
+        self.pausa = pausa_ms / 1000.0
+        self._parando = threading.Event()
+        self._executando = threading.Lock()
+        self._thread = None
+    
+    def _ocioso(self) -> bool:
+        if self.ultima_atividade is None:
+            return True
+        return time.monotonic() - self.ultima_atividade() >= self.ociosidade
+    
+    def executar(self) -> Dict[str, Dict]:
+        """Um ciclo de manutenção; retorna as métricas finais de cada banco"""
+        resultado = {}
+        with self._executando:
+            try:
+                connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            except sqlite3.Error as e:
+                print(f"Erro ao conectar para manutenção: {e}")
+                return resultado
+            
+            try:
+                anexar_arquivo(connection, self.db_path)
+                for esquema in ('main', ALIAS_ARQUIVO):
+                    if self._parando.is_set():
+                        break
+                    resultado[esquema] = self._manter(connection, esquema)
+                # 0x10000: confere o tamanho de todas as tabelas, não só das consultadas nesta conexão
+                connection.execute(f"PRAGMA analysis_limit = {LIMITE_ANALISE}")
+                connection.execute("PRAGMA optimize = 0x10002")
+            except sqlite3.Error as e:
+                print(f"Erro na manutenção do banco de dados: {e}")
+            finally:
+                connection.close()
+        return resultado
+    
+    def _manter(self, connection: sqlite3.Connection, esquema: str) -> Dict:
+        antes = medir(connection, esquema)
+        if (antes['fragmentacao'] >= self.limite_fragmentacao
+                and antes['auto_vacuum'] == AUTO_VACUUM_INCREMENTAL):
+            self._vacuum_incremental(connection, esquema)
+        
+        # Banco nunca analisado: o PRAGMA optimize não cria as estatísticas do zero
+        analisado = not connection.execute(
+            f"SELECT 1 FROM {esquema}.sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()
+        if analisado:
+            connection.execute(f"ANALYZE {esquema}")
+        
+        depois = medir(connection, esquema)
+        depois['paginas_liberadas'] = max(0, antes['paginas'] - depois['paginas'])
+        self._registrar(connection, esquema, depois, analisado)
+        return depois
+    
+    def _vacuum_incremental(self, connection: sqlite3.Connection, esquema: str) -> None:
+        """Libera as páginas livres em passos, parando se o sistema voltar a ser usado"""
+        while not self._parando.is_set() and self._ocioso():
+            if not connection.execute(f"PRAGMA {esquema}.freelist_count").fetchone()[0]:
+                break
+            # execute para no primeiro passo (uma página); executescript roda o comando até o fim
+            connection.executescript(f"PRAGMA {esquema}.incremental_vacuum({self.paginas_por_passo});")
+            # Dá espaço para as gravações da interface entre um passo e outro
+            time.sleep(self.pausa)
+    
+    def converter_auto_vacuum(self) -> List[str]:
+        """Converte para o auto_vacuum incremental os bancos criados sem ele
+        
+        O modo só muda com um VACUUM completo, que reescreve o banco inteiro e
+        segura as gravações enquanto dura; por isso não roda nos ciclos, e sim
+        ao encerrar (com as demais conexões fechadas), e só quando a
+        fragmentação passar do limite. Retorna os esquemas convertidos.
+        """
+        convertidos = []
+        with self._executando:
+            try:
+                connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            except sqlite3.Error as e:
+                print(f"Erro ao conectar para manutenção: {e}")
+                return convertidos
+            
+            try:
+                anexar_arquivo(connection, self.db_path)
+                for esquema in ('main', ALIAS_ARQUIVO):
+                    metricas = medir(connection, esquema)
+                    if (metricas['auto_vacuum'] == AUTO_VACUUM_NENHUM
+                            and metricas['fragmentacao'] >= self.limite_fragmentacao):
+                        print(f"Convertendo o banco {esquema} para o auto_vacuum incremental...")
+                        connection.execute(f"PRAGMA {esquema}.auto_vacuum = INCREMENTAL")
+                        connection.execute(f"VACUUM {esquema}")
+                        convertidos.append(esquema)
+            except sqlite3.Error as e:
+                print(f"Erro ao converter o auto_vacuum do banco: {e}")
+            finally:
+                connection.close()
+        return convertidos
+    
+    def _registrar(self, connection: sqlite3.Connection, esquema: str, metricas: Dict, analisado: bool) -> None:
+        """Grava as métricas em metricas_banco, se algo mudou desde o último registro"""
+        ultimo = connection.execute(
+            "SELECT paginas, paginas_livres FROM main.metricas_banco WHERE banco = ? ORDER BY id DESC LIMIT 1",
+            (esquema,)
+        ).fetchone()
+        if ultimo == (metricas['paginas'], metricas['paginas_livres']) and not analisado:
+            return
+        connection.execute(
+            "INSERT INTO main.metricas_banco "
+            "(banco, tamanho_bytes, paginas, paginas_livres, paginas_liberadas, analisado) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (esquema, metricas['tamanho_bytes'], metricas['paginas'], metricas['paginas_livres'],
+             metricas['paginas_liberadas'], int(analisado))
+        )
+        connection.execute(
+            "DELETE FROM main.metricas_banco WHERE id <= (SELECT MAX(id) FROM main.metricas_banco) - ?",
+            (MAXIMO_METRICAS,)
+        )
+    
+    def _agendar(self) -> None:
+        """Executa um ciclo a cada intervalo, se o sistema estiver ocioso"""
+        while not self._parando.wait(self.intervalo):
+            if self._ocioso():
+                self.executar()
+    
+    def iniciar(self) -> None:
+        """Executa a manutenção agendada numa thread em segundo plano"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parando.clear()
+        self._thread = threading.Thread(target=self._agendar, name="Manutencao", daemon=True)
+        self._thread.start()
+    
+    def parar(self, timeout: float = 5.0) -> None:
+        """Interrompe a manutenção após o passo atual"""
+        self._parando.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
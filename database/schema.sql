@@ -3,6 +3,10 @@
 -- Habilitar chaves estrangeiras
 PRAGMA foreign_keys = ON;
 
+-- Páginas livres devolvidas ao disco pela manutenção (vale para bancos novos;
+-- os existentes são convertidos pelo ServicoManutencao, ao encerrar o sistema)
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- Tabela de territórios
 CREATE TABLE IF NOT EXISTS territorios (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,6 +29,7 @@ CREATE TABLE IF NOT EXISTS imoveis (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     rua_id INTEGER NOT NULL,
     numero TEXT NOT NULL,
+    numero_ordem TEXT, -- chave de ordenação natural de numero ("2" antes de "10")
     tipo TEXT NOT NULL, -- 'residencial', 'comercial', 'predio', 'vila'
     nome TEXT, -- Nome do edifício (opcional)
     total_unidades INTEGER, -- Total de apartamentos/unidades (para prédios e vilas)
@@ -39,10 +44,28 @@ CREATE TABLE IF NOT EXISTS unidades (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     imovel_id INTEGER NOT NULL,
     numero TEXT NOT NULL,
+    numero_ordem TEXT, -- chave de ordenação natural de numero
     observacoes TEXT,
+    faixa_id INTEGER REFERENCES faixas_unidades(id) ON DELETE SET NULL, -- NULL para unidades avulsas
+    FOREIGN KEY (imovel_id) REFERENCES imoveis(id) ON DELETE CASCADE
+);
+
+-- Faixas de unidades de prédios/vilas (sequenciais ou andares × unidades, por bloco).
+-- Uma unidade só ganha linha em `unidades` quando recebe atendimento ou observação.
+CREATE TABLE IF NOT EXISTS faixas_unidades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    imovel_id INTEGER NOT NULL,
+    prefixo TEXT NOT NULL, -- 'Apto', 'Casa'
+    bloco TEXT, -- NULL quando o imóvel não tem blocos
+    andar_inicio INTEGER, -- NULL para numeração sequencial
+    andar_fim INTEGER,
+    unidade_inicio INTEGER NOT NULL DEFAULT 1,
+    unidade_fim INTEGER NOT NULL,
     FOREIGN KEY (imovel_id) REFERENCES imoveis(id) ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_faixas_unidades_imovel_id ON faixas_unidades(imovel_id);
+
 -- Tabela de saídas de campo
 CREATE TABLE IF NOT EXISTS saidas_campo (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,9 +74,37 @@ CREATE TABLE IF NOT EXISTS saidas_campo (
     dia_semana TEXT NOT NULL,
     horario TEXT NOT NULL,
     dirigente TEXT,
+    data_criacao TEXT DEFAULT CURRENT_TIMESTAMP,
+    regra_id INTEGER REFERENCES regras_saida_campo(id) ON DELETE SET NULL -- Ocorrência gravada de uma regra
+);
+
+-- Regras de saídas de campo recorrentes (as ocorrências são calculadas sob demanda)
+CREATE TABLE IF NOT EXISTS regras_saida_campo (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    frequencia TEXT NOT NULL DEFAULT 'semanal', -- 'semanal', 'mensal'
+    dia_semana INTEGER NOT NULL, -- 0 = segunda-feira ... 6 = domingo
+    semana_do_mes INTEGER, -- 1 a 5, ou -1 para a última (regras mensais)
+    intervalo INTEGER NOT NULL DEFAULT 1, -- a cada quantas semanas (regras semanais)
+    horario TEXT NOT NULL,
+    dirigente TEXT,
+    data_inicio TEXT NOT NULL,
+    data_fim TEXT,
+    ativa INTEGER NOT NULL DEFAULT 1,
     data_criacao TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Ocorrências canceladas de uma regra
+CREATE TABLE IF NOT EXISTS excecoes_regra_saida (
+    regra_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (regra_id, data),
+    FOREIGN KEY (regra_id) REFERENCES regras_saida_campo(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_saidas_campo_data ON saidas_campo(data);
+CREATE INDEX IF NOT EXISTS idx_excecoes_regra_saida_data ON excecoes_regra_saida(data);
+
 -- Tabela de designações de territórios
 CREATE TABLE IF NOT EXISTS designacoes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -150,15 +201,200 @@ CREATE TABLE IF NOT EXISTS notificacoes (
 -- Índices para consultas frequentes
 CREATE INDEX IF NOT EXISTS idx_log_usuario_id ON log_atividades(usuario_id);
 CREATE INDEX IF NOT EXISTS idx_log_data_hora ON log_atividades(data_hora);
+CREATE INDEX IF NOT EXISTS idx_log_usuario_data_hora ON log_atividades(usuario_id, data_hora);
+CREATE INDEX IF NOT EXISTS idx_log_tipo_acao_data_hora ON log_atividades(tipo_acao, data_hora);
 -- Índices para notificações
 CREATE INDEX IF NOT EXISTS idx_notificacoes_usuario_id ON notificacoes(usuario_id);
 CREATE INDEX IF NOT EXISTS idx_notificacoes_status ON notificacoes(status);
+CREATE INDEX IF NOT EXISTS idx_notificacoes_data_criacao ON notificacoes(data_criacao);
+CREATE INDEX IF NOT EXISTS idx_notificacoes_usuario_data_criacao ON notificacoes(usuario_id, data_criacao);
 -- Índices para melhorar performance
 CREATE INDEX IF NOT EXISTS idx_ruas_territorio_id ON ruas(territorio_id);
 CREATE INDEX IF NOT EXISTS idx_imoveis_rua_id ON imoveis(rua_id);
 CREATE INDEX IF NOT EXISTS idx_unidades_imovel_id ON unidades(imovel_id);
 CREATE INDEX IF NOT EXISTS idx_designacoes_territorio_id ON designacoes(territorio_id);
 CREATE INDEX IF NOT EXISTS idx_designacoes_saida_campo_id ON designacoes(saida_campo_id);
+CREATE INDEX IF NOT EXISTS idx_designacoes_status_data ON designacoes(status, data_designacao);
+CREATE INDEX IF NOT EXISTS idx_designacoes_data_designacao ON designacoes(data_designacao);
 CREATE INDEX IF NOT EXISTS idx_atendimentos_imovel_id ON atendimentos(imovel_id);
 CREATE INDEX IF NOT EXISTS idx_historico_imovel_id ON historico_predios_vilas(imovel_id);
-CREATE INDEX IF NOT EXISTS idx_designacoes_predios_vilas_imovel_id ON designacoes_predios_vilas(imovel_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_designacoes_predios_vilas_imovel_id ON designacoes_predios_vilas(imovel_id);
+CREATE INDEX IF NOT EXISTS idx_designacoes_predios_vilas_status_data ON designacoes_predios_vilas(status, data_designacao);
+CREATE INDEX IF NOT EXISTS idx_designacoes_predios_vilas_data_designacao ON designacoes_predios_vilas(data_designacao);
+
+-- Tamanho e fragmentação dos bancos, registrados pelo ServicoManutencao
+CREATE TABLE IF NOT EXISTS metricas_banco (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_hora TEXT DEFAULT CURRENT_TIMESTAMP,
+    banco TEXT NOT NULL, -- 'main' ou 'arquivo'
+    tamanho_bytes INTEGER NOT NULL,
+    paginas INTEGER NOT NULL,
+    paginas_livres INTEGER NOT NULL,
+    paginas_liberadas INTEGER NOT NULL DEFAULT 0, -- devolvidas ao disco neste ciclo
+    analisado INTEGER NOT NULL DEFAULT 0 -- 1: estatísticas criadas com ANALYZE neste ciclo
+);
+
+-- Contador de notificações não lidas por usuário, mantido pelos triggers abaixo
+CREATE TABLE IF NOT EXISTS notificacoes_nao_lidas (
+    usuario_id INTEGER PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_notificacoes_nao_lidas_insert
+AFTER INSERT ON notificacoes
+WHEN NEW.status = 'nao_lida'
+BEGIN
+    INSERT INTO notificacoes_nao_lidas (usuario_id, total) VALUES (NEW.usuario_id, 1)
+    ON CONFLICT(usuario_id) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_notificacoes_nao_lidas_update
+AFTER UPDATE OF status, usuario_id ON notificacoes
+WHEN (OLD.status = 'nao_lida') != (NEW.status = 'nao_lida') OR OLD.usuario_id != NEW.usuario_id
+BEGIN
+    UPDATE notificacoes_nao_lidas SET total = total - 1
+    WHERE usuario_id = OLD.usuario_id AND OLD.status = 'nao_lida';
+    INSERT INTO notificacoes_nao_lidas (usuario_id, total)
+    SELECT NEW.usuario_id, 1 WHERE NEW.status = 'nao_lida'
+    ON CONFLICT(usuario_id) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_notificacoes_nao_lidas_delete
+AFTER DELETE ON notificacoes
+WHEN OLD.status = 'nao_lida'
+BEGIN
+    UPDATE notificacoes_nao_lidas SET total = total - 1 WHERE usuario_id = OLD.usuario_id;
+END;
+
+-- Preenche o contador em bancos criados antes dele (linhas existentes não são alteradas)
+INSERT OR IGNORE INTO notificacoes_nao_lidas (usuario_id, total)
+SELECT usuario_id, COUNT(*) FROM notificacoes WHERE status = 'nao_lida' GROUP BY usuario_id;
+
+-- Os índices de uma única designação ativa por território e por prédio/vila
+-- são criados por DatabaseManager._unificar_designacoes_ativas, que antes
+-- conclui e informa as ativas repetidas de bancos antigos.
+
+-- Resumo por território para as sugestões de designação, mantido pelos triggers abaixo.
+-- A conclusão de uma designação conta na data de devolução (ou de designação), nunca no futuro.
+CREATE TABLE IF NOT EXISTS resumo_territorios (
+    territorio_id INTEGER PRIMARY KEY,
+    ultima_conclusao TEXT, -- NULL se o território nunca foi concluído
+    total_imoveis INTEGER NOT NULL DEFAULT 0,
+    imoveis_visitados INTEGER NOT NULL DEFAULT 0 -- imóveis com pelo menos um atendimento
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_territorio_insert
+AFTER INSERT ON territorios
+BEGIN
+    INSERT OR IGNORE INTO resumo_territorios (territorio_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_territorio_delete
+AFTER DELETE ON territorios
+BEGIN
+    DELETE FROM resumo_territorios WHERE territorio_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_imovel_insert
+AFTER INSERT ON imoveis
+BEGIN
+    UPDATE resumo_territorios SET total_imoveis = total_imoveis + 1
+    WHERE territorio_id = (SELECT territorio_id FROM ruas WHERE id = NEW.rua_id);
+END;
+
+-- BEFORE: os atendimentos do imóvel ainda existem. Quando a rua inteira é
+-- excluída ela já não existe aqui, e o trigger da rua recalcula o território.
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_imovel_delete
+BEFORE DELETE ON imoveis
+BEGIN
+    UPDATE resumo_territorios
+    SET total_imoveis = total_imoveis - 1,
+        imoveis_visitados = imoveis_visitados - EXISTS (SELECT 1 FROM atendimentos WHERE imovel_id = OLD.id)
+    WHERE territorio_id = (SELECT territorio_id FROM ruas WHERE id = OLD.rua_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_imovel_rua
+AFTER UPDATE OF rua_id ON imoveis
+WHEN OLD.rua_id != NEW.rua_id
+BEGIN
+    UPDATE resumo_territorios
+    SET total_imoveis = total_imoveis - 1,
+        imoveis_visitados = imoveis_visitados - EXISTS (SELECT 1 FROM atendimentos WHERE imovel_id = NEW.id)
+    WHERE territorio_id = (SELECT territorio_id FROM ruas WHERE id = OLD.rua_id);
+    UPDATE resumo_territorios
+    SET total_imoveis = total_imoveis + 1,
+        imoveis_visitados = imoveis_visitados + EXISTS (SELECT 1 FROM atendimentos WHERE imovel_id = NEW.id)
+    WHERE territorio_id = (SELECT territorio_id FROM ruas WHERE id = NEW.rua_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_rua_delete
+AFTER DELETE ON ruas
+BEGIN
+    UPDATE resumo_territorios
+    SET total_imoveis = (SELECT COUNT(*) FROM imoveis i JOIN ruas r ON r.id = i.rua_id
+                         WHERE r.territorio_id = OLD.territorio_id),
+        imoveis_visitados = (SELECT COUNT(*) FROM imoveis i JOIN ruas r ON r.id = i.rua_id
+                             WHERE r.territorio_id = OLD.territorio_id
+                             AND EXISTS (SELECT 1 FROM atendimentos a WHERE a.imovel_id = i.id))
+    WHERE territorio_id = OLD.territorio_id;
+END;
+
+-- Só o primeiro atendimento de um imóvel muda a cobertura
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_atendimento_insert
+AFTER INSERT ON atendimentos
+WHEN NOT EXISTS (SELECT 1 FROM atendimentos WHERE imovel_id = NEW.imovel_id AND id != NEW.id)
+BEGIN
+    UPDATE resumo_territorios SET imoveis_visitados = imoveis_visitados + 1
+    WHERE territorio_id = (SELECT r.territorio_id FROM imoveis i JOIN ruas r ON r.id = i.rua_id
+                           WHERE i.id = NEW.imovel_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_atendimento_delete
+AFTER DELETE ON atendimentos
+WHEN NOT EXISTS (SELECT 1 FROM atendimentos WHERE imovel_id = OLD.imovel_id)
+BEGIN
+    UPDATE resumo_territorios SET imoveis_visitados = imoveis_visitados - 1
+    WHERE territorio_id = (SELECT r.territorio_id FROM imoveis i JOIN ruas r ON r.id = i.rua_id
+                           WHERE i.id = OLD.imovel_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_designacao_insert
+AFTER INSERT ON designacoes
+WHEN NEW.status = 'concluido'
+BEGIN
+    UPDATE resumo_territorios
+    SET ultima_conclusao = (SELECT MAX(MIN(COALESCE(data_devolucao, data_designacao), date('now')))
+                            FROM designacoes WHERE territorio_id = NEW.territorio_id AND status = 'concluido')
+    WHERE territorio_id = NEW.territorio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_designacao_update
+AFTER UPDATE OF status, territorio_id, data_designacao, data_devolucao ON designacoes
+BEGIN
+    UPDATE resumo_territorios
+    SET ultima_conclusao = (SELECT MAX(MIN(COALESCE(data_devolucao, data_designacao), date('now')))
+                            FROM designacoes WHERE territorio_id = resumo_territorios.territorio_id
+                            AND status = 'concluido')
+    WHERE territorio_id IN (OLD.territorio_id, NEW.territorio_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_territorios_designacao_delete
+AFTER DELETE ON designacoes
+WHEN OLD.status = 'concluido'
+BEGIN
+    UPDATE resumo_territorios
+    SET ultima_conclusao = (SELECT MAX(MIN(COALESCE(data_devolucao, data_designacao), date('now')))
+                            FROM designacoes WHERE territorio_id = OLD.territorio_id AND status = 'concluido')
+    WHERE territorio_id = OLD.territorio_id;
+END;
+
+-- Preenche o resumo dos territórios que ainda não o têm
+INSERT OR IGNORE INTO resumo_territorios (territorio_id, ultima_conclusao, total_imoveis, imoveis_visitados)
+SELECT t.id,
+       (SELECT MAX(MIN(COALESCE(d.data_devolucao, d.data_designacao), date('now')))
+        FROM designacoes d WHERE d.territorio_id = t.id AND d.status = 'concluido'),
+       (SELECT COUNT(*) FROM imoveis i JOIN ruas r ON r.id = i.rua_id WHERE r.territorio_id = t.id),
+       (SELECT COUNT(*) FROM imoveis i JOIN ruas r ON r.id = i.rua_id
+        WHERE r.territorio_id = t.id AND EXISTS (SELECT 1 FROM atendimentos a WHERE a.imovel_id = i.id))
+FROM territorios t
+WHERE t.id NOT IN (SELECT territorio_id FROM resumo_territorios);
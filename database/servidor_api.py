@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from database.arquivamento import anexar_arquivo
+from database.consultas import CONSULTAS, LEITURAS, TAMANHO_CACHE_COMANDOS
+from database.desfazer import HistoricoDesfazer
+from database.manutencao import ServicoManutencao, otimizar_ao_fechar
+from database.sincronizacao import endereco_local
+from models.usuario import Usuario
+
+MOTIVOS_HTTP = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+                403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+# Validade da sessão de usuário aberta por /login (em segundos)
+DURACAO_SESSAO = 12 * 60 * 60
+
+# Comandos do registro que só administradores executam pelo serviço
+SO_ADMINISTRADOR = {'usuarios.inserir', 'usuarios.excluir'}
+
+# Colunas que nunca saem do servidor (a senha é conferida aqui, em /login)
+COLUNAS_PROTEGIDAS = {'senha_hash'}
+
+# Operações de modelo que o cliente pode pedir pelo nome, além dos comandos do
+# registro. Montam comandos fora do registro, então rodam aqui, com um
+# DatabaseManager local do servidor: operacao(db_manager, **args) -> dict.
+# O histórico de desfazer é o do usuário logado (o usuario_id enviado pelo
+# cliente é substituído) e da sessão do cliente; exigem nível de gestor
+OPERACOES = {
+    'historico.desfazer': lambda db_manager, usuario_id, sessao:
+        {'descricao': HistoricoDesfazer(db_manager, usuario_id=usuario_id, sessao=sessao).desfazer()},
+    'historico.refazer': lambda db_manager, usuario_id, sessao:
+        {'descricao': HistoricoDesfazer(db_manager, usuario_id=usuario_id, sessao=sessao).refazer()},
+}
+
+
+def _resultado(cursor: sqlite3.Cursor) -> Dict:
+    """Converte um cursor executado no formato de resposta da API, sem as COLUNAS_PROTEGIDAS"""
+    colunas = [descricao[0] for descricao in cursor.description] if cursor.description else []
+    linhas = [list(row) for row in cursor.fetchall()] if colunas else []
+    protegidas = [i for i, coluna in enumerate(colunas) if coluna in COLUNAS_PROTEGIDAS]
+    for linha in linhas if protegidas else ():
+        for i in protegidas:
+            linha[i] = None
+    return {'colunas': colunas, 'linhas': linhas,
+            'lastrowid': cursor.lastrowid, 'rowcount': cursor.rowcount}
+
+
+class ServidorAPI:
+    """Serviço HTTP/JSON que hospeda o banco para vários computadores da congregação
+    
+    No modo cliente, o DatabaseManager envia o nome de cada comando do
+    registro (database/consultas.py) com os parâmetros; SQL enviado pelo
+    cliente nunca é executado. Sem chave de acesso, o serviço só atende no
+    próprio computador (127.0.0.1). Fora /estado e /login, cada requisição
+    leva o token da sessão do usuário (aberta por /login, que confere a
+    senha aqui) e é autorizada pelo nível dele. As leituras rodam em um
+    conjunto de conexões somente leitura (WAL) e respondem com ETag, para o
+    cliente revalidar o cache sem a consulta ser executada de novo. As
+    escritas passam por uma fila única: uma conexão escritora, e a transação
+    aberta por um cliente segura os demais até o commit ou rollback.
+    """
+    
+    # Transação aberta e sem atividade por mais tempo que isso é desfeita
+    TEMPO_TRANSACAO = 30.0
+    
+    def __init__(self, db_path: str, endereco: str = '127.0.0.1', porta: int = 8780,
+                 leitores: int = 4, chave: str = None):
+        if not chave and not endereco_local(endereco):
+            raise ValueError(f"Sem chave de acesso, o serviço não pode atender em {endereco}; "
+                             "informe uma chave ou use 127.0.0.1.")
+        self.db_path = db_path
+        self.endereco = endereco
+        self.porta = porta
+        self.chave = chave  # Se informada, exigida no cabeçalho Authorization
+        self.instancia = uuid.uuid4().hex[:8]  # Invalida os ETags de execuções anteriores
+        
+        self._leitores = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="LeitorAPI")
+        self._executor_escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix="EscritorAPI")
+        self._local = threading.local()
+        self._escrita = None
+        self._gerenciador = None  # DatabaseManager das OPERACOES, criado no primeiro uso
+        self._sessoes = {}       # token -> (usuario_id, expira em time.monotonic)
+        self._trava_sessoes = threading.Lock()
+        self._versao = None      # Conexão usada só para ler PRAGMA data_version
+        self._trava_versao = threading.Lock()
+        
+        self._fila = None        # Pedidos de escrita: (sessão, operação, dados, futuro)
+        self._adiados = deque()  # Pedidos de outras sessões durante uma transação
+        self._dono = None        # Sessão com transação aberta
+        self._ultima_atividade = 0.0
+        self.ultima_requisicao = time.monotonic()  # Para a manutenção esperar o serviço ficar ocioso
+        
+        self._loop = None
+        self._servidor = None
+        self._thread = None
+    
+    # Conexões
+    
+    def _conectar_escrita(self) -> None:
+        self._escrita = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                                        cached_statements=TAMANHO_CACHE_COMANDOS)
+        self._escrita.execute("PRAGMA journal_mode = WAL")  # Leitores não bloqueiam a escrita
+        self._escrita.execute("PRAGMA foreign_keys = ON")
+        self._versao = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+    
+    def _conexao_leitura(self) -> sqlite3.Connection:
+        """Conexão somente leitura da thread atual do conjunto de leitores"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, cached_statements=TAMANHO_CACHE_COMANDOS)
+            anexar_arquivo(connection, self.db_path)  # Visões *_completo do banco de arquivo
+            connection.execute("PRAGMA query_only = ON")
+            self._local.connection = connection
+        return connection
+    
+    def _versao_dados(self) -> int:
+        """Muda sempre que qualquer conexão grava no banco"""
+        with self._trava_versao:
+            return self._versao.execute("PRAGMA data_version").fetchone()[0]
+    
+    # Usuários
+    
+    def _usuario(self, consulta: str, valor) -> Optional[Dict]:
+        """Linha do usuário (como dict), lida por um dos leitores"""
+        cursor = self._conexao_leitura().execute(CONSULTAS[consulta], (valor,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([descricao[0] for descricao in cursor.description], row))
+    
+    def _entrar(self, email: str, senha: str) -> Optional[Dict]:
+        """Confere a senha (PBKDF2, num dos leitores) e abre uma sessão do usuário"""
+        dados = self._usuario('usuarios.por_email', email)
+        if dados is None or not dados['ativo'] or not Usuario.from_db_row(dados).verificar_senha(senha):
+            return None
+        token = secrets.token_urlsafe(32)
+        with self._trava_sessoes:
+            agora = time.monotonic()
+            self._sessoes = {t: s for t, s in self._sessoes.items() if s[1] > agora}
+            self._sessoes[token] = (dados['id'], agora + DURACAO_SESSAO)
+        dados['senha_hash'] = None
+        return {'token': token, 'usuario': dados}
+    
+    def _sair(self, token: str) -> None:
+        with self._trava_sessoes:
+            self._sessoes.pop(token, None)
+    
+    def _usuario_da_sessao(self, token: str) -> Optional[Dict]:
+        """Usuário logado com o token, se a sessão valer e ele continuar ativo"""
+        with self._trava_sessoes:
+            sessao = self._sessoes.get(token)
+        if sessao is None or sessao[1] < time.monotonic():
+            return None
+        # Lido a cada requisição: desativar o usuário ou mudar o nível vale na hora
+        dados = self._usuario('usuarios.por_id', sessao[0])
+        return dados if dados is not None and dados['ativo'] else None
+    
+    @staticmethod
+    def _recusa(caminho: str, dados: Dict, usuario: Dict) -> Optional[str]:
+        """Motivo para recusar o pedido de escrita ao usuário, ou None se ele pode fazê-lo"""
+        administrador = usuario['nivel_permissao'] >= Usuario.NIVEL_ADMIN
+        if caminho == '/operacao':
+            if usuario['nivel_permissao'] < Usuario.NIVEL_GESTOR:
+                return "Operação restrita a gestores."
+            return None
+        nome = dados.get('nome')
+        if nome in SO_ADMINISTRADOR and not administrador:
+            return "Comando restrito a administradores."
+        if nome == 'usuarios.atualizar' and not administrador:
+            # Sem ser administrador, só o próprio cadastro, sem mudar o nível nem a situação
+            params = dados.get('params')
+            if (not isinstance(params, list) or len(params) != 6 or params[5] != usuario['id']
+                    or params[3] != usuario['nivel_permissao'] or bool(params[4]) != bool(usuario['ativo'])):
+                return "Só administradores alteram o cadastro de outros usuários."
+        return None
+    
+    # Execução
+    
+    def _executar_leituras(self, consultas: List[Dict]) -> List[Dict]:
+        connection = self._conexao_leitura()
+        resultados = []
+        for consulta in consultas:
+            nome = consulta.get('nome')
+            if nome not in LEITURAS:
+                resultados.append({'erro': f"Consulta desconhecida: {nome}"})
+                continue
+            try:
+                cursor = connection.execute(CONSULTAS[nome], consulta.get('params') or ())
+                resultados.append(_resultado(cursor))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                resultados.append({'erro': str(e)})
+        return resultados
+    
+    def _executar_escrita(self, operacao: str, dados: Dict) -> Dict:
+        if operacao == 'commit':
+            self._escrita.commit()
+            return {}
+        if operacao == 'rollback':
+            self._escrita.rollback()
+            return {}
+        if operacao == 'operacao':
+            return self._operar(dados['nome'], dados.get('args') or {})
+        cursor = self._escrita.execute(CONSULTAS[dados['nome']], dados.get('params') or ())
+        return _resultado(cursor)
+    
+    def _operar(self, nome: str, args: Dict) -> Dict:
+        """Executa uma das OPERACOES (na thread de escrita, fora de transação)"""
+        if self._escrita.in_transaction:
+            raise ValueError("Conclua a transação aberta antes desta operação.")
+        if self._gerenciador is None:
+            from database.db_manager import DatabaseManager
+            self._gerenciador = DatabaseManager(self.db_path)
+        return OPERACOES[nome](self._gerenciador, **args)
+    
+    async def _escritor(self) -> None:
+        """Consome a fila de escrita, uma transação por vez"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._dono is not None and time.monotonic() - self._ultima_atividade > self.TEMPO_TRANSACAO:
+                print(f"Transação abandonada desfeita (sessão {self._dono})")
+                await loop.run_in_executor(self._executor_escrita, self._escrita.rollback)
+                self._dono = None
+            
+            if self._dono is None and self._adiados:
+                pedido = self._adiados.popleft()
+            else:
+                try:
+                    pedido = await asyncio.wait_for(self._fila.get(), 1.0 if self._dono else None)
+                except asyncio.TimeoutError:
+                    continue
+            if pedido is None:
+                break
+            
+            sessao, operacao, dados, futuro = pedido
+            if self._dono is not None and sessao != self._dono:
+                self._adiados.append(pedido)
+                continue
+            
+            try:
+                resultado = await loop.run_in_executor(
+                    self._executor_escrita, self._executar_escrita, operacao, dados
+                )
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                resultado = {'erro': str(e)}
+            resultado['em_transacao'] = self._escrita.in_transaction
+            self._dono = sessao if self._escrita.in_transaction else None
+            self._ultima_atividade = time.monotonic()
+            if not futuro.done():
+                futuro.set_result(resultado)
+    
+    # HTTP
+    
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Atende as requisições de uma conexão (mantida aberta entre requisições)"""
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                metodo, caminho, _ = linha.decode('latin-1').split(' ', 2)
+                cabecalhos = {}
+                while True:
+                    linha = await reader.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                tamanho = int(cabecalhos.get('content-length', 0))
+                corpo = await reader.readexactly(tamanho) if tamanho else b''
+                
+                codigo, resposta, extras = await self._rotear(metodo, caminho, cabecalhos, corpo)
+                conteudo = json.dumps(resposta, ensure_ascii=False).encode('utf-8') if resposta is not None else b''
+                linhas = [f"HTTP/1.1 {codigo} {MOTIVOS_HTTP.get(codigo, '')}",
+                          "Content-Type: application/json; charset=utf-8",
+                          f"Content-Length: {len(conteudo)}"]
+                linhas += [f"{nome}: {valor}" for nome, valor in extras.items()]
+                writer.write(("\r\n".join(linhas) + "\r\n\r\n").encode('latin-1') + conteudo)
+                await writer.drain()
+                
+                if cabecalhos.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, ValueError):
+            pass  # Cliente desconectou ou o serviço está parando
+        finally:
+            writer.close()
+    
+    async def _rotear(self, metodo: str, caminho: str, cabecalhos: Dict,
+                      corpo: bytes) -> Tuple[int, Optional[Dict], Dict]:
+        self.ultima_requisicao = time.monotonic()
+        if self.chave and not hmac.compare_digest(cabecalhos.get('authorization', ''), f"Bearer {self.chave}"):
+            return 401, {'erro': 'Chave de acesso inválida.'}, {}
+        
+        caminho = caminho.split('?', 1)[0].rstrip('/')
+        loop = asyncio.get_running_loop()
+        if caminho == '/estado' and metodo == 'GET':
+            versao = await loop.run_in_executor(self._leitores, self._versao_dados)
+            return 200, {'instancia': self.instancia, 'versao': versao}, {}
+        if metodo != 'POST':
+            return 405, {'erro': 'Método não permitido.'}, {}
+        
+        try:
+            dados = json.loads(corpo.decode('utf-8')) if corpo else {}
+        except ValueError:
+            return 400, {'erro': 'JSON inválido.'}, {}
+        if not isinstance(dados, dict):
+            return 400, {'erro': 'JSON inválido.'}, {}
+        
+        if caminho == '/login':
+            sessao = await loop.run_in_executor(self._leitores, self._entrar,
+                                                str(dados.get('email', '')), str(dados.get('senha', '')))
+            if sessao is None:
+                return 401, {'erro': 'Email ou senha incorretos.'}, {}
+            return 200, sessao, {}
+        
+        token = cabecalhos.get('x-token-usuario', '')
+        usuario = await loop.run_in_executor(self._leitores, self._usuario_da_sessao, token)
+        if usuario is None:
+            return 401, {'erro': 'Sessão de usuário inválida; faça login novamente.'}, {}
+        
+        if caminho == '/logout':
+            self._sair(token)
+            return 200, {}, {}
+        if caminho == '/leitura':
+            return await self._leitura(dados, cabecalhos, corpo)
+        if caminho in ('/escrita', '/commit', '/rollback', '/operacao'):
+            if not dados.get('sessao'):
+                return 400, {'erro': 'Pedido de escrita incompleto.'}, {}
+            if caminho == '/escrita' and dados.get('nome') not in CONSULTAS:
+                return 400, {'erro': f"Comando desconhecido: {dados.get('nome')}"}, {}
+            if caminho == '/operacao' and dados.get('nome') not in OPERACOES:
+                return 400, {'erro': f"Operação desconhecida: {dados.get('nome')}"}, {}
+            recusa = self._recusa(caminho, dados, usuario)
+            if recusa:
+                return 403, {'erro': recusa}, {}
+            if caminho == '/operacao':
+                dados['args'] = dict(dados.get('args') or {}, usuario_id=usuario['id'])
+            futuro = asyncio.get_running_loop().create_future()
+            await self._fila.put((dados['sessao'], caminho[1:], dados, futuro))
+            resultado = await futuro
+            return (400 if 'erro' in resultado else 200), resultado, {}
+        return 404, {'erro': 'Caminho desconhecido.'}, {}
+    
+    async def _leitura(self, dados: Dict, cabecalhos: Dict, corpo: bytes) -> Tuple[int, Optional[Dict], Dict]:
+        """Lote de consultas; responde 304 sem executar se nada mudou desde o ETag do cliente"""
+        loop = asyncio.get_running_loop()
+        versao = await loop.run_in_executor(self._leitores, self._versao_dados)
+        etag = f'"{self.instancia}-{versao}-{hashlib.sha1(corpo).hexdigest()[:16]}"'
+        if cabecalhos.get('if-none-match') == etag:
+            return 304, None, {'ETag': etag}
+        
+        resultados = await loop.run_in_executor(self._leitores, self._executar_leituras, dados.get('consultas', []))
+        return 200, {'resultados': resultados}, {'ETag': etag}
+    
+    # Ciclo de vida
+    
+    async def _principal(self, pronto: threading.Event = None) -> None:
+        self._conectar_escrita()
+        self._fila = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        escritor = asyncio.create_task(self._escritor())
+        self._servidor = await asyncio.start_server(self._atender, self.endereco, self.porta)
+        if pronto is not None:
+            pronto.set()
+        try:
+            await self._servidor.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._servidor.close()
+            await self._fila.put(None)
+            await escritor
+            if self._escrita.in_transaction:
+                self._escrita.rollback()
+            if self._gerenciador is not None:
+                await asyncio.get_running_loop().run_in_executor(self._executor_escrita, self._gerenciador.close)
+            otimizar_ao_fechar(self._escrita)
+            self._escrita.close()
+            self._versao.close()
+            self._leitores.shutdown(wait=False)
+            self._executor_escrita.shutdown(wait=False)
+    
+    def executar(self) -> None:
+        """Atende até ser interrompido (Ctrl+C)"""
+        try:
+            asyncio.run(self._principal())
+        except KeyboardInterrupt:
+            pass
+    
+    def iniciar(self) -> None:
+        """Atende numa thread em segundo plano"""
+        if self._thread is not None:
+            return
+        pronto = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._principal(pronto)),
+                                        name="ServidorAPI", daemon=True)
+        self._thread.start()
+        pronto.wait(10)
+    
+    def parar(self) -> None:
+        """Encerra o serviço iniciado por iniciar"""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._servidor.close)
+        self._thread.join(5.0)
+        self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de banco de dados do Sistema de Controle de Territórios")
+    parser.add_argument('--banco', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'territorios.db'))
+    parser.add_argument('--endereco', default='127.0.0.1',
+                        help="0.0.0.0 atende a rede local (exige --chave)")
+    parser.add_argument('--porta', type=int, default=8780)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--chave', default=os.environ.get('TERRITORIOS_CHAVE'))
+    args = parser.parse_args()
+    
+    try:
+        servidor = ServidorAPI(args.banco, args.endereco, args.porta, args.leitores, args.chave)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # O schema e as migrações são aplicados aqui, não pelos clientes
+    from database.db_manager import DatabaseManager
+    db_manager = DatabaseManager(args.banco)
+    db_manager.setup_database()
+    db_manager.close()
+    
+    # Com o banco hospedado aqui, o backup também fica a cargo do serviço
+    from database.backup import ServicoBackup
+    backup = ServicoBackup(args.banco)
+    backup.iniciar()
+    
+    manutencao = ServicoManutencao(args.banco, ultima_atividade=lambda: servidor.ultima_requisicao)
+    manutencao.iniciar()
+    
+    print(f"Servindo {args.banco} em {args.endereco}:{args.porta}")
+    servidor.executar()
+    manutencao.parar()
+    backup.parar()
+    # Conversão única de bancos antigos para o auto_vacuum incremental, já sem outras conexões
+    manutencao.converter_auto_vacuum()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,822 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import hmac
+import ipaddress
+import json
+import secrets
+import socket
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib import request as urllib_request
+
+from database.manutencao import analisar_apos_carga
+
+# Versão do formato dos pacotes de sincronização
+FORMATO_PACOTE = 1
+
+# Tamanho máximo de um pacote recebido pela rede (compactado e descompactado)
+MAXIMO_PACOTE = 256 * 1024 * 1024
+
+# Tabelas sincronizadas, com os pais antes dos filhos:
+# tabela -> (chaves estrangeiras {coluna: tabela referenciada}, chave natural)
+# A chave natural junta linhas criadas em separado em dois dispositivos
+# (ex.: a mesma unidade de uma faixa gravada no campo e no computador).
+TABELAS_SINCRONIZADAS = {
+    'territorios': ({}, None),
+    'ruas': ({'territorio_id': 'territorios'}, None),
+    'imoveis': ({'rua_id': 'ruas'}, None),
+    'faixas_unidades': ({'imovel_id': 'imoveis'}, None),
+    'unidades': ({'imovel_id': 'imoveis', 'faixa_id': 'faixas_unidades'}, ('imovel_id', 'numero')),
+    'regras_saida_campo': ({}, None),
+    'saidas_campo': ({'regra_id': 'regras_saida_campo'}, ('regra_id', 'data')),
+    'designacoes': ({'territorio_id': 'territorios', 'saida_campo_id': 'saidas_campo'}, None),
+    'designacoes_predios_vilas': ({'imovel_id': 'imoveis', 'saida_campo_id': 'saidas_campo'}, None),
+    'atendimentos': ({'imovel_id': 'imoveis', 'unidade_id': 'unidades'}, None),
+    'historico_predios_vilas': ({'imovel_id': 'imoveis'}, None),
+}
+
+# Referências ON DELETE SET NULL: se a linha referenciada não existir aqui,
+# a alteração é aplicada com a coluna nula em vez de ser descartada
+REFERENCIAS_OPCIONAIS = {('unidades', 'faixa_id'), ('saidas_campo', 'regra_id')}
+
+NOVO_GID_SQL = "lower(hex(randomblob(16)))"
+AGORA_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+TABELAS_CONTROLE = [
+    # Uma entrada por linha alterada (a última alteração); exclusões ficam como lápides
+    "CREATE TABLE IF NOT EXISTS diario_alteracoes ("
+    "    versao INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "    tabela TEXT NOT NULL,"
+    "    gid TEXT NOT NULL,"
+    "    excluido INTEGER NOT NULL DEFAULT 0,"
+    "    origem TEXT,"  # dispositivo de onde veio a alteração (NULL = feita aqui)
+    "    data_hora TEXT NOT NULL,"
+    "    UNIQUE (tabela, gid)"
+    ")",
+    # Até onde cada par confirmou ter recebido (enviada) e até onde recebemos dele
+    "CREATE TABLE IF NOT EXISTS pares_sincronizacao ("
+    "    par TEXT PRIMARY KEY,"
+    "    nome TEXT,"
+    "    versao_enviada INTEGER NOT NULL DEFAULT 0,"
+    "    versao_recebida INTEGER NOT NULL DEFAULT 0,"
+    "    ultima_sincronizacao TEXT,"
+    "    segredo TEXT"  # Chave do pareamento, criada por criar_copia_campo; assina os pacotes
+    ")",
+    # gid de outro dispositivo que corresponde a uma linha já existente aqui
+    "CREATE TABLE IF NOT EXISTS apelidos_sincronizacao ("
+    "    tabela TEXT NOT NULL,"
+    "    gid_remoto TEXT NOT NULL,"
+    "    gid_local TEXT NOT NULL,"
+    "    PRIMARY KEY (tabela, gid_remoto)"
+    ") WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS conflitos_sincronizacao ("
+    "    id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "    tabela TEXT NOT NULL,"
+    "    gid TEXT NOT NULL,"
+    "    par TEXT,"
+    "    dados_locais TEXT,"
+    "    dados_remotos TEXT,"
+    "    resolucao TEXT NOT NULL,"
+    "    data_hora TEXT DEFAULT CURRENT_TIMESTAMP"
+    ")",
+    # Preenchida só durante uma importação, para os gatilhos saberem a origem
+    "CREATE TABLE IF NOT EXISTS contexto_sincronizacao (origem TEXT)",
+    "CREATE TABLE IF NOT EXISTS configuracao_sincronizacao (chave TEXT PRIMARY KEY, valor TEXT)",
+]
+
+
+def _gatilhos(tabela: str) -> List[str]:
+    """Gatilhos que dão um gid às linhas novas e registram as alterações no diário
+    
+    A entrada anterior é apagada antes de inserir a nova (que recebe a próxima versão).
+    INSERT OR REPLACE não serve: dentro de uma ação de chave estrangeira (ON DELETE
+    SET NULL) a política ABORT da ação prevalece e o REPLACE vira erro de UNIQUE.
+    """
+    registrar = (
+        f"DELETE FROM diario_alteracoes WHERE tabela = '{tabela}' AND gid = {{linha}}.gid; "
+        "INSERT INTO diario_alteracoes (tabela, gid, excluido, origem, data_hora) "
+        f"VALUES ('{tabela}', {{linha}}.gid, {{excluido}}, "
+        f"(SELECT origem FROM contexto_sincronizacao LIMIT 1), {AGORA_SQL});"
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_sync_{tabela}_gid AFTER INSERT ON {tabela} "
+        f"WHEN NEW.gid IS NULL BEGIN "
+        f"UPDATE {tabela} SET gid = {NOVO_GID_SQL} WHERE id = NEW.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_sync_{tabela}_insert AFTER INSERT ON {tabela} "
+        f"WHEN NEW.gid IS NOT NULL BEGIN {registrar.format(linha='NEW', excluido=0)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_sync_{tabela}_update AFTER UPDATE ON {tabela} "
+        f"WHEN NEW.gid IS NOT NULL BEGIN {registrar.format(linha='NEW', excluido=0)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_sync_{tabela}_delete AFTER DELETE ON {tabela} "
+        f"WHEN OLD.gid IS NOT NULL BEGIN {registrar.format(linha='OLD', excluido=1)} END",
+    ]
+
+
+def instalar_diario(connection: sqlite3.Connection) -> None:
+    """Cria as tabelas de controle, a coluna gid e os gatilhos do diário de alterações
+    
+    As linhas anteriores ao diário recebem um gid (e entram no diário) na primeira vez.
+    """
+    for ddl in TABELAS_CONTROLE:
+        connection.execute(ddl)
+    
+    for tabela in TABELAS_SINCRONIZADAS:
+        colunas = [row[1] for row in connection.execute(f"PRAGMA table_info({tabela})").fetchall()]
+        if 'gid' not in colunas:
+            connection.execute(f"ALTER TABLE {tabela} ADD COLUMN gid TEXT")
+        connection.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{tabela}_gid ON {tabela}(gid)")
+        for ddl in _gatilhos(tabela):
+            connection.execute(ddl)
+        connection.execute(f"UPDATE {tabela} SET gid = {NOVO_GID_SQL} WHERE gid IS NULL")
+    
+    connection.execute(
+        "INSERT OR IGNORE INTO configuracao_sincronizacao (chave, valor) VALUES ('dispositivo', ?)",
+        (uuid.uuid4().hex,)
+    )
+    connection.execute(
+        "INSERT OR IGNORE INTO configuracao_sincronizacao (chave, valor) VALUES ('nome', ?)",
+        (socket.gethostname(),)
+    )
+    connection.commit()
+
+
+def endereco_local(endereco: str) -> bool:
+    """Endereço que só aceita conexões deste computador"""
+    if endereco == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(endereco).is_loopback
+    except ValueError:
+        return False
+
+
+def _configuracao(connection: sqlite3.Connection, chave: str) -> Optional[str]:
+    row = connection.execute(
+        "SELECT valor FROM configuracao_sincronizacao WHERE chave = ?", (chave,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+class PacoteNaoAutorizado(ValueError):
+    """Pacote de um dispositivo não pareado com este, ou com assinatura inválida"""
+
+
+def assinar_pacote(pacote: Dict, segredo: str) -> str:
+    """HMAC-SHA256 do pacote (sem o campo assinatura) com o segredo do pareamento"""
+    conteudo = json.dumps({chave: valor for chave, valor in pacote.items() if chave != 'assinatura'},
+                          sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hmac.new(segredo.encode('utf-8'), conteudo.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _em_lotes(valores: list, tamanho: int = 500):
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+
+def resolver_conflito(tabela: str, local: Dict, remota: Dict) -> str:
+    """Decide qual de duas alterações concorrentes da mesma linha prevalece
+    
+    Cada alteração é um dict com 'data_hora' e 'dados' (None para exclusão, com
+    as referências em gid). A regra é simétrica, para que os dois dispositivos
+    cheguem à mesma decisão. Retorna 'local' ou 'remota'.
+    """
+    dados_local, dados_remota = local['dados'], remota['dados']
+    
+    if tabela in ('designacoes', 'designacoes_predios_vilas'):
+        # A devolução (status concluído) prevalece sobre a designação ainda ativa ou excluída
+        concluida_local = bool(dados_local) and dados_local.get('status') == 'concluido'
+        concluida_remota = bool(dados_remota) and dados_remota.get('status') == 'concluido'
+        if concluida_local != concluida_remota:
+            return 'local' if concluida_local else 'remota'
+    elif tabela == 'atendimentos':
+        # Atendimento editado de um lado e excluído do outro é mantido
+        if (dados_local is None) != (dados_remota is None):
+            return 'local' if dados_local is not None else 'remota'
+    
+    # Nos demais casos prevalece a alteração mais recente
+    chave_local = (local['data_hora'] or '', json.dumps(dados_local, sort_keys=True))
+    chave_remota = (remota['data_hora'] or '', json.dumps(dados_remota, sort_keys=True))
+    return 'local' if chave_local >= chave_remota else 'remota'
+
+
+def designacao_prevalece(local: Dict, remota: Dict) -> str:
+    """Decide qual de duas designações ativas do mesmo território (ou prédio) continua ativa
+    
+    Cada uma é a linha com 'data_designacao' e 'gid'. Prevalece a designação
+    mais antiga; no mesmo dia, a de menor gid, para os dois dispositivos
+    decidirem igual. Retorna 'local' ou 'remota'.
+    """
+    chave_local = (local.get('data_designacao') or '', local['gid'])
+    chave_remota = (remota.get('data_designacao') or '', remota['gid'])
+    return 'local' if chave_local <= chave_remota else 'remota'
+
+
+class Sincronizador:
+    """Troca com outros dispositivos só as alterações feitas desde a última sincronização
+    
+    Cada dispositivo tem um diário com a última alteração de cada linha (ou a
+    lápide, se foi excluída). O pacote para um par leva as entradas com versão
+    acima da última confirmada por ele, então o custo acompanha o número de
+    alterações, não o tamanho do banco. Cada alteração leva a versão do
+    diário de origem, e as que não passam da última já recebida do par são
+    ignoradas: um pacote repetido ou atrasado não desfaz alterações mais novas.
+    
+    Um novo dispositivo de campo começa de uma cópia (criar_copia_campo), que
+    também pareia os dois: cada lado guarda o mesmo segredo, que assina os
+    pacotes trocados. Pacotes de dispositivos não pareados são recusados.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._trava = threading.Lock()
+    
+    def _conectar(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys = ON")  # Exclusões importadas propagam em cascata
+        return connection
+    
+    def identidade(self) -> Dict[str, str]:
+        """ID e nome deste dispositivo"""
+        connection = self._conectar()
+        try:
+            return {'id': _configuracao(connection, 'dispositivo'), 'nome': _configuracao(connection, 'nome')}
+        finally:
+            connection.close()
+    
+    def listar_pares(self) -> List[Dict]:
+        """Dispositivos com os quais este já sincronizou, com o total de alterações pendentes"""
+        connection = self._conectar()
+        try:
+            cursor = connection.execute(
+                "SELECT p.par, p.nome, p.versao_enviada, p.versao_recebida, p.ultima_sincronizacao, "
+                "       (SELECT COUNT(*) FROM diario_alteracoes d "
+                "             WHERE d.versao > p.versao_enviada "
+                "             AND (d.origem IS NULL OR d.origem != p.par)) as pendentes "
+                "FROM pares_sincronizacao p ORDER BY p.nome"
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            connection.close()
+    
+    # Exportação
+    
+    def gerar_pacote(self, par: str) -> Dict:
+        """Pacote com as alterações ainda não confirmadas pelo par"""
+        with self._trava:
+            connection = self._conectar()
+            try:
+                return self._gerar_pacote(connection, par)
+            finally:
+                connection.close()
+    
+    def _segredo(self, connection: sqlite3.Connection, par: str) -> str:
+        """Segredo do pareamento com o par; recusa dispositivos não pareados"""
+        row = connection.execute(
+            "SELECT segredo FROM pares_sincronizacao WHERE par = ?", (par,)
+        ).fetchone()
+        if row is None or not row['segredo']:
+            raise PacoteNaoAutorizado(
+                "Dispositivo não pareado com este computador. Crie o banco do dispositivo "
+                "com \"Criar Banco para Dispositivo de Campo\"."
+            )
+        return row['segredo']
+    
+    def _gerar_pacote(self, connection: sqlite3.Connection, par: str) -> Dict:
+        segredo = self._segredo(connection, par)
+        row = connection.execute(
+            "SELECT versao_enviada, versao_recebida FROM pares_sincronizacao WHERE par = ?", (par,)
+        ).fetchone()
+        enviada, recebida = row['versao_enviada'], row['versao_recebida']
+        
+        versao_ate = enviada
+        alteracoes = []
+        pendentes = {}  # tabela -> {gid: alteração sem os dados}
+        cursor = connection.execute(
+            "SELECT versao, tabela, gid, excluido, origem, data_hora FROM diario_alteracoes "
+            "WHERE versao > ? ORDER BY versao",
+            (enviada,)
+        )
+        for entrada in cursor.fetchall():
+            versao_ate = entrada['versao']
+            # Não devolve ao par o que veio dele
+            if entrada['origem'] == par or entrada['tabela'] not in TABELAS_SINCRONIZADAS:
+                continue
+            alteracao = {
+                'tabela': entrada['tabela'],
+                'gid': entrada['gid'],
+                'versao': entrada['versao'],
+                'excluido': bool(entrada['excluido']),
+                'data_hora': entrada['data_hora'],
+                'dados': None,
+            }
+            alteracoes.append(alteracao)
+            if not alteracao['excluido']:
+                pendentes.setdefault(entrada['tabela'], {})[entrada['gid']] = alteracao
+        
+        for tabela, por_gid in pendentes.items():
+            for gid, dados in self._ler_linhas(connection, tabela, list(por_gid)).items():
+                por_gid[gid]['dados'] = dados
+        
+        pacote = {
+            'formato': FORMATO_PACOTE,
+            'origem': _configuracao(connection, 'dispositivo'),
+            'nome': _configuracao(connection, 'nome'),
+            'destino': par,
+            'versao_ate': versao_ate,
+            'confirmacao': recebida,  # até onde já recebemos do par
+            'gerado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'alteracoes': [a for a in alteracoes if a['excluido'] or a['dados'] is not None],
+        }
+        pacote['assinatura'] = assinar_pacote(pacote, segredo)
+        return pacote
+    
+    def _ler_linhas(self, connection: sqlite3.Connection, tabela: str, gids: List[str]) -> Dict[str, Dict]:
+        """Linhas pelo gid, com as chaves estrangeiras trocadas pelo gid da linha referenciada"""
+        chaves, _ = TABELAS_SINCRONIZADAS[tabela]
+        linhas = {}
+        for lote in _em_lotes(gids):
+            marcadores = ", ".join("?" for _ in lote)
+            for row in connection.execute(
+                f"SELECT * FROM {tabela} WHERE gid IN ({marcadores})", lote
+            ).fetchall():
+                dados = dict(row)
+                del dados['id']
+                linhas[dados.pop('gid')] = dados
+        
+        for coluna, referenciada in chaves.items():
+            ids = list({dados[coluna] for dados in linhas.values() if dados.get(coluna) is not None})
+            gid_por_id = {}
+            for lote in _em_lotes(ids):
+                marcadores = ", ".join("?" for _ in lote)
+                gid_por_id.update(connection.execute(
+                    f"SELECT id, gid FROM {referenciada} WHERE id IN ({marcadores})", lote
+                ).fetchall())
+            for dados in linhas.values():
+                if dados.get(coluna) is not None:
+                    dados[coluna] = gid_por_id.get(dados[coluna])
+        return linhas
+    
+    def exportar_arquivo(self, par: str, caminho: str) -> int:
+        """Grava o pacote para o par em um arquivo compactado; retorna o total de alterações"""
+        pacote = self.gerar_pacote(par)
+        with gzip.open(caminho, 'wt', encoding='utf-8') as f:
+            json.dump(pacote, f, ensure_ascii=False)
+        return len(pacote['alteracoes'])
+    
+    # Importação
+    
+    def importar_pacote(self, pacote: Dict) -> Dict[str, int]:
+        """Aplica o pacote de outro dispositivo em uma única transação
+        
+        Retorna o total de alterações aplicadas, em conflito (mantida a local) e ignoradas.
+        Alterações já recebidas do par (de um pacote repetido) contam como ignoradas.
+        """
+        with self._trava:
+            connection = self._conectar()
+            try:
+                return self._importar(connection, pacote)
+            finally:
+                connection.close()
+    
+    def _importar(self, connection: sqlite3.Connection, pacote: Dict) -> Dict[str, int]:
+        local = _configuracao(connection, 'dispositivo')
+        par = pacote.get('origem')
+        if pacote.get('formato') != FORMATO_PACOTE or not par:
+            raise ValueError("Pacote de sincronização inválido.")
+        if par == local:
+            raise ValueError("O pacote foi gerado por este mesmo dispositivo.")
+        if pacote.get('destino') != local:
+            raise ValueError("O pacote foi gerado para outro dispositivo.")
+        # Só pares criados por criar_copia_campo, com o pacote assinado pelo segredo do pareamento
+        segredo = self._segredo(connection, par)
+        if not hmac.compare_digest(str(pacote.get('assinatura', '')), assinar_pacote(pacote, segredo)):
+            raise PacoteNaoAutorizado("Assinatura do pacote de sincronização inválida.")
+        
+        resumo = {'aplicadas': 0, 'conflitos': 0, 'ignoradas': 0}
+        ordem = list(TABELAS_SINCRONIZADAS)
+        alteracoes = [a for a in pacote.get('alteracoes', []) if a.get('tabela') in TABELAS_SINCRONIZADAS]
+        # Exclusões dos filhos para os pais; gravações dos pais para os filhos
+        exclusoes = sorted((a for a in alteracoes if a['excluido']), key=lambda a: -ordem.index(a['tabela']))
+        gravacoes = sorted((a for a in alteracoes if not a['excluido']), key=lambda a: ordem.index(a['tabela']))
+        
+        with connection:
+            # Alterações locais acima de enviada o par ainda não tinha visto;
+            # as do par até recebida já foram aplicadas aqui
+            row = connection.execute(
+                "SELECT versao_enviada, versao_recebida FROM pares_sincronizacao WHERE par = ?", (par,)
+            ).fetchone()
+            enviada, recebida = row['versao_enviada'], row['versao_recebida']
+            
+            connection.execute("DELETE FROM contexto_sincronizacao")
+            connection.execute("INSERT INTO contexto_sincronizacao (origem) VALUES (?)", (par,))
+            for alteracao in exclusoes + gravacoes:
+                if alteracao.get('versao', pacote.get('versao_ate', 0)) <= recebida:
+                    resumo['ignoradas'] += 1
+                    continue
+                resumo[self._aplicar(connection, par, enviada, alteracao)] += 1
+            connection.execute("DELETE FROM contexto_sincronizacao")
+            
+            connection.execute(
+                "UPDATE pares_sincronizacao SET "
+                "versao_recebida = MAX(versao_recebida, ?), "
+                "versao_enviada = MAX(versao_enviada, ?), "
+                "nome = COALESCE(?, nome), ultima_sincronizacao = ? "
+                "WHERE par = ?",
+                (pacote.get('versao_ate', 0), pacote.get('confirmacao', 0), pacote.get('nome'),
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'), par)
+            )
+            self._podar_diario(connection)
+        analisar_apos_carga(connection, resumo['aplicadas'])
+        return resumo
+    
+    def _aplicar(self, connection: sqlite3.Connection, par: str, enviada: int, alteracao: Dict) -> str:
+        """Aplica uma alteração recebida; retorna a chave do resumo em que ela conta"""
+        tabela = alteracao['tabela']
+        _, chave_natural = TABELAS_SINCRONIZADAS[tabela]
+        gid = self._gid_local(connection, tabela, alteracao['gid'])
+        linha = connection.execute(f"SELECT * FROM {tabela} WHERE gid = ?", (gid,)).fetchone()
+        
+        if alteracao['excluido'] and linha is None:
+            return 'ignoradas'  # Já excluída aqui
+        
+        dados = None
+        if not alteracao['excluido']:
+            dados = self._traduzir_referencias(connection, tabela, alteracao['dados'])
+            if dados is None:
+                # A linha referenciada foi excluída aqui
+                self._registrar_conflito(connection, tabela, alteracao['gid'], par, None,
+                                         alteracao['dados'], 'referencia_ausente')
+                return 'ignoradas'
+            if linha is None and chave_natural:
+                linha = self._buscar_chave_natural(connection, tabela, chave_natural, dados)
+                if linha is not None:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO apelidos_sincronizacao (tabela, gid_remoto, gid_local) "
+                        "VALUES (?, ?, ?)",
+                        (tabela, alteracao['gid'], linha['gid'])
+                    )
+                    gid = linha['gid']
+        
+        # Alteração local da mesma linha que o par ainda não tinha visto
+        concorrente = connection.execute(
+            "SELECT excluido, data_hora FROM diario_alteracoes "
+            "WHERE tabela = ? AND gid = ? AND versao > ? AND (origem IS NULL OR origem != ?)",
+            (tabela, gid, enviada, par)
+        ).fetchone()
+        if concorrente is not None:
+            dados_locais = None if concorrente['excluido'] else self._ler_linhas(connection, tabela, [gid]).get(gid)
+            local = {'data_hora': concorrente['data_hora'], 'dados': dados_locais}
+            remota = {'data_hora': alteracao['data_hora'],
+                      'dados': None if alteracao['excluido'] else alteracao['dados']}
+            if resolver_conflito(tabela, local, remota) == 'local':
+                self._registrar_conflito(connection, tabela, gid, par, local['dados'], remota['dados'], 'mantida_local')
+                return 'conflitos'
+            self._registrar_conflito(connection, tabela, gid, par, local['dados'], remota['dados'], 'aplicada_remota')
+        
+        if alteracao['excluido']:
+            connection.execute(f"DELETE FROM {tabela} WHERE gid = ?", (gid,))
+        else:
+            try:
+                self._gravar(connection, tabela, gid, dados, linha is not None)
+            except sqlite3.IntegrityError as e:
+                if tabela in ('designacoes', 'designacoes_predios_vilas') and dados.get('status') == 'ativo':
+                    # Os dois dispositivos designaram o mesmo território (ou prédio)
+                    resultado = self._resolver_designacao_dupla(connection, tabela, gid, par, alteracao,
+                                                                dados, linha is not None)
+                    if resultado is not None:
+                        return resultado
+                print(f"Erro ao aplicar alteração sincronizada em {tabela}: {e}")
+                self._registrar_conflito(connection, tabela, gid, par, None, alteracao['dados'], 'violacao_integridade')
+                return 'ignoradas'
+        
+        # O diário guarda o horário da alteração original, usado nos próximos conflitos
+        connection.execute(
+            "UPDATE diario_alteracoes SET data_hora = ? WHERE tabela = ? AND gid = ?",
+            (alteracao['data_hora'], tabela, gid)
+        )
+        return 'aplicadas'
+    
+    def _gravar(self, connection: sqlite3.Connection, tabela: str, gid: str, dados: Dict, existe: bool) -> None:
+        """Atualiza a linha do gid (ou a insere) com os dados já traduzidos para ids locais"""
+        colunas = [c for c in self._colunas(connection, tabela) if c in dados]
+        valores = [dados[c] for c in colunas]
+        if existe:
+            atribuicoes = ", ".join(f"{c} = ?" for c in colunas)
+            connection.execute(f"UPDATE {tabela} SET {atribuicoes} WHERE gid = ?", valores + [gid])
+        else:
+            lista = ", ".join(colunas + ['gid'])
+            marcadores = ", ".join("?" for _ in range(len(colunas) + 1))
+            connection.execute(f"INSERT INTO {tabela} ({lista}) VALUES ({marcadores})", valores + [gid])
+    
+    def _resolver_designacao_dupla(self, connection: sqlite3.Connection, tabela: str, gid: str, par: str,
+                                   alteracao: Dict, dados: Dict, existe: bool) -> Optional[str]:
+        """Resolve a designação ativa recebida que o índice único recusou
+        
+        Uma só continua ativa (designacao_prevalece); a outra é descartada e
+        fica no registro de conflitos. Retorna a chave do resumo, ou None se a
+        recusa não veio de outra designação ativa.
+        """
+        coluna = 'territorio_id' if tabela == 'designacoes' else 'imovel_id'
+        outra = connection.execute(
+            f"SELECT gid, data_designacao FROM {tabela} WHERE {coluna} = ? AND status = 'ativo' AND gid != ?",
+            (dados[coluna], gid)
+        ).fetchone()
+        if outra is None:
+            return None
+        
+        dados_locais = self._ler_linhas(connection, tabela, [outra['gid']]).get(outra['gid'])
+        remota = {'data_designacao': dados.get('data_designacao'), 'gid': alteracao['gid']}
+        if designacao_prevalece(dict(outra), remota) == 'local':
+            self._registrar_conflito(connection, tabela, gid, par, dados_locais, alteracao['dados'],
+                                     'designacao_ativa_duplicada')
+            return 'conflitos'
+        
+        # A designação local sai (a exclusão vai para o diário como as demais)
+        connection.execute(f"DELETE FROM {tabela} WHERE gid = ?", (outra['gid'],))
+        self._gravar(connection, tabela, gid, dados, existe)
+        self._registrar_conflito(connection, tabela, outra['gid'], par, dados_locais,
+                                 alteracao['dados'], 'designacao_ativa_substituida')
+        connection.execute(
+            "UPDATE diario_alteracoes SET data_hora = ? WHERE tabela = ? AND gid = ?",
+            (alteracao['data_hora'], tabela, gid)
+        )
+        return 'aplicadas'
+    
+    def _colunas(self, connection: sqlite3.Connection, tabela: str) -> List[str]:
+        return [row[1] for row in connection.execute(f"PRAGMA table_info({tabela})").fetchall()
+                if row[1] not in ('id', 'gid')]
+    
+    def _gid_local(self, connection: sqlite3.Connection, tabela: str, gid: str) -> str:
+        row = connection.execute(
+            "SELECT gid_local FROM apelidos_sincronizacao WHERE tabela = ? AND gid_remoto = ?",
+            (tabela, gid)
+        ).fetchone()
+        return row[0] if row else gid
+    
+    def _traduzir_referencias(self, connection: sqlite3.Connection, tabela: str, dados: Dict) -> Optional[Dict]:
+        """Troca os gids das chaves estrangeiras pelos ids locais; None se faltar uma referência obrigatória"""
+        chaves, _ = TABELAS_SINCRONIZADAS[tabela]
+        dados = dict(dados)
+        for coluna, referenciada in chaves.items():
+            if dados.get(coluna) is None:
+                continue
+            row = connection.execute(
+                f"SELECT id FROM {referenciada} WHERE gid = ?",
+                (self._gid_local(connection, referenciada, dados[coluna]),)
+            ).fetchone()
+            if row is not None:
+                dados[coluna] = row[0]
+            elif (tabela, coluna) in REFERENCIAS_OPCIONAIS:
+                dados[coluna] = None
+            else:
+                return None
+        return dados
+    
+    def _buscar_chave_natural(self, connection: sqlite3.Connection, tabela: str, chave: tuple, dados: Dict):
+        valores = [dados.get(coluna) for coluna in chave]
+        if any(valor is None for valor in valores):
+            return None
+        condicao = " AND ".join(f"{coluna} = ?" for coluna in chave)
+        return connection.execute(f"SELECT * FROM {tabela} WHERE {condicao} LIMIT 1", valores).fetchone()
+    
+    def _registrar_conflito(self, connection: sqlite3.Connection, tabela: str, gid: str, par: str,
+                            dados_locais, dados_remotos, resolucao: str) -> None:
+        connection.execute(
+            "INSERT INTO conflitos_sincronizacao (tabela, gid, par, dados_locais, dados_remotos, resolucao) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (tabela, gid, par,
+             json.dumps(dados_locais, ensure_ascii=False) if dados_locais is not None else None,
+             json.dumps(dados_remotos, ensure_ascii=False) if dados_remotos is not None else None,
+             resolucao)
+        )
+    
+    def _podar_diario(self, connection: sqlite3.Connection) -> None:
+        """Remove do diário o que todos os pares já confirmaram"""
+        row = connection.execute(
+            "SELECT COUNT(*), MIN(versao_enviada) FROM pares_sincronizacao"
+        ).fetchone()
+        if row[0]:
+            connection.execute("DELETE FROM diario_alteracoes WHERE versao <= ?", (row[1],))
+    
+    def importar_arquivo(self, caminho: str) -> Dict[str, int]:
+        """Lê e aplica um pacote gravado por exportar_arquivo"""
+        with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+            pacote = json.load(f)
+        return self.importar_pacote(pacote)
+    
+    def listar_conflitos(self, limit: int = 100) -> List[Dict]:
+        """Conflitos resolvidos nas últimas importações, do mais recente para o mais antigo"""
+        connection = self._conectar()
+        try:
+            cursor = connection.execute(
+                "SELECT c.*, p.nome as nome_par FROM conflitos_sincronizacao c "
+                "LEFT JOIN pares_sincronizacao p ON c.par = p.par "
+                "ORDER BY c.id DESC LIMIT ?",
+                (limit,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            connection.close()
+    
+    # Novos dispositivos e rede local
+    
+    def criar_copia_campo(self, destino: str, nome: str) -> str:
+        """Cria em destino o banco de um novo dispositivo de campo e o registra como par
+        
+        Retorna o ID do novo dispositivo.
+        """
+        with self._trava:
+            connection = self._conectar()
+            try:
+                origem = _configuracao(connection, 'dispositivo')
+                nome_origem = _configuracao(connection, 'nome')
+                segredo = secrets.token_hex(32)
+                versao = connection.execute(
+                    "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'diario_alteracoes'), 0)"
+                ).fetchone()[0]
+                
+                copia = sqlite3.connect(destino)
+                try:
+                    connection.backup(copia)
+                    novo = uuid.uuid4().hex
+                    copia.execute("UPDATE configuracao_sincronizacao SET valor = ? WHERE chave = 'dispositivo'", (novo,))
+                    copia.execute("UPDATE configuracao_sincronizacao SET valor = ? WHERE chave = 'nome'", (nome,))
+                    # A cópia já contém tudo o que este dispositivo tinha
+                    copia.execute("DELETE FROM diario_alteracoes")
+                    copia.execute("DELETE FROM pares_sincronizacao")
+                    copia.execute("DELETE FROM conflitos_sincronizacao")
+                    copia.execute(
+                        "INSERT INTO pares_sincronizacao (par, nome, versao_enviada, versao_recebida, segredo) "
+                        "VALUES (?, ?, 0, ?, ?)",
+                        (origem, nome_origem, versao, segredo)
+                    )
+                    copia.commit()
+                finally:
+                    copia.close()
+                
+                connection.execute(
+                    "INSERT OR REPLACE INTO pares_sincronizacao (par, nome, versao_enviada, versao_recebida, segredo) "
+                    "VALUES (?, ?, ?, 0, ?)",
+                    (novo, nome, versao, segredo)
+                )
+                connection.commit()
+                return novo
+            finally:
+                connection.close()
+    
+    def sincronizar_http(self, url: str, timeout: float = 30, chave: str = None) -> Dict[str, int]:
+        """Troca pacotes com um ServidorSincronizacao: envia o nosso e aplica a resposta
+        
+        chave é a chave de acesso do servidor, se ele exigir uma.
+        """
+        url = url.rstrip('/')
+        cabecalhos = {'Authorization': f"Bearer {chave}"} if chave else {}
+        requisicao = urllib_request.Request(f"{url}/dispositivo", headers=cabecalhos)
+        with urllib_request.urlopen(requisicao, timeout=timeout) as resposta:
+            servidor = json.loads(resposta.read().decode('utf-8'))
+        
+        pacote = self.gerar_pacote(servidor['id'])
+        requisicao = urllib_request.Request(
+            f"{url}/pacote",
+            data=gzip.compress(json.dumps(pacote, ensure_ascii=False).encode('utf-8')),
+            headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip', **cabecalhos},
+            method='POST'
+        )
+        with urllib_request.urlopen(requisicao, timeout=timeout) as resposta:
+            retorno = json.loads(_descompactar(resposta.read(MAXIMO_PACOTE + 1)).decode('utf-8'))
+        
+        # A resposta também é conferida: precisa vir assinada pelo servidor pareado
+        resumo = self.importar_pacote(retorno)
+        resumo['enviadas'] = len(pacote['alteracoes'])
+        return resumo
+
+
+def _descompactar(dados: bytes) -> bytes:
+    """Descompacta um pacote gzip recebido pela rede, sem passar de MAXIMO_PACOTE"""
+    if len(dados) > MAXIMO_PACOTE:
+        raise ValueError("Pacote de sincronização grande demais.")
+    descompactador = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    conteudo = descompactador.decompress(dados, MAXIMO_PACOTE + 1)
+    if len(conteudo) > MAXIMO_PACOTE or descompactador.unconsumed_tail:
+        raise ValueError("Pacote de sincronização grande demais.")
+    return conteudo
+
+
+class _ManipuladorSincronizacao(BaseHTTPRequestHandler):
+    """GET /dispositivo devolve a identidade; POST /pacote aplica o pacote e responde com o nosso
+    
+    Só pacotes assinados por um dispositivo pareado são aplicados (veja Sincronizador).
+    Se o servidor tiver chave de acesso, ela é exigida no cabeçalho Authorization.
+    """
+    
+    def _autorizado(self) -> bool:
+        chave = self.server.chave
+        if chave and not hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {chave}"):
+            self._responder(401, {'erro': 'Chave de acesso inválida.'})
+            return False
+        return True
+    
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        if self.path.rstrip('/') != '/dispositivo':
+            self._responder(404, {'erro': 'Caminho desconhecido.'})
+            return
+        self._responder(200, self.server.sincronizador.identidade())
+    
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        if self.path.rstrip('/') != '/pacote':
+            self._responder(404, {'erro': 'Caminho desconhecido.'})
+            return
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            if tamanho > MAXIMO_PACOTE:
+                raise ValueError("Pacote de sincronização grande demais.")
+            pacote = json.loads(_descompactar(self.rfile.read(tamanho)).decode('utf-8'))
+            if not isinstance(pacote, dict):
+                raise ValueError("Pacote de sincronização inválido.")
+            sincronizador = self.server.sincronizador
+            resumo = sincronizador.importar_pacote(pacote)
+            resposta = sincronizador.gerar_pacote(pacote['origem'])
+        except PacoteNaoAutorizado as e:
+            self._responder(401, {'erro': str(e)})
+            return
+        except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            self._responder(400, {'erro': str(e)})
+            return
+        self._responder(200, resposta, compactar=True)
+        if self.server.ao_importar is not None:
+            self.server.ao_importar(resumo)
+    
+    def _responder(self, codigo: int, conteudo: Dict, compactar: bool = False):
+        corpo = json.dumps(conteudo, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compactar:
+            corpo = gzip.compress(corpo)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def log_message(self, format, *args):
+        pass  # Sem registro de cada requisição no console
+
+
+class ServidorSincronizacao:
+    """Recebe sincronizações de dispositivos de campo pela rede local
+    
+    Serve de ponto de troca no lugar de um servidor central: cada requisição
+    aplica o pacote recebido e responde com as alterações para o remetente.
+    ao_importar é chamada (na thread do servidor) com o resumo de cada pacote
+    aplicado, para quem tem dados em memória recarregá-los. Sem chave de
+    acesso, o servidor só atende no próprio computador (127.0.0.1).
+    """
+    
+    def __init__(self, db_path: str, porta: int = 8765, endereco: str = '127.0.0.1',
+                 ao_importar: Callable[[Dict[str, int]], None] = None, chave: str = None):
+        if not chave and not endereco_local(endereco):
+            raise ValueError(f"Sem chave de acesso, o servidor não pode atender em {endereco}; "
+                             "informe uma chave ou use 127.0.0.1.")
+        self.sincronizador = Sincronizador(db_path)
+        self.porta = porta
+        self.endereco = endereco
+        self.ao_importar = ao_importar
+        self.chave = chave  # Se informada, exigida no cabeçalho Authorization
+        self._servidor = None
+        self._thread = None
+    
+    def iniciar(self) -> None:
+        """Passa a aceitar conexões numa thread em segundo plano"""
+        if self._servidor is not None:
+            return
+        self._servidor = ThreadingHTTPServer((self.endereco, self.porta), _ManipuladorSincronizacao)
+        self._servidor.sincronizador = self.sincronizador
+        self._servidor.ao_importar = self.ao_importar
+        self._servidor.chave = self.chave
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="Sincronizacao", daemon=True)
+        self._thread.start()
+    
+    def parar(self) -> None:
+        """Encerra o servidor"""
+        if self._servidor is None:
+            return
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        self._thread.join(5.0)
+        self._servidor = None
+        self._thread = None
+    
+    @property
+    def ativo(self) -> bool:
+        return self._servidor is not None
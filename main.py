@@ -8,12 +8,20 @@ from PySide6.QtCore import QFile, QTextStream, Qt
 from PySide6.QtGui import QIcon
 
 from database.db_manager import DatabaseManager
+from database.arquivamento import ServicoArquivamento
+from database.backup import ServicoBackup
+from database.manutencao import ServicoManutencao
+from models.gravador_log import GravadorLog
+from models.usuario import LogAtividade
 from views.main_window import MainWindow
 
 def setup_database():
     """Inicializa o banco de dados"""
     db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'territorios.db')
-    db_manager = DatabaseManager(db_path)
+    # Com TERRITORIOS_SERVIDOR definido, usa o banco hospedado pelo ServidorAPI
+    db_manager = DatabaseManager(db_path,
+                                 servidor=os.environ.get('TERRITORIOS_SERVIDOR'),
+                                 chave=os.environ.get('TERRITORIOS_CHAVE'))
     db_manager.setup_database()
     return db_manager
 
@@ -29,12 +37,47 @@ def main():
     # Inicializa o banco de dados
     db_manager = setup_database()
     
+    # Serviços que abrem o arquivo diretamente (no modo cliente, ficam com o servidor)
+    arquivamento = None
+    backup = None
+    manutencao = None
+    if db_manager.cliente is None:
+        # Log de atividades gravado em segundo plano, em lotes
+        gravador = GravadorLog(db_manager.db_path)
+        gravador.iniciar()
+        LogAtividade.configurar_gravador(gravador)
+        
+        # Move logs e notificações antigos para o banco de arquivo, em segundo plano
+        arquivamento = ServicoArquivamento(db_manager.db_path)
+        arquivamento.iniciar()
+        
+        # Backup diário do banco, copiado em passos sem travar a interface
+        backup = ServicoBackup(db_manager.db_path)
+        backup.iniciar()
+        
+        # Estatísticas e espaço livre do banco cuidados enquanto a interface está ociosa
+        manutencao = ServicoManutencao(db_manager.db_path,
+                                       ultima_atividade=lambda: db_manager.ultima_atividade)
+        manutencao.iniciar()
+    
     # Cria a janela principal
     window = MainWindow(db_manager)
     window.show()
     
     # Inicia o loop de eventos
-    sys.exit(app.exec())
+    codigo_saida = app.exec()
+    
+    # Grava as atividades pendentes antes de sair
+    if arquivamento is not None:
+        arquivamento.parar()
+        backup.parar()
+        manutencao.parar()
+    LogAtividade.encerrar_gravador()
+    db_manager.close()  # Roda o PRAGMA optimize
+    if manutencao is not None:
+        # Conversão única de bancos antigos para o auto_vacuum incremental, já sem outras conexões
+        manutencao.converter_auto_vacuum()
+    sys.exit(codigo_saida)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -49,17 +49,7 @@ class Atendimento:
     @staticmethod
     def get_all(db_manager) -> List['Atendimento']:
         """Obtém todos os atendimentos do banco de dados"""
-        cursor = db_manager.execute(
-            "SELECT a.*, i.numero as imovel_numero, i.tipo as imovel_tipo, "
-            "r.nome as rua_nome, t.nome as territorio_nome, "
-            "u.numero as unidade_numero "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "LEFT JOIN unidades u ON a.unidade_id = u.id "
-            "ORDER BY a.data DESC"
-        )
+        cursor = db_manager.executar_consulta('atendimentos.todos')
         if cursor:
             return [Atendimento.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -67,19 +57,7 @@ class Atendimento:
     @staticmethod
     def get_by_imovel(db_manager, imovel_id: int) -> List['Atendimento']:
         """Obtém todos os atendimentos de um imóvel"""
-        cursor = db_manager.execute(
-            "SELECT a.*, i.numero as imovel_numero, i.tipo as imovel_tipo, "
-            "r.nome as rua_nome, t.nome as territorio_nome, "
-            "u.numero as unidade_numero "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "LEFT JOIN unidades u ON a.unidade_id = u.id "
-            "WHERE a.imovel_id = ? "
-            "ORDER BY a.data DESC",
-            (imovel_id,)
-        )
+        cursor = db_manager.executar_consulta('atendimentos.por_imovel', (imovel_id,))
         if cursor:
             return [Atendimento.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -87,19 +65,7 @@ class Atendimento:
     @staticmethod
     def get_by_unidade(db_manager, unidade_id: int) -> List['Atendimento']:
         """Obtém todos os atendimentos de uma unidade"""
-        cursor = db_manager.execute(
-            "SELECT a.*, i.numero as imovel_numero, i.tipo as imovel_tipo, "
-            "r.nome as rua_nome, t.nome as territorio_nome, "
-            "u.numero as unidade_numero "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "JOIN unidades u ON a.unidade_id = u.id "
-            "WHERE a.unidade_id = ? "
-            "ORDER BY a.data DESC",
-            (unidade_id,)
-        )
+        cursor = db_manager.executar_consulta('atendimentos.por_unidade', (unidade_id,))
         if cursor:
             return [Atendimento.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -107,19 +73,7 @@ class Atendimento:
     @staticmethod
     def get_ultimos(db_manager, limit: int = 10) -> List['Atendimento']:
         """Obtém os últimos atendimentos registrados"""
-        cursor = db_manager.execute(
-            "SELECT a.*, i.numero as imovel_numero, i.tipo as imovel_tipo, "
-            "r.nome as rua_nome, t.nome as territorio_nome, "
-            "u.numero as unidade_numero "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "LEFT JOIN unidades u ON a.unidade_id = u.id "
-            "ORDER BY a.data_registro DESC "
-            "LIMIT ?",
-            (limit,)
-        )
+        cursor = db_manager.executar_consulta('atendimentos.ultimos', (limit,))
         if cursor:
             return [Atendimento.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -135,41 +89,27 @@ class Atendimento:
         }
         
         # Total de atendimentos
-        cursor = db_manager.execute("SELECT COUNT(*) as total FROM atendimentos")
+        cursor = db_manager.executar_consulta('atendimentos.total')
         if cursor:
             row = cursor.fetchone()
             if row:
                 estatisticas['total'] = row['total']
         
         # Atendimentos por resultado
-        cursor = db_manager.execute(
-            "SELECT resultado, COUNT(*) as total FROM atendimentos GROUP BY resultado"
-        )
+        cursor = db_manager.executar_consulta('atendimentos.total_por_resultado')
         if cursor:
             for row in cursor.fetchall():
                 if row['resultado']:
                     estatisticas['por_resultado'][row['resultado']] = row['total']
         
         # Atendimentos por tipo de imóvel
-        cursor = db_manager.execute(
-            "SELECT i.tipo, COUNT(*) as total "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "GROUP BY i.tipo"
-        )
+        cursor = db_manager.executar_consulta('atendimentos.total_por_tipo_imovel')
         if cursor:
             for row in cursor.fetchall():
                 estatisticas['por_tipo'][row['tipo']] = row['total']
         
         # Atendimentos por território
-        cursor = db_manager.execute(
-            "SELECT t.nome, COUNT(*) as total "
-            "FROM atendimentos a "
-            "JOIN imoveis i ON a.imovel_id = i.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "GROUP BY t.id"
-        )
+        cursor = db_manager.executar_consulta('atendimentos.total_por_territorio')
         if cursor:
             for row in cursor.fetchall():
                 estatisticas['por_territorio'][row['nome']] = row['total']
@@ -180,9 +120,8 @@ class Atendimento:
         """Salva o atendimento no banco de dados"""
         if self.id is None:
             # Inserir novo atendimento
-            cursor = db_manager.execute(
-                "INSERT INTO atendimentos (imovel_id, unidade_id, data, resultado, observacoes) "
-                "VALUES (?, ?, ?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'atendimentos.inserir',
                 (self.imovel_id, self.unidade_id, self.data, self.resultado, self.observacoes)
             )
             if cursor:
@@ -191,9 +130,8 @@ class Atendimento:
                 return True
         else:
             # Atualizar atendimento existente
-            cursor = db_manager.execute(
-                "UPDATE atendimentos SET imovel_id = ?, unidade_id = ?, data = ?, "
-                "resultado = ?, observacoes = ? WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'atendimentos.atualizar',
                 (self.imovel_id, self.unidade_id, self.data, self.resultado, 
                  self.observacoes, self.id)
             )
@@ -205,10 +143,7 @@ class Atendimento:
     def delete(self, db_manager) -> bool:
         """Deleta o atendimento do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM atendimentos WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('atendimentos.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
                 return True
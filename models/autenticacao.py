@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Optional
+
+from models.usuario import Usuario
+
+def pasta_configuracao() -> str:
+    """Pasta de configuração do usuário do sistema operacional, fora da pasta de dados"""
+    base = os.environ.get('APPDATA') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'territorios')
+
+class ServicoAutenticacao:
+    """Classe para verificar credenciais e manter tokens de sessão locais
+
+    O token salvo não faz login sozinho: ele guarda um verificador da senha
+    (HMAC com a chave local), para que a senha digitada ao reabrir o sistema
+    seja conferida sem recalcular o PBKDF2. A chave fica na pasta de
+    configuração do usuário, não junto do banco e do token.
+
+    No modo cliente não há token local: a senha é conferida pelo servidor
+    (entrar_no_servidor), que abre a sessão usada nas requisições seguintes.
+    """
+
+    # Validade do token de sessão (em segundos)
+    DURACAO_TOKEN = 12 * 60 * 60
+
+    ARQUIVO_CHAVE = "chave_sessao"
+    ARQUIVO_TOKEN = "sessao.token"
+
+    def __init__(self, db_manager, pasta_chave: str = None):
+        self.db_manager = db_manager
+        pasta = os.path.dirname(os.path.abspath(db_manager.db_path))
+        self.chave_path = os.path.join(pasta_chave or pasta_configuracao(), self.ARQUIVO_CHAVE)
+        self.token_path = os.path.join(pasta, self.ARQUIVO_TOKEN)
+        self._chave = None
+
+        # Verificador da senha da sessão atual, mantido apenas em memória
+        self._chave_memoria = os.urandom(32)
+        self._verificador = None
+        self._usuario_sessao = None
+
+    def entrar_no_servidor(self, email: str, senha: str) -> Optional[Usuario]:
+        """Modo cliente: login no servidor; retorna o usuário (sem o hash da senha) ou None"""
+        dados = self.db_manager.cliente.entrar(email, senha)
+        return Usuario.from_db_row(dados) if dados else None
+
+    @staticmethod
+    def verificar_senha(usuario: Usuario, senha: str) -> bool:
+        """Verifica a senha (PBKDF2) e atualiza o hash se os parâmetros mudaram
+
+        Não acessa o banco de dados, para poder rodar fora da thread da interface.
+        """
+        if not usuario.verificar_senha(senha):
+            return False
+        if usuario.precisa_rehash():
+            usuario.definir_senha(senha)
+        return True
+
+    def _obter_chave(self) -> bytes:
+        """Obtém (ou cria) a chave local usada para assinar os tokens"""
+        if self._chave is None:
+            try:
+                with open(self.chave_path, 'rb') as f:
+                    self._chave = f.read()
+            except OSError:
+                self._chave = b""
+
+            if len(self._chave) < 32:
+                self._chave = os.urandom(32)
+                try:
+                    os.makedirs(os.path.dirname(self.chave_path), exist_ok=True)
+                    with open(self.chave_path, 'wb') as f:
+                        f.write(self._chave)
+                    os.chmod(self.chave_path, 0o600)
+                except OSError as e:
+                    print(f"Erro ao salvar chave de sessão: {e}")
+        return self._chave
+
+    @staticmethod
+    def _impressao_senha(usuario: Usuario) -> str:
+        """Impressão digital do hash da senha (uma troca de senha invalida o token)"""
+        return hashlib.sha256((usuario.senha_hash or "").encode('utf-8')).hexdigest()[:32]
+
+    def _assinar(self, dados: bytes) -> bytes:
+        """Assina os dados com HMAC-SHA256"""
+        return hmac.new(self._obter_chave(), dados, hashlib.sha256).digest()
+
+    def _verificador_token(self, sal: str, senha: str) -> str:
+        """Verificador rápido da senha guardado no token (só confere com a chave local)"""
+        return hmac.new(self._obter_chave(), (sal + senha).encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def emitir_token(self, usuario: Usuario, senha: str) -> Optional[str]:
+        """Emite e salva um token de sessão assinado, com o verificador da senha"""
+        if self.db_manager.cliente is not None:
+            return None
+        sal = os.urandom(16).hex()
+        payload = json.dumps({
+            'uid': usuario.id,
+            'exp': int(time.time()) + self.DURACAO_TOKEN,
+            'fp': self._impressao_senha(usuario),
+            'sal': sal,
+            'ver': self._verificador_token(sal, senha)
+        }, separators=(',', ':')).encode('utf-8')
+        token = (base64.urlsafe_b64encode(payload).decode('ascii') + "." +
+                 base64.urlsafe_b64encode(self._assinar(payload)).decode('ascii'))
+        try:
+            with open(self.token_path, 'w', encoding='utf-8') as f:
+                f.write(token)
+            os.chmod(self.token_path, 0o600)
+        except OSError as e:
+            print(f"Erro ao salvar token de sessão: {e}")
+            return None
+        return token
+
+    def _ler_token(self, token: str = None) -> Optional[dict]:
+        """Dados do token salvo, se a assinatura conferir e ainda estiver no prazo"""
+        if self.db_manager.cliente is not None:
+            return None
+        if token is None:
+            try:
+                with open(self.token_path, 'r', encoding='utf-8') as f:
+                    token = f.read().strip()
+            except OSError:
+                return None
+
+        try:
+            payload_b64, assinatura_b64 = token.split(".")
+            payload = base64.urlsafe_b64decode(payload_b64)
+            assinatura = base64.urlsafe_b64decode(assinatura_b64)
+            if not hmac.compare_digest(assinatura, self._assinar(payload)):
+                return None
+            dados = json.loads(payload)
+        except (ValueError, TypeError):
+            return None
+
+        if dados.get('exp', 0) < time.time():
+            self.revogar_token()
+            return None
+        return dados
+
+    def usuario_do_token(self, token: str = None) -> Optional[Usuario]:
+        """Usuário da última sessão, para o login já vir preenchido; não dispensa a senha
+
+        Uma troca de senha (ou a desativação do usuário) invalida o token.
+        """
+        dados = self._ler_token(token)
+        if dados is None:
+            return None
+        usuario = Usuario.get_by_id(self.db_manager, dados.get('uid'))
+        if not usuario or not usuario.ativo:
+            return None
+        if not hmac.compare_digest(dados.get('fp', ''), self._impressao_senha(usuario)):
+            return None
+        return usuario
+
+    def validar_token(self, usuario: Usuario, senha: str, token: str = None) -> bool:
+        """Confere a senha com o verificador do token, sem recalcular o PBKDF2
+
+        Retorna False se o token não for deste usuário ou a senha não conferir.
+        """
+        dados = self._ler_token(token)
+        if dados is None or dados.get('uid') != usuario.id:
+            return False
+        if not hmac.compare_digest(dados.get('fp', ''), self._impressao_senha(usuario)):
+            return False
+        verificador = self._verificador_token(str(dados.get('sal', '')), senha)
+        return hmac.compare_digest(str(dados.get('ver', '')), verificador)
+
+    def revogar_token(self) -> None:
+        """Remove o token de sessão salvo (logout)"""
+        if self.db_manager.cliente is not None:
+            self.db_manager.cliente.sair()
+        try:
+            os.remove(self.token_path)
+        except OSError:
+            pass
+        self._verificador = None
+        self._usuario_sessao = None
+
+    def registrar_sessao(self, usuario: Usuario, senha: str) -> None:
+        """Guarda em memória um verificador rápido da senha do usuário logado"""
+        self._usuario_sessao = usuario.id
+        self._verificador = hmac.new(self._chave_memoria, senha.encode('utf-8'), hashlib.sha256).digest()
+
+    def reautenticar(self, usuario: Usuario, senha: str) -> bool:
+        """Confirma a senha do usuário logado sem pagar o custo do PBKDF2
+
+        Retorna False se não houver verificador da sessão; nesse caso a senha
+        deve ser verificada normalmente com verificar_senha.
+        """
+        if self._verificador is None or self._usuario_sessao != usuario.id:
+            return False
+        verificador = hmac.new(self._chave_memoria, senha.encode('utf-8'), hashlib.sha256).digest()
+        return hmac.compare_digest(verificador, self._verificador)
@@ -5,6 +5,26 @@ from typing import List, Optional, Dict, Any
 import sqlite3
 from datetime import datetime
 
+
+# Funções (sem argumentos) chamadas sempre que uma designação de território
+# ou de prédio/vila é criada, alterada, concluída ou excluída
+ouvintes_alteracao = []
+
+def registrar_ouvinte(funcao) -> None:
+    """Registra uma função a ser avisada das alterações de designações"""
+    if funcao not in ouvintes_alteracao:
+        ouvintes_alteracao.append(funcao)
+
+def remover_ouvinte(funcao) -> None:
+    """Remove uma função registrada com registrar_ouvinte"""
+    if funcao in ouvintes_alteracao:
+        ouvintes_alteracao.remove(funcao)
+
+def avisar_alteracao() -> None:
+    """Avisa os ouvintes de que as designações mudaram"""
+    for funcao in list(ouvintes_alteracao):
+        funcao()
+
 class Designacao:
     """Modelo para representar uma designação de território"""
     
@@ -48,13 +68,7 @@ class Designacao:
     @staticmethod
     def get_all(db_manager) -> List['Designacao']:
         """Obtém todas as designações do banco de dados"""
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
-            "FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "ORDER BY d.data_designacao DESC"
-        )
+        cursor = db_manager.executar_consulta('designacoes.todas')
         if cursor:
             return [Designacao.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -62,14 +76,7 @@ class Designacao:
     @staticmethod
     def get_ativas(db_manager) -> List['Designacao']:
         """Obtém as designações ativas"""
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
-            "FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "WHERE d.status = 'ativo' "
-            "ORDER BY d.data_designacao DESC"
-        )
+        cursor = db_manager.executar_consulta('designacoes.ativas')
         if cursor:
             return [Designacao.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -77,107 +84,142 @@ class Designacao:
     @staticmethod
     def get_by_id(db_manager, designacao_id: int) -> Optional['Designacao']:
         """Obtém uma designação pelo ID"""
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
-            "FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "WHERE d.id = ?", 
-            (designacao_id,)
-        )
+        cursor = db_manager.executar_consulta('designacoes.por_id', (designacao_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
                 return Designacao.from_db_row(row)
         return None
     
+    @staticmethod
+    def buscar(db_manager, status: str = None, territorio_id: int = None,
+               data_inicio: str = None, data_fim: str = None,
+               apos: tuple = None, limit: int = 100) -> List['Designacao']:
+        """Obtém designações filtradas no banco, uma página por vez
+        
+        Datas (AAAA-MM-DD, inclusivas) filtram pela data de designação. A
+        paginação é por chave: para a próxima página, passe em apos o cursor
+        (data_designacao, id) da última designação recebida (veja cursor_pagina).
+        """
+        apos_data, apos_id = apos if apos is not None else (None, None)
+        cursor = db_manager.executar_consulta('designacoes.buscar', {
+            'status': status or None, 'territorio_id': territorio_id,
+            'data_inicio': data_inicio or None, 'data_fim': data_fim or None,
+            'apos_data': apos_data, 'apos_id': apos_id, 'limit': limit
+        })
+        if cursor:
+            return [Designacao.from_db_row(row) for row in cursor.fetchall()]
+        return []
+    
+    @staticmethod
+    def cursor_pagina(designacoes: List['Designacao']) -> Optional[tuple]:
+        """Cursor de paginação (data_designacao, id) a partir da última designação da página"""
+        if not designacoes:
+            return None
+        return (designacoes[-1].data_designacao, designacoes[-1].id)
+    
     @staticmethod
     def get_by_territorio(db_manager, territorio_id: int) -> List['Designacao']:
         """Obtém todas as designações de um território"""
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
-            "FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "WHERE d.territorio_id = ? "
-            "ORDER BY d.data_designacao DESC",
-            (territorio_id,)
-        )
+        cursor = db_manager.executar_consulta('designacoes.por_territorio', (territorio_id,))
         if cursor:
             return [Designacao.from_db_row(row) for row in cursor.fetchall()]
         return []
     
+    @staticmethod
+    def get_ativa_por_territorio(db_manager, territorio_id: int) -> Optional['Designacao']:
+        """Obtém a designação ativa do território, se houver (no máximo uma)"""
+        cursor = db_manager.executar_consulta('designacoes.ativa_por_territorio', (territorio_id,))
+        if cursor:
+            row = cursor.fetchone()
+            if row:
+                return Designacao.from_db_row(row)
+        return None
+    
+    @staticmethod
+    def territorio_designado(db_manager, territorio_id: int) -> bool:
+        """Verifica se o território tem designação ativa
+        
+        Consulta apenas o índice único parcial uq_designacoes_territorio_ativo
+        (o status precisa estar literal na consulta para o índice ser usado).
+        """
+        cursor = db_manager.executar_consulta('designacoes.territorio_designado', (territorio_id,))
+        return bool(cursor and cursor.fetchone())
+    
     @staticmethod
     def get_designacao_do_dia(db_manager) -> Optional['Designacao']:
         """Obtém a designação para o dia atual"""
         hoje = datetime.now().strftime('%Y-%m-%d')
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome, s.nome as saida_campo_nome "
-            "FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "WHERE d.data_designacao <= ? AND (d.data_devolucao >= ? OR d.data_devolucao IS NULL) "
-            "AND d.status = 'ativo' "
-            "ORDER BY d.data_designacao DESC "
-            "LIMIT 1",
-            (hoje, hoje)
-        )
+        cursor = db_manager.executar_consulta('designacoes.do_dia', (hoje, hoje))
         if cursor:
             row = cursor.fetchone()
             if row:
                 return Designacao.from_db_row(row)
         return None
     
-    def save(self, db_manager) -> bool:
-        """Salva a designação no banco de dados"""
+    def save(self, db_manager, substituir_ativa: bool = False) -> bool:
+        """Salva a designação no banco de dados
+        
+        Só pode haver uma designação ativa do território (índice único parcial):
+        salvar outra falha, a menos que substituir_ativa seja True, caso em que
+        a atual é concluída na mesma transação.
+        """
+        if substituir_ativa and self.status == "ativo":
+            cursor = db_manager.executar_consulta(
+                'designacoes.concluir_ativa_do_territorio',
+                (self.territorio_id, self.id)
+            )
+            if not cursor:
+                db_manager.rollback()
+                return False
+        
         if self.id is None:
             # Inserir nova designação
-            cursor = db_manager.execute(
-                "INSERT INTO designacoes (territorio_id, saida_campo_id, data_designacao, "
-                "data_devolucao, responsavel, status) VALUES (?, ?, ?, ?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'designacoes.inserir',
                 (self.territorio_id, self.saida_campo_id, self.data_designacao,
                  self.data_devolucao, self.responsavel, self.status)
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         else:
             # Atualizar designação existente
-            cursor = db_manager.execute(
-                "UPDATE designacoes SET territorio_id = ?, saida_campo_id = ?, "
-                "data_designacao = ?, data_devolucao = ?, responsavel = ?, status = ? "
-                "WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'designacoes.atualizar',
                 (self.territorio_id, self.saida_campo_id, self.data_designacao,
                  self.data_devolucao, self.responsavel, self.status, self.id)
             )
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
+        
+        # Encerra a transação aberta (e a conclusão da designação anterior, se houver):
+        # o comando que falhou não a desfaz e ela seguraria a trava de escrita
+        db_manager.rollback()
         return False
     
     def concluir(self, db_manager) -> bool:
         """Marca a designação como concluída"""
         if self.id is not None:
             self.status = "concluido"
-            cursor = db_manager.execute(
-                "UPDATE designacoes SET status = 'concluido' WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('designacoes.concluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         return False
     
     def delete(self, db_manager) -> bool:
         """Deleta a designação do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM designacoes WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('designacoes.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         return False
     
@@ -232,16 +274,7 @@ class DesignacaoPredioVila:
     @staticmethod
     def get_all(db_manager) -> List['DesignacaoPredioVila']:
         """Obtém todas as designações de prédios/vilas do banco de dados"""
-        cursor = db_manager.execute(
-            "SELECT d.*, i.numero as imovel_numero, i.nome as imovel_nome, i.tipo as imovel_tipo, "
-            "s.nome as saida_campo_nome, r.nome as rua_nome, t.nome as territorio_nome "
-            "FROM designacoes_predios_vilas d "
-            "JOIN imoveis i ON d.imovel_id = i.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "ORDER BY d.data_designacao DESC"
-        )
+        cursor = db_manager.executar_consulta('designacoes_predios_vilas.todas')
         if cursor:
             return [DesignacaoPredioVila.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -249,91 +282,118 @@ class DesignacaoPredioVila:
     @staticmethod
     def get_ativas(db_manager) -> List['DesignacaoPredioVila']:
         """Obtém as designações ativas de prédios/vilas"""
-        cursor = db_manager.execute(
-            "SELECT d.*, i.numero as imovel_numero, i.nome as imovel_nome, i.tipo as imovel_tipo, "
-            "s.nome as saida_campo_nome, r.nome as rua_nome, t.nome as territorio_nome "
-            "FROM designacoes_predios_vilas d "
-            "JOIN imoveis i ON d.imovel_id = i.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "WHERE d.status = 'ativo' "
-            "ORDER BY d.data_designacao DESC"
-        )
+        cursor = db_manager.executar_consulta('designacoes_predios_vilas.ativas')
         if cursor:
             return [DesignacaoPredioVila.from_db_row(row) for row in cursor.fetchall()]
         return []
     
+    @staticmethod
+    def buscar(db_manager, status: str = None, territorio_id: int = None,
+               data_inicio: str = None, data_fim: str = None,
+               apos: tuple = None, limit: int = 100) -> List['DesignacaoPredioVila']:
+        """Obtém designações de prédios/vilas filtradas no banco, uma página por vez
+        
+        Mesmos filtros e paginação de Designacao.buscar; territorio_id filtra
+        pelo território da rua do prédio/vila.
+        """
+        apos_data, apos_id = apos if apos is not None else (None, None)
+        cursor = db_manager.executar_consulta('designacoes_predios_vilas.buscar', {
+            'status': status or None, 'territorio_id': territorio_id,
+            'data_inicio': data_inicio or None, 'data_fim': data_fim or None,
+            'apos_data': apos_data, 'apos_id': apos_id, 'limit': limit
+        })
+        if cursor:
+            return [DesignacaoPredioVila.from_db_row(row) for row in cursor.fetchall()]
+        return []
+    
+    @staticmethod
+    def cursor_pagina(designacoes: List['DesignacaoPredioVila']) -> Optional[tuple]:
+        """Cursor de paginação (data_designacao, id) a partir da última designação da página"""
+        if not designacoes:
+            return None
+        return (designacoes[-1].data_designacao, designacoes[-1].id)
+    
     @staticmethod
     def get_by_imovel(db_manager, imovel_id: int) -> Optional['DesignacaoPredioVila']:
         """Obtém a designação ativa de um prédio/vila específico"""
-        cursor = db_manager.execute(
-            "SELECT d.*, i.numero as imovel_numero, i.nome as imovel_nome, i.tipo as imovel_tipo, "
-            "s.nome as saida_campo_nome, r.nome as rua_nome, t.nome as territorio_nome "
-            "FROM designacoes_predios_vilas d "
-            "JOIN imoveis i ON d.imovel_id = i.id "
-            "JOIN saidas_campo s ON d.saida_campo_id = s.id "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "WHERE d.imovel_id = ? AND d.status = 'ativo'",
-            (imovel_id,)
-        )
+        cursor = db_manager.executar_consulta('designacoes_predios_vilas.ativa_por_imovel', (imovel_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
                 return DesignacaoPredioVila.from_db_row(row)
         return None
     
-    def save(self, db_manager) -> bool:
-        """Salva a designação no banco de dados"""
+    @staticmethod
+    def imovel_designado(db_manager, imovel_id: int) -> bool:
+        """Verifica se o prédio/vila tem designação ativa
+        
+        Consulta apenas o índice único parcial uq_designacoes_predios_vilas_imovel_ativo.
+        """
+        cursor = db_manager.executar_consulta('designacoes_predios_vilas.imovel_designado', (imovel_id,))
+        return bool(cursor and cursor.fetchone())
+    
+    def save(self, db_manager, substituir_ativa: bool = False) -> bool:
+        """Salva a designação no banco de dados
+        
+        Só pode haver uma designação ativa do prédio/vila (índice único parcial):
+        salvar outra falha, a menos que substituir_ativa seja True, caso em que
+        a atual é concluída na mesma transação.
+        """
+        if substituir_ativa and self.status == "ativo":
+            cursor = db_manager.executar_consulta(
+                'designacoes_predios_vilas.concluir_ativa_do_imovel',
+                (self.imovel_id, self.id)
+            )
+            if not cursor:
+                db_manager.rollback()
+                return False
+        
         if self.id is None:
             # Inserir nova designação
-            cursor = db_manager.execute(
-                "INSERT INTO designacoes_predios_vilas (imovel_id, responsavel, saida_campo_id, "
-                "data_designacao, data_devolucao, status) VALUES (?, ?, ?, ?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'designacoes_predios_vilas.inserir',
                 (self.imovel_id, self.responsavel, self.saida_campo_id, 
                  self.data_designacao, self.data_devolucao, self.status)
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         else:
             # Atualizar designação existente
-            cursor = db_manager.execute(
-                "UPDATE designacoes_predios_vilas SET imovel_id = ?, responsavel = ?, "
-                "saida_campo_id = ?, data_designacao = ?, data_devolucao = ?, status = ? "
-                "WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'designacoes_predios_vilas.atualizar',
                 (self.imovel_id, self.responsavel, self.saida_campo_id,
                  self.data_designacao, self.data_devolucao, self.status, self.id)
             )
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
+        
+        # Encerra a transação aberta (e a conclusão da designação anterior, se houver)
+        db_manager.rollback()
         return False
     
     def concluir(self, db_manager) -> bool:
         """Marca a designação como concluída"""
         if self.id is not None:
             self.status = "concluido"
-            cursor = db_manager.execute(
-                "UPDATE designacoes_predios_vilas SET status = 'concluido' WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('designacoes_predios_vilas.concluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         return False
     
     def delete(self, db_manager) -> bool:
         """Deleta a designação do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM designacoes_predios_vilas WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('designacoes_predios_vilas.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                avisar_alteracao()
                 return True
         return False
     
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from database.consultas import CONSULTAS
+
+class GravadorLog:
+    """Grava o log de atividades em segundo plano, em lotes
+
+    As entradas ficam numa fila em memória e uma thread própria, com conexão
+    própria ao banco, grava tudo numa única transação a cada intervalo_ms ou
+    quando a fila atinge tamanho_lote entradas.
+    """
+
+    # Políticas quando a fila está cheia
+    DESCARTAR_ANTIGAS = "descartar_antigas"  # Remove a entrada mais antiga da fila
+    DESCARTAR_NOVAS = "descartar_novas"      # Ignora a nova entrada
+    BLOQUEAR = "bloquear"                    # Espera haver espaço na fila
+
+    # Resultados de registrar
+    ENFILEIRADA = "enfileirada"  # Será gravada pela thread
+    DESCARTADA = "descartada"    # Perdida pela política da fila cheia (conta em descartadas)
+    INATIVO = "inativo"          # Gravador parado ou parando: quem chamou grava por conta própria
+
+    def __init__(self, db_path: str, intervalo_ms: int = 500, tamanho_lote: int = 100,
+                 capacidade: int = 10000, politica: str = DESCARTAR_ANTIGAS):
+        self.db_path = db_path
+        self.intervalo = intervalo_ms / 1000.0
+        self.tamanho_lote = tamanho_lote
+        self.capacidade = capacidade
+        self.politica = politica
+
+        self.descartadas = 0  # Entradas perdidas por estouro da fila ou erro de gravação
+
+        self._fila = deque()
+        self._em_gravacao = 0
+        self._flush_pendente = False
+        self._parando = False
+        self._condicao = threading.Condition()
+        self._thread = None
+
+    def iniciar(self) -> None:
+        """Inicia a thread de gravação"""
+        if self._thread is not None:
+            return
+        self._parando = False
+        self._thread = threading.Thread(target=self._executar, name="GravadorLog", daemon=True)
+        self._thread.start()
+        atexit.register(self.parar)
+
+    def registrar(self, usuario_id: int, tipo_acao: str, descricao: str,
+                  entidade: str = None, entidade_id: int = None) -> str:
+        """Enfileira uma atividade para gravação (não acessa o banco)
+
+        Retorna ENFILEIRADA, DESCARTADA ou INATIVO.
+        """
+        # Mesmo formato do CURRENT_TIMESTAMP do SQLite (UTC)
+        data_hora = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        entrada = (usuario_id, tipo_acao, descricao, data_hora, entidade, entidade_id)
+
+        with self._condicao:
+            if self._parando or self._thread is None:
+                return GravadorLog.INATIVO
+
+            if len(self._fila) >= self.capacidade:
+                if self.politica == GravadorLog.DESCARTAR_NOVAS:
+                    self.descartadas += 1
+                    return GravadorLog.DESCARTADA
+                elif self.politica == GravadorLog.BLOQUEAR:
+                    self._flush_pendente = True
+                    self._condicao.notify_all()
+                    self._condicao.wait_for(
+                        lambda: len(self._fila) < self.capacidade or self._parando
+                    )
+                    if self._parando:
+                        # A thread está encerrando: a entrada não foi perdida, só não entra mais na fila
+                        return GravadorLog.INATIVO
+                else:
+                    self._fila.popleft()
+                    self.descartadas += 1
+
+            self._fila.append(entrada)
+            if len(self._fila) >= self.tamanho_lote:
+                self._condicao.notify_all()
+        return GravadorLog.ENFILEIRADA
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera até que todas as entradas enfileiradas sejam gravadas"""
+        with self._condicao:
+            if self._thread is None:
+                return not self._fila
+            self._flush_pendente = True
+            self._condicao.notify_all()
+            gravado = self._condicao.wait_for(
+                lambda: not self._fila and self._em_gravacao == 0, timeout
+            )
+            self._flush_pendente = False
+            return gravado
+
+    def parar(self, timeout: float = 5.0) -> None:
+        """Grava as entradas pendentes e encerra a thread"""
+        with self._condicao:
+            if self._thread is None:
+                return
+            self._parando = True
+            self._condicao.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _proximo_lote(self):
+        """Espera pelo próximo lote a gravar (None quando a thread deve encerrar)"""
+        with self._condicao:
+            while not self._fila:
+                if self._parando:
+                    return None
+                self._condicao.wait()
+
+            # Acumula entradas até completar o lote ou vencer o intervalo
+            limite = time.monotonic() + self.intervalo
+            while (len(self._fila) < self.tamanho_lote and not self._flush_pendente
+                   and not self._parando):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicao.wait(restante)
+
+            lote = list(self._fila)
+            self._fila.clear()
+            self._em_gravacao = len(lote)
+            self._condicao.notify_all()
+            return lote
+
+    def _executar(self) -> None:
+        """Laço da thread de gravação"""
+        try:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+        except sqlite3.Error as e:
+            print(f"Erro ao conectar o gravador de log: {e}")
+            return
+
+        try:
+            while True:
+                lote = self._proximo_lote()
+                if lote is None:
+                    break
+                try:
+                    with connection:
+                        connection.executemany(CONSULTAS['log_atividades.inserir_com_data'], lote)
+                except sqlite3.Error as e:
+                    print(f"Erro ao gravar log de atividades: {e}")
+                    with self._condicao:
+                        self.descartadas += len(lote)
+                finally:
+                    with self._condicao:
+                        self._em_gravacao = 0
+                        self._condicao.notify_all()
+        finally:
+            connection.close()
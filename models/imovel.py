@@ -1,12 +1,104 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
+import re
 import sqlite3
 
+_PARTES_NUMERICAS = re.compile(r'(\d+)')
+
+def chave_natural(texto: str) -> str:
+    """Chave de ordenação natural para números de imóveis e unidades
+    
+    Os trechos numéricos são completados com zeros à esquerda, de modo que a
+    ordem do texto da chave ("apto 0000000011" < "apto 0000000100") é a ordem
+    natural e pode vir direto de um índice.
+    """
+    partes = _PARTES_NUMERICAS.split((texto or "").strip().casefold())
+    return "".join(parte.zfill(10) if parte.isdigit() else parte for parte in partes)
+
+class FaixaUnidades:
+    """Faixa de unidades de um prédio/vila guardada de forma compacta
+    
+    Sem andares, as unidades são numeradas em sequência ("Apto 01" a "Apto 12");
+    com andares, cada andar tem as mesmas unidades ("Apto 101" a "Apto 804").
+    Um bloco opcional prefixa o número ("Bloco A - Apto 101"). As unidades só
+    ganham uma linha em `unidades` quando recebem atendimento ou observação.
+    """
+    
+    MAX_UNIDADES_POR_ANDAR = 99  # O número da unidade no andar ocupa dois dígitos
+    
+    def __init__(self, id: int = None, imovel_id: int = None, prefixo: str = "Apto",
+                 bloco: str = None, andar_inicio: int = None, andar_fim: int = None,
+                 unidade_inicio: int = 1, unidade_fim: int = 0):
+        self.id = id
+        self.imovel_id = imovel_id
+        self.prefixo = prefixo
+        self.bloco = bloco
+        self.andar_inicio = andar_inicio  # None para numeração sequencial
+        self.andar_fim = andar_fim
+        self.unidade_inicio = unidade_inicio
+        self.unidade_fim = unidade_fim
+    
+    @staticmethod
+    def from_db_row(row: sqlite3.Row) -> 'FaixaUnidades':
+        """Cria um objeto FaixaUnidades a partir de uma linha do banco de dados"""
+        return FaixaUnidades(
+            id=row['id'],
+            imovel_id=row['imovel_id'],
+            prefixo=row['prefixo'],
+            bloco=row['bloco'],
+            andar_inicio=row['andar_inicio'],
+            andar_fim=row['andar_fim'],
+            unidade_inicio=row['unidade_inicio'],
+            unidade_fim=row['unidade_fim']
+        )
+    
+    @property
+    def andares(self) -> int:
+        """Quantidade de andares (0 para numeração sequencial)"""
+        if self.andar_inicio is None:
+            return 0
+        return max(0, self.andar_fim - self.andar_inicio + 1)
+    
+    def __len__(self) -> int:
+        return max(0, self.unidade_fim - self.unidade_inicio + 1) * max(1, self.andares)
+    
+    def _rotulo(self, numero: str) -> str:
+        """Monta o rótulo completo da unidade"""
+        rotulo = f"{self.prefixo} {numero}"
+        return f"Bloco {self.bloco} - {rotulo}" if self.bloco else rotulo
+    
+    def numeros(self) -> Iterator[str]:
+        """Percorre os números das unidades da faixa, em ordem"""
+        if self.andar_inicio is None:
+            for unidade in range(self.unidade_inicio, self.unidade_fim + 1):
+                yield self._rotulo(f"{unidade:02d}")
+        else:
+            for andar in range(self.andar_inicio, self.andar_fim + 1):
+                for unidade in range(self.unidade_inicio, self.unidade_fim + 1):
+                    yield self._rotulo(f"{andar}{unidade:02d}")
+    
+    def contem(self, numero: str) -> bool:
+        """Indica se o número pertence à faixa (sem percorrê-la)"""
+        inicio = self._rotulo("")
+        if not numero.startswith(inicio) or not numero[len(inicio):].isdigit():
+            return False
+        valor = int(numero[len(inicio):])
+        if self.andar_inicio is None:
+            return (self.unidade_inicio <= valor <= self.unidade_fim
+                    and numero == self._rotulo(f"{valor:02d}"))
+        andar, unidade = divmod(valor, 100)
+        return (self.andar_inicio <= andar <= self.andar_fim
+                and self.unidade_inicio <= unidade <= self.unidade_fim
+                and numero == self._rotulo(f"{andar}{unidade:02d}"))
+
 class Imovel:
     """Modelo para representar um imóvel"""
     
+    # Tipos que têm unidades (as telas antigas gravam 'prédio' com acento)
+    TIPOS_COM_UNIDADES = ('predio', 'prédio', 'vila')
+    
     def __init__(self, id: int = None, rua_id: int = None, 
                  numero: str = "", tipo: str = "", nome: str = None,
                  total_unidades: int = None, tipo_portaria: str = None,
@@ -21,6 +113,10 @@ class Imovel:
         self.tipo_acesso = tipo_acesso
         self.observacoes = observacoes
         self.unidades = []
+        
+        # Organização das unidades usada ao salvar um prédio/vila novo
+        self.andares = 0
+        self.blocos = 1
     
     @staticmethod
     def from_db_row(row: sqlite3.Row) -> 'Imovel':
@@ -40,10 +136,7 @@ class Imovel:
     @staticmethod
     def get_by_id(db_manager, imovel_id: int) -> Optional['Imovel']:
         """Obtém um imóvel pelo ID"""
-        cursor = db_manager.execute(
-            "SELECT * FROM imoveis WHERE id = ?", 
-            (imovel_id,)
-        )
+        cursor = db_manager.executar_consulta('imoveis.por_id', (imovel_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
@@ -53,10 +146,7 @@ class Imovel:
     @staticmethod
     def get_by_rua(db_manager, rua_id: int) -> List['Imovel']:
         """Obtém todos os imóveis de uma rua"""
-        cursor = db_manager.execute(
-            "SELECT * FROM imoveis WHERE rua_id = ? ORDER BY numero",
-            (rua_id,)
-        )
+        cursor = db_manager.executar_consulta('imoveis.por_rua', (rua_id,))
         if cursor:
             return [Imovel.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -64,10 +154,7 @@ class Imovel:
     @staticmethod
     def get_by_tipo(db_manager, tipo: str) -> List['Imovel']:
         """Obtém todos os imóveis de um determinado tipo"""
-        cursor = db_manager.execute(
-            "SELECT * FROM imoveis WHERE tipo = ? ORDER BY numero",
-            (tipo,)
-        )
+        cursor = db_manager.executar_consulta('imoveis.por_tipo', (tipo,))
         if cursor:
             return [Imovel.from_db_row(row) for row in cursor.fetchall()]
         return []
@@ -75,14 +162,7 @@ class Imovel:
     @staticmethod
     def get_predios_vilas(db_manager) -> List['Imovel']:
         """Obtém todos os prédios e vilas"""
-        cursor = db_manager.execute(
-            "SELECT i.*, r.nome as rua_nome, t.nome as territorio_nome "
-            "FROM imoveis i "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "JOIN territorios t ON r.territorio_id = t.id "
-            "WHERE i.tipo IN ('predio', 'vila') "
-            "ORDER BY t.nome, r.nome, i.numero"
-        )
+        cursor = db_manager.executar_consulta('imoveis.predios_vilas')
         if cursor:
             result = []
             for row in cursor.fetchall():
@@ -98,85 +178,226 @@ class Imovel:
         """Salva o imóvel no banco de dados"""
         if self.id is None:
             # Inserir novo imóvel
-            cursor = db_manager.execute(
-                "INSERT INTO imoveis (rua_id, numero, tipo, nome, total_unidades, "
-                "tipo_portaria, tipo_acesso, observacoes) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (self.rua_id, self.numero, self.tipo, self.nome, self.total_unidades,
-                 self.tipo_portaria, self.tipo_acesso, self.observacoes)
+            cursor = db_manager.executar_consulta(
+                'imoveis.inserir',
+                (self.rua_id, self.numero, chave_natural(self.numero), self.tipo, self.nome,
+                 self.total_unidades, self.tipo_portaria, self.tipo_acesso, self.observacoes)
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
                 
-                # Se for prédio ou vila, criar unidades automaticamente
-                if self.tipo in ('predio', 'vila') and self.total_unidades and self.total_unidades > 0:
+                # Se for prédio ou vila, registrar as faixas de unidades
+                if self.tipo in self.TIPOS_COM_UNIDADES and self.total_unidades and self.total_unidades > 0:
                     self._criar_unidades(db_manager)
                 
                 return True
         else:
             # Atualizar imóvel existente
-            cursor = db_manager.execute(
-                "UPDATE imoveis SET rua_id = ?, numero = ?, tipo = ?, nome = ?, "
-                "total_unidades = ?, tipo_portaria = ?, tipo_acesso = ?, observacoes = ? "
-                "WHERE id = ?",
-                (self.rua_id, self.numero, self.tipo, self.nome, self.total_unidades,
-                 self.tipo_portaria, self.tipo_acesso, self.observacoes, self.id)
+            cursor = db_manager.executar_consulta(
+                'imoveis.atualizar',
+                (self.rua_id, self.numero, chave_natural(self.numero), self.tipo, self.nome,
+                 self.total_unidades, self.tipo_portaria, self.tipo_acesso, self.observacoes, self.id)
             )
             if cursor:
                 db_manager.commit()
                 return True
         return False
     
+    @staticmethod
+    def montar_faixas(tipo: str, total: int, andares: int = 0, blocos: int = 1) -> Optional[List[FaixaUnidades]]:
+        """Divide o total de unidades em faixas por bloco (e por andar, se informado)
+        
+        Retorna None se o total não se dividir igualmente entre blocos e andares.
+        """
+        blocos = max(1, blocos or 1)
+        andares = max(0, andares or 0)
+        if not total or total <= 0 or total % blocos:
+            return None
+        por_bloco = total // blocos
+        if andares and (por_bloco % andares or por_bloco // andares > FaixaUnidades.MAX_UNIDADES_POR_ANDAR):
+            return None
+        
+        prefixo = "Casa" if tipo == 'vila' else "Apto"
+        faixas = []
+        for indice in range(blocos):
+            bloco = chr(ord('A') + indice) if blocos > 1 else None
+            if andares:
+                faixas.append(FaixaUnidades(prefixo=prefixo, bloco=bloco, andar_inicio=1, andar_fim=andares,
+                                            unidade_inicio=1, unidade_fim=por_bloco // andares))
+            else:
+                faixas.append(FaixaUnidades(prefixo=prefixo, bloco=bloco, unidade_inicio=1, unidade_fim=por_bloco))
+        return faixas
+    
     def _criar_unidades(self, db_manager) -> bool:
-        """Cria as unidades para um prédio ou vila"""
-        unidades = []
-        if self.tipo == 'predio':
-            # Para prédios, criar apartamentos numerados
-            for i in range(1, self.total_unidades + 1):
-                unidades.append((self.id, f"Apto {i:02d}", None))
-        else:  # vila
-            # Para vilas, criar casas numeradas
-            for i in range(1, self.total_unidades + 1):
-                unidades.append((self.id, f"Casa {i:02d}", None))
+        """Registra as faixas de unidades de um prédio ou vila recém-cadastrado"""
+        faixas = (Imovel.montar_faixas(self.tipo, self.total_unidades, self.andares, self.blocos)
+                  or Imovel.montar_faixas(self.tipo, self.total_unidades))
+        return self.definir_faixas(db_manager, faixas)
+    
+    def get_faixas(self, db_manager) -> List[FaixaUnidades]:
+        """Obtém as faixas de unidades do prédio/vila"""
+        if self.id is None:
+            return []
+        cursor = db_manager.executar_consulta('faixas_unidades.por_imovel', (self.id,))
+        if cursor:
+            return [FaixaUnidades.from_db_row(row) for row in cursor.fetchall()]
+        return []
+    
+    def definir_faixas(self, db_manager, faixas: List[FaixaUnidades]) -> bool:
+        """Substitui as faixas de unidades do prédio/vila
         
-        if unidades:
-            db_manager.executemany(
-                "INSERT INTO unidades (imovel_id, numero, observacoes) VALUES (?, ?, ?)",
-                unidades
-            )
+        Unidades gravadas sem atendimento nem observação são excluídas; as demais
+        são ligadas à faixa que as cobre, ou ficam avulsas se saíram das faixas.
+        Tudo vai numa só transação: se um comando falhar, nada é gravado.
+        """
+        if self.id is None:
+            return False
+        
+        def executar(nome, params):
+            # executar_consulta devolve None em caso de erro, em vez de levantar
+            cursor = db_manager.executar_consulta(nome, params)
+            if cursor is None:
+                raise sqlite3.Error(f"falha em {nome}")
+            return cursor
+        
+        total_anterior = self.total_unidades
+        try:
+            executar('faixas_unidades.excluir_do_imovel', (self.id,))
+            for faixa in faixas or []:
+                faixa.imovel_id = self.id
+                cursor = executar(
+                    'faixas_unidades.inserir',
+                    (self.id, faixa.prefixo, faixa.bloco, faixa.andar_inicio, faixa.andar_fim,
+                     faixa.unidade_inicio, faixa.unidade_fim)
+                )
+                faixa.id = cursor.lastrowid
+            
+            for row in executar('unidades.do_imovel_com_uso', (self.id,)).fetchall():
+                # Sem atendimento nem observação a unidade volta a ser só parte da faixa
+                if not row['atendida'] and not row['observacoes']:
+                    executar('unidades.excluir', (row['id'],))
+                else:
+                    faixa = next((f for f in faixas or [] if f.contem(row['numero'])), None)
+                    executar('unidades.definir_faixa', (faixa.id if faixa else None, row['id']))
+            
+            self.total_unidades = sum(len(f) for f in faixas or []) or None
+            executar('imoveis.definir_total_unidades', (self.total_unidades, self.id))
             db_manager.commit()
             return True
-        return False
+        except sqlite3.Error as e:
+            print(f"Erro ao definir unidades: {e}")
+            db_manager.rollback()
+            self.total_unidades = total_anterior
+            return False
+    
+    def redimensionar_unidades(self, db_manager, total: int) -> bool:
+        """Ajusta as faixas a um novo total, mantendo blocos e andares quando possível"""
+        faixas = self.get_faixas(db_manager)
+        blocos = len({f.bloco for f in faixas}) or 1
+        andares = faixas[0].andares if faixas else 0
+        novas = (Imovel.montar_faixas(self.tipo, total, andares, blocos)
+                 or Imovel.montar_faixas(self.tipo, total))
+        return self.definir_faixas(db_manager, novas or [])
+    
+    @staticmethod
+    def compactar_unidades(db_manager) -> int:
+        """Converte as unidades gravadas uma a uma (formato antigo) em faixas
+        
+        Vale para prédios/vilas com total de unidades e sem faixas. Retorna a
+        quantidade de imóveis convertidos.
+        """
+        cursor = db_manager.executar_consulta('imoveis.predios_vilas_sem_faixas')
+        if not cursor:
+            return 0
+        convertidos = 0
+        for row in cursor.fetchall():
+            imovel = Imovel.from_db_row(row)
+            if imovel.definir_faixas(db_manager, Imovel.montar_faixas(imovel.tipo, imovel.total_unidades)):
+                convertidos += 1
+        return convertidos
     
     def delete(self, db_manager) -> bool:
         """Deleta o imóvel do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM imoveis WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('imoveis.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
                 return True
         return False
     
     def get_unidades(self, db_manager) -> List[Dict[str, Any]]:
-        """Obtém todas as unidades do imóvel"""
+        """Obtém todas as unidades do imóvel, das faixas e das gravadas
+        
+        Unidades ainda não gravadas vêm com id None (ver materializar_unidade).
+        """
+        if self.id is None:
+            return []
+        cursor = db_manager.executar_consulta('unidades.por_imovel', (self.id,))
+        if not cursor:
+            return []
+        gravadas = {}
+        avulsas = []
+        for row in cursor.fetchall():
+            unidade = dict(row)
+            if unidade.get('faixa_id') is None:
+                avulsas.append(unidade)
+            else:
+                gravadas[unidade['numero']] = unidade
+        
+        unidades = []
+        for faixa in self.get_faixas(db_manager):
+            for numero in faixa.numeros():
+                unidade = gravadas.pop(numero, None)
+                if unidade is None:
+                    unidade = {'id': None, 'imovel_id': self.id, 'numero': numero,
+                               'observacoes': None, 'faixa_id': faixa.id}
+                unidades.append(unidade)
+        # Gravadas cuja faixa mudou sem religação continuam visíveis
+        return unidades + list(gravadas.values()) + avulsas
+    
+    def contar_unidades(self, db_manager) -> int:
+        """Conta as unidades do imóvel sem expandir as faixas"""
+        if self.id is None:
+            return 0
+        cursor = db_manager.executar_consulta('unidades.total_do_imovel', (self.id,))
+        row = cursor.fetchone() if cursor else None
+        return row['total'] if row else 0
+    
+    def get_cobertura(self, db_manager) -> Dict[str, int]:
+        """Unidades com atendimento e total de unidades do prédio/vila"""
+        visitadas = 0
         if self.id is not None:
-            cursor = db_manager.execute(
-                "SELECT * FROM unidades WHERE imovel_id = ? ORDER BY numero",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('unidades.total_visitadas', (self.id,))
             if cursor:
-                return [dict(row) for row in cursor.fetchall()]
-        return []
+                visitadas = cursor.fetchone()[0]
+        return {'visitadas': visitadas, 'total': self.contar_unidades(db_manager)}
+    
+    def materializar_unidade(self, db_manager, numero: str) -> Optional[Dict[str, Any]]:
+        """Grava (se ainda não existir) a unidade de uma faixa, para receber atendimento ou observação"""
+        if self.id is None:
+            return None
+        cursor = db_manager.executar_consulta('unidades.por_numero', (self.id, numero))
+        row = cursor.fetchone() if cursor else None
+        if row:
+            return dict(row)
+        
+        faixa = next((f for f in self.get_faixas(db_manager) if f.contem(numero)), None)
+        cursor = db_manager.executar_consulta(
+            'unidades.inserir',
+            (self.id, numero, chave_natural(numero), faixa.id if faixa else None)
+        )
+        if cursor:
+            db_manager.commit()
+            return {'id': cursor.lastrowid, 'imovel_id': self.id, 'numero': numero,
+                    'observacoes': None, 'faixa_id': faixa.id if faixa else None}
+        return None
     
     def adicionar_historico(self, db_manager, data: str, descricao: str) -> bool:
         """Adiciona um registro ao histórico do prédio/vila"""
         if self.id is not None and self.tipo in ('predio', 'vila'):
-            cursor = db_manager.execute(
-                "INSERT INTO historico_predios_vilas (imovel_id, data, descricao) VALUES (?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'historico_predios_vilas.inserir',
                 (self.id, data, descricao)
             )
             if cursor:
@@ -187,10 +408,7 @@ class Imovel:
     def get_historico(self, db_manager) -> List[Dict[str, Any]]:
         """Obtém o histórico do prédio/vila"""
         if self.id is not None and self.tipo in ('predio', 'vila'):
-            cursor = db_manager.execute(
-                "SELECT * FROM historico_predios_vilas WHERE imovel_id = ? ORDER BY data DESC",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('historico_predios_vilas.por_imovel', (self.id,))
             if cursor:
                 return [dict(row) for row in cursor.fetchall()]
         return []
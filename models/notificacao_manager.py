@@ -19,21 +19,11 @@ class NotificacaoManager:
         limite_str = limite.strftime('%Y-%m-%d')
         
         # Buscar designações próximas do vencimento
-        cursor = db_manager.execute(
-            "SELECT d.*, t.nome as territorio_nome FROM designacoes d "
-            "JOIN territorios t ON d.territorio_id = t.id "
-            "WHERE d.status = 'ativo' AND d.data_devolucao BETWEEN ? AND ? "
-            "ORDER BY d.data_devolucao",
-            (hoje_str, limite_str)
-        )
+        cursor = db_manager.executar_consulta('designacoes.vencendo_no_periodo', (hoje_str, limite_str))
         
         if cursor:
             designacoes = cursor.fetchall()
             
-            # Buscar usuários gestores e administradores
-            usuarios = [u for u in Usuario.get_ativos(db_manager) 
-                       if u.nivel_permissao >= Usuario.NIVEL_GESTOR]
-            
             # Gerar notificações para cada designação
             for designacao in designacoes:
                 dias_restantes = (datetime.strptime(designacao['data_devolucao'], '%Y-%m-%d').date() - hoje).days
@@ -42,28 +32,19 @@ class NotificacaoManager:
                 mensagem = (f"A designação do território '{designacao['territorio_nome']}' "
                           f"vence em {dias_restantes} dias ({designacao['data_devolucao']}).")
                 
-                # Notificar todos os gestores e administradores
-                for usuario in usuarios:
-                    # Verificar se já existe notificação similar não lida
-                    cursor = db_manager.execute(
-                        "SELECT id FROM notificacoes "
-                        "WHERE usuario_id = ? AND entidade = 'designacao' AND entidade_id = ? "
-                        "AND status = ? AND tipo = ?",
-                        (usuario.id, designacao['id'], Notificacao.STATUS_NAO_LIDA, Notificacao.TIPO_ALERTA)
-                    )
-                    
-                    if cursor and not cursor.fetchone():
-                        # Criar notificação
-                        Notificacao.criar(
-                            db_manager,
-                            usuario.id,
-                            Notificacao.TIPO_ALERTA,
-                            titulo,
-                            mensagem,
-                            None,  # link
-                            "designacao",
-                            designacao['id']
-                        )
+                # Notificar todos os gestores e administradores que ainda
+                # não têm notificação similar não lida
+                Notificacao.criar_para_todos(
+                    db_manager,
+                    Notificacao.TIPO_ALERTA,
+                    titulo,
+                    mensagem,
+                    None,  # link
+                    "designacao",
+                    designacao['id'],
+                    nivel_minimo=Usuario.NIVEL_GESTOR,
+                    evitar_repetidas=True
+                )
     
     @staticmethod
     def verificar_predios_vilas_proximos_vencimento(db_manager):
@@ -76,22 +57,14 @@ class NotificacaoManager:
         limite_str = limite.strftime('%Y-%m-%d')
         
         # Buscar designações próximas do vencimento
-        cursor = db_manager.execute(
-            "SELECT d.*, i.nome as imovel_nome, i.numero, i.tipo "
-            "FROM designacoes_predios_vilas d "
-            "JOIN imoveis i ON d.imovel_id = i.id "
-            "WHERE d.status = 'ativo' AND d.data_devolucao BETWEEN ? AND ? "
-            "ORDER BY d.data_devolucao",
+        cursor = db_manager.executar_consulta(
+            'designacoes_predios_vilas.vencendo_no_periodo',
             (hoje_str, limite_str)
         )
         
         if cursor:
             designacoes = cursor.fetchall()
             
-            # Buscar usuários gestores e administradores
-            usuarios = [u for u in Usuario.get_ativos(db_manager) 
-                       if u.nivel_permissao >= Usuario.NIVEL_GESTOR]
-            
             # Gerar notificações para cada designação
             for designacao in designacoes:
                 dias_restantes = (datetime.strptime(designacao['data_devolucao'], '%Y-%m-%d').date() - hoje).days
@@ -103,28 +76,19 @@ class NotificacaoManager:
                 mensagem = (f"A designação do {tipo_imovel} '{nome_imovel}' "
                           f"vence em {dias_restantes} dias ({designacao['data_devolucao']}).")
                 
-                # Notificar todos os gestores e administradores
-                for usuario in usuarios:
-                    # Verificar se já existe notificação similar não lida
-                    cursor = db_manager.execute(
-                        "SELECT id FROM notificacoes "
-                        "WHERE usuario_id = ? AND entidade = 'designacao_predios_vilas' AND entidade_id = ? "
-                        "AND status = ? AND tipo = ?",
-                        (usuario.id, designacao['id'], Notificacao.STATUS_NAO_LIDA, Notificacao.TIPO_ALERTA)
-                    )
-                    
-                    if cursor and not cursor.fetchone():
-                        # Criar notificação
-                        Notificacao.criar(
-                            db_manager,
-                            usuario.id,
-                            Notificacao.TIPO_ALERTA,
-                            titulo,
-                            mensagem,
-                            None,  # link
-                            "designacao_predios_vilas",
-                            designacao['id']
-                        )
+                # Notificar todos os gestores e administradores que ainda
+                # não têm notificação similar não lida
+                Notificacao.criar_para_todos(
+                    db_manager,
+                    Notificacao.TIPO_ALERTA,
+                    titulo,
+                    mensagem,
+                    None,  # link
+                    "designacao_predios_vilas",
+                    designacao['id'],
+                    nivel_minimo=Usuario.NIVEL_GESTOR,
+                    evitar_repetidas=True
+                )
     
     @staticmethod
     def verificar_todas_notificacoes(db_manager):
@@ -3,14 +3,25 @@
 
 from typing import List, Optional, Dict, Any
 import sqlite3
-from datetime import datetime
+import calendar
+from datetime import datetime, date, timedelta
+
+# Nomes dos dias na ordem de date.weekday() (0 = segunda-feira)
+DIAS_SEMANA = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+               "Sexta-feira", "Sábado", "Domingo"]
+
+def _para_data(valor) -> date:
+    """Converte 'yyyy-MM-dd' (ou date) em date"""
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(valor, '%Y-%m-%d').date()
 
 class SaidaCampo:
     """Modelo para representar uma saída de campo"""
     
     def __init__(self, id: int = None, nome: str = "", data: str = "", 
                  dia_semana: str = "", horario: str = "", dirigente: str = None,
-                 data_criacao: str = None):
+                 data_criacao: str = None, regra_id: int = None):
         self.id = id
         self.nome = nome
         self.data = data
@@ -18,6 +29,7 @@ class SaidaCampo:
         self.horario = horario
         self.dirigente = dirigente
         self.data_criacao = data_criacao
+        self.regra_id = regra_id  # Regra de recorrência que gerou a saída (se houver)
     
     @staticmethod
     def from_db_row(row: sqlite3.Row) -> 'SaidaCampo':
@@ -29,76 +41,370 @@ class SaidaCampo:
             dia_semana=row['dia_semana'],
             horario=row['horario'],
             dirigente=row['dirigente'],
-            data_criacao=row['data_criacao']
+            data_criacao=row['data_criacao'],
+            regra_id=row['regra_id'] if 'regra_id' in row.keys() else None
         )
     
+    @property
+    def virtual(self) -> bool:
+        """Indica uma ocorrência de regra ainda não gravada em saidas_campo"""
+        return self.id is None and self.regra_id is not None
+    
     @staticmethod
     def get_all(db_manager) -> List['SaidaCampo']:
         """Obtém todas as saídas de campo do banco de dados"""
-        cursor = db_manager.execute("SELECT * FROM saidas_campo ORDER BY data DESC")
+        saidas = db_manager.cache.obter_lista(SaidaCampo, 'todas')
+        if saidas is not None:
+            return saidas
+        
+        cursor = db_manager.executar_consulta('saidas_campo.todas')
         if cursor:
-            return [SaidaCampo.from_db_row(row) for row in cursor.fetchall()]
+            saidas = [db_manager.cache.carregar(SaidaCampo, row, SaidaCampo.from_db_row)
+                      for row in cursor.fetchall()]
+            db_manager.cache.guardar_lista(SaidaCampo, 'todas', saidas)
+            return list(saidas)
         return []
     
     @staticmethod
-    def get_proximas(db_manager, limit: int = 5) -> List['SaidaCampo']:
-        """Obtém as próximas saídas de campo"""
-        hoje = datetime.now().strftime('%Y-%m-%d')
-        cursor = db_manager.execute(
-            "SELECT * FROM saidas_campo WHERE data >= ? ORDER BY data LIMIT ?",
-            (hoje, limit)
+    def get_ocorrencias(db_manager, inicio, fim) -> List['SaidaCampo']:
+        """Obtém as saídas de campo entre duas datas (inclusive)
+        
+        Junta as saídas gravadas com as ocorrências das regras de recorrência,
+        expandidas só para a janela pedida. As ocorrências ainda não gravadas
+        voltam com id None e regra_id preenchido (ver materializar).
+        """
+        inicio = _para_data(inicio)
+        fim = _para_data(fim)
+        if fim < inicio:
+            return []
+        
+        cursor = db_manager.executar_consulta(
+            'saidas_campo.no_periodo',
+            (inicio.isoformat(), fim.isoformat())
         )
-        if cursor:
-            return [SaidaCampo.from_db_row(row) for row in cursor.fetchall()]
-        return []
+        if not cursor:
+            return []
+        saidas = [db_manager.cache.carregar(SaidaCampo, row, SaidaCampo.from_db_row)
+                  for row in cursor.fetchall()]
+        
+        gravadas = {(s.regra_id, s.data) for s in saidas if s.regra_id is not None}
+        for regra in RegraSaidaCampo.get_na_janela(db_manager, inicio, fim):
+            for dia in regra.ocorrencias(inicio, fim):
+                if (regra.id, dia.isoformat()) not in gravadas:
+                    saidas.append(regra.criar_saida(dia))
+        
+        saidas.sort(key=lambda s: (s.data, s.horario))
+        return saidas
+    
+    @staticmethod
+    def get_proximas(db_manager, limit: int = 5, dias: int = 60) -> List['SaidaCampo']:
+        """Obtém as próximas saídas de campo (gravadas ou de regras)"""
+        hoje = datetime.now().date()
+        return SaidaCampo.get_ocorrencias(db_manager, hoje, hoje + timedelta(days=dias))[:limit]
     
     @staticmethod
     def get_by_id(db_manager, saida_id: int) -> Optional['SaidaCampo']:
         """Obtém uma saída de campo pelo ID"""
-        cursor = db_manager.execute(
-            "SELECT * FROM saidas_campo WHERE id = ?", 
-            (saida_id,)
-        )
+        saida = db_manager.cache.obter(SaidaCampo, saida_id)
+        if saida is not None:
+            return saida
+        
+        cursor = db_manager.executar_consulta('saidas_campo.por_id', (saida_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
-                return SaidaCampo.from_db_row(row)
+                return db_manager.cache.carregar(SaidaCampo, row, SaidaCampo.from_db_row)
         return None
     
+    def materializar(self, db_manager) -> bool:
+        """Grava a ocorrência virtual de uma regra, preenchendo o id"""
+        if not self.virtual:
+            return self.id is not None
+        saida = RegraSaidaCampo.materializar(db_manager, self.regra_id, self.data)
+        if saida is None:
+            return False
+        self.id = saida.id
+        self.data_criacao = saida.data_criacao
+        return True
+    
     def save(self, db_manager) -> bool:
         """Salva a saída de campo no banco de dados"""
         if self.id is None:
             # Inserir nova saída de campo
-            cursor = db_manager.execute(
-                "INSERT INTO saidas_campo (nome, data, dia_semana, horario, dirigente) VALUES (?, ?, ?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'saidas_campo.inserir',
                 (self.nome, self.data, self.dia_semana, self.horario, self.dirigente)
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
+                db_manager.cache.salvo(self)
                 return True
         else:
             # Atualizar saída de campo existente
-            cursor = db_manager.execute(
-                "UPDATE saidas_campo SET nome = ?, data = ?, dia_semana = ?, horario = ?, dirigente = ? WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'saidas_campo.atualizar',
                 (self.nome, self.data, self.dia_semana, self.horario, self.dirigente, self.id)
             )
             if cursor:
                 db_manager.commit()
+                db_manager.cache.salvo(self)
                 return True
+            # O objeto em memória pode ter divergido do banco
+            db_manager.cache.descartar(SaidaCampo, self.id)
         return False
     
     def delete(self, db_manager) -> bool:
         """Deleta a saída de campo do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM saidas_campo WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('saidas_campo.excluir', (self.id,))
+            if cursor:
+                db_manager.commit()
+                db_manager.cache.removido(self)
+                return True
+        return False
+    
+    def __str__(self) -> str:
+        return f"{self.nome} - {self.data}"
+
+
+class RegraSaidaCampo:
+    """Modelo para uma regra de saídas de campo recorrentes
+    
+    Uma regra semanal repete no dia da semana a cada `intervalo` semanas a partir
+    de data_inicio; uma regra mensal repete na semana_do_mes-ésima ocorrência do
+    dia da semana (-1 = última). Datas canceladas ficam em excecoes_regra_saida.
+    Só as ocorrências que recebem designações são gravadas em saidas_campo.
+    """
+    
+    FREQUENCIA_SEMANAL = "semanal"
+    FREQUENCIA_MENSAL = "mensal"
+    
+    def __init__(self, id: int = None, nome: str = "", frequencia: str = FREQUENCIA_SEMANAL,
+                 dia_semana: int = 0, semana_do_mes: int = None, intervalo: int = 1,
+                 horario: str = "", dirigente: str = None, data_inicio: str = "",
+                 data_fim: str = None, ativa: bool = True, data_criacao: str = None):
+        self.id = id
+        self.nome = nome
+        self.frequencia = frequencia
+        self.dia_semana = dia_semana  # 0 = segunda-feira, como date.weekday()
+        self.semana_do_mes = semana_do_mes  # 1 a 5, ou -1 para a última (regras mensais)
+        self.intervalo = intervalo  # A cada quantas semanas (regras semanais)
+        self.horario = horario
+        self.dirigente = dirigente
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.ativa = ativa
+        self.data_criacao = data_criacao
+        self.excecoes = set()  # Datas canceladas ('yyyy-MM-dd')
+    
+    @staticmethod
+    def from_db_row(row: sqlite3.Row) -> 'RegraSaidaCampo':
+        """Cria um objeto RegraSaidaCampo a partir de uma linha do banco de dados"""
+        return RegraSaidaCampo(
+            id=row['id'],
+            nome=row['nome'],
+            frequencia=row['frequencia'],
+            dia_semana=row['dia_semana'],
+            semana_do_mes=row['semana_do_mes'],
+            intervalo=row['intervalo'] or 1,
+            horario=row['horario'],
+            dirigente=row['dirigente'],
+            data_inicio=row['data_inicio'],
+            data_fim=row['data_fim'],
+            ativa=bool(row['ativa']),
+            data_criacao=row['data_criacao']
+        )
+    
+    @property
+    def descricao(self) -> str:
+        """Descrição legível da recorrência"""
+        dia = DIAS_SEMANA[self.dia_semana]
+        if self.frequencia == self.FREQUENCIA_MENSAL:
+            ordem = "Última" if self.semana_do_mes == -1 else f"{self.semana_do_mes}ª"
+            return f"{ordem} {dia.lower()} do mês"
+        if self.intervalo and self.intervalo > 1:
+            return f"{dia}, a cada {self.intervalo} semanas"
+        return f"Toda {dia.lower()}" if self.dia_semana < 5 else f"Todo {dia.lower()}"
+    
+    def ocorrencias(self, inicio, fim) -> List[date]:
+        """Datas da regra entre inicio e fim (inclusive), sem as exceções"""
+        inicio = max(_para_data(inicio), _para_data(self.data_inicio))
+        fim = _para_data(fim)
+        if self.data_fim:
+            fim = min(fim, _para_data(self.data_fim))
+        if fim < inicio:
+            return []
+        
+        if self.frequencia == self.FREQUENCIA_MENSAL:
+            datas = self._ocorrencias_mensais(inicio, fim)
+        else:
+            datas = self._ocorrencias_semanais(inicio, fim)
+        return [d for d in datas if d.isoformat() not in self.excecoes]
+    
+    def _ocorrencias_semanais(self, inicio: date, fim: date) -> List[date]:
+        """Expande a regra semanal na janela"""
+        passo = max(1, self.intervalo or 1) * 7
+        # Primeira ocorrência da regra, ancorada em data_inicio
+        primeira = _para_data(self.data_inicio)
+        primeira += timedelta(days=(self.dia_semana - primeira.weekday()) % 7)
+        atual = primeira
+        if inicio > primeira:
+            atual += timedelta(days=-(-(inicio - primeira).days // passo) * passo)
+        
+        datas = []
+        while atual <= fim:
+            datas.append(atual)
+            atual += timedelta(days=passo)
+        return datas
+    
+    def _ocorrencias_mensais(self, inicio: date, fim: date) -> List[date]:
+        """Expande a regra mensal na janela, um mês por vez"""
+        datas = []
+        ano, mes = inicio.year, inicio.month
+        while (ano, mes) <= (fim.year, fim.month):
+            dia = self._dia_no_mes(ano, mes)
+            if dia is not None and inicio <= dia <= fim:
+                datas.append(dia)
+            ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        return datas
+    
+    def _dia_no_mes(self, ano: int, mes: int) -> Optional[date]:
+        """Dia do mês em que cai a ocorrência (None se o mês não tiver essa semana)"""
+        ultimo = calendar.monthrange(ano, mes)[1]
+        if self.semana_do_mes == -1:
+            dia = date(ano, mes, ultimo)
+            return dia - timedelta(days=(dia.weekday() - self.dia_semana) % 7)
+        primeiro = date(ano, mes, 1)
+        dia = primeiro + timedelta(days=(self.dia_semana - primeiro.weekday()) % 7)
+        dia += timedelta(weeks=(self.semana_do_mes or 1) - 1)
+        return dia if dia.month == mes else None
+    
+    def criar_saida(self, dia) -> SaidaCampo:
+        """Cria a saída de campo (ainda não gravada) de uma ocorrência"""
+        dia = _para_data(dia)
+        return SaidaCampo(
+            nome=self.nome,
+            data=dia.isoformat(),
+            dia_semana=DIAS_SEMANA[dia.weekday()],
+            horario=self.horario,
+            dirigente=self.dirigente,
+            regra_id=self.id
+        )
+    
+    @staticmethod
+    def _carregar_excecoes(db_manager, regras: dict, inicio: str = None, fim: str = None) -> None:
+        """Preenche as datas canceladas das regras (id -> regra), numa só consulta"""
+        if not regras:
+            return
+        if inicio is not None:
+            cursor = db_manager.executar_consulta('excecoes_regra_saida.no_periodo', (inicio, fim))
+        elif len(regras) == 1:
+            cursor = db_manager.executar_consulta('excecoes_regra_saida.por_regra', (next(iter(regras)),))
+        else:
+            cursor = db_manager.executar_consulta('excecoes_regra_saida.todas')
+        if cursor:
+            for row in cursor.fetchall():
+                regra = regras.get(row['regra_id'])
+                if regra:
+                    regra.excecoes.add(row['data'])
+    
+    @staticmethod
+    def get_all(db_manager) -> List['RegraSaidaCampo']:
+        """Obtém todas as regras de recorrência, já com as exceções"""
+        cursor = db_manager.executar_consulta('regras_saida_campo.todas')
+        if not cursor:
+            return []
+        regras = [RegraSaidaCampo.from_db_row(row) for row in cursor.fetchall()]
+        RegraSaidaCampo._carregar_excecoes(db_manager, {regra.id: regra for regra in regras})
+        return regras
+    
+    @staticmethod
+    def get_by_id(db_manager, regra_id: int) -> Optional['RegraSaidaCampo']:
+        """Obtém uma regra pelo ID, já com as exceções"""
+        cursor = db_manager.executar_consulta('regras_saida_campo.por_id', (regra_id,))
+        if cursor:
+            row = cursor.fetchone()
+            if row:
+                regra = RegraSaidaCampo.from_db_row(row)
+                RegraSaidaCampo._carregar_excecoes(db_manager, {regra.id: regra})
+                return regra
+        return None
+    
+    @staticmethod
+    def get_na_janela(db_manager, inicio, fim) -> List['RegraSaidaCampo']:
+        """Obtém as regras ativas que podem ter ocorrências na janela, já com as exceções"""
+        inicio = _para_data(inicio).isoformat()
+        fim = _para_data(fim).isoformat()
+        cursor = db_manager.executar_consulta('regras_saida_campo.na_janela', (fim, inicio))
+        if not cursor:
+            return []
+        regras = {row['id']: RegraSaidaCampo.from_db_row(row) for row in cursor.fetchall()}
+        RegraSaidaCampo._carregar_excecoes(db_manager, regras, inicio, fim)
+        return list(regras.values())
+    
+    @staticmethod
+    def materializar(db_manager, regra_id: int, data) -> Optional[SaidaCampo]:
+        """Grava (se ainda não existir) a saída de campo de uma ocorrência da regra"""
+        regra = RegraSaidaCampo.get_by_id(db_manager, regra_id)
+        if regra is None:
+            return None
+        saida = regra.criar_saida(data)
+        
+        # O índice único (regra_id, data) faz o INSERT ser ignorado se a ocorrência já existir
+        cursor = db_manager.executar_consulta(
+            'saidas_campo.inserir_ocorrencia',
+            (saida.nome, saida.data, saida.dia_semana, saida.horario, saida.dirigente, regra.id)
+        )
+        if not cursor:
+            return None
+        cursor = db_manager.executar_consulta('saidas_campo.por_regra_e_data', (regra.id, saida.data))
+        row = cursor.fetchone() if cursor else None
+        if row is None:
+            return None
+        db_manager.commit()
+        db_manager.cache.invalidar_listas(SaidaCampo)
+        return db_manager.cache.carregar(SaidaCampo, row, SaidaCampo.from_db_row)
+    
+    def adicionar_excecao(self, db_manager, data) -> bool:
+        """Cancela a ocorrência da regra em uma data"""
+        data = _para_data(data).isoformat()
+        cursor = db_manager.executar_consulta('excecoes_regra_saida.inserir', (self.id, data))
+        if cursor:
+            db_manager.commit()
+            self.excecoes.add(data)
+            return True
+        return False
+    
+    def save(self, db_manager) -> bool:
+        """Salva a regra no banco de dados"""
+        valores = (self.nome, self.frequencia, self.dia_semana, self.semana_do_mes,
+                   self.intervalo, self.horario, self.dirigente, self.data_inicio,
+                   self.data_fim, 1 if self.ativa else 0)
+        if self.id is None:
+            cursor = db_manager.executar_consulta('regras_saida_campo.inserir', valores)
+            if cursor:
+                self.id = cursor.lastrowid
+                db_manager.commit()
+                return True
+        else:
+            cursor = db_manager.executar_consulta('regras_saida_campo.atualizar', valores + (self.id,))
+            if cursor:
+                db_manager.commit()
+                return True
+        return False
+    
+    def delete(self, db_manager) -> bool:
+        """Exclui a regra (as saídas já gravadas são mantidas, sem vínculo com a regra)"""
+        if self.id is not None:
+            cursor = db_manager.executar_consulta('regras_saida_campo.excluir', (self.id,))
             if cursor:
+                db_manager.executar_consulta('excecoes_regra_saida.excluir_da_regra', (self.id,))
+                db_manager.executar_consulta('saidas_campo.desvincular_regra', (self.id,))
                 db_manager.commit()
+                db_manager.cache.invalidar_listas(SaidaCampo)
                 return True
         return False
     
     def __str__(self) -> str:
-        return f"{self.nome} - {self.data}"
\ No newline at end of file
+        return f"{self.nome} - {self.descricao}"
@@ -3,10 +3,17 @@
 
 from typing import List, Optional, Dict, Any
 import sqlite3
+from datetime import datetime
 
 class Territorio:
     """Modelo para representar um território"""
     
+    # Pesos da pontuação das sugestões de designação
+    PESO_TEMPO = 0.6      # dias desde a última conclusão
+    PESO_COBERTURA = 0.3  # imóveis ainda não visitados
+    PESO_TAMANHO = 0.1    # quantidade de imóveis
+    DIAS_REFERENCIA = 180 # a partir daqui o tempo já conta como máximo
+    
     def __init__(self, id: int = None, nome: str = "", descricao: str = "", 
                  ultima_visita: str = None, data_criacao: str = None):
         self.id = id
@@ -14,7 +21,10 @@ class Territorio:
         self.descricao = descricao
         self.ultima_visita = ultima_visita
         self.data_criacao = data_criacao
+        
+        # Ruas carregadas do banco (preenchidas por get_ruas ou carregar_ruas)
         self.ruas = []
+        self.ruas_carregadas = False
     
     @staticmethod
     def from_db_row(row: sqlite3.Row) -> 'Territorio':
@@ -30,79 +40,193 @@ class Territorio:
     @staticmethod
     def get_all(db_manager) -> List['Territorio']:
         """Obtém todos os territórios do banco de dados"""
-        cursor = db_manager.execute("SELECT * FROM territorios ORDER BY nome")
+        territorios = db_manager.cache.obter_lista(Territorio, 'todos')
+        if territorios is not None:
+            return territorios
+        
+        cursor = db_manager.executar_consulta('territorios.todos')
         if cursor:
-            return [Territorio.from_db_row(row) for row in cursor.fetchall()]
+            territorios = [db_manager.cache.carregar(Territorio, row, Territorio.from_db_row)
+                           for row in cursor.fetchall()]
+            db_manager.cache.guardar_lista(Territorio, 'todos', territorios)
+            return list(territorios)
         return []
     
     @staticmethod
     def get_by_id(db_manager, territorio_id: int) -> Optional['Territorio']:
         """Obtém um território pelo ID"""
-        cursor = db_manager.execute(
-            "SELECT * FROM territorios WHERE id = ?", 
-            (territorio_id,)
-        )
+        territorio = db_manager.cache.obter(Territorio, territorio_id)
+        if territorio is not None:
+            return territorio
+        
+        cursor = db_manager.executar_consulta('territorios.por_id', (territorio_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
-                return Territorio.from_db_row(row)
+                return db_manager.cache.carregar(Territorio, row, Territorio.from_db_row)
         return None
     
     def save(self, db_manager) -> bool:
         """Salva o território no banco de dados"""
         if self.id is None:
             # Inserir novo território
-            cursor = db_manager.execute(
-                "INSERT INTO territorios (nome, descricao, ultima_visita) VALUES (?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'territorios.inserir',
                 (self.nome, self.descricao, self.ultima_visita)
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
+                db_manager.cache.salvo(self)
                 return True
         else:
             # Atualizar território existente
-            cursor = db_manager.execute(
-                "UPDATE territorios SET nome = ?, descricao = ?, ultima_visita = ? WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'territorios.atualizar',
                 (self.nome, self.descricao, self.ultima_visita, self.id)
             )
             if cursor:
                 db_manager.commit()
+                db_manager.cache.salvo(self)
                 return True
+            # O objeto em memória pode ter divergido do banco
+            db_manager.cache.descartar(Territorio, self.id)
         return False
     
     def delete(self, db_manager) -> bool:
         """Deleta o território do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM territorios WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('territorios.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                db_manager.cache.removido(self)
                 return True
         return False
     
-    def get_ruas(self, db_manager) -> List[Dict[str, Any]]:
-        """Obtém todas as ruas do território"""
-        if self.id is not None:
-            cursor = db_manager.execute(
-                "SELECT * FROM ruas WHERE territorio_id = ? ORDER BY nome",
-                (self.id,)
-            )
-            if cursor:
-                return [dict(row) for row in cursor.fetchall()]
-        return []
+    @staticmethod
+    def sugerir_designacao(db_manager, limit: int = 5) -> List[Dict[str, Any]]:
+        """Sugere territórios não designados para a próxima designação
+        
+        Lê o resumo mantido pelos triggers (resumo_territorios) e ordena pela
+        pontuação: há mais tempo sem conclusão, menor cobertura e maior tamanho.
+        Territórios nunca concluídos contam com o tempo máximo.
+        """
+        cursor = db_manager.executar_consulta('territorios.sugestoes')
+        if not cursor:
+            return []
+        linhas = cursor.fetchall()
+        if not linhas:
+            return []
+        
+        hoje = datetime.now().date()
+        maior = max(row['total_imoveis'] for row in linhas) or 1
+        sugestoes = []
+        for row in linhas:
+            dias = None
+            if row['ultima_conclusao']:
+                try:
+                    conclusao = datetime.strptime(row['ultima_conclusao'][:10], '%Y-%m-%d').date()
+                    dias = max(0, (hoje - conclusao).days)
+                except ValueError:
+                    pass
+            
+            total = row['total_imoveis']
+            cobertura = row['imoveis_visitados'] / total if total else 0.0
+            tempo = 1.0 if dias is None else min(dias, Territorio.DIAS_REFERENCIA) / Territorio.DIAS_REFERENCIA
+            pontuacao = (Territorio.PESO_TEMPO * tempo
+                         + Territorio.PESO_COBERTURA * (1 - cobertura)
+                         + Territorio.PESO_TAMANHO * total / maior)
+            
+            sugestoes.append({
+                'territorio_id': row['id'],
+                'nome': row['nome'],
+                'ultima_conclusao': row['ultima_conclusao'],
+                'dias_desde_conclusao': dias,
+                'total_imoveis': total,
+                'cobertura': cobertura,
+                'pontuacao': pontuacao
+            })
+        
+        sugestoes.sort(key=lambda s: (-s['pontuacao'], s['nome']))
+        return sugestoes[:limit]
+    
+    @staticmethod
+    def carregar_ruas(db_manager, territorios: List['Territorio']) -> None:
+        """Carrega de uma vez, com uma única consulta, as ruas dos territórios informados"""
+        pendentes = {t.id: t for t in territorios if t.id is not None and not t.ruas_carregadas}
+        if not pendentes:
+            return
+        
+        cursor = db_manager.executar_consulta('ruas.todas')
+        if not cursor:
+            return
+        
+        ruas_por_territorio = {territorio_id: [] for territorio_id in pendentes}
+        for row in cursor.fetchall():
+            if row['territorio_id'] in ruas_por_territorio:
+                ruas_por_territorio[row['territorio_id']].append(dict(row))
+        
+        for territorio_id, territorio in pendentes.items():
+            territorio.ruas = ruas_por_territorio[territorio_id]
+            territorio.ruas_carregadas = True
+    
+    def get_ruas(self, db_manager, recarregar: bool = False) -> List[Dict[str, Any]]:
+        """Obtém todas as ruas do território (consulta o banco só na primeira vez)"""
+        if self.id is None:
+            return []
+        
+        if recarregar or not self.ruas_carregadas:
+            cursor = db_manager.executar_consulta('ruas.por_territorio', (self.id,))
+            if not cursor:
+                return []
+            self.ruas = [dict(row) for row in cursor.fetchall()]
+            self.ruas_carregadas = True
+        
+        return list(self.ruas)
+    
+    def get_rua(self, db_manager, rua_id: int) -> Optional[Dict[str, Any]]:
+        """Obtém uma rua do território pelo ID"""
+        for rua in self.get_ruas(db_manager):
+            if rua['id'] == rua_id:
+                return rua
+        return None
+    
+    def _ordenar_ruas(self) -> None:
+        """Mantém as ruas carregadas na mesma ordem da consulta (ORDER BY nome)"""
+        self.ruas.sort(key=lambda rua: rua['nome'])
     
     def add_rua(self, db_manager, nome_rua: str) -> bool:
         """Adiciona uma nova rua ao território"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "INSERT INTO ruas (territorio_id, nome) VALUES (?, ?)",
-                (self.id, nome_rua)
-            )
+            cursor = db_manager.executar_consulta('ruas.inserir', (self.id, nome_rua))
+            if cursor:
+                db_manager.commit()
+                if self.ruas_carregadas:
+                    self.ruas.append({'id': cursor.lastrowid, 'territorio_id': self.id, 'nome': nome_rua})
+                    self._ordenar_ruas()
+                return True
+        return False
+    
+    def editar_rua(self, db_manager, rua_id: int, nome_rua: str) -> bool:
+        """Altera o nome de uma rua do território"""
+        if self.id is not None:
+            cursor = db_manager.executar_consulta('ruas.atualizar', (nome_rua, rua_id, self.id))
+            if cursor:
+                db_manager.commit()
+                for rua in self.ruas:
+                    if rua['id'] == rua_id:
+                        rua['nome'] = nome_rua
+                self._ordenar_ruas()
+                return True
+        return False
+    
+    def excluir_rua(self, db_manager, rua_id: int) -> bool:
+        """Exclui uma rua do território (e, em cascata, seus imóveis)"""
+        if self.id is not None:
+            cursor = db_manager.executar_consulta('ruas.excluir', (rua_id, self.id))
             if cursor:
                 db_manager.commit()
+                self.ruas = [rua for rua in self.ruas if rua['id'] != rua_id]
                 return True
         return False
     
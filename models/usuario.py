@@ -4,6 +4,8 @@
 from typing import List, Optional, Dict, Any
 import sqlite3
 import hashlib
+import hmac
+import json
 import os
 
 class Usuario:
@@ -14,6 +16,11 @@ class Usuario:
     NIVEL_GESTOR = 2    # Pode gerenciar territórios, designações, etc.
     NIVEL_BASICO = 1    # Apenas registra atendimentos e consulta dados
     
+    # Parâmetros do hash de senha (ficam gravados no próprio hash)
+    KDF_ALGORITMO = "pbkdf2_sha256"
+    KDF_ITERACOES = 100000
+    KDF_ITERACOES_LEGADO = 100000  # Hashes antigos no formato salt:hash
+    
     def __init__(self, id: int = None, nome: str = "", email: str = "",
                  senha_hash: str = None, nivel_permissao: int = NIVEL_BASICO,
                  ativo: bool = True, data_criacao: str = None):
@@ -41,43 +48,60 @@ class Usuario:
     @staticmethod
     def get_all(db_manager) -> List['Usuario']:
         """Obtém todos os usuários do banco de dados"""
-        cursor = db_manager.execute("SELECT * FROM usuarios ORDER BY nome")
-        if cursor:
-            return [Usuario.from_db_row(row) for row in cursor.fetchall()]
-        return []
+        return Usuario._listar(db_manager, 'todos', 'usuarios.todos')
     
     @staticmethod
     def get_ativos(db_manager) -> List['Usuario']:
         """Obtém todos os usuários ativos do banco de dados"""
-        cursor = db_manager.execute("SELECT * FROM usuarios WHERE ativo = 1 ORDER BY nome")
+        return Usuario._listar(db_manager, 'ativos', 'usuarios.ativos')
+    
+    @staticmethod
+    def _listar(db_manager, chave: str, consulta: str) -> List['Usuario']:
+        """Executa uma listagem de usuários, usando o cache da sessão"""
+        usuarios = db_manager.cache.obter_lista(Usuario, chave)
+        if usuarios is not None:
+            return usuarios
+        
+        cursor = db_manager.executar_consulta(consulta)
         if cursor:
-            return [Usuario.from_db_row(row) for row in cursor.fetchall()]
+            usuarios = [Usuario._carregar(db_manager, row) for row in cursor.fetchall()]
+            db_manager.cache.guardar_lista(Usuario, chave, usuarios)
+            return list(usuarios)
         return []
     
+    @staticmethod
+    def _carregar(db_manager, row: sqlite3.Row) -> 'Usuario':
+        """Obtém o objeto único da sessão para uma linha de usuário"""
+        usuario = db_manager.cache.carregar(Usuario, row, Usuario.from_db_row)
+        db_manager.cache.indexar_campo(usuario, 'email')
+        return usuario
+    
     @staticmethod
     def get_by_id(db_manager, usuario_id: int) -> Optional['Usuario']:
         """Obtém um usuário pelo ID"""
-        cursor = db_manager.execute(
-            "SELECT * FROM usuarios WHERE id = ?", 
-            (usuario_id,)
-        )
+        usuario = db_manager.cache.obter(Usuario, usuario_id)
+        if usuario is not None:
+            return usuario
+        
+        cursor = db_manager.executar_consulta('usuarios.por_id', (usuario_id,))
         if cursor:
             row = cursor.fetchone()
             if row:
-                return Usuario.from_db_row(row)
+                return Usuario._carregar(db_manager, row)
         return None
     
     @staticmethod
     def get_by_email(db_manager, email: str) -> Optional['Usuario']:
         """Obtém um usuário pelo email"""
-        cursor = db_manager.execute(
-            "SELECT * FROM usuarios WHERE email = ?", 
-            (email,)
-        )
+        usuario = db_manager.cache.obter_por_campo(Usuario, 'email', email)
+        if usuario is not None:
+            return usuario
+        
+        cursor = db_manager.executar_consulta('usuarios.por_email', (email,))
         if cursor:
             row = cursor.fetchone()
             if row:
-                return Usuario.from_db_row(row)
+                return Usuario._carregar(db_manager, row)
         return None
     
     @staticmethod
@@ -88,19 +112,37 @@ class Usuario:
             return usuario
         return None
     
-    def definir_senha(self, senha: str) -> None:
-        """Define a senha do usuário (faz o hash)"""
+    @staticmethod
+    def _calcular_hash(senha: str, salt: bytes, iteracoes: int) -> bytes:
+        """Calcula o hash PBKDF2 da senha"""
+        return hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), salt, iteracoes)
+    
+    @staticmethod
+    def gerar_hash_senha(senha: str, iteracoes: int = None) -> str:
+        """Gera o hash da senha no formato algoritmo$iteracoes$salt$hash"""
+        iteracoes = iteracoes or Usuario.KDF_ITERACOES
         # Gera um salt aleatório
         salt = os.urandom(32)
-        # Gera o hash com o salt
-        senha_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            senha.encode('utf-8'),
-            salt,
-            100000
-        )
-        # Armazena salt+hash
-        self.senha_hash = salt.hex() + ":" + senha_hash.hex()
+        senha_hash = Usuario._calcular_hash(senha, salt, iteracoes)
+        return f"{Usuario.KDF_ALGORITMO}${iteracoes}${salt.hex()}${senha_hash.hex()}"
+    
+    @staticmethod
+    def _parametros_hash(senha_hash: str):
+        """Extrai (iterações, salt, hash) de um hash armazenado
+        
+        Aceita também o formato antigo salt:hash, gerado com 100.000 iterações.
+        """
+        if "$" in senha_hash:
+            algoritmo, iteracoes, salt_str, hash_str = senha_hash.split("$")
+            if algoritmo != Usuario.KDF_ALGORITMO:
+                raise ValueError(f"Algoritmo de hash não suportado: {algoritmo}")
+            return int(iteracoes), bytes.fromhex(salt_str), bytes.fromhex(hash_str)
+        salt_str, hash_str = senha_hash.split(":")
+        return Usuario.KDF_ITERACOES_LEGADO, bytes.fromhex(salt_str), bytes.fromhex(hash_str)
+    
+    def definir_senha(self, senha: str) -> None:
+        """Define a senha do usuário (faz o hash)"""
+        self.senha_hash = Usuario.gerar_hash_senha(senha)
     
     def verificar_senha(self, senha: str) -> bool:
         """Verifica se a senha fornecida corresponde ao hash armazenado"""
@@ -108,22 +150,25 @@ class Usuario:
             return False
         
         try:
-            salt_str, hash_str = self.senha_hash.split(":")
-            salt = bytes.fromhex(salt_str)
-            hash_stored = bytes.fromhex(hash_str)
+            iteracoes, salt, hash_stored = Usuario._parametros_hash(self.senha_hash)
             
-            # Calcula o hash da senha fornecida com o mesmo salt
-            hash_senha = hashlib.pbkdf2_hmac(
-                'sha256',
-                senha.encode('utf-8'),
-                salt,
-                100000
-            )
+            # Calcula o hash da senha fornecida com o mesmo salt e custo
+            hash_senha = Usuario._calcular_hash(senha, salt, iteracoes)
             
-            return hash_senha == hash_stored
+            return hmac.compare_digest(hash_senha, hash_stored)
         except Exception:
             return False
     
+    def precisa_rehash(self) -> bool:
+        """Indica se o hash armazenado usa parâmetros diferentes dos atuais"""
+        if not self.senha_hash or "$" not in self.senha_hash:
+            return True
+        try:
+            iteracoes, _, _ = Usuario._parametros_hash(self.senha_hash)
+        except Exception:
+            return True
+        return iteracoes != Usuario.KDF_ITERACOES
+    
     def save(self, db_manager) -> bool:
         """Salva o usuário no banco de dados"""
         if self.id is None:
@@ -132,37 +177,39 @@ class Usuario:
                 return False
                 
             # Inserir novo usuário
-            cursor = db_manager.execute(
-                "INSERT INTO usuarios (nome, email, senha_hash, nivel_permissao, ativo) "
-                "VALUES (?, ?, ?, ?, ?)",
+            cursor = db_manager.executar_consulta(
+                'usuarios.inserir',
                 (self.nome, self.email, self.senha_hash, self.nivel_permissao, int(self.ativo))
             )
             if cursor:
                 self.id = cursor.lastrowid
                 db_manager.commit()
+                db_manager.cache.salvo(self)
+                db_manager.cache.indexar_campo(self, 'email')
                 return True
         else:
             # Atualizar usuário existente
-            cursor = db_manager.execute(
-                "UPDATE usuarios SET nome = ?, email = ?, senha_hash = ?, "
-                "nivel_permissao = ?, ativo = ? WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'usuarios.atualizar',
                 (self.nome, self.email, self.senha_hash, self.nivel_permissao, 
                  int(self.ativo), self.id)
             )
             if cursor:
                 db_manager.commit()
+                db_manager.cache.salvo(self)
+                db_manager.cache.indexar_campo(self, 'email')
                 return True
+            # O objeto em memória pode ter divergido do banco
+            db_manager.cache.descartar(Usuario, self.id)
         return False
     
     def delete(self, db_manager) -> bool:
         """Deleta o usuário do banco de dados"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "DELETE FROM usuarios WHERE id = ?",
-                (self.id,)
-            )
+            cursor = db_manager.executar_consulta('usuarios.excluir', (self.id,))
             if cursor:
                 db_manager.commit()
+                db_manager.cache.removido(self)
                 return True
         return False
     
@@ -181,6 +228,9 @@ class LogAtividade:
     ACAO_EXCLUIR = "excluir"
     ACAO_VISUALIZAR = "visualizar"
     
+    # Gravador em segundo plano (GravadorLog); sem ele, registrar grava na hora
+    gravador = None
+    
     def __init__(self, id: int = None, usuario_id: int = None, 
                  tipo_acao: str = "", descricao: str = "",
                  data_hora: str = None, entidade: str = None,
@@ -192,11 +242,14 @@ class LogAtividade:
         self.data_hora = data_hora
         self.entidade = entidade  # tipo de entidade (território, designação, etc.)
         self.entidade_id = entidade_id  # id da entidade, se aplicável
+        
+        # Campo extra para exibição
+        self.usuario_nome = None
     
     @staticmethod
     def from_db_row(row: sqlite3.Row) -> 'LogAtividade':
         """Cria um objeto LogAtividade a partir de uma linha do banco de dados"""
-        return LogAtividade(
+        log = LogAtividade(
             id=row['id'],
             usuario_id=row['usuario_id'],
             tipo_acao=row['tipo_acao'],
@@ -205,37 +258,93 @@ class LogAtividade:
             entidade=row['entidade'],
             entidade_id=row['entidade_id']
         )
+        
+        # Adiciona campos extras se estiverem disponíveis
+        if 'usuario_nome' in row.keys():
+            log.usuario_nome = row['usuario_nome']
+        
+        return log
     
     @staticmethod
-    def get_all(db_manager, limit: int = 100) -> List['LogAtividade']:
-        """Obtém todos os registros de atividade do banco de dados"""
-        cursor = db_manager.execute(
-            "SELECT * FROM log_atividades ORDER BY data_hora DESC LIMIT ?",
-            (limit,)
-        )
+    def configurar_gravador(gravador) -> None:
+        """Define o gravador em segundo plano usado por registrar"""
+        LogAtividade.gravador = gravador
+    
+    @staticmethod
+    def flush() -> None:
+        """Grava as atividades ainda pendentes no gravador em segundo plano"""
+        if LogAtividade.gravador is not None:
+            LogAtividade.gravador.flush()
+    
+    @staticmethod
+    def encerrar_gravador() -> None:
+        """Grava as atividades pendentes e encerra o gravador (logout/saída)"""
+        if LogAtividade.gravador is not None:
+            LogAtividade.gravador.parar()
+            LogAtividade.gravador = None
+    
+    @staticmethod
+    def buscar(db_manager, usuario_id: int = None, tipo_acao: str = None,
+               entidade: str = None, data_inicio: str = None, data_fim: str = None,
+               apos: tuple = None, limit: int = 100,
+               incluir_arquivo: bool = False) -> List['LogAtividade']:
+        """Obtém registros de atividade com o nome do usuário, filtrados e paginados
+
+        Datas no formato AAAA-MM-DD (inclusivas). A paginação é por chave: para
+        a próxima página, passe em apos o cursor (data_hora, id) do último
+        registro recebido (veja cursor_pagina). Com incluir_arquivo, a busca
+        inclui os registros já movidos para o banco de arquivo.
+        """
+        LogAtividade.flush()
+
+        consulta = 'log_atividades.buscar'
+        if incluir_arquivo and db_manager.anexar_arquivo():
+            consulta = 'log_atividades.buscar_com_arquivo'
+
+        apos_data, apos_id = apos if apos is not None else (None, None)
+        cursor = db_manager.executar_consulta(consulta, {
+            'usuario_id': usuario_id, 'tipo_acao': tipo_acao or None,
+            'entidade': entidade or None, 'data_inicio': data_inicio or None,
+            'data_fim': f"{data_fim} 23:59:59" if data_fim else None,
+            'apos_data': apos_data, 'apos_id': apos_id, 'limit': limit
+        })
         if cursor:
             return [LogAtividade.from_db_row(row) for row in cursor.fetchall()]
         return []
     
+    @staticmethod
+    def cursor_pagina(logs: List['LogAtividade']) -> Optional[tuple]:
+        """Cursor de paginação (data_hora, id) a partir do último registro da página"""
+        if not logs:
+            return None
+        return (logs[-1].data_hora, logs[-1].id)
+    
+    @staticmethod
+    def get_all(db_manager, limit: int = 100) -> List['LogAtividade']:
+        """Obtém todos os registros de atividade do banco de dados"""
+        return LogAtividade.buscar(db_manager, limit=limit)
+    
     @staticmethod
     def get_by_usuario(db_manager, usuario_id: int, limit: int = 50) -> List['LogAtividade']:
         """Obtém os registros de atividade de um usuário específico"""
-        cursor = db_manager.execute(
-            "SELECT * FROM log_atividades WHERE usuario_id = ? "
-            "ORDER BY data_hora DESC LIMIT ?",
-            (usuario_id, limit)
-        )
-        if cursor:
-            return [LogAtividade.from_db_row(row) for row in cursor.fetchall()]
-        return []
+        return LogAtividade.buscar(db_manager, usuario_id=usuario_id, limit=limit)
     
     @staticmethod
     def registrar(db_manager, usuario_id: int, tipo_acao: str, 
                  descricao: str, entidade: str = None, entidade_id: int = None) -> bool:
         """Registra uma nova atividade no sistema"""
-        cursor = db_manager.execute(
-            "INSERT INTO log_atividades (usuario_id, tipo_acao, descricao, entidade, entidade_id) "
-            "VALUES (?, ?, ?, ?, ?)",
+        # Com o gravador ativo, a atividade é apenas enfileirada; a gravação direta
+        # fica para quando ele não está rodando (descartada pela política, não é gravada)
+        gravador = LogAtividade.gravador
+        if gravador is not None:
+            situacao = gravador.registrar(usuario_id, tipo_acao, descricao, entidade, entidade_id)
+            if situacao == gravador.ENFILEIRADA:
+                return True
+            if situacao == gravador.DESCARTADA:
+                return False
+        
+        cursor = db_manager.executar_consulta(
+            'log_atividades.inserir',
             (usuario_id, tipo_acao, descricao, entidade, entidade_id)
         )
         if cursor:
@@ -260,6 +369,9 @@ class Notificacao:
     STATUS_LIDA = "lida"
     STATUS_ARQUIVADA = "arquivada"
     
+    # Status exibidos por padrão na central de notificações
+    STATUS_VISIVEIS = (STATUS_NAO_LIDA, STATUS_LIDA)
+    
     def __init__(self, id: int = None, usuario_id: int = None,
                  tipo: str = TIPO_INFO, titulo: str = "",
                  mensagem: str = "", status: str = STATUS_NAO_LIDA,
@@ -296,30 +408,57 @@ class Notificacao:
         )
     
     @staticmethod
-    def get_by_usuario(db_manager, usuario_id: int, apenas_nao_lidas: bool = False) -> List['Notificacao']:
-        """Obtém as notificações de um usuário específico"""
-        query = "SELECT * FROM notificacoes WHERE usuario_id = ?"
-        params = [usuario_id]
+    def get_by_usuario(db_manager, usuario_id: int, apenas_nao_lidas: bool = False,
+                       incluir_arquivo: bool = False) -> List['Notificacao']:
+        """Obtém as notificações de um usuário específico
         
-        if apenas_nao_lidas:
-            query += " AND status = ?"
-            params.append(Notificacao.STATUS_NAO_LIDA)
+        Com incluir_arquivo, inclui as notificações movidas para o banco de arquivo.
+        """
+        consulta = 'notificacoes.por_usuario'
+        if incluir_arquivo and db_manager.anexar_arquivo():
+            consulta = 'notificacoes.por_usuario_com_arquivo'
         
-        query += " ORDER BY data_criacao DESC"
+        cursor = db_manager.executar_consulta(consulta, {
+            'usuario_id': usuario_id,
+            'status': Notificacao.STATUS_NAO_LIDA if apenas_nao_lidas else None
+        })
+        if cursor:
+            return [Notificacao.from_db_row(row) for row in cursor.fetchall()]
+        return []
+    
+    @staticmethod
+    def buscar(db_manager, usuario_id: int, status: tuple = STATUS_VISIVEIS,
+               apos: tuple = None, limit: int = 50) -> List['Notificacao']:
+        """Obtém uma página das notificações do usuário, filtradas por status
         
-        cursor = db_manager.execute(query, params)
+        Por padrão as arquivadas ficam de fora (status=None inclui todas). A
+        paginação é por chave: para a próxima página, passe em apos o cursor
+        (data_criacao, id) da última notificação recebida (veja cursor_pagina).
+        """
+        apos_data, apos_id = apos if apos is not None else (None, None)
+        cursor = db_manager.executar_consulta('notificacoes.buscar', {
+            'usuario_id': usuario_id,
+            'status': json.dumps(list(status)) if status else None,
+            'apos_data': apos_data, 'apos_id': apos_id, 'limit': limit
+        })
         if cursor:
             return [Notificacao.from_db_row(row) for row in cursor.fetchall()]
         return []
     
+    @staticmethod
+    def cursor_pagina(notificacoes: List['Notificacao']) -> Optional[tuple]:
+        """Cursor de paginação (data_criacao, id) a partir da última notificação da página"""
+        if not notificacoes:
+            return None
+        return (notificacoes[-1].data_criacao, notificacoes[-1].id)
+    
     @staticmethod
     def criar(db_manager, usuario_id: int, tipo: str, titulo: str, 
               mensagem: str, link: str = None, entidade: str = None, 
               entidade_id: int = None) -> bool:
         """Cria uma nova notificação para um usuário"""
-        cursor = db_manager.execute(
-            "INSERT INTO notificacoes (usuario_id, tipo, titulo, mensagem, status, link, entidade, entidade_id) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        cursor = db_manager.executar_consulta(
+            'notificacoes.inserir',
             (usuario_id, tipo, titulo, mensagem, Notificacao.STATUS_NAO_LIDA, link, entidade, entidade_id)
         )
         if cursor:
@@ -330,28 +469,83 @@ class Notificacao:
     @staticmethod
     def criar_para_todos(db_manager, tipo: str, titulo: str, 
                         mensagem: str, link: str = None, entidade: str = None, 
-                        entidade_id: int = None) -> bool:
-        """Cria uma notificação para todos os usuários ativos"""
-        # Obtém todos os usuários ativos
-        usuarios = Usuario.get_ativos(db_manager)
-        if not usuarios:
+                        entidade_id: int = None, nivel_minimo: int = None,
+                        evitar_repetidas: bool = False) -> bool:
+        """Cria uma notificação para todos os usuários ativos
+        
+        Com nivel_minimo, apenas para os usuários com esse nível de permissão
+        ou superior. Com evitar_repetidas, pula quem já tem uma notificação não
+        lida do mesmo tipo para a mesma entidade. Um único INSERT ... SELECT,
+        numa transação.
+        """
+        cursor = db_manager.executar_consulta('notificacoes.criar_para_todos', {
+            'tipo': tipo, 'titulo': titulo, 'mensagem': mensagem,
+            'status': Notificacao.STATUS_NAO_LIDA, 'link': link,
+            'entidade': entidade, 'entidade_id': entidade_id,
+            'nivel_minimo': nivel_minimo, 'evitar_repetidas': int(evitar_repetidas)
+        })
+        if not cursor:
+            db_manager.rollback()
             return False
+        # Comita mesmo sem linhas inseridas: o INSERT já abriu a transação e
+        # ela seguraria a trava de escrita do banco até o próximo commit
+        db_manager.commit()
+        return cursor.rowcount > 0
+    
+    @staticmethod
+    def alterar_status_em_lote(db_manager, usuario_id: int, novo_status: str,
+                               ids: List[int] = None) -> int:
+        """Altera o status de várias notificações do usuário numa transação
         
-        # Cria a notificação para cada usuário
-        for usuario in usuarios:
-            Notificacao.criar(
-                db_manager, usuario.id, tipo, titulo, mensagem, 
-                link, entidade, entidade_id
-            )
+        Sem ids, altera todas as notificações do usuário. Marcar como lida só
+        afeta as não lidas; arquivar afeta as que ainda não estão arquivadas.
+        Retorna quantas notificações foram alteradas (-1 em caso de erro).
+        """
+        consulta = 'notificacoes.alterar_status_em_lote'
+        if novo_status == Notificacao.STATUS_LIDA:
+            consulta = 'notificacoes.marcar_lidas_em_lote'
+        
+        # Um único UPDATE; os IDs vão numa lista JSON, sem limite de parâmetros
+        cursor = db_manager.executar_consulta(consulta, {
+            'status': novo_status, 'status_anterior': Notificacao.STATUS_NAO_LIDA,
+            'usuario_id': usuario_id, 'ids': None if ids is None else json.dumps(list(ids))
+        })
+        if not cursor:
+            db_manager.rollback()
+            return -1
         
-        return True
+        db_manager.commit()
+        return cursor.rowcount
+    
+    @staticmethod
+    def marcar_todas_como_lidas(db_manager, usuario_id: int, ids: List[int] = None) -> int:
+        """Marca como lidas todas as notificações do usuário (ou as dos ids informados)"""
+        return Notificacao.alterar_status_em_lote(db_manager, usuario_id, Notificacao.STATUS_LIDA, ids)
+    
+    @staticmethod
+    def arquivar_todas(db_manager, usuario_id: int, ids: List[int] = None) -> int:
+        """Arquiva todas as notificações do usuário (ou as dos ids informados)"""
+        return Notificacao.alterar_status_em_lote(db_manager, usuario_id, Notificacao.STATUS_ARQUIVADA, ids)
+    
+    @staticmethod
+    def contar_nao_lidas(db_manager, usuario_id: int) -> int:
+        """Obtém o total de notificações não lidas do usuário
+        
+        Lê o contador mantido por triggers (notificacoes_nao_lidas), sem
+        percorrer a tabela de notificações.
+        """
+        cursor = db_manager.executar_consulta('notificacoes.total_nao_lidas', (usuario_id,))
+        if cursor:
+            row = cursor.fetchone()
+            if row:
+                return max(row['total'], 0)
+        return 0
     
     def marcar_como_lida(self, db_manager) -> bool:
         """Marca a notificação como lida"""
         if self.id is not None and self.status == Notificacao.STATUS_NAO_LIDA:
-            cursor = db_manager.execute(
-                "UPDATE notificacoes SET status = ?, data_leitura = CURRENT_TIMESTAMP "
-                "WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'notificacoes.marcar_lida',
                 (Notificacao.STATUS_LIDA, self.id)
             )
             if cursor:
@@ -363,8 +557,8 @@ class Notificacao:
     def arquivar(self, db_manager) -> bool:
         """Arquiva a notificação"""
         if self.id is not None:
-            cursor = db_manager.execute(
-                "UPDATE notificacoes SET status = ? WHERE id = ?",
+            cursor = db_manager.executar_consulta(
+                'notificacoes.definir_status',
                 (Notificacao.STATUS_ARQUIVADA, self.id)
             )
             if cursor:
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from database.backup import ServicoBackup
+from database.db_manager import DatabaseManager
+
+
+class TestServicoBackup(unittest.TestCase):
+    """Backup online do banco e restauração a partir da cópia compactada"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, 'territorios.db')
+        db_manager = DatabaseManager(self.caminho)
+        db_manager.setup_database()
+        db_manager.close()
+        self._executar("INSERT INTO territorios (nome) VALUES ('Antes do Backup')")
+        self.servico = ServicoBackup(self.caminho, pasta=os.path.join(self.pasta.name, 'backups'),
+                                     paginas_por_passo=4, pausa_ms=0)
+    
+    def tearDown(self):
+        self.pasta.cleanup()
+    
+    def _executar(self, sql, params=()):
+        connection = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            connection.execute(sql, params)
+            connection.commit()
+        finally:
+            connection.close()
+    
+    def _nomes(self, caminho=None):
+        connection = sqlite3.connect(caminho or self.caminho)
+        try:
+            return {nome for (nome,) in connection.execute("SELECT nome FROM territorios")}
+        finally:
+            connection.close()
+    
+    def test_backup_e_restauracao(self):
+        gerados = self.servico.fazer_backup()
+        self.assertEqual(gerados[0], self.servico.listar_backups()[0])
+        self.assertIsNotNone(self.servico.ultimo_backup())
+        
+        self._executar("DELETE FROM territorios WHERE nome = 'Antes do Backup'")
+        self._executar("INSERT INTO territorios (nome) VALUES ('Depois do Backup')")
+        
+        self.assertTrue(ServicoBackup.restaurar(gerados[0], self.caminho))
+        nomes = self._nomes()
+        self.assertIn('Antes do Backup', nomes)
+        self.assertNotIn('Depois do Backup', nomes)
+        self.assertFalse(os.path.exists(f"{self.caminho}.restaurando"))
+    
+    def test_copia_em_wal_durante_gravacoes(self):
+        self._executar("PRAGMA journal_mode = WAL")
+        parar = threading.Event()
+        
+        def gravar():
+            contador = 0
+            while not parar.is_set():
+                contador += 1
+                self._executar("INSERT INTO territorios (nome) VALUES (?)", (f"Gravado {contador}",))
+        
+        thread = threading.Thread(target=gravar)
+        thread.start()
+        try:
+            gerados = self.servico.fazer_backup()
+        finally:
+            parar.set()
+            thread.join()
+        
+        # O instantâneo não recomeça com as gravações: a cópia sai sem ser adiada
+        self.assertFalse(self.servico.adiado)
+        self.assertTrue(gerados)
+        restaurado = os.path.join(self.pasta.name, 'restaurado.db')
+        self.assertTrue(ServicoBackup.restaurar(gerados[0], restaurado))
+        self.assertIn('Antes do Backup', self._nomes(restaurado))
+    
+    def test_backup_corrompido_nao_substitui_o_banco(self):
+        corrompido = os.path.join(self.pasta.name, 'corrompido.db.gz')
+        with gzip.open(corrompido, 'wb') as f:
+            f.write(b"isto nao e um banco SQLite" * 100)
+        
+        self.assertFalse(ServicoBackup.restaurar(corrompido, self.caminho))
+        self.assertIn('Antes do Backup', self._nomes())
+        self.assertFalse(os.path.exists(f"{self.caminho}.restaurando"))
+
+
+if __name__ == '__main__':
+    unittest.main()
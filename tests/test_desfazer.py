@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+from database.db_manager import DatabaseManager
+from database.desfazer import TABELAS_DESFAZER
+from models.atendimento import Atendimento
+from models.imovel import Imovel
+from models.territorio import Territorio
+
+
+class TestDesfazerExclusaoEmCascata(unittest.TestCase):
+    """Desfazer e refazer a exclusão de um território com tudo o que depende dele"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.pasta.name, 'territorios.db'))
+        self.db_manager.setup_database()
+        self.db_manager.historico.usuario_id = 1
+        
+        db = self.db_manager
+        self.territorio = Territorio(nome="Território Desfazer")
+        self.assertTrue(self.territorio.save(db))
+        self.assertTrue(self.territorio.add_rua(db, "Rua A"))
+        rua_id = self.territorio.get_ruas(db, True)[0]['id']
+        
+        casa = Imovel(rua_id=rua_id, numero="10", tipo="residencial")
+        self.assertTrue(casa.save(db))
+        self.assertTrue(Atendimento(imovel_id=casa.id, data="2024-03-01", resultado="atendido").save(db))
+        
+        predio = Imovel(rua_id=rua_id, numero="20", tipo="predio")
+        self.assertTrue(predio.save(db))
+        self.assertTrue(predio.definir_faixas(db, Imovel.montar_faixas("predio", 8, 4)))
+        unidade = predio.materializar_unidade(db, "101")
+        self.assertTrue(Atendimento(imovel_id=predio.id, unidade_id=unidade['id'],
+                                    data="2024-03-02", resultado="ausente").save(db))
+    
+    def tearDown(self):
+        self.db_manager.close()
+        self.pasta.cleanup()
+    
+    def _estado(self):
+        """Todas as linhas das tabelas do histórico"""
+        return {tabela: [tuple(row) for row in self.db_manager.connection.execute(
+                    f"SELECT * FROM {tabela} ORDER BY id").fetchall()]
+                for tabela in TABELAS_DESFAZER}
+    
+    def _excluir_territorio(self):
+        with self.db_manager.historico.acao(f"Excluir território '{self.territorio.nome}'"):
+            self.assertTrue(self.territorio.delete(self.db_manager))
+    
+    def test_desfazer_e_refazer_voltam_exatamente_ao_estado_anterior(self):
+        antes = self._estado()
+        self._excluir_territorio()
+        depois = self._estado()
+        for tabela in ('territorios', 'ruas', 'imoveis', 'faixas_unidades', 'unidades', 'atendimentos'):
+            self.assertLess(len(depois[tabela]), len(antes[tabela]), tabela)
+        
+        historico = self.db_manager.historico
+        self.assertEqual(historico.desfazer(), "Excluir território 'Território Desfazer'")
+        self.assertEqual(self._estado(), antes)
+        
+        self.assertTrue(historico.refazer_exclui())
+        self.assertEqual(historico.refazer(), "Excluir território 'Território Desfazer'")
+        self.assertEqual(self._estado(), depois)
+        
+        historico.desfazer()
+        self.assertEqual(self._estado(), antes)
+        self.assertIsNone(historico.descricao_desfazer())
+    
+    def test_nao_desfaz_se_os_dados_mudaram_depois(self):
+        self._excluir_territorio()
+        historico = self.db_manager.historico
+        historico.desfazer()
+        
+        self.territorio.nome = "Renomeado depois"
+        self.assertTrue(self.territorio.save(self.db_manager))
+        antes = self._estado()
+        with self.assertRaises(ValueError):
+            historico.refazer()
+        self.assertEqual(self._estado(), antes)
+    
+    def test_historico_e_do_usuario_e_da_sessao(self):
+        self._excluir_territorio()
+        historico = self.db_manager.historico
+        self.assertIsNotNone(historico.descricao_desfazer())
+        
+        outra_sessao = DatabaseManager(self.db_manager.db_path)
+        try:
+            outra_sessao.historico.usuario_id = 1
+            self.assertIsNone(outra_sessao.historico.descricao_desfazer())
+            self.assertIsNone(outra_sessao.historico.desfazer())
+        finally:
+            outra_sessao.close()
+        
+        historico.usuario_id = 2
+        self.assertIsNone(historico.descricao_desfazer())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from database.db_manager import DatabaseManager
+from models.atendimento import Atendimento
+from models.imovel import FaixaUnidades, Imovel
+from models.territorio import Territorio
+
+
+class TestFaixaUnidadesContem(unittest.TestCase):
+    """FaixaUnidades.contem sem percorrer a faixa"""
+    
+    def test_numeracao_sequencial(self):
+        faixa = FaixaUnidades(prefixo="Casa", unidade_inicio=1, unidade_fim=12)
+        self.assertTrue(faixa.contem("Casa 01"))
+        self.assertTrue(faixa.contem("Casa 12"))
+        self.assertFalse(faixa.contem("Casa 13"))
+        self.assertFalse(faixa.contem("Casa 00"))
+        self.assertFalse(faixa.contem("Casa 1"))    # Sem o zero à esquerda não é da faixa
+        self.assertFalse(faixa.contem("Apto 01"))   # Outro prefixo
+        self.assertFalse(faixa.contem("Casa 01A"))
+    
+    def test_numeracao_por_andar(self):
+        faixa = FaixaUnidades(prefixo="Apto", andar_inicio=1, andar_fim=8, unidade_inicio=1, unidade_fim=4)
+        self.assertTrue(faixa.contem("Apto 101"))
+        self.assertTrue(faixa.contem("Apto 804"))
+        self.assertFalse(faixa.contem("Apto 805"))
+        self.assertFalse(faixa.contem("Apto 901"))
+        self.assertFalse(faixa.contem("Apto 100"))
+        self.assertFalse(faixa.contem("Apto 0101"))
+        
+        altos = FaixaUnidades(prefixo="Apto", andar_inicio=9, andar_fim=12, unidade_inicio=1, unidade_fim=2)
+        self.assertTrue(altos.contem("Apto 1002"))
+        self.assertFalse(altos.contem("Apto 1003"))
+    
+    def test_bloco(self):
+        faixa = FaixaUnidades(prefixo="Apto", bloco="B", andar_inicio=1, andar_fim=2, unidade_inicio=1, unidade_fim=2)
+        self.assertTrue(faixa.contem("Bloco B - Apto 101"))
+        self.assertFalse(faixa.contem("Bloco A - Apto 101"))
+        self.assertFalse(faixa.contem("Apto 101"))
+    
+    def test_concorda_com_numeros(self):
+        faixas = [
+            FaixaUnidades(prefixo="Casa", unidade_inicio=1, unidade_fim=15),
+            FaixaUnidades(prefixo="Apto", andar_inicio=1, andar_fim=11, unidade_inicio=1, unidade_fim=3),
+            FaixaUnidades(prefixo="Apto", bloco="A", andar_inicio=2, andar_fim=3, unidade_inicio=5, unidade_fim=6),
+        ]
+        for faixa in faixas:
+            numeros = list(faixa.numeros())
+            self.assertEqual(len(numeros), len(faixa))
+            self.assertEqual(len(set(numeros)), len(numeros))
+            for numero in numeros:
+                self.assertTrue(faixa.contem(numero), numero)
+            for outra in faixas:
+                if outra is not faixa:
+                    self.assertFalse(any(outra.contem(numero) for numero in numeros))
+
+
+class TestImovelGetUnidades(unittest.TestCase):
+    """get_unidades junta as unidades das faixas com as gravadas"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.pasta.name, 'territorios.db'))
+        self.db_manager.setup_database()
+        
+        db = self.db_manager
+        territorio = Territorio(nome="Território Unidades")
+        self.assertTrue(territorio.save(db))
+        self.assertTrue(territorio.add_rua(db, "Rua B"))
+        rua_id = territorio.get_ruas(db, True)[0]['id']
+        self.predio = Imovel(rua_id=rua_id, numero="30", tipo="predio")
+        self.assertTrue(self.predio.save(db))
+        # 2 andares com 2 unidades: Apto 101, 102, 201 e 202
+        self.assertTrue(self.predio.definir_faixas(db, Imovel.montar_faixas("predio", 4, 2)))
+    
+    def tearDown(self):
+        self.db_manager.close()
+        self.pasta.cleanup()
+    
+    def _numeros(self):
+        return [u['numero'] for u in self.predio.get_unidades(self.db_manager)]
+    
+    def test_unidades_das_faixas_sem_linhas_gravadas(self):
+        unidades = self.predio.get_unidades(self.db_manager)
+        self.assertEqual([u['numero'] for u in unidades], ["Apto 101", "Apto 102", "Apto 201", "Apto 202"])
+        self.assertTrue(all(u['id'] is None for u in unidades))
+        self.assertEqual(self.predio.contar_unidades(self.db_manager), 4)
+    
+    def test_unidade_gravada_substitui_a_da_faixa(self):
+        gravada = self.predio.materializar_unidade(self.db_manager, "Apto 102")
+        self.assertIsNotNone(gravada['faixa_id'])
+        # Gravar de novo devolve a mesma linha
+        self.assertEqual(self.predio.materializar_unidade(self.db_manager, "Apto 102")['id'], gravada['id'])
+        
+        unidades = self.predio.get_unidades(self.db_manager)
+        self.assertEqual([u['numero'] for u in unidades], ["Apto 101", "Apto 102", "Apto 201", "Apto 202"])
+        self.assertEqual([u['id'] for u in unidades], [None, gravada['id'], None, None])
+        self.assertEqual(self.predio.contar_unidades(self.db_manager), 4)
+    
+    def test_unidade_fora_das_faixas_fica_avulsa_no_fim(self):
+        avulsa = self.predio.materializar_unidade(self.db_manager, "Cobertura")
+        self.assertIsNone(avulsa['faixa_id'])
+        self.assertEqual(self._numeros(), ["Apto 101", "Apto 102", "Apto 201", "Apto 202", "Cobertura"])
+        self.assertEqual(self.predio.contar_unidades(self.db_manager), 5)
+    
+    def test_redefinir_faixas_mantem_so_unidades_com_atendimento(self):
+        atendida = self.predio.materializar_unidade(self.db_manager, "Apto 202")
+        self.assertTrue(Atendimento(imovel_id=self.predio.id, unidade_id=atendida['id'],
+                                    data="2024-03-01", resultado="atendido").save(self.db_manager))
+        self.predio.materializar_unidade(self.db_manager, "Apto 101")  # Sem atendimento
+        
+        # Um andar só: o Apto 202 sai das faixas, mas tem atendimento e continua
+        self.assertTrue(self.predio.definir_faixas(self.db_manager, Imovel.montar_faixas("predio", 2, 1)))
+        unidades = self.predio.get_unidades(self.db_manager)
+        self.assertEqual([u['numero'] for u in unidades], ["Apto 101", "Apto 102", "Apto 202"])
+        self.assertIsNone(unidades[0]['id'])  # Apto 101 voltou a ser só parte da faixa
+        self.assertEqual(unidades[2]['id'], atendida['id'])
+        self.assertIsNone(unidades[2]['faixa_id'])
+    
+    def _falhar_em(self, nome):
+        """executar_consulta que devolve None (como num erro do SQLite) para o comando nome"""
+        original = self.db_manager.executar_consulta
+        return mock.patch.object(
+            self.db_manager, 'executar_consulta',
+            side_effect=lambda consulta, params=None: None if consulta == nome else original(consulta, params)
+        )
+    
+    def test_falha_em_qualquer_comando_desfaz_tudo(self):
+        gravada = self.predio.materializar_unidade(self.db_manager, "Apto 202")
+        for nome in ('unidades.excluir', 'imoveis.definir_total_unidades'):
+            with self.subTest(comando=nome):
+                with self._falhar_em(nome):
+                    self.assertFalse(self.predio.definir_faixas(self.db_manager, Imovel.montar_faixas("predio", 2, 1)))
+                self.assertEqual(self.predio.total_unidades, 4)
+                self.assertEqual(self._numeros(), ["Apto 101", "Apto 102", "Apto 201", "Apto 202"])
+                self.assertEqual(self.predio.get_unidades(self.db_manager)[3]['id'], gravada['id'])
+                self.assertEqual(Imovel.get_by_id(self.db_manager, self.predio.id).total_unidades, 4)
+    
+    def test_edicao_com_falha_nas_faixas_nao_grava_o_total(self):
+        # Como na edição do imóvel: o cadastro e as faixas numa só ação
+        with self._falhar_em('faixas_unidades.inserir'):
+            with self.db_manager.historico.acao("Editar imóvel"):
+                self.predio.total_unidades = 2
+                sucesso = self.predio.save(self.db_manager)
+                self.assertTrue(sucesso)
+                sucesso = self.predio.redimensionar_unidades(self.db_manager, 2)
+                if not sucesso:
+                    self.db_manager.rollback()
+        self.assertFalse(sucesso)
+        self.assertEqual(Imovel.get_by_id(self.db_manager, self.predio.id).total_unidades, 4)
+        self.assertEqual(len(self.predio.get_faixas(self.db_manager)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
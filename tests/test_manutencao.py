@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from database.db_manager import DatabaseManager
+from database.manutencao import AUTO_VACUUM_INCREMENTAL, AUTO_VACUUM_NENHUM, ServicoManutencao
+
+
+class TestServicoManutencao(unittest.TestCase):
+    """Ciclo de manutenção: páginas livres devolvidas ao disco e métricas registradas"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, 'territorios.db')
+        db_manager = DatabaseManager(self.caminho)
+        db_manager.setup_database()
+        db_manager.close()
+    
+    def tearDown(self):
+        self.pasta.cleanup()
+    
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, isolation_level=None)
+    
+    def _pragma(self, nome):
+        connection = self._conectar()
+        try:
+            return connection.execute(f"PRAGMA {nome}").fetchone()[0]
+        finally:
+            connection.close()
+    
+    def _fragmentar(self):
+        """Grava e exclui territórios volumosos, deixando páginas livres no banco"""
+        connection = self._conectar()
+        try:
+            connection.executemany(
+                "INSERT INTO territorios (nome, descricao) VALUES (?, ?)",
+                ((f"Território {i}", "x" * 2000) for i in range(500))
+            )
+            connection.execute("DELETE FROM territorios")
+        finally:
+            connection.close()
+        self.assertGreater(self._pragma('freelist_count'), 0)
+    
+    def test_ciclo_ocioso_libera_paginas_e_registra_metricas(self):
+        self.assertEqual(self._pragma('auto_vacuum'), AUTO_VACUUM_INCREMENTAL)
+        self._fragmentar()
+        paginas = self._pragma('page_count')
+        
+        resultado = ServicoManutencao(self.caminho, paginas_por_passo=16, pausa_ms=0).executar()
+        self.assertEqual(resultado['main']['paginas_livres'], 0)
+        self.assertGreater(resultado['main']['paginas_liberadas'], 0)
+        self.assertLess(self._pragma('page_count'), paginas)
+        
+        connection = self._conectar()
+        try:
+            registro = connection.execute(
+                "SELECT paginas_livres, paginas_liberadas FROM metricas_banco "
+                "WHERE banco = 'main' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        finally:
+            connection.close()
+        self.assertEqual(registro, (0, resultado['main']['paginas_liberadas']))
+    
+    def test_sistema_em_uso_adia_o_vacuum(self):
+        self._fragmentar()
+        livres = self._pragma('freelist_count')
+        
+        servico = ServicoManutencao(self.caminho, ultima_atividade=time.monotonic, pausa_ms=0)
+        resultado = servico.executar()
+        self.assertEqual(resultado['main']['paginas_livres'], livres)
+    
+    def test_banco_sem_auto_vacuum_so_converte_ao_encerrar(self):
+        connection = self._conectar()
+        try:
+            connection.execute("PRAGMA auto_vacuum = NONE")
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+        self.assertEqual(self._pragma('auto_vacuum'), AUTO_VACUUM_NENHUM)
+        self._fragmentar()
+        
+        servico = ServicoManutencao(self.caminho, pausa_ms=0)
+        servico.executar()
+        self.assertEqual(self._pragma('auto_vacuum'), AUTO_VACUUM_NENHUM)
+        self.assertGreater(self._pragma('freelist_count'), 0)
+        
+        self.assertIn('main', servico.converter_auto_vacuum())
+        self.assertEqual(self._pragma('auto_vacuum'), AUTO_VACUUM_INCREMENTAL)
+        self.assertEqual(self._pragma('freelist_count'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
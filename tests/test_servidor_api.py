@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from database.cliente_api import ClienteAPI
+from database.db_manager import DatabaseManager
+from database.servidor_api import ServidorAPI
+from models.autenticacao import ServicoAutenticacao
+from models.territorio import Territorio
+from models.usuario import Usuario
+
+SENHA_ADMIN = "admin123"  # Criada por setup_database
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ServidorTeste(unittest.TestCase):
+    """Banco temporário servido por um ServidorAPI em segundo plano"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, 'territorios.db')
+        db_manager = DatabaseManager(self.caminho)
+        db_manager.setup_database()
+        basico = Usuario(nome="Básico", email="basico@teste.local", nivel_permissao=Usuario.NIVEL_BASICO)
+        basico.definir_senha("senha123")
+        self.assertTrue(basico.save(db_manager))
+        self.basico_id = basico.id
+        self.admin_id = Usuario.get_by_email(db_manager, "admin@sistema.local").id
+        db_manager.close()
+        
+        self.porta = _porta_livre()
+        self.servidor = ServidorAPI(self.caminho, porta=self.porta)
+        self.configurar_servidor(self.servidor)
+        self.servidor.iniciar()
+        self.clientes = []
+    
+    def configurar_servidor(self, servidor):
+        pass
+    
+    def tearDown(self):
+        for cliente in self.clientes:
+            cliente.fechar()
+        self.servidor.parar()
+        self.pasta.cleanup()
+    
+    def cliente(self, email="admin@sistema.local", senha=SENHA_ADMIN):
+        cliente = ClienteAPI(f"http://127.0.0.1:{self.porta}")
+        self.clientes.append(cliente)
+        if email:
+            self.assertIsNotNone(cliente.entrar(email, senha))
+        return cliente
+    
+    def ler_local(self, sql, params=()):
+        connection = sqlite3.connect(self.caminho)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+    
+    def nomes_territorios(self):
+        return {nome for (nome,) in self.ler_local("SELECT nome FROM territorios")}
+
+
+class TestModoCliente(ServidorTeste):
+    """DatabaseManager em modo cliente e o cache de leituras por ETag"""
+    
+    def test_ida_e_volta_pelo_db_manager(self):
+        db_manager = DatabaseManager(self.caminho, servidor=f"http://127.0.0.1:{self.porta}")
+        try:
+            self.assertTrue(db_manager.setup_database())
+            usuario = ServicoAutenticacao(db_manager).entrar_no_servidor("admin@sistema.local", SENHA_ADMIN)
+            self.assertEqual(usuario.nivel_permissao, Usuario.NIVEL_ADMIN)
+            self.assertIsNone(usuario.senha_hash)
+            
+            territorio = Territorio(nome="Pelo Servidor")
+            self.assertTrue(territorio.save(db_manager))
+            self.assertIn("Pelo Servidor", self.nomes_territorios())
+            self.assertEqual(Territorio.get_by_id(db_manager, territorio.id).nome, "Pelo Servidor")
+            
+            # SQL fora do registro não chega ao servidor
+            self.assertIsNone(db_manager.execute("SELECT * FROM usuarios"))
+            
+            # Gravação desfeita não fica no banco
+            self.assertIsNotNone(db_manager.executar_consulta('territorios.inserir', ("Desfeito", None, None)))
+            db_manager.rollback()
+            self.assertNotIn("Desfeito", self.nomes_territorios())
+        finally:
+            db_manager.close()
+    
+    def test_leitura_repetida_revalida_com_304(self):
+        cliente = self.cliente()
+        primeira = [linha['nome'] for linha in cliente.executar('territorios.todos').fetchall()]
+        segunda = [linha['nome'] for linha in cliente.executar('territorios.todos').fetchall()]
+        self.assertEqual(cliente.revalidacoes, 1)
+        self.assertEqual(primeira, segunda)
+        
+        # Uma gravação de outro cliente muda a versão dos dados: a leitura é refeita
+        outro = self.cliente()
+        outro.executar('territorios.inserir', ("Novo", None, None))
+        outro.commit()
+        terceira = [linha['nome'] for linha in cliente.executar('territorios.todos').fetchall()]
+        self.assertEqual(cliente.revalidacoes, 1)
+        self.assertIn("Novo", terceira)
+    
+    def test_fila_de_escrita_espera_a_transacao_aberta(self):
+        primeiro, segundo = self.cliente(), self.cliente()
+        primeiro.executar('territorios.inserir', ("Do Primeiro", None, None))
+        self.assertTrue(primeiro.em_transacao)
+        
+        def gravar():
+            segundo.executar('territorios.inserir', ("Do Segundo", None, None))
+            segundo.commit()
+        
+        thread = threading.Thread(target=gravar)
+        thread.start()
+        thread.join(0.5)
+        self.assertTrue(thread.is_alive())  # Espera o commit do primeiro
+        
+        primeiro.commit()
+        thread.join(5.0)
+        self.assertFalse(thread.is_alive())
+        self.assertLessEqual({"Do Primeiro", "Do Segundo"}, self.nomes_territorios())
+
+
+class TestTransacaoAbandonada(ServidorTeste):
+    """Transação sem atividade além de TEMPO_TRANSACAO é desfeita e libera a fila"""
+    
+    def configurar_servidor(self, servidor):
+        servidor.TEMPO_TRANSACAO = 0.5
+    
+    def test_transacao_abandonada_e_desfeita(self):
+        abandonada, seguinte = self.cliente(), self.cliente()
+        abandonada.executar('territorios.inserir', ("Abandonado", None, None))
+        
+        inicio = time.monotonic()
+        seguinte.executar('territorios.inserir', ("Seguinte", None, None))
+        seguinte.commit()
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.4)
+        
+        nomes = self.nomes_territorios()
+        self.assertIn("Seguinte", nomes)
+        self.assertNotIn("Abandonado", nomes)
+
+
+class TestAutorizacao(ServidorTeste):
+    """Cada requisição é do usuário logado e autorizada pelo nível dele"""
+    
+    def test_sem_login_so_o_estado_responde(self):
+        cliente = self.cliente(email=None)
+        self.assertIn('versao', cliente.estado())
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('territorios.todos')
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('territorios.inserir', ("Sem login", None, None))
+    
+    def test_senha_errada_nao_abre_sessao(self):
+        cliente = self.cliente(email=None)
+        self.assertIsNone(cliente.entrar("admin@sistema.local", "errada"))
+        self.assertIsNone(cliente.token_usuario)
+    
+    def test_hash_da_senha_nao_sai_do_servidor(self):
+        cliente = self.cliente()
+        linhas = cliente.executar('usuarios.todos').fetchall()
+        self.assertGreaterEqual(len(linhas), 2)
+        self.assertTrue(all(linha['senha_hash'] is None for linha in linhas))
+    
+    def test_usuario_basico_nao_altera_outros_usuarios(self):
+        cliente = self.cliente("basico@teste.local", "senha123")
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('usuarios.atualizar', ["Admin", "admin@sistema.local", None,
+                                                    Usuario.NIVEL_ADMIN, 1, self.admin_id])
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('usuarios.inserir', ["Novo", "novo@teste.local", None, Usuario.NIVEL_ADMIN, 1])
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('usuarios.excluir', [self.admin_id])
+        # Nem se promover
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.executar('usuarios.atualizar', ["Básico", "basico@teste.local", None,
+                                                    Usuario.NIVEL_ADMIN, 1, self.basico_id])
+        
+        # O próprio cadastro pode; sem hash, a senha continua a mesma
+        cliente.executar('usuarios.atualizar', ["Outro Nome", "basico@teste.local", None,
+                                                Usuario.NIVEL_BASICO, 1, self.basico_id])
+        cliente.commit()
+        nome, nivel, senha_hash = self.ler_local(
+            "SELECT nome, nivel_permissao, senha_hash FROM usuarios WHERE id = ?", (self.basico_id,)
+        )[0]
+        self.assertEqual((nome, nivel), ("Outro Nome", Usuario.NIVEL_BASICO))
+        self.assertTrue(Usuario(senha_hash=senha_hash).verificar_senha("senha123"))
+    
+    def test_desfazer_exige_gestor(self):
+        cliente = self.cliente("basico@teste.local", "senha123")
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.operar('historico.desfazer', {'usuario_id': self.admin_id, 'sessao': cliente.sessao})
+    
+    def test_sessao_encerrada_e_usuario_desativado_perdem_o_acesso(self):
+        cliente = self.cliente("basico@teste.local", "senha123")
+        cliente.executar('territorios.todos')
+        
+        admin = self.cliente()
+        admin.executar('usuarios.atualizar', ["Básico", "basico@teste.local", None,
+                                              Usuario.NIVEL_BASICO, 0, self.basico_id])
+        admin.commit()
+        with self.assertRaises(sqlite3.DatabaseError):
+            cliente.consultar_lote([('territorios.por_id', (1,))])[0].fetchall()
+        
+        admin.sair()
+        with self.assertRaises(sqlite3.DatabaseError):
+            admin.executar('territorios.todos')
+
+
+if __name__ == '__main__':
+    unittest.main()
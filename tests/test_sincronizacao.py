@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from database.db_manager import DatabaseManager
+from database.sincronizacao import (PacoteNaoAutorizado, ServidorSincronizacao, Sincronizador,
+                                    designacao_prevalece, resolver_conflito)
+
+
+def _alteracao(data_hora, dados):
+    return {'data_hora': data_hora, 'dados': dados}
+
+
+class TestResolverConflito(unittest.TestCase):
+    """Regras de conflito entre alterações concorrentes da mesma linha"""
+    
+    def test_prevalece_a_mais_recente(self):
+        antiga = _alteracao('2024-01-01 10:00:00.000', {'nome': 'A'})
+        recente = _alteracao('2024-01-01 10:00:00.001', {'nome': 'B'})
+        self.assertEqual(resolver_conflito('territorios', antiga, recente), 'remota')
+        self.assertEqual(resolver_conflito('territorios', recente, antiga), 'local')
+    
+    def test_exclusao_mais_recente_prevalece_fora_dos_atendimentos(self):
+        edicao = _alteracao('2024-01-01 10:00:00', {'nome': 'A'})
+        exclusao = _alteracao('2024-01-02 10:00:00', None)
+        self.assertEqual(resolver_conflito('territorios', edicao, exclusao), 'remota')
+    
+    def test_mesmo_horario_decide_igual_nos_dois_dispositivos(self):
+        a = _alteracao('2024-01-01 10:00:00', {'nome': 'A'})
+        b = _alteracao('2024-01-01 10:00:00', {'nome': 'B'})
+        # Vista de cada lado, a alteração escolhida é a mesma
+        vencedora_aqui = a if resolver_conflito('territorios', a, b) == 'local' else b
+        vencedora_la = b if resolver_conflito('territorios', b, a) == 'local' else a
+        self.assertIs(vencedora_aqui, vencedora_la)
+    
+    def test_devolucao_prevalece_sobre_designacao_ativa_mais_recente(self):
+        concluida = _alteracao('2024-01-01 10:00:00', {'status': 'concluido'})
+        ativa = _alteracao('2024-01-05 10:00:00', {'status': 'ativo'})
+        for tabela in ('designacoes', 'designacoes_predios_vilas'):
+            self.assertEqual(resolver_conflito(tabela, concluida, ativa), 'local')
+            self.assertEqual(resolver_conflito(tabela, ativa, concluida), 'remota')
+    
+    def test_devolucao_prevalece_sobre_exclusao_da_designacao(self):
+        concluida = _alteracao('2024-01-01 10:00:00', {'status': 'concluido'})
+        excluida = _alteracao('2024-01-05 10:00:00', None)
+        self.assertEqual(resolver_conflito('designacoes', excluida, concluida), 'remota')
+    
+    def test_atendimento_editado_prevalece_sobre_exclusao(self):
+        editado = _alteracao('2024-01-01 10:00:00', {'resultado': 'atendido'})
+        excluido = _alteracao('2024-01-05 10:00:00', None)
+        self.assertEqual(resolver_conflito('atendimentos', editado, excluido), 'local')
+        self.assertEqual(resolver_conflito('atendimentos', excluido, editado), 'remota')
+    
+    def test_designacao_ativa_mais_antiga_prevalece(self):
+        antiga = {'data_designacao': '2024-03-01', 'gid': 'f'}
+        nova = {'data_designacao': '2024-03-02', 'gid': 'a'}
+        self.assertEqual(designacao_prevalece(antiga, nova), 'local')
+        self.assertEqual(designacao_prevalece(nova, antiga), 'remota')
+        # No mesmo dia decide o gid, igual nos dois dispositivos
+        a = {'data_designacao': '2024-03-01', 'gid': 'a'}
+        b = {'data_designacao': '2024-03-01', 'gid': 'b'}
+        self.assertEqual(designacao_prevalece(a, b), 'local')
+        self.assertEqual(designacao_prevalece(b, a), 'remota')
+
+
+class TestSincronizacao(unittest.TestCase):
+    """Troca de pacotes entre o computador central e uma cópia de campo"""
+    
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho_central = os.path.join(self.pasta.name, 'central.db')
+        self.caminho_campo = os.path.join(self.pasta.name, 'campo.db')
+        
+        db_manager = DatabaseManager(self.caminho_central)
+        db_manager.setup_database()
+        db_manager.close()
+        self.territorio_id = self._executar(
+            self.caminho_central, "INSERT INTO territorios (nome) VALUES ('Território Teste')"
+        )
+        self.saida_id = self._executar(
+            self.caminho_central,
+            "INSERT INTO saidas_campo (nome, data, dia_semana, horario) "
+            "VALUES ('Saída', '2024-03-01', 'Sexta', '09:00')"
+        )
+        
+        self.central = Sincronizador(self.caminho_central)
+        self.id_campo = self.central.criar_copia_campo(self.caminho_campo, 'Campo')
+        self.campo = Sincronizador(self.caminho_campo)
+        self.id_central = self.central.identidade()['id']
+    
+    def tearDown(self):
+        self.pasta.cleanup()
+    
+    @staticmethod
+    def _executar(caminho, sql, params=()):
+        connection = sqlite3.connect(caminho)
+        try:
+            cursor = connection.execute(sql, params)
+            connection.commit()
+        finally:
+            connection.close()
+        time.sleep(0.01)  # Horários de alteração distintos (resolução de milissegundos)
+        return cursor.lastrowid
+    
+    def _renomear(self, caminho, nome):
+        self._executar(caminho, "UPDATE territorios SET nome = ? WHERE id = ?", (nome, self.territorio_id))
+    
+    def _nome_territorio(self, caminho):
+        connection = sqlite3.connect(caminho)
+        try:
+            return connection.execute(
+                "SELECT nome FROM territorios WHERE id = ?", (self.territorio_id,)
+            ).fetchone()[0]
+        finally:
+            connection.close()
+    
+    def _trocar(self):
+        """Campo envia primeiro; o central responde com o que tem de novo"""
+        resumo_central = self.central.importar_pacote(self.campo.gerar_pacote(self.id_central))
+        resumo_campo = self.campo.importar_pacote(self.central.gerar_pacote(self.id_campo))
+        return resumo_central, resumo_campo
+    
+    def test_alteracao_do_campo_chega_ao_central(self):
+        self._renomear(self.caminho_campo, 'Nome do Campo')
+        resumo_central, _ = self._trocar()
+        self.assertEqual(resumo_central['aplicadas'], 1)
+        self.assertEqual(self._nome_territorio(self.caminho_central), 'Nome do Campo')
+    
+    def test_conflito_converge_para_a_alteracao_mais_recente(self):
+        self._renomear(self.caminho_campo, 'Nome do Campo')
+        self._renomear(self.caminho_central, 'Nome do Central')
+        resumo_central, _ = self._trocar()
+        self.assertEqual(resumo_central['conflitos'], 1)
+        self.assertEqual(self._nome_territorio(self.caminho_central), 'Nome do Central')
+        self.assertEqual(self._nome_territorio(self.caminho_campo), 'Nome do Central')
+        self.assertEqual(self.central.listar_conflitos()[0]['resolucao'], 'mantida_local')
+    
+    def test_pacote_repetido_nao_desfaz_alteracao_mais_nova(self):
+        self._renomear(self.caminho_campo, 'v1')
+        pacote_antigo = self.campo.gerar_pacote(self.id_central)
+        self.assertEqual(self.central.importar_pacote(pacote_antigo)['aplicadas'], 1)
+        
+        # v2 feita no central chega ao campo, e o campo confirma o recebimento
+        self._renomear(self.caminho_central, 'v2')
+        self.campo.importar_pacote(self.central.gerar_pacote(self.id_campo))
+        self.central.importar_pacote(self.campo.gerar_pacote(self.id_central))
+        
+        resumo = self.central.importar_pacote(pacote_antigo)
+        self.assertEqual(resumo['aplicadas'], 0)
+        self.assertEqual(resumo['ignoradas'], 1)
+        self.assertEqual(self._nome_territorio(self.caminho_central), 'v2')
+        self.assertEqual(self._nome_territorio(self.caminho_campo), 'v2')
+    
+    def _designar(self, caminho, data):
+        self._executar(
+            caminho,
+            "INSERT INTO designacoes (territorio_id, saida_campo_id, data_designacao, responsavel) "
+            "VALUES (?, ?, ?, ?)",
+            (self.territorio_id, self.saida_id, data, caminho)
+        )
+    
+    def _designacoes_ativas(self, caminho):
+        connection = sqlite3.connect(caminho)
+        try:
+            return connection.execute(
+                "SELECT gid, data_designacao FROM designacoes WHERE territorio_id = ? AND status = 'ativo'",
+                (self.territorio_id,)
+            ).fetchall()
+        finally:
+            connection.close()
+    
+    def test_mesmo_territorio_designado_nos_dois_dispositivos(self):
+        for data_campo in ('2024-03-02', '2024-02-28'):
+            with self.subTest(data_campo=data_campo):
+                self._executar(self.caminho_central, "DELETE FROM designacoes")
+                self._trocar()
+                self._designar(self.caminho_central, '2024-03-01')
+                self._designar(self.caminho_campo, data_campo)
+                self._trocar()
+                
+                # Fica ativa a mesma designação (a mais antiga) nos dois lados
+                ativas_central = self._designacoes_ativas(self.caminho_central)
+                self.assertEqual(len(ativas_central), 1)
+                self.assertEqual(ativas_central, self._designacoes_ativas(self.caminho_campo))
+                self.assertEqual(ativas_central[0][1], min('2024-03-01', data_campo))
+                self.assertTrue(any(c['tabela'] == 'designacoes' and c['resolucao'].startswith('designacao_ativa')
+                                    for c in self.central.listar_conflitos()))
+                
+                # A troca seguinte não reabre o conflito
+                resumo_central, resumo_campo = self._trocar()
+                self.assertEqual(resumo_central['conflitos'] + resumo_campo['conflitos'], 0)
+                self.assertEqual(ativas_central, self._designacoes_ativas(self.caminho_campo))
+    
+    def test_servidor_na_rede_exige_chave(self):
+        with self.assertRaises(ValueError):
+            ServidorSincronizacao(self.caminho_central, endereco='0.0.0.0')
+        self.assertEqual(ServidorSincronizacao(self.caminho_central).endereco, '127.0.0.1')
+        ServidorSincronizacao(self.caminho_central, endereco='0.0.0.0', chave='segredo')
+    
+    def test_pacote_sem_assinatura_valida_e_recusado(self):
+        self._renomear(self.caminho_campo, 'Nome do Campo')
+        pacote = self.campo.gerar_pacote(self.id_central)
+        pacote['assinatura'] = '0' * 64
+        with self.assertRaises(PacoteNaoAutorizado):
+            self.central.importar_pacote(pacote)
+        self.assertEqual(self._nome_territorio(self.caminho_central), 'Território Teste')
+    
+    def test_dispositivo_nao_pareado_e_recusado(self):
+        pacote = self.campo.gerar_pacote(self.id_central)
+        pacote['origem'] = 'dispositivo-desconhecido'
+        with self.assertRaises(PacoteNaoAutorizado):
+            self.central.importar_pacote(pacote)
+        self.assertNotIn('dispositivo-desconhecido', [p['par'] for p in self.central.listar_pares()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+from datetime import datetime, timedelta
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from models import designacao
+from models.notificacao_manager import NotificacaoManager
+
+class AgendadorNotificacoes(QObject):
+    """Gera os alertas de vencimento no momento em que o prazo entra na janela de alerta
+    
+    Mantém um heap com o instante de alerta de cada designação ativa
+    (data_devolucao - DIAS_ALERTA) e programa um único timer para o próximo.
+    Quando uma designação é criada, alterada ou excluída, o plano é refeito.
+    """
+    
+    notificacoes_verificadas = Signal()  # Emitido após gerar os alertas vencidos
+    
+    DIAS_ALERTA = 5  # Mesmo prazo usado pelo NotificacaoManager
+    
+    # Replaneja periodicamente mesmo sem alertas, para perceber alterações
+    # feitas por outro computador no mesmo banco
+    INTERVALO_MAXIMO_MS = 6 * 60 * 60 * 1000
+    
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.prazos = []      # heap de (instante_alerta, entidade, id, data_devolucao)
+        self.avisados = set() # (entidade, id, data_devolucao) já verificados nesta sessão
+        
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.replanejar)
+    
+    def iniciar(self):
+        """Planeja os alertas e passa a acompanhar as alterações de designações"""
+        designacao.registrar_ouvinte(self.alteracao_designacao)
+        self.replanejar()
+    
+    def parar(self):
+        """Para o timer e deixa de acompanhar as alterações"""
+        designacao.remover_ouvinte(self.alteracao_designacao)
+        self.timer.stop()
+    
+    def alteracao_designacao(self):
+        """Agenda um novo plano (várias alterações seguidas geram um só)"""
+        self.timer.start(0)
+    
+    def replanejar(self):
+        """Recarrega os prazos das designações ativas e programa o próximo alerta"""
+        hoje = datetime.now().strftime('%Y-%m-%d')
+        cursor = self.db_manager.executar_consulta('designacoes.prazos_ativos', (hoje, hoje))
+        
+        prazos = []
+        if cursor:
+            for row in cursor.fetchall():
+                try:
+                    devolucao = datetime.strptime(row['data_devolucao'], '%Y-%m-%d')
+                except (TypeError, ValueError):
+                    continue
+                instante = devolucao - timedelta(days=self.DIAS_ALERTA)
+                prazos.append((instante, row['entidade'], row['id'], row['data_devolucao']))
+        heapq.heapify(prazos)
+        self.prazos = prazos
+        
+        self.processar_vencidos()
+    
+    def processar_vencidos(self):
+        """Gera os alertas cujo instante já chegou e programa o timer para o próximo"""
+        agora = datetime.now()
+        novos = False
+        while self.prazos and self.prazos[0][0] <= agora:
+            _, entidade, designacao_id, data_devolucao = heapq.heappop(self.prazos)
+            chave = (entidade, designacao_id, data_devolucao)
+            if chave not in self.avisados:
+                self.avisados.add(chave)
+                novos = True
+        
+        if novos:
+            NotificacaoManager.verificar_todas_notificacoes(self.db_manager)
+            self.notificacoes_verificadas.emit()
+        
+        intervalo = self.INTERVALO_MAXIMO_MS
+        if self.prazos:
+            restante = (self.prazos[0][0] - agora).total_seconds() * 1000
+            intervalo = max(1000, min(int(restante), self.INTERVALO_MAXIMO_MS))
+        self.timer.start(intervalo)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+
+# Versão do layout do cartão (alterar invalida o cache de cartões já gerados)
+LAYOUT_VERSAO = 1
+
+FORMATO_PDF = "pdf"
+FORMATO_PNG = "png"
+FORMATOS = (FORMATO_PDF, FORMATO_PNG)
+
+# Arquivo de cache com o hash do conteúdo de cada cartão gerado
+CACHE_ARQUIVO = ".cartoes_cache.json"
+
+# Dimensões do cartão PNG (A6 paisagem a 300 dpi)
+_PNG_LARGURA = 1748
+_PNG_ALTURA = 1240
+_PNG_DPI = 300
+
+
+def _consultar(db_manager, consulta: str, territorio_ids: Optional[List[int]]) -> List[Dict[str, Any]]:
+    """Executa um comando do registro para todos os territórios ou apenas para os IDs informados"""
+    ids = None if territorio_ids is None else json.dumps(territorio_ids)
+    cursor = db_manager.executar_consulta(consulta, {'ids': ids})
+    if cursor:
+        return [dict(row) for row in cursor.fetchall()]
+    return []
+
+
+def coletar_dados_cartoes(db_manager, territorio_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Obtém em lote os dados de todos os cartões (territórios, ruas, imóveis e última designação)"""
+    if territorio_ids is not None:
+        territorio_ids = sorted(set(territorio_ids))
+        if not territorio_ids:
+            return []
+
+    territorios = _consultar(db_manager, 'territorios.para_cartoes', territorio_ids)
+    ruas = _consultar(db_manager, 'ruas.para_cartoes', territorio_ids)
+    imoveis = _consultar(db_manager, 'imoveis.para_cartoes', territorio_ids)
+    designacoes = _consultar(db_manager, 'designacoes.para_cartoes', territorio_ids)
+
+    # Agrupa imóveis por rua
+    imoveis_por_rua = {}
+    for imovel in imoveis:
+        imoveis_por_rua.setdefault(imovel['rua_id'], []).append(imovel)
+
+    # Agrupa ruas por território
+    ruas_por_territorio = {}
+    for rua in ruas:
+        rua['imoveis'] = imoveis_por_rua.get(rua['id'], [])
+        ruas_por_territorio.setdefault(rua['territorio_id'], []).append(rua)
+
+    # Mantém apenas a designação mais recente de cada território
+    ultima_designacao = {}
+    for designacao in designacoes:
+        ultima_designacao.setdefault(designacao['territorio_id'], designacao)
+
+    cartoes = []
+    for territorio in territorios:
+        territorio['ruas'] = ruas_por_territorio.get(territorio['id'], [])
+        territorio['ultima_designacao'] = ultima_designacao.get(territorio['id'])
+        cartoes.append(territorio)
+    return cartoes
+
+
+def hash_cartao(dados: Dict[str, Any], formato: str) -> str:
+    """Calcula o hash do conteúdo de um cartão"""
+    conteudo = json.dumps(
+        {'layout': LAYOUT_VERSAO, 'formato': formato, 'dados': dados},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def nome_arquivo_cartao(territorio_id: int, formato: str) -> str:
+    """Nome do arquivo do cartão de um território"""
+    return f"cartao_territorio_{territorio_id}.{formato}"
+
+
+def _formatar_data(data: Optional[str]) -> str:
+    """Formata uma data ISO (AAAA-MM-DD) para DD/MM/AAAA"""
+    if not data:
+        return "-"
+    try:
+        return datetime.strptime(data[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return data
+
+
+def _descrever_imovel(imovel: Dict[str, Any]) -> str:
+    """Texto curto de um imóvel para o cartão"""
+    if imovel['tipo'] in ('predio', 'prédio', 'vila'):
+        tipo = "Vila" if imovel['tipo'] == 'vila' else "Prédio"
+        return f"{imovel['numero']} ({imovel['nome'] or tipo})"
+    if imovel['tipo'] == 'comercial':
+        return f"{imovel['numero']} (C)"
+    return imovel['numero']
+
+
+def _linhas_cartao(dados: Dict[str, Any]) -> List[str]:
+    """Monta as linhas de texto do corpo do cartão"""
+    linhas = []
+    for rua in dados['ruas']:
+        numeros = ", ".join(_descrever_imovel(i) for i in rua['imoveis'])
+        linhas.append(f"{rua['nome']}: {numeros}" if numeros else rua['nome'])
+    if not linhas:
+        linhas.append("Nenhuma rua cadastrada.")
+    return linhas
+
+
+# Aplicação Qt do processo de renderização (uma por processo de trabalho)
+_app = None
+
+
+def _inicializar_worker():
+    """Prepara o processo de trabalho para renderizar com Qt sem janela"""
+    global _app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtGui import QGuiApplication
+    if QGuiApplication.instance() is None:
+        _app = QGuiApplication([])
+
+
+def _desenhar_cartao(painter, largura: int, altura: int, dados: Dict[str, Any]) -> None:
+    """Desenha o conteúdo do cartão no painter informado"""
+    from PySide6.QtCore import Qt, QRect
+    from PySide6.QtGui import QFont, QPen, QColor, QFontMetrics
+
+    margem = int(largura * 0.04)
+    area = QRect(margem, margem, largura - 2 * margem, altura - 2 * margem)
+
+    # Moldura
+    painter.setPen(QPen(QColor("#333333"), max(1, largura // 400)))
+    painter.drawRect(area)
+    interno = area.adjusted(margem // 2, margem // 2, -margem // 2, -margem // 2)
+
+    # Cabeçalho
+    fonte_titulo = QFont("Sans Serif")
+    fonte_titulo.setPixelSize(max(10, altura // 14))
+    fonte_titulo.setBold(True)
+    painter.setFont(fonte_titulo)
+    altura_titulo = QFontMetrics(fonte_titulo).height()
+    painter.drawText(
+        QRect(interno.left(), interno.top(), interno.width(), altura_titulo),
+        Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+        dados['nome']
+    )
+    y = interno.top() + altura_titulo
+
+    fonte_texto = QFont("Sans Serif")
+    fonte_texto.setPixelSize(max(8, altura // 30))
+    painter.setFont(fonte_texto)
+    metricas = QFontMetrics(fonte_texto)
+    altura_linha = metricas.height()
+
+    if dados.get('descricao'):
+        painter.drawText(
+            QRect(interno.left(), y, interno.width(), altura_linha),
+            Qt.AlignmentFlag.AlignLeft, dados['descricao']
+        )
+        y += altura_linha
+
+    # Última designação
+    designacao = dados.get('ultima_designacao')
+    if designacao:
+        status = "Ativa" if designacao['status'] == 'ativo' else "Concluída"
+        texto_designacao = (
+            f"Última designação: {_formatar_data(designacao['data_designacao'])} a "
+            f"{_formatar_data(designacao['data_devolucao'])} - {designacao['saida_campo_nome']}"
+            f"{' - ' + designacao['responsavel'] if designacao['responsavel'] else ''} ({status})"
+        )
+    else:
+        texto_designacao = "Última designação: nenhuma"
+    painter.drawText(
+        QRect(interno.left(), y, interno.width(), altura_linha),
+        Qt.AlignmentFlag.AlignLeft, texto_designacao
+    )
+    y += altura_linha
+    painter.drawText(
+        QRect(interno.left(), y, interno.width(), altura_linha),
+        Qt.AlignmentFlag.AlignLeft,
+        f"Última visita: {_formatar_data(dados.get('ultima_visita'))}"
+    )
+    y += altura_linha + altura_linha // 2
+
+    painter.drawLine(interno.left(), y, interno.right(), y)
+    y += altura_linha // 2
+
+    # Ruas e imóveis, com quebra de linha e corte ao atingir o fim do cartão
+    flags = Qt.AlignmentFlag.AlignLeft | Qt.TextFlag.TextWordWrap
+    for linha in _linhas_cartao(dados):
+        retangulo = metricas.boundingRect(
+            QRect(interno.left(), 0, interno.width(), altura), int(flags), linha
+        )
+        if y + retangulo.height() > interno.bottom():
+            painter.drawText(
+                QRect(interno.left(), y, interno.width(), altura_linha),
+                Qt.AlignmentFlag.AlignLeft, "..."
+            )
+            break
+        painter.drawText(
+            QRect(interno.left(), y, interno.width(), retangulo.height()), flags, linha
+        )
+        y += retangulo.height()
+
+
+def _renderizar_cartao(dados: Dict[str, Any], caminho: str, formato: str) -> str:
+    """Renderiza um único cartão em PDF ou PNG (executado nos processos de trabalho)"""
+    _inicializar_worker()
+    from PySide6.QtCore import QMarginsF
+    from PySide6.QtGui import QPainter, QPdfWriter, QPageSize, QPageLayout, QImage, QColor
+
+    painter = QPainter()
+    if formato == FORMATO_PDF:
+        writer = QPdfWriter(caminho)
+        writer.setResolution(_PNG_DPI)
+        writer.setPageSize(QPageSize(QPageSize.PageSizeId.A6))
+        writer.setPageOrientation(QPageLayout.Orientation.Landscape)
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        writer.setTitle(f"Cartão de Território - {dados['nome']}")
+        painter.begin(writer)
+        _desenhar_cartao(painter, writer.width(), writer.height(), dados)
+        painter.end()
+    else:
+        imagem = QImage(_PNG_LARGURA, _PNG_ALTURA, QImage.Format.Format_RGB32)
+        imagem.fill(QColor("white"))
+        dpm = int(_PNG_DPI / 0.0254)
+        imagem.setDotsPerMeterX(dpm)
+        imagem.setDotsPerMeterY(dpm)
+        painter.begin(imagem)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        _desenhar_cartao(painter, _PNG_LARGURA, _PNG_ALTURA, dados)
+        painter.end()
+        if not imagem.save(caminho, "PNG"):
+            raise IOError(f"Não foi possível salvar {caminho}")
+    return caminho
+
+
+class GeradorCartoes:
+    """Gera cartões de território para impressão em lote"""
+
+    def __init__(self, db_manager, pasta_saida: str):
+        self.db_manager = db_manager
+        self.pasta_saida = pasta_saida
+        self.cache_path = os.path.join(pasta_saida, CACHE_ARQUIVO)
+
+    def _carregar_cache(self) -> Dict[str, str]:
+        """Carrega o cache de hashes dos cartões já gerados"""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _salvar_cache(self, cache: Dict[str, str]) -> None:
+        """Salva o cache de hashes dos cartões gerados"""
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, indent=1, sort_keys=True)
+        except OSError as e:
+            print(f"Erro ao salvar cache de cartões: {e}")
+
+    def gerar(self, territorio_ids: Optional[List[int]] = None, formato: str = FORMATO_PDF,
+              max_workers: int = None, forcar: bool = False) -> Dict[str, List]:
+        """Gera os cartões de todos os territórios ou dos IDs informados
+
+        Cartões cujo conteúdo não mudou desde a última geração são ignorados,
+        a menos que forcar seja True.
+        """
+        return self.renderizar(self.preparar(territorio_ids, formato, forcar), max_workers)
+
+    def preparar(self, territorio_ids: Optional[List[int]] = None, formato: str = FORMATO_PDF,
+                 forcar: bool = False) -> Dict[str, Any]:
+        """Lê os dados dos cartões e separa os que precisam ser renderizados
+
+        Acessa o banco: deve rodar na thread do DatabaseManager. O resultado
+        vai para renderizar, que pode rodar em segundo plano.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de cartão inválido: {formato}")
+
+        resultado = {'gerados': [], 'ignorados': [], 'erros': []}
+        cache = self._carregar_cache()
+        pendentes = []
+        for dados in coletar_dados_cartoes(self.db_manager, territorio_ids):
+            nome_arquivo = nome_arquivo_cartao(dados['id'], formato)
+            caminho = os.path.join(self.pasta_saida, nome_arquivo)
+            hash_atual = hash_cartao(dados, formato)
+            if not forcar and cache.get(nome_arquivo) == hash_atual and os.path.exists(caminho):
+                resultado['ignorados'].append(caminho)
+                continue
+            pendentes.append((dados, caminho, nome_arquivo, hash_atual))
+        return {'formato': formato, 'cache': cache, 'pendentes': pendentes, 'resultado': resultado}
+
+    def renderizar(self, preparo: Dict[str, Any], max_workers: int = None) -> Dict[str, List]:
+        """Renderiza os cartões pendentes de preparar e atualiza o cache (não acessa o banco)"""
+        formato, cache, pendentes, resultado = (
+            preparo['formato'], preparo['cache'], preparo['pendentes'], preparo['resultado']
+        )
+        if not pendentes:
+            return resultado
+
+        os.makedirs(self.pasta_saida, exist_ok=True)
+        if len(pendentes) == 1 or max_workers == 1:
+            # Poucos cartões: renderiza no próprio processo
+            for dados, caminho, nome_arquivo, hash_atual in pendentes:
+                try:
+                    _renderizar_cartao(dados, caminho, formato)
+                    cache[nome_arquivo] = hash_atual
+                    resultado['gerados'].append(caminho)
+                except Exception as e:
+                    print(f"Erro ao gerar cartão {caminho}: {e}")
+                    resultado['erros'].append(caminho)
+        else:
+            # spawn: um processo criado por fork herdaria a QApplication da interface
+            # e não criaria a sua própria aplicação sem janela
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_inicializar_worker) as executor:
+                futuros = {
+                    executor.submit(_renderizar_cartao, dados, caminho, formato): (caminho, nome_arquivo, hash_atual)
+                    for dados, caminho, nome_arquivo, hash_atual in pendentes
+                }
+                for futuro in as_completed(futuros):
+                    caminho, nome_arquivo, hash_atual = futuros[futuro]
+                    try:
+                        futuro.result()
+                        cache[nome_arquivo] = hash_atual
+                        resultado['gerados'].append(caminho)
+                    except Exception as e:
+                        print(f"Erro ao gerar cartão {caminho}: {e}")
+                        resultado['erros'].append(caminho)
+
+        self._salvar_cache(cache)
+        return resultado
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+class SinaisTarefa(QObject):
+    """Sinais emitidos por uma tarefa em segundo plano"""
+
+    concluido = Signal(object)  # Resultado da função
+    falhou = Signal(str)        # Mensagem de erro
+
+
+class TarefaSegundoPlano(QRunnable):
+    """Executa uma função fora da thread da interface
+
+    A função não deve acessar o DatabaseManager: a conexão SQLite pertence à
+    thread que a criou.
+    """
+
+    def __init__(self, funcao, *args, **kwargs):
+        super().__init__()
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.sinais = SinaisTarefa()
+
+    def run(self):
+        """Executa a função e emite o resultado"""
+        try:
+            resultado = self.funcao(*self.args, **self.kwargs)
+        except Exception as e:
+            self.sinais.falhou.emit(str(e))
+            return
+        self.sinais.concluido.emit(resultado)
+
+
+def executar_em_segundo_plano(funcao, *args, ao_concluir=None, ao_falhar=None, **kwargs) -> TarefaSegundoPlano:
+    """Agenda uma função no pool de threads global do Qt"""
+    tarefa = TarefaSegundoPlano(funcao, *args, **kwargs)
+    if ao_concluir:
+        tarefa.sinais.concluido.connect(ao_concluir)
+    if ao_falhar:
+        tarefa.sinais.falhou.connect(ao_falhar)
+    QThreadPool.globalInstance().start(tarefa)
+    return tarefa
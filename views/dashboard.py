@@ -191,18 +191,13 @@ class DashboardWidget(QWidget):
         self.territorios_card.value_label.setText(str(len(territorios)))
         self.territorios_card.progress.setValue(100)
         
-        # Imóveis atendidos
-        cursor = self.db_manager.execute(
-            "SELECT COUNT(*) as total FROM imoveis WHERE tipo IN ('residencial', 'comercial')"
-        )
-        total_imoveis = cursor.fetchone()['total'] if cursor else 0
-        
-        cursor = self.db_manager.execute(
-            "SELECT COUNT(DISTINCT imovel_id) as atendidos FROM atendimentos "
-            "JOIN imoveis ON atendimentos.imovel_id = imoveis.id "
-            "WHERE imoveis.tipo IN ('residencial', 'comercial')"
-        )
-        imoveis_atendidos = cursor.fetchone()['atendidos'] if cursor else 0
+        # Imóveis atendidos (as duas contagens em um só lote)
+        resultados = self.db_manager.executar_lote([
+            ('imoveis.total_casas', None),
+            ('atendimentos.casas_atendidas', None),
+        ])
+        total_imoveis = resultados[0][0]['total'] if resultados else 0
+        imoveis_atendidos = resultados[1][0]['atendidos'] if resultados else 0
         
         self.imoveis_card.value_label.setText(f"{imoveis_atendidos}/{total_imoveis}")
         if total_imoveis > 0:
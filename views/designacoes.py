@@ -5,13 +5,14 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QLabel, QPushButton, QLineEdit, QComboBox,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QDialog, QFormLayout, QDateEdit,
-                             QTabWidget, QSplitter)
+                             QTabWidget, QSplitter, QCheckBox, QListWidget,
+                             QListWidgetItem)
 from PySide6.QtCore import Qt, Signal, Slot, QDate
 from PySide6.QtGui import QIcon, QFont, QColor
 
 from models.territorio import Territorio
 from models.designacao import Designacao, DesignacaoPredioVila
-from models.saida_campo import SaidaCampo
+from models.saida_campo import SaidaCampo, RegraSaidaCampo
 from models.imovel import Imovel
 
 from datetime import datetime, timedelta
@@ -24,9 +25,18 @@ class DesignacoesWidget(QWidget):
         self.db_manager = db_manager
         self.territorios = []
         self.saidas_campo = []
-        self.designacoes = []
+        self.dias_ocorrencias = 30  # Janela das ocorrências recorrentes oferecidas nos formulários
+        self.total_sugestoes = 5  # Territórios sugeridos no formulário de designação
         self.predios_vilas = []
-        self.designacoes_predios_vilas = []
+        
+        # Designações carregadas na tabela, por ID (páginas carregadas sob demanda)
+        self.designacoes = {}
+        self.designacoes_predios_vilas = {}
+        self.designacoes_por_pagina = 100
+        self.designacoes_cursor = None
+        self.designacoes_esgotadas = False
+        self.pv_designacoes_cursor = None
+        self.pv_designacoes_esgotadas = False
         
         self.init_ui()
         self.load_data()
@@ -63,6 +73,12 @@ class DesignacoesWidget(QWidget):
         self.territorio_select = QComboBox()
         form_layout.addRow("Território:", self.territorio_select)
         
+        # Sugestões de territórios para designar (clique para selecionar)
+        self.sugestoes_list = QListWidget()
+        self.sugestoes_list.setMaximumHeight(110)
+        self.sugestoes_list.itemClicked.connect(self.selecionar_sugestao)
+        form_layout.addRow("Sugestões:", self.sugestoes_list)
+        
         # Combobox de saídas de campo
         self.saida_campo_select = QComboBox()
         form_layout.addRow("Saída de Campo:", self.saida_campo_select)
@@ -95,6 +111,11 @@ class DesignacoesWidget(QWidget):
         # Tabela de designações
         territorios_layout.addWidget(QLabel("Designações Registradas"))
         
+        # Filtros (aplicados na consulta ao banco)
+        (filtros_layout, self.filtro_status, self.filtro_territorio, self.filtro_periodo,
+         self.filtro_data_inicio, self.filtro_data_fim) = self.criar_filtros(self.load_designacoes)
+        territorios_layout.addLayout(filtros_layout)
+        
         self.designacoes_table = QTableWidget(0, 7)  # ID, Território, Saída, Data Des., Data Dev., Responsável, Status
         self.designacoes_table.setHorizontalHeaderLabels([
             "ID", "Território", "Saída de Campo", "Data de Designação", 
@@ -106,6 +127,8 @@ class DesignacoesWidget(QWidget):
         self.designacoes_table.setColumnHidden(0, True)  # Esconder coluna ID
         self.designacoes_table.verticalHeader().setVisible(False)
         self.designacoes_table.itemSelectionChanged.connect(self.on_designacao_selection_changed)
+        # Carregar a próxima página ao chegar ao fim da tabela
+        self.designacoes_table.verticalScrollBar().valueChanged.connect(self.on_designacoes_scroll)
         territorios_layout.addWidget(self.designacoes_table)
         
         # Botões para gerenciar designações
@@ -132,6 +155,12 @@ class DesignacoesWidget(QWidget):
         self.excluir_designacao_button.clicked.connect(self.excluir_designacao)
         buttons_layout.addWidget(self.excluir_designacao_button)
         
+        buttons_layout.addStretch()
+        
+        self.mais_designacoes_button = QPushButton("Carregar Mais")
+        self.mais_designacoes_button.clicked.connect(self.load_more_designacoes)
+        buttons_layout.addWidget(self.mais_designacoes_button)
+        
         territorios_layout.addLayout(buttons_layout)
         
         # === Tab de Prédios e Vilas ===
@@ -177,6 +206,11 @@ class DesignacoesWidget(QWidget):
         # Tabela de designações de prédios/vilas
         predios_vilas_layout.addWidget(QLabel("Designações de Prédios/Vilas Registradas"))
         
+        # Filtros (aplicados na consulta ao banco)
+        (pv_filtros_layout, self.pv_filtro_status, self.pv_filtro_territorio, self.pv_filtro_periodo,
+         self.pv_filtro_data_inicio, self.pv_filtro_data_fim) = self.criar_filtros(self.load_pv_designacoes)
+        predios_vilas_layout.addLayout(pv_filtros_layout)
+        
         self.pv_designacoes_table = QTableWidget(0, 8)  # ID, Prédio/Vila, Tipo, Local, Saída, Resp., Data Des., Status
         self.pv_designacoes_table.setHorizontalHeaderLabels([
             "ID", "Prédio/Vila", "Tipo", "Localização", "Saída de Campo", 
@@ -196,6 +230,8 @@ class DesignacoesWidget(QWidget):
         self.pv_designacoes_table.setColumnHidden(0, True)  # Esconder coluna ID
         self.pv_designacoes_table.verticalHeader().setVisible(False)
         self.pv_designacoes_table.itemSelectionChanged.connect(self.on_pv_designacao_selection_changed)
+        # Carregar a próxima página ao chegar ao fim da tabela
+        self.pv_designacoes_table.verticalScrollBar().valueChanged.connect(self.on_pv_designacoes_scroll)
         predios_vilas_layout.addWidget(self.pv_designacoes_table)
         
         # Botões para gerenciar designações de prédios/vilas
@@ -222,8 +258,67 @@ class DesignacoesWidget(QWidget):
         self.pv_excluir_button.clicked.connect(self.excluir_pv_designacao)
         pv_buttons_layout.addWidget(self.pv_excluir_button)
         
+        pv_buttons_layout.addStretch()
+        
+        self.pv_mais_button = QPushButton("Carregar Mais")
+        self.pv_mais_button.clicked.connect(self.load_more_pv_designacoes)
+        pv_buttons_layout.addWidget(self.pv_mais_button)
+        
         predios_vilas_layout.addLayout(pv_buttons_layout)
     
+    def criar_filtros(self, ao_filtrar):
+        """Cria a linha de filtros (status, território e período) de uma tabela"""
+        filtros_layout = QHBoxLayout()
+        
+        filtros_layout.addWidget(QLabel("Status:"))
+        status_filter = QComboBox()
+        status_filter.addItem("Todos", None)
+        status_filter.addItem("Ativo", "ativo")
+        status_filter.addItem("Concluído", "concluido")
+        filtros_layout.addWidget(status_filter)
+        
+        filtros_layout.addWidget(QLabel("Território:"))
+        territorio_filter = QComboBox()
+        territorio_filter.addItem("Todos", None)
+        filtros_layout.addWidget(territorio_filter)
+        
+        periodo_check = QCheckBox("Designadas de:")
+        filtros_layout.addWidget(periodo_check)
+        data_inicio = QDateEdit(QDate.currentDate().addMonths(-3))
+        data_inicio.setCalendarPopup(True)
+        data_inicio.setDisplayFormat("dd/MM/yyyy")
+        data_inicio.setEnabled(False)
+        filtros_layout.addWidget(data_inicio)
+        
+        filtros_layout.addWidget(QLabel("até:"))
+        data_fim = QDateEdit(QDate.currentDate())
+        data_fim.setCalendarPopup(True)
+        data_fim.setDisplayFormat("dd/MM/yyyy")
+        data_fim.setEnabled(False)
+        filtros_layout.addWidget(data_fim)
+        
+        periodo_check.toggled.connect(data_inicio.setEnabled)
+        periodo_check.toggled.connect(data_fim.setEnabled)
+        
+        filtrar_button = QPushButton("Filtrar")
+        filtrar_button.clicked.connect(ao_filtrar)
+        filtros_layout.addWidget(filtrar_button)
+        filtros_layout.addStretch()
+        
+        return filtros_layout, status_filter, territorio_filter, periodo_check, data_inicio, data_fim
+    
+    @staticmethod
+    def valores_filtro(status_filter, territorio_filter, periodo_check, data_inicio, data_fim):
+        """Lê os filtros de uma tabela como argumentos para buscar()"""
+        filtros = {
+            'status': status_filter.currentData(),
+            'territorio_id': territorio_filter.currentData()
+        }
+        if periodo_check.isChecked():
+            filtros['data_inicio'] = data_inicio.date().toString("yyyy-MM-dd")
+            filtros['data_fim'] = data_fim.date().toString("yyyy-MM-dd")
+        return filtros
+    
     def load_data(self):
         """Carrega os dados necessários para a interface"""
         # Carregar territórios
@@ -232,6 +327,20 @@ class DesignacoesWidget(QWidget):
         for territorio in self.territorios:
             self.territorio_select.addItem(territorio.nome, territorio.id)
         
+        # Territórios nos filtros (mantendo a seleção atual)
+        for territorio_filter in (self.filtro_territorio, self.pv_filtro_territorio):
+            atual = territorio_filter.currentData()
+            territorio_filter.blockSignals(True)
+            territorio_filter.clear()
+            territorio_filter.addItem("Todos", None)
+            for territorio in self.territorios:
+                territorio_filter.addItem(territorio.nome, territorio.id)
+                if territorio.id == atual:
+                    territorio_filter.setCurrentIndex(territorio_filter.count() - 1)
+            territorio_filter.blockSignals(False)
+        
+        self.update_sugestoes()
+        
         # Carregar saídas de campo
         self.saidas_campo = SaidaCampo.get_all(self.db_manager)
         self.saida_campo_select.clear()
@@ -240,9 +349,16 @@ class DesignacoesWidget(QWidget):
             self.saida_campo_select.addItem(saida.nome, saida.id)
             self.pv_saida_campo_select.addItem(saida.nome, saida.id)
         
-        # Carregar designações
-        self.designacoes = Designacao.get_all(self.db_manager)
-        self.update_designacoes_table()
+        # Próximas ocorrências das regras recorrentes (gravadas só ao designar)
+        for saida in SaidaCampo.get_proximas(self.db_manager, limit=20, dias=self.dias_ocorrencias):
+            if saida.virtual:
+                data = QDate.fromString(saida.data, "yyyy-MM-dd").toString("dd/MM/yyyy")
+                texto = f"{saida.nome} - {data} {saida.horario}"
+                self.saida_campo_select.addItem(texto, (saida.regra_id, saida.data))
+                self.pv_saida_campo_select.addItem(texto, (saida.regra_id, saida.data))
+        
+        # Carregar a primeira página de designações
+        self.load_designacoes()
         
         # Carregar prédios e vilas
         self.predios_vilas = Imovel.get_predios_vilas(self.db_manager)
@@ -252,17 +368,89 @@ class DesignacoesWidget(QWidget):
             texto = f"{nome} ({imovel.tipo.capitalize()}) - {imovel.rua_nome}"
             self.predio_vila_select.addItem(texto, imovel.id)
         
-        # Carregar designações de prédios e vilas
-        self.designacoes_predios_vilas = DesignacaoPredioVila.get_all(self.db_manager)
-        self.update_pv_designacoes_table()
+        # Carregar a primeira página de designações de prédios e vilas
+        self.load_pv_designacoes()
     
-    def update_designacoes_table(self):
-        """Atualiza a tabela de designações"""
+    def load_designacoes(self):
+        """Recarrega a tabela de designações a partir da primeira página"""
+        self.designacoes = {}
+        self.designacoes_cursor = None
+        self.designacoes_esgotadas = False
         self.designacoes_table.setRowCount(0)
+        self.load_more_designacoes()
+    
+    def load_more_designacoes(self):
+        """Carrega a próxima página de designações com os filtros atuais"""
+        if self.designacoes_esgotadas:
+            return
         
-        for row, designacao in enumerate(self.designacoes):
-            self.designacoes_table.insertRow(row)
-            
+        designacoes = Designacao.buscar(
+            self.db_manager,
+            apos=self.designacoes_cursor,
+            limit=self.designacoes_por_pagina,
+            **self.valores_filtro(self.filtro_status, self.filtro_territorio, self.filtro_periodo,
+                                  self.filtro_data_inicio, self.filtro_data_fim)
+        )
+        
+        if len(designacoes) < self.designacoes_por_pagina:
+            self.designacoes_esgotadas = True
+        self.mais_designacoes_button.setEnabled(not self.designacoes_esgotadas)
+        
+        if designacoes:
+            self.designacoes_cursor = Designacao.cursor_pagina(designacoes)
+            for designacao in designacoes:
+                self.designacoes[designacao.id] = designacao
+            self.update_designacoes_table(designacoes)
+    
+    @Slot(int)
+    def on_designacoes_scroll(self, value):
+        """Carrega mais designações ao rolar até o fim da tabela"""
+        if value == self.designacoes_table.verticalScrollBar().maximum():
+            self.load_more_designacoes()
+    
+    def load_pv_designacoes(self):
+        """Recarrega a tabela de designações de prédios/vilas a partir da primeira página"""
+        self.designacoes_predios_vilas = {}
+        self.pv_designacoes_cursor = None
+        self.pv_designacoes_esgotadas = False
+        self.pv_designacoes_table.setRowCount(0)
+        self.load_more_pv_designacoes()
+    
+    def load_more_pv_designacoes(self):
+        """Carrega a próxima página de designações de prédios/vilas com os filtros atuais"""
+        if self.pv_designacoes_esgotadas:
+            return
+        
+        designacoes = DesignacaoPredioVila.buscar(
+            self.db_manager,
+            apos=self.pv_designacoes_cursor,
+            limit=self.designacoes_por_pagina,
+            **self.valores_filtro(self.pv_filtro_status, self.pv_filtro_territorio, self.pv_filtro_periodo,
+                                  self.pv_filtro_data_inicio, self.pv_filtro_data_fim)
+        )
+        
+        if len(designacoes) < self.designacoes_por_pagina:
+            self.pv_designacoes_esgotadas = True
+        self.pv_mais_button.setEnabled(not self.pv_designacoes_esgotadas)
+        
+        if designacoes:
+            self.pv_designacoes_cursor = DesignacaoPredioVila.cursor_pagina(designacoes)
+            for designacao in designacoes:
+                self.designacoes_predios_vilas[designacao.id] = designacao
+            self.update_pv_designacoes_table(designacoes)
+    
+    @Slot(int)
+    def on_pv_designacoes_scroll(self, value):
+        """Carrega mais designações de prédios/vilas ao rolar até o fim da tabela"""
+        if value == self.pv_designacoes_table.verticalScrollBar().maximum():
+            self.load_more_pv_designacoes()
+    
+    def update_designacoes_table(self, designacoes):
+        """Acrescenta uma página de designações à tabela"""
+        inicio = self.designacoes_table.rowCount()
+        self.designacoes_table.setRowCount(inicio + len(designacoes))
+        
+        for row, designacao in enumerate(designacoes, start=inicio):
             self.designacoes_table.setItem(row, 0, QTableWidgetItem(str(designacao.id)))
             self.designacoes_table.setItem(row, 1, QTableWidgetItem(designacao.territorio_nome))
             self.designacoes_table.setItem(row, 2, QTableWidgetItem(designacao.saida_campo_nome))
@@ -295,13 +483,12 @@ class DesignacoesWidget(QWidget):
             
             self.designacoes_table.setItem(row, 6, status_item)
     
-    def update_pv_designacoes_table(self):
-        """Atualiza a tabela de designações de prédios e vilas"""
-        self.pv_designacoes_table.setRowCount(0)
+    def update_pv_designacoes_table(self, designacoes):
+        """Acrescenta uma página de designações de prédios e vilas à tabela"""
+        inicio = self.pv_designacoes_table.rowCount()
+        self.pv_designacoes_table.setRowCount(inicio + len(designacoes))
         
-        for row, designacao in enumerate(self.designacoes_predios_vilas):
-            self.pv_designacoes_table.insertRow(row)
-            
+        for row, designacao in enumerate(designacoes, start=inicio):
             self.pv_designacoes_table.setItem(row, 0, QTableWidgetItem(str(designacao.id)))
             
             nome = designacao.imovel_nome if designacao.imovel_nome else f"Nº {designacao.imovel_numero}"
@@ -328,6 +515,35 @@ class DesignacoesWidget(QWidget):
             
             self.pv_designacoes_table.setItem(row, 7, status_item)
     
+    def update_sugestoes(self):
+        """Atualiza a lista de territórios sugeridos para designação"""
+        self.sugestoes_list.clear()
+        for sugestao in Territorio.sugerir_designacao(self.db_manager, self.total_sugestoes):
+            if sugestao['dias_desde_conclusao'] is None:
+                tempo = "nunca concluído"
+            else:
+                tempo = f"concluído há {sugestao['dias_desde_conclusao']} dias"
+            texto = (f"{sugestao['nome']} — {tempo}, {sugestao['cobertura']:.0%} visitado, "
+                     f"{sugestao['total_imoveis']} imóveis")
+            item = QListWidgetItem(texto)
+            item.setData(Qt.ItemDataRole.UserRole, sugestao['territorio_id'])
+            self.sugestoes_list.addItem(item)
+    
+    @Slot(QListWidgetItem)
+    def selecionar_sugestao(self, item):
+        """Seleciona no formulário o território sugerido"""
+        indice = self.territorio_select.findData(item.data(Qt.ItemDataRole.UserRole))
+        if indice >= 0:
+            self.territorio_select.setCurrentIndex(indice)
+    
+    def resolver_saida(self, dado):
+        """Obtém o ID da saída escolhida, gravando antes a ocorrência de uma regra recorrente"""
+        if isinstance(dado, (list, tuple)):
+            regra_id, data = dado
+            saida = RegraSaidaCampo.materializar(self.db_manager, regra_id, data)
+            return saida.id if saida else None
+        return dado
+    
     @Slot()
     def designar_territorio(self):
         """Designa um território"""
@@ -346,22 +562,24 @@ class DesignacoesWidget(QWidget):
             return
         
         # Verificar se o território já está designado
-        territorio_ativo = False
-        for d in self.designacoes:
-            if d.territorio_id == territorio_id and d.status == "ativo":
-                territorio_ativo = True
-                break
+        territorio_ativo = Designacao.territorio_designado(self.db_manager, territorio_id)
         
         if territorio_ativo:
             reply = QMessageBox.question(
                 self, "Território já designado",
-                "Este território já possui uma designação ativa. Deseja criar uma nova designação mesmo assim?",
+                "Este território já possui uma designação ativa. Deseja concluí-la e criar a nova designação?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.No:
                 return
         
+        # Ocorrências de regras recorrentes só são gravadas agora
+        saida_campo_id = self.resolver_saida(saida_campo_id)
+        if not saida_campo_id:
+            QMessageBox.critical(self, "Erro", "Não foi possível registrar a saída de campo recorrente.")
+            return
+        
         # Criar a designação
         designacao = Designacao(
             territorio_id=territorio_id,
@@ -372,13 +590,16 @@ class DesignacoesWidget(QWidget):
             status="ativo"
         )
         
-        if designacao.save(self.db_manager):
+        # O banco garante uma única designação ativa por território
+        if designacao.save(self.db_manager, substituir_ativa=territorio_ativo):
             QMessageBox.information(self, "Sucesso", "Território designado com sucesso.")
             self.responsavel_input.clear()
             # Atualizar a tabela
             self.load_data()
         else:
-            QMessageBox.critical(self, "Erro", "Não foi possível designar o território.")
+            QMessageBox.critical(self, "Erro", "Não foi possível designar o território. "
+                                 "Verifique se ele não foi designado por outro usuário.")
+            self.load_data()
     
     @Slot()
     def designar_predio_vila(self):
@@ -402,22 +623,24 @@ class DesignacoesWidget(QWidget):
             return
         
         # Verificar se o prédio/vila já está designado
-        imovel_ativo = False
-        for d in self.designacoes_predios_vilas:
-            if d.imovel_id == imovel_id and d.status == "ativo":
-                imovel_ativo = True
-                break
+        imovel_ativo = DesignacaoPredioVila.imovel_designado(self.db_manager, imovel_id)
         
         if imovel_ativo:
             reply = QMessageBox.question(
                 self, "Prédio/Vila já designado",
-                "Este prédio/vila já possui uma designação ativa. Deseja criar uma nova designação mesmo assim?",
+                "Este prédio/vila já possui uma designação ativa. Deseja concluí-la e criar a nova designação?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.No:
                 return
         
+        # Ocorrências de regras recorrentes só são gravadas agora
+        saida_campo_id = self.resolver_saida(saida_campo_id)
+        if not saida_campo_id:
+            QMessageBox.critical(self, "Erro", "Não foi possível registrar a saída de campo recorrente.")
+            return
+        
         # Criar a designação
         designacao = DesignacaoPredioVila(
             imovel_id=imovel_id,
@@ -428,13 +651,16 @@ class DesignacoesWidget(QWidget):
             status="ativo"
         )
         
-        if designacao.save(self.db_manager):
+        # O banco garante uma única designação ativa por prédio/vila
+        if designacao.save(self.db_manager, substituir_ativa=imovel_ativo):
             QMessageBox.information(self, "Sucesso", "Prédio/Vila designado com sucesso.")
             self.pv_responsavel_input.clear()
             # Atualizar a tabela
             self.load_data()
         else:
-            QMessageBox.critical(self, "Erro", "Não foi possível designar o prédio/vila.")
+            QMessageBox.critical(self, "Erro", "Não foi possível designar o prédio/vila. "
+                                 "Verifique se ele não foi designado por outro usuário.")
+            self.load_data()
     
     @Slot()
     def editar_designacao(self):
@@ -447,11 +673,7 @@ class DesignacoesWidget(QWidget):
         designacao_id = int(self.designacoes_table.item(row, 0).text())
         
         # Buscar a designação
-        designacao = None
-        for d in self.designacoes:
-            if d.id == designacao_id:
-                designacao = d
-                break
+        designacao = self.designacoes.get(designacao_id)
         
         if not designacao:
             QMessageBox.critical(self, "Erro", "Designação não encontrada.")
@@ -528,7 +750,9 @@ class DesignacoesWidget(QWidget):
                 QMessageBox.information(self, "Sucesso", "Designação atualizada com sucesso.")
                 self.load_data()
             else:
-                QMessageBox.critical(self, "Erro", "Não foi possível atualizar a designação.")
+                QMessageBox.critical(self, "Erro", "Não foi possível atualizar a designação. "
+                                     "Só pode haver uma designação ativa por território ou prédio/vila.")
+                self.load_data()
     
     @Slot()
     def concluir_designacao(self):
@@ -541,11 +765,7 @@ class DesignacoesWidget(QWidget):
         designacao_id = int(self.designacoes_table.item(row, 0).text())
         
         # Buscar a designação
-        designacao = None
-        for d in self.designacoes:
-            if d.id == designacao_id:
-                designacao = d
-                break
+        designacao = self.designacoes.get(designacao_id)
         
         if not designacao:
             QMessageBox.critical(self, "Erro", "Designação não encontrada.")
@@ -579,24 +799,26 @@ class DesignacoesWidget(QWidget):
         reply = QMessageBox.question(
             self, "Confirmar Exclusão",
             f"Tem certeza que deseja excluir a designação do território '{territorio_nome}'?\n"
-            f"Esta ação não pode ser desfeita.",
+            f"A exclusão pode ser desfeita com Ctrl+Z.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
             # Buscar e excluir a designação
-            for designacao in self.designacoes:
-                if designacao.id == designacao_id:
-                    if designacao.delete(self.db_manager):
-                        QMessageBox.information(self, "Sucesso", "Designação excluída com sucesso.")
-                        self.load_data()
-                        self.editar_designacao_button.setEnabled(False)
-                        self.concluir_designacao_button.setEnabled(False)
-                        self.excluir_designacao_button.setEnabled(False)
-                    else:
-                        QMessageBox.critical(self, "Erro", "Não foi possível excluir a designação.")
-                    break
+            designacao = self.designacoes.get(designacao_id)
+            excluida = False
+            if designacao:
+                with self.db_manager.historico.acao(f"Excluir designação do território '{territorio_nome}'"):
+                    excluida = designacao.delete(self.db_manager)
+            if excluida:
+                QMessageBox.information(self, "Sucesso", "Designação excluída com sucesso.")
+                self.load_data()
+                self.editar_designacao_button.setEnabled(False)
+                self.concluir_designacao_button.setEnabled(False)
+                self.excluir_designacao_button.setEnabled(False)
+            else:
+                QMessageBox.critical(self, "Erro", "Não foi possível excluir a designação.")
     
     @Slot()
     def editar_pv_designacao(self):
@@ -609,11 +831,7 @@ class DesignacoesWidget(QWidget):
         designacao_id = int(self.pv_designacoes_table.item(row, 0).text())
         
         # Buscar a designação
-        designacao = None
-        for d in self.designacoes_predios_vilas:
-            if d.id == designacao_id:
-                designacao = d
-                break
+        designacao = self.designacoes_predios_vilas.get(designacao_id)
         
         if not designacao:
             QMessageBox.critical(self, "Erro", "Designação não encontrada.")
@@ -695,7 +913,9 @@ class DesignacoesWidget(QWidget):
                 QMessageBox.information(self, "Sucesso", "Designação atualizada com sucesso.")
                 self.load_data()
             else:
-                QMessageBox.critical(self, "Erro", "Não foi possível atualizar a designação.")
+                QMessageBox.critical(self, "Erro", "Não foi possível atualizar a designação. "
+                                     "Só pode haver uma designação ativa por território ou prédio/vila.")
+                self.load_data()
     
     @Slot()
     def concluir_pv_designacao(self):
@@ -709,11 +929,7 @@ class DesignacoesWidget(QWidget):
         nome_pv = self.pv_designacoes_table.item(row, 1).text()
         
         # Buscar a designação
-        designacao = None
-        for d in self.designacoes_predios_vilas:
-            if d.id == designacao_id:
-                designacao = d
-                break
+        designacao = self.designacoes_predios_vilas.get(designacao_id)
         
         if not designacao:
             QMessageBox.critical(self, "Erro", "Designação não encontrada.")
@@ -747,24 +963,26 @@ class DesignacoesWidget(QWidget):
         reply = QMessageBox.question(
             self, "Confirmar Exclusão",
             f"Tem certeza que deseja excluir a designação do prédio/vila '{nome_pv}'?\n"
-            f"Esta ação não pode ser desfeita.",
+            f"A exclusão pode ser desfeita com Ctrl+Z.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
             # Buscar e excluir a designação
-            for designacao in self.designacoes_predios_vilas:
-                if designacao.id == designacao_id:
-                    if designacao.delete(self.db_manager):
-                        QMessageBox.information(self, "Sucesso", "Designação excluída com sucesso.")
-                        self.load_data()
-                        self.pv_editar_button.setEnabled(False)
-                        self.pv_concluir_button.setEnabled(False)
-                        self.pv_excluir_button.setEnabled(False)
-                    else:
-                        QMessageBox.critical(self, "Erro", "Não foi possível excluir a designação.")
-                    break
+            designacao = self.designacoes_predios_vilas.get(designacao_id)
+            excluida = False
+            if designacao:
+                with self.db_manager.historico.acao(f"Excluir designação do prédio/vila '{nome_pv}'"):
+                    excluida = designacao.delete(self.db_manager)
+            if excluida:
+                QMessageBox.information(self, "Sucesso", "Designação excluída com sucesso.")
+                self.load_data()
+                self.pv_editar_button.setEnabled(False)
+                self.pv_concluir_button.setEnabled(False)
+                self.pv_excluir_button.setEnabled(False)
+            else:
+                QMessageBox.critical(self, "Erro", "Não foi possível excluir a designação.")
     
     @Slot()
     def on_designacao_selection_changed(self):
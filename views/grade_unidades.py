@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+
+from PySide6.QtWidgets import QAbstractScrollArea, QToolTip
+from PySide6.QtCore import Qt, Signal, QRect, QTimer, QDate, QEvent
+from PySide6.QtGui import QPainter, QColor, QPen
+
+class GradeUnidades(QAbstractScrollArea):
+    """Grade de unidades de um prédio/vila desenhada em um único widget
+    
+    Guarda as unidades em vetores compactos (id, estado de atendimento) e uma
+    máscara de visibilidade para a busca. Só as linhas visíveis são desenhadas
+    e o clique é localizado pela posição, sem um botão por unidade.
+    """
+    
+    unidade_clicada = Signal(int)  # Índice da unidade na lista recebida
+    
+    LARGURA_CELULA = 80
+    ALTURA_CELULA = 40
+    ESPACO = 6
+    ATRASO_BUSCA_MS = 150
+    
+    COR_ATENDIDA = QColor("#d4edda")
+    COR_TEXTO_ATENDIDA = QColor("#155724")
+    COR_BORDA = QColor("#adb5bd")
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ids = array('q')        # id da unidade (0 = ainda só na faixa)
+        self.atendidas = bytearray() # 1 = tem atendimento
+        self.numeros = []
+        self.datas = {}              # índice -> data do último atendimento
+        self.mascara = bytearray()   # 1 = visível na busca atual
+        self.visiveis = array('l')   # índices visíveis, na ordem de exibição
+        self.texto_busca = ""
+        self.sob_mouse = -1
+        
+        self.viewport().setMouseTracking(True)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setMinimumHeight(self.ALTURA_CELULA * 3)
+        
+        # Busca com atraso: várias teclas seguidas geram um só filtro
+        self.timer_busca = QTimer(self)
+        self.timer_busca.setSingleShot(True)
+        self.timer_busca.setInterval(self.ATRASO_BUSCA_MS)
+        self.timer_busca.timeout.connect(self.aplicar_busca)
+    
+    def definir_unidades(self, unidades, ultimos_atendimentos):
+        """Carrega as unidades (dicts de Imovel.get_unidades) e a data do último atendimento por id"""
+        self.ids = array('q', (unidade['id'] or 0 for unidade in unidades))
+        self.numeros = [unidade['numero'] for unidade in unidades]
+        self.atendidas = bytearray(len(self.numeros))
+        self.datas = {}
+        for indice, unidade_id in enumerate(self.ids):
+            data = ultimos_atendimentos.get(unidade_id) if unidade_id else None
+            if data:
+                self.atendidas[indice] = 1
+                self.datas[indice] = data
+        self.filtrar(self.texto_busca)
+    
+    def buscar(self, texto):
+        """Agenda o filtro pelo texto digitado"""
+        self.texto_busca = texto
+        self.timer_busca.start()
+    
+    def aplicar_busca(self):
+        """Aplica o filtro agendado por buscar"""
+        self.filtrar(self.texto_busca)
+    
+    def filtrar(self, texto):
+        """Atualiza a máscara de visibilidade e redesenha"""
+        self.texto_busca = texto
+        texto = (texto or "").strip().lower()
+        if texto:
+            self.mascara = bytearray(texto in numero.lower() for numero in self.numeros)
+        else:
+            self.mascara = bytearray(b'\x01') * len(self.numeros)
+        self.visiveis = array('l', (i for i, visivel in enumerate(self.mascara) if visivel))
+        self.sob_mouse = -1
+        self.atualizar_rolagem()
+        self.viewport().update()
+    
+    def colunas(self):
+        """Quantidade de colunas que cabem na largura atual"""
+        largura = self.viewport().width() - self.ESPACO
+        return max(1, largura // (self.LARGURA_CELULA + self.ESPACO))
+    
+    def atualizar_rolagem(self):
+        """Ajusta a barra de rolagem à altura total da grade"""
+        linhas = -(-len(self.visiveis) // self.colunas())
+        altura = linhas * (self.ALTURA_CELULA + self.ESPACO) + self.ESPACO
+        barra = self.verticalScrollBar()
+        barra.setRange(0, max(0, altura - self.viewport().height()))
+        barra.setPageStep(self.viewport().height())
+        barra.setSingleStep(self.ALTURA_CELULA + self.ESPACO)
+    
+    def retangulo(self, posicao, colunas):
+        """Retângulo (nas coordenadas do viewport) da posição na ordem de exibição"""
+        linha, coluna = divmod(posicao, colunas)
+        x = self.ESPACO + coluna * (self.LARGURA_CELULA + self.ESPACO)
+        y = self.ESPACO + linha * (self.ALTURA_CELULA + self.ESPACO) - self.verticalScrollBar().value()
+        return QRect(x, y, self.LARGURA_CELULA, self.ALTURA_CELULA)
+    
+    def indice_em(self, ponto):
+        """Índice da unidade sob o ponto, ou -1"""
+        colunas = self.colunas()
+        x = ponto.x() - self.ESPACO
+        y = ponto.y() + self.verticalScrollBar().value() - self.ESPACO
+        if x < 0 or y < 0:
+            return -1
+        coluna, resto_x = divmod(x, self.LARGURA_CELULA + self.ESPACO)
+        linha, resto_y = divmod(y, self.ALTURA_CELULA + self.ESPACO)
+        if coluna >= colunas or resto_x >= self.LARGURA_CELULA or resto_y >= self.ALTURA_CELULA:
+            return -1
+        posicao = linha * colunas + coluna
+        if posicao >= len(self.visiveis):
+            return -1
+        return self.visiveis[posicao]
+    
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        paleta = self.palette()
+        
+        if not self.visiveis:
+            painter.setPen(paleta.text().color())
+            texto = "Nenhuma unidade encontrada." if self.numeros else "Nenhuma unidade cadastrada."
+            painter.drawText(self.viewport().rect().adjusted(8, 8, -8, -8),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, texto)
+            return
+        
+        # Só as linhas que aparecem no viewport
+        colunas = self.colunas()
+        passo = self.ALTURA_CELULA + self.ESPACO
+        topo = self.verticalScrollBar().value()
+        primeira = max(0, (topo - self.ESPACO) // passo) * colunas
+        ultima = min(len(self.visiveis), ((topo + self.viewport().height()) // passo + 1) * colunas)
+        
+        metricas = painter.fontMetrics()
+        for posicao in range(primeira, ultima):
+            indice = self.visiveis[posicao]
+            rect = self.retangulo(posicao, colunas)
+            atendida = self.atendidas[indice]
+            
+            fundo = self.COR_ATENDIDA if atendida else paleta.button().color()
+            if indice == self.sob_mouse:
+                fundo = fundo.darker(110)
+            painter.setPen(QPen(self.COR_BORDA, 1))
+            painter.setBrush(fundo)
+            painter.drawRoundedRect(rect.adjusted(0, 0, -1, -1), 3, 3)
+            
+            painter.setPen(self.COR_TEXTO_ATENDIDA if atendida else paleta.buttonText().color())
+            numero = metricas.elidedText(self.numeros[indice], Qt.TextElideMode.ElideMiddle, rect.width() - 6)
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, numero)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.atualizar_rolagem()
+    
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+    
+    def mouseMoveEvent(self, event):
+        indice = self.indice_em(event.position().toPoint())
+        if indice != self.sob_mouse:
+            self.sob_mouse = indice
+            self.viewport().update()
+        super().mouseMoveEvent(event)
+    
+    def leaveEvent(self, event):
+        self.sob_mouse = -1
+        self.viewport().update()
+        super().leaveEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            indice = self.indice_em(event.position().toPoint())
+            if indice >= 0:
+                self.unidade_clicada.emit(indice)
+                return
+        super().mouseReleaseEvent(event)
+    
+    def viewportEvent(self, event):
+        # Dica com a data do último atendimento da unidade sob o mouse
+        if event.type() == QEvent.Type.ToolTip:
+            indice = self.indice_em(event.pos())
+            data = self.datas.get(indice)
+            if data:
+                data_formatada = QDate.fromString(data, "yyyy-MM-dd").toString("dd/MM/yyyy")
+                QToolTip.showText(event.globalPos(), f"Atendido em: {data_formatada}", self.viewport())
+            else:
+                QToolTip.hideText()
+            return True
+        return super().viewportEvent(event)
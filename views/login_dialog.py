@@ -3,20 +3,24 @@
 
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                               QPushButton, QLineEdit, QMessageBox, QCheckBox,
-                              QFormLayout, QWidget, QGroupBox)
-from PySide6.QtCore import Qt, Signal, Slot
+                              QFormLayout, QWidget, QGroupBox, QProgressBar)
+from PySide6.QtCore import Qt, Signal, Slot, QTimer
 from PySide6.QtGui import QIcon, QPixmap
 
 from models.usuario import Usuario, LogAtividade
+from models.autenticacao import ServicoAutenticacao
+from utils.tarefas import executar_em_segundo_plano
 
 class LoginDialog(QDialog):
     """Diálogo de login para o sistema"""
     
     login_success = Signal(Usuario)  # Sinal emitido quando o login é bem-sucedido
     
-    def __init__(self, db_manager, parent=None):
+    def __init__(self, db_manager, servico_autenticacao=None, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.servico_autenticacao = servico_autenticacao or ServicoAutenticacao(db_manager)
+        self.tarefa = None  # Verificação de senha em andamento
         self.setWindowTitle("Login - Sistema de Controle de Territórios")
         self.setMinimumSize(400, 300)
         self.setWindowFlags(Qt.WindowType.Dialog | Qt.WindowType.WindowCloseButtonHint)
@@ -56,6 +60,14 @@ class LoginDialog(QDialog):
         
         layout.addWidget(login_group)
         
+        # Indicador de progresso durante a verificação da senha
+        self.progresso = QProgressBar()
+        self.progresso.setRange(0, 0)
+        self.progresso.setTextVisible(False)
+        self.progresso.setMaximumHeight(8)
+        self.progresso.hide()
+        layout.addWidget(self.progresso)
+        
         # Botões
         buttons_layout = QHBoxLayout()
         
@@ -76,6 +88,9 @@ class LoginDialog(QDialog):
         
         # Carregar configurações salvas
         self.carregar_configuracoes()
+        
+        # Preencher o usuário da sessão anterior quando o diálogo for exibido
+        QTimer.singleShot(0, self.restaurar_sessao)
     
     def carregar_configuracoes(self):
         """Carrega configurações salvas, como email lembrado"""
@@ -87,9 +102,27 @@ class LoginDialog(QDialog):
         # Implementação futura: salvar em um arquivo de configuração
         pass
     
+    def set_verificando(self, verificando):
+        """Ativa ou desativa o estado de verificação (spinner e campos bloqueados)"""
+        self.progresso.setVisible(verificando)
+        self.email_input.setEnabled(not verificando)
+        self.senha_input.setEnabled(not verificando)
+        self.login_button.setEnabled(not verificando)
+    
+    @Slot()
+    def restaurar_sessao(self):
+        """Preenche o email da sessão salva; a senha continua sendo pedida"""
+        usuario = self.servico_autenticacao.usuario_do_token()
+        if usuario and not self.email_input.text():
+            self.email_input.setText(usuario.email)
+            self.senha_input.setFocus()
+    
     @Slot()
     def fazer_login(self):
-        """Verifica as credenciais e faz login se forem válidas"""
+        """Verifica as credenciais em segundo plano e faz login se forem válidas"""
+        if self.tarefa is not None:
+            return
+        
         email = self.email_input.text().strip()
         senha = self.senha_input.text()
         
@@ -97,26 +130,75 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, "Atenção", "Por favor, preencha todos os campos.")
             return
         
-        # Verificar credenciais
-        usuario = Usuario.verificar_credenciais(self.db_manager, email, senha)
-        
-        if usuario:
-            # Registrar atividade de login
-            LogAtividade.registrar(
-                self.db_manager, 
-                usuario.id, 
-                LogAtividade.ACAO_LOGIN, 
-                f"Login realizado por {usuario.nome}"
+        if self.db_manager.cliente is not None:
+            # No modo cliente a senha é conferida pelo servidor, que abre a sessão do usuário
+            self.set_verificando(True)
+            self.tarefa = executar_em_segundo_plano(
+                self.servico_autenticacao.entrar_no_servidor, email, senha,
+                ao_concluir=lambda usuario: self.verificacao_concluida(usuario, senha, None, usuario is not None),
+                ao_falhar=self.servidor_indisponivel
             )
-            
-            # Salvar configurações se marcado "lembrar"
-            if self.lembrar_checkbox.isChecked():
-                self.salvar_configuracoes()
-            
-            # Emitir sinal de sucesso com o usuário logado
-            self.login_success.emit(usuario)
-            self.accept()
-        else:
-            QMessageBox.critical(self, "Erro", "Email ou senha incorretos.")
-            self.senha_input.clear()
-            self.senha_input.setFocus()
\ No newline at end of file
+            return
+        
+        usuario = Usuario.get_by_email(self.db_manager, email)
+        if not usuario or not usuario.ativo:
+            self.login_falhou()
+            return
+        
+        # Com o token da sessão anterior, a senha é conferida sem o PBKDF2
+        if self.servico_autenticacao.validar_token(usuario, senha):
+            self.verificacao_concluida(usuario, senha, usuario.senha_hash, True)
+            return
+        
+        # O PBKDF2 roda fora da thread da interface
+        hash_anterior = usuario.senha_hash
+        self.set_verificando(True)
+        self.tarefa = executar_em_segundo_plano(
+            ServicoAutenticacao.verificar_senha, usuario, senha,
+            ao_concluir=lambda valida: self.verificacao_concluida(usuario, senha, hash_anterior, valida),
+            ao_falhar=lambda erro: self.verificacao_concluida(usuario, senha, hash_anterior, False)
+        )
+    
+    def verificacao_concluida(self, usuario, senha, hash_anterior, valida):
+        """Conclui o login após a verificação da senha"""
+        self.tarefa = None
+        self.set_verificando(False)
+        
+        if not valida:
+            self.login_falhou()
+            return
+        
+        # Salvar o hash atualizado se os parâmetros do KDF mudaram
+        if usuario.senha_hash != hash_anterior:
+            usuario.save(self.db_manager)
+        
+        self.servico_autenticacao.registrar_sessao(usuario, senha)
+        self.servico_autenticacao.emitir_token(usuario, senha)
+        
+        # Registrar atividade de login
+        LogAtividade.registrar(
+            self.db_manager, 
+            usuario.id, 
+            LogAtividade.ACAO_LOGIN, 
+            f"Login realizado por {usuario.nome}"
+        )
+        
+        # Salvar configurações se marcado "lembrar"
+        if self.lembrar_checkbox.isChecked():
+            self.salvar_configuracoes()
+        
+        # Emitir sinal de sucesso com o usuário logado
+        self.login_success.emit(usuario)
+        self.accept()
+    
+    def servidor_indisponivel(self, erro):
+        """Informa que o login no servidor não pôde ser feito"""
+        self.tarefa = None
+        self.set_verificando(False)
+        QMessageBox.critical(self, "Erro", f"Não foi possível conectar ao servidor: {erro}")
+    
+    def login_falhou(self):
+        """Informa credenciais inválidas"""
+        QMessageBox.critical(self, "Erro", "Email ou senha incorretos.")
+        self.senha_input.clear()
+        self.senha_input.setFocus()
@@ -5,8 +5,9 @@ import sys
 from PySide6.QtWidgets import (QMainWindow, QStackedWidget, QToolBar, QStatusBar,
                              QLabel, QWidget, QVBoxLayout, QHBoxLayout, QDialog,
                              QPushButton, QLineEdit, QMessageBox, QFormLayout,
-                             QMenu, QApplication, QSizePolicy)
-from PySide6.QtGui import QAction, QIcon, QPixmap, QActionGroup
+                             QMenu, QApplication, QSizePolicy, QProgressBar,
+                             QInputDialog, QFileDialog)
+from PySide6.QtGui import QAction, QIcon, QPixmap, QActionGroup, QKeySequence
 from PySide6.QtCore import QSize, Qt, Signal, Slot, QTimer, QProcess
 
 from views.dashboard import DashboardWidget
@@ -20,16 +21,29 @@ from views.login_dialog import LoginDialog
 from views.notificacoes_widget import NotificacoesWidget
 
 from models.usuario import Usuario, LogAtividade
-from models.notificacao_manager import NotificacaoManager
+from models.designacao import avisar_alteracao
+from database.sincronizacao import Sincronizador, ServidorSincronizacao
+from models.autenticacao import ServicoAutenticacao
+from utils.tarefas import executar_em_segundo_plano
+from utils.agendador_notificacoes import AgendadorNotificacoes
 
 class MainWindow(QMainWindow):
     """Janela principal da aplicação"""
     
+    # Emitido pela thread do servidor de sincronização após aplicar um pacote recebido
+    pacote_recebido = Signal(object)
+    
     def __init__(self, db_manager):
         super().__init__()
         
         self.db_manager = db_manager
         self.usuario = None  # Usuário logado
+        self.servico_autenticacao = ServicoAutenticacao(db_manager)
+        self.tarefa_senha = None  # Alteração de senha em andamento
+        self.sincronizador = Sincronizador(db_manager.db_path)
+        self.servidor_sincronizacao = None  # Recebe sincronizações pela rede local
+        self.tarefa_sincronizacao = None
+        self.pacote_recebido.connect(self.pacote_recebido_rede)
         
         self.setWindowTitle("Sistema de Controle de Territórios")
         self.setMinimumSize(1000, 700)
@@ -38,6 +52,14 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         
+        # Indicador de progresso para operações em segundo plano
+        self.progresso = QProgressBar()
+        self.progresso.setRange(0, 0)
+        self.progresso.setTextVisible(False)
+        self.progresso.setMaximumWidth(120)
+        self.progresso.hide()
+        self.status_bar.addPermanentWidget(self.progresso)
+        
         # Widget central com páginas empilhadas
         self.stacked_widget = QStackedWidget()
         self.setCentralWidget(self.stacked_widget)
@@ -47,7 +69,7 @@ class MainWindow(QMainWindow):
     
     def mostrar_login(self):
         """Exibe o diálogo de login"""
-        dialog = LoginDialog(self.db_manager)
+        dialog = LoginDialog(self.db_manager, self.servico_autenticacao)
         dialog.login_success.connect(self.autenticar_usuario)
         
         # Se o login for cancelado, fechar a aplicação
@@ -58,6 +80,8 @@ class MainWindow(QMainWindow):
     def autenticar_usuario(self, usuario):
         """Configura a aplicação para o usuário logado"""
         self.usuario = usuario
+        # O histórico de desfazer é só deste usuário, nesta sessão
+        self.db_manager.historico.usuario_id = usuario.id
         
         # Mostrar mensagem de boas-vindas
         self.status_bar.showMessage(f"Bem-vindo ao Sistema de Controle de Territórios, {usuario.nome}!")
@@ -103,6 +127,7 @@ class MainWindow(QMainWindow):
         
         # Notificações
         self.notificacoes_widget = NotificacoesWidget(self.db_manager, self.usuario)
+        self.notificacoes_widget.nao_lidas_alteradas.connect(self.exibir_contador_notificacoes)
         self.stacked_widget.addWidget(self.notificacoes_widget)
     
     def setup_sidebar(self):
@@ -163,6 +188,9 @@ class MainWindow(QMainWindow):
             self.sidebar.addWidget(label)
             
             self.sidebar.addAction(self.action_usuarios)
+            # A sincronização trabalha sobre o arquivo local do banco
+            if self.db_manager.cliente is None:
+                self.sidebar.addAction(self.action_sincronizacao)
         
         # Perfil de usuário e notificações na parte inferior
         self.sidebar.addSeparator()
@@ -223,6 +251,22 @@ class MainWindow(QMainWindow):
             self.action_usuarios = QAction("Usuários", self)
             self.action_usuarios.setIcon(QIcon.fromTheme("system-users", QIcon()))
             self.action_usuarios.triggered.connect(self.show_usuarios)
+            
+            self.action_sincronizacao = QAction("Sincronização", self)
+            self.action_sincronizacao.setIcon(QIcon.fromTheme("view-refresh", QIcon()))
+            self.action_sincronizacao.triggered.connect(self.show_sincronizacao_menu)
+        
+        # Desfazer/refazer exclusões de cadastro (atalhos da janela inteira, apenas para gestor e admin)
+        if self.usuario.nivel_permissao >= Usuario.NIVEL_GESTOR:
+            self.action_desfazer = QAction("Desfazer", self)
+            self.action_desfazer.setShortcut(QKeySequence.StandardKey.Undo)
+            self.action_desfazer.triggered.connect(self.desfazer_acao)
+            self.addAction(self.action_desfazer)
+            
+            self.action_refazer = QAction("Refazer", self)
+            self.action_refazer.setShortcuts([QKeySequence.StandardKey.Redo, QKeySequence("Ctrl+Y")])
+            self.action_refazer.triggered.connect(self.refazer_acao)
+            self.addAction(self.action_refazer)
         
         # Notificações
         self.action_notificacoes = QAction("Notificações", self)
@@ -236,13 +280,11 @@ class MainWindow(QMainWindow):
     
     def setup_notificacoes(self):
         """Configura o sistema de notificações"""
-        # Verificar notificações no início
-        NotificacaoManager.verificar_todas_notificacoes(self.db_manager)
-        
-        # Configurar o timer para verificação periódica (a cada 15 minutos)
-        self.notificacao_timer = QTimer(self)
-        self.notificacao_timer.timeout.connect(self.verificar_notificacoes)
-        self.notificacao_timer.start(900000)  # 15 minutos = 900000 ms
+        # Gerar os alertas de vencimento quando cada prazo entra na janela
+        # de alerta (inclusive os que já entraram, no início)
+        self.agendador_notificacoes = AgendadorNotificacoes(self.db_manager, self)
+        self.agendador_notificacoes.notificacoes_verificadas.connect(self.atualizar_icone_notificacoes)
+        self.agendador_notificacoes.iniciar()
         
         # Verificar se há notificações não lidas
         self.atualizar_icone_notificacoes()
@@ -251,19 +293,12 @@ class MainWindow(QMainWindow):
         """Atualiza o ícone de notificações com contador, se houver não lidas"""
         from models.usuario import Notificacao
         
-        # Verificar quantas notificações não lidas existem
-        cursor = self.db_manager.execute(
-            "SELECT COUNT(*) as total FROM notificacoes "
-            "WHERE usuario_id = ? AND status = ?",
-            (self.usuario.id, Notificacao.STATUS_NAO_LIDA)
-        )
-        
-        nao_lidas = 0
-        if cursor:
-            row = cursor.fetchone()
-            if row:
-                nao_lidas = row['total']
-        
+        # Contador mantido por triggers: custo constante
+        self.exibir_contador_notificacoes(Notificacao.contar_nao_lidas(self.db_manager, self.usuario.id))
+    
+    @Slot(int)
+    def exibir_contador_notificacoes(self, nao_lidas):
+        """Exibe o total de notificações não lidas no menu"""
         # Atualizar o texto da ação
         if nao_lidas > 0:
             self.action_notificacoes.setText(f"Notificações ({nao_lidas})")
@@ -272,12 +307,6 @@ class MainWindow(QMainWindow):
             self.action_notificacoes.setText("Notificações")
             self.action_notificacoes.setIcon(QIcon.fromTheme("notifications", QIcon()))
     
-    @Slot()
-    def verificar_notificacoes(self):
-        """Verifica por novas notificações periodicamente"""
-        NotificacaoManager.verificar_todas_notificacoes(self.db_manager)
-        self.atualizar_icone_notificacoes()
-    
     @Slot()
     def show_dashboard(self):
         """Mostra a página do dashboard"""
@@ -399,6 +428,243 @@ class MainWindow(QMainWindow):
             "Acessou as Notificações"
         )
     
+    def recarregar_dados(self):
+        """Recarrega a página aberta depois de alterações feitas fora dela"""
+        avisar_alteracao()  # As designações podem ter voltado ou saído
+        pagina = self.stacked_widget.currentWidget()
+        if hasattr(pagina, 'update_data'):
+            pagina.update_data()
+        elif hasattr(pagina, 'load_data'):
+            pagina.load_data()
+    
+    @Slot()
+    def desfazer_acao(self):
+        """Desfaz a última exclusão registrada no histórico"""
+        self.aplicar_historico(self.db_manager.historico.desfazer, "Desfeito", "Nada para desfazer.")
+    
+    @Slot()
+    def refazer_acao(self):
+        """Refaz a última ação desfeita (refazer uma exclusão pede confirmação)"""
+        historico = self.db_manager.historico
+        descricao = historico.descricao_refazer()
+        if descricao is not None and historico.refazer_exclui():
+            reply = QMessageBox.question(
+                self, "Confirmar Exclusão",
+                f"Refazer '{descricao}' vai excluir os registros novamente.\n"
+                f"Deseja continuar?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        self.aplicar_historico(historico.refazer, "Refeito", "Nada para refazer.")
+    
+    def aplicar_historico(self, operacao, rotulo, mensagem_vazia):
+        """Executa desfazer/refazer e atualiza a página aberta"""
+        if self.usuario.nivel_permissao < Usuario.NIVEL_GESTOR:
+            return
+        try:
+            descricao = operacao()
+        except ValueError as e:
+            QMessageBox.warning(self, "Atenção", str(e))
+            return
+        if descricao is None:
+            self.status_bar.showMessage(mensagem_vazia, 3000)
+            return
+        
+        self.recarregar_dados()
+        self.status_bar.showMessage(f"{rotulo}: {descricao}", 5000)
+        
+        LogAtividade.registrar(
+            self.db_manager,
+            self.usuario.id,
+            LogAtividade.ACAO_EDITAR,
+            f"{rotulo}: {descricao}"
+        )
+    
+    @Slot()
+    def show_sincronizacao_menu(self):
+        """Exibe o menu de sincronização com os dispositivos de campo"""
+        menu = QMenu(self)
+        
+        exportar = QAction("Exportar Pacote para Dispositivo...", self)
+        exportar.triggered.connect(self.exportar_pacote_sincronizacao)
+        menu.addAction(exportar)
+        
+        importar = QAction("Importar Pacote...", self)
+        importar.triggered.connect(self.importar_pacote_sincronizacao)
+        menu.addAction(importar)
+        
+        sincronizar = QAction("Sincronizar pela Rede...", self)
+        sincronizar.triggered.connect(self.sincronizar_rede)
+        menu.addAction(sincronizar)
+        
+        menu.addSeparator()
+        
+        copia = QAction("Criar Banco para Dispositivo de Campo...", self)
+        copia.triggered.connect(self.criar_copia_campo)
+        menu.addAction(copia)
+        
+        servidor = QAction("Aceitar Sincronizações pela Rede", self)
+        servidor.setCheckable(True)
+        servidor.setChecked(self.servidor_sincronizacao is not None)
+        servidor.toggled.connect(self.alternar_servidor_sincronizacao)
+        menu.addAction(servidor)
+        
+        action_pos = self.sidebar.actionGeometry(self.action_sincronizacao)
+        global_pos = self.sidebar.mapToGlobal(action_pos.bottomLeft())
+        menu.exec(global_pos)
+    
+    def exportar_pacote_sincronizacao(self):
+        """Grava em arquivo as alterações ainda não enviadas a um dispositivo"""
+        pares = self.sincronizador.listar_pares()
+        if not pares:
+            QMessageBox.information(self, "Sincronização",
+                                    "Nenhum dispositivo cadastrado. Crie primeiro o banco de um dispositivo de campo.")
+            return
+        
+        opcoes = [f"{par['nome'] or par['par']} ({par['pendentes']} alterações pendentes)" for par in pares]
+        escolha, ok = QInputDialog.getItem(self, "Exportar Pacote", "Dispositivo:", opcoes, 0, False)
+        if not ok:
+            return
+        par = pares[opcoes.index(escolha)]
+        
+        caminho, _ = QFileDialog.getSaveFileName(
+            self, "Salvar Pacote", f"sincronizacao_{par['nome'] or 'dispositivo'}.json.gz",
+            "Pacotes de sincronização (*.json.gz)"
+        )
+        if not caminho:
+            return
+        
+        try:
+            total = self.sincronizador.exportar_arquivo(par['par'], caminho)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Erro", f"Não foi possível exportar o pacote: {e}")
+            return
+        QMessageBox.information(self, "Sincronização", f"Pacote exportado com {total} alterações.")
+    
+    def importar_pacote_sincronizacao(self):
+        """Aplica um pacote recebido de outro dispositivo"""
+        caminho, _ = QFileDialog.getOpenFileName(
+            self, "Importar Pacote", "", "Pacotes de sincronização (*.json.gz)"
+        )
+        if not caminho or self.tarefa_sincronizacao is not None:
+            return
+        
+        self.progresso.show()
+        self.status_bar.showMessage("Importando pacote de sincronização...")
+        self.tarefa_sincronizacao = executar_em_segundo_plano(
+            self.sincronizador.importar_arquivo, caminho,
+            ao_concluir=self.sincronizacao_concluida,
+            ao_falhar=self.sincronizacao_falhou
+        )
+    
+    def sincronizar_rede(self):
+        """Troca pacotes com um computador que aceita sincronizações pela rede"""
+        if self.tarefa_sincronizacao is not None:
+            return
+        url, ok = QInputDialog.getText(self, "Sincronizar pela Rede", "Endereço do servidor:",
+                                       QLineEdit.EchoMode.Normal, "http://192.168.0.10:8765")
+        if not ok or not url.strip():
+            return
+        chave, ok = QInputDialog.getText(self, "Sincronizar pela Rede", "Chave de acesso do servidor:",
+                                         QLineEdit.EchoMode.Password)
+        if not ok:
+            return
+        
+        self.progresso.show()
+        self.status_bar.showMessage("Sincronizando...")
+        self.tarefa_sincronizacao = executar_em_segundo_plano(
+            self.sincronizador.sincronizar_http, url.strip(), 30, chave.strip() or None,
+            ao_concluir=self.sincronizacao_concluida,
+            ao_falhar=self.sincronizacao_falhou
+        )
+    
+    def sincronizacao_concluida(self, resumo):
+        """Mostra o resultado da importação feita em segundo plano"""
+        self.tarefa_sincronizacao = None
+        self.progresso.hide()
+        self.status_bar.clearMessage()
+        
+        # As linhas foram alteradas por outra conexão
+        self.db_manager.cache.limpar()
+        self.recarregar_dados()
+        
+        mensagem = (f"Alterações aplicadas: {resumo['aplicadas']}\n"
+                    f"Conflitos (mantida a versão deste computador): {resumo['conflitos']}\n"
+                    f"Ignoradas: {resumo['ignoradas']}")
+        if 'enviadas' in resumo:
+            mensagem = f"Alterações enviadas: {resumo['enviadas']}\n" + mensagem
+        QMessageBox.information(self, "Sincronização", mensagem)
+        
+        LogAtividade.registrar(
+            self.db_manager,
+            self.usuario.id,
+            LogAtividade.ACAO_EDITAR,
+            f"Sincronizou {resumo['aplicadas']} alterações de outro dispositivo"
+        )
+    
+    def sincronizacao_falhou(self, erro):
+        """Informa a falha da sincronização feita em segundo plano"""
+        self.tarefa_sincronizacao = None
+        self.progresso.hide()
+        self.status_bar.clearMessage()
+        QMessageBox.critical(self, "Erro", f"Não foi possível sincronizar: {erro}")
+    
+    @Slot(object)
+    def pacote_recebido_rede(self, resumo):
+        """Recarrega os dados depois de um pacote aplicado pelo servidor de sincronização"""
+        if not resumo['aplicadas']:
+            return
+        self.db_manager.cache.limpar()
+        self.recarregar_dados()
+        self.status_bar.showMessage(
+            f"Sincronização recebida pela rede: {resumo['aplicadas']} alterações aplicadas", 5000
+        )
+    
+    def criar_copia_campo(self):
+        """Cria o banco de um novo dispositivo de campo a partir deste"""
+        nome, ok = QInputDialog.getText(self, "Novo Dispositivo", "Nome do dispositivo:")
+        if not ok or not nome.strip():
+            return
+        
+        caminho, _ = QFileDialog.getSaveFileName(
+            self, "Salvar Banco do Dispositivo", "territorios.db", "Banco de dados (*.db)"
+        )
+        if not caminho:
+            return
+        
+        try:
+            self.sincronizador.criar_copia_campo(caminho, nome.strip())
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Não foi possível criar o banco do dispositivo: {e}")
+            return
+        QMessageBox.information(self, "Sincronização",
+                                f"Banco do dispositivo \"{nome.strip()}\" criado com sucesso.")
+    
+    def alternar_servidor_sincronizacao(self, ativo):
+        """Liga ou desliga o recebimento de sincronizações pela rede local"""
+        if ativo and self.servidor_sincronizacao is None:
+            # Atender a rede local exige uma chave, informada também nos dispositivos de campo
+            chave, ok = QInputDialog.getText(self, "Aceitar Sincronizações",
+                                             "Chave de acesso para os dispositivos de campo:",
+                                             QLineEdit.EchoMode.Password)
+            if not ok or not chave.strip():
+                return  # O menu é montado de novo e mostra o estado atual
+            # O sinal leva o resumo da thread do servidor para a da interface
+            servidor = ServidorSincronizacao(self.db_manager.db_path, endereco='0.0.0.0',
+                                             ao_importar=self.pacote_recebido.emit, chave=chave.strip())
+            try:
+                servidor.iniciar()
+            except OSError as e:
+                QMessageBox.critical(self, "Erro", f"Não foi possível aceitar sincronizações: {e}")
+                return
+            self.servidor_sincronizacao = servidor
+            self.status_bar.showMessage(f"Aceitando sincronizações na porta {servidor.porta}", 5000)
+        elif not ativo and self.servidor_sincronizacao is not None:
+            self.servidor_sincronizacao.parar()
+            self.servidor_sincronizacao = None
+    
     @Slot()
     def show_perfil_menu(self):
         """Exibe o menu de perfil/logout"""
@@ -532,29 +798,59 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Atenção", "Por favor, preencha todos os campos.")
                 return
             
-            if not self.usuario.verificar_senha(senha_atual):
-                QMessageBox.warning(self, "Atenção", "Senha atual incorreta.")
-                return
-            
             if nova_senha != confirmar_senha:
                 QMessageBox.warning(self, "Atenção", "As senhas não coincidem.")
                 return
             
-            # Atualizar a senha
-            self.usuario.definir_senha(nova_senha)
+            if self.tarefa_senha is not None:
+                return
             
-            if self.usuario.save(self.db_manager):
-                QMessageBox.information(self, "Sucesso", "Senha alterada com sucesso.")
-                
-                # Registrar atividade
-                LogAtividade.registrar(
-                    self.db_manager,
-                    self.usuario.id,
-                    LogAtividade.ACAO_EDITAR,
-                    "Alterou sua senha"
-                )
-            else:
-                QMessageBox.critical(self, "Erro", "Não foi possível alterar a senha.")
+            # Verificação e novo hash (PBKDF2) rodam fora da thread da interface
+            senha_verificada = self.servico_autenticacao.reautenticar(self.usuario, senha_atual)
+            self.progresso.show()
+            self.status_bar.showMessage("Alterando a senha...")
+            self.tarefa_senha = executar_em_segundo_plano(
+                self._gerar_hash_nova_senha, self.usuario, senha_atual, nova_senha, senha_verificada,
+                ao_concluir=lambda novo_hash: self.alteracao_senha_concluida(novo_hash, nova_senha),
+                ao_falhar=lambda erro: self.alteracao_senha_concluida(None, nova_senha)
+            )
+    
+    @staticmethod
+    def _gerar_hash_nova_senha(usuario, senha_atual, nova_senha, senha_verificada):
+        """Confirma a senha atual e gera o hash da nova (executado em segundo plano)"""
+        if not senha_verificada and not usuario.verificar_senha(senha_atual):
+            return None
+        return Usuario.gerar_hash_senha(nova_senha)
+    
+    def alteracao_senha_concluida(self, novo_hash, nova_senha):
+        """Salva a nova senha após a verificação em segundo plano"""
+        self.tarefa_senha = None
+        self.progresso.hide()
+        self.status_bar.clearMessage()
+        
+        if not novo_hash:
+            QMessageBox.warning(self, "Atenção", "Senha atual incorreta.")
+            return
+        
+        # Atualizar a senha
+        self.usuario.senha_hash = novo_hash
+        
+        if self.usuario.save(self.db_manager):
+            # O token anterior deixa de valer com a troca de senha
+            self.servico_autenticacao.registrar_sessao(self.usuario, nova_senha)
+            self.servico_autenticacao.emitir_token(self.usuario, nova_senha)
+            
+            QMessageBox.information(self, "Sucesso", "Senha alterada com sucesso.")
+            
+            # Registrar atividade
+            LogAtividade.registrar(
+                self.db_manager,
+                self.usuario.id,
+                LogAtividade.ACAO_EDITAR,
+                "Alterou sua senha"
+            )
+        else:
+            QMessageBox.critical(self, "Erro", "Não foi possível alterar a senha.")
     
     def atualizar_sidebar_usuario(self):
         """Atualiza as informações do usuário na sidebar"""
@@ -571,6 +867,18 @@ class MainWindow(QMainWindow):
             f"Logout realizado por {self.usuario.nome}"
         )
         
+        # Encerrar a sessão salva para exigir nova autenticação
+        self.servico_autenticacao.revogar_token()
+        
+        # Parar o agendador de alertas
+        self.agendador_notificacoes.parar()
+        
+        if self.servidor_sincronizacao is not None:
+            self.servidor_sincronizacao.parar()
+        
+        # Gravar as atividades pendentes antes de reiniciar
+        LogAtividade.encerrar_gravador()
+        
         # Fechar todas as conexões e widgets atuais
         self.db_manager.close()
         self.close()
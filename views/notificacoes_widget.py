@@ -2,62 +2,182 @@
 # -*- coding: utf-8 -*-
 
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-                             QPushButton, QListWidget, QListWidgetItem,
+                             QPushButton, QListView, QComboBox,
                              QMenu, QMessageBox, QDialog, QTextEdit,
-                             QFrame, QSizePolicy)
-from PySide6.QtCore import Qt, Signal, Slot, QSize
+                             QFrame, QSizePolicy, QStyledItemDelegate, QStyle)
+from PySide6.QtCore import Qt, Signal, Slot, QSize, QAbstractListModel, QModelIndex, QRect
 from PySide6.QtGui import QIcon, QColor, QFont, QAction
 
 from models.usuario import Notificacao
 from datetime import datetime
 
-class NotificacaoItem(QListWidgetItem):
-    """Item personalizado para a lista de notificações"""
+def formatar_data(data_criacao):
+    """Formata a data da notificação para exibição"""
+    try:
+        return datetime.strptime(data_criacao, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
+    except (TypeError, ValueError):
+        return data_criacao or ""
+
+
+class ModeloNotificacoes(QAbstractListModel):
+    """Modelo da lista de notificações, carregado do banco página a página"""
     
-    def __init__(self, notificacao):
-        super().__init__()
-        self.notificacao = notificacao
-        self.setSizeHint(QSize(0, 50))  # Altura maior para melhor visualização
-        self.update_display()
-    
-    def update_display(self):
-        """Atualiza a exibição do item de acordo com a notificação"""
-        if self.notificacao.status == Notificacao.STATUS_NAO_LIDA:
-            self.setIcon(QIcon.fromTheme("mail-unread", QIcon()))
-            self.setBackground(QColor("#f0f8ff"))  # Azul claro para destacar
-            self.setFont(QFont("", -1, QFont.Bold))
+    def __init__(self, db_manager, usuario_id, por_pagina=50, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.usuario_id = usuario_id
+        self.por_pagina = por_pagina
+        self.status = Notificacao.STATUS_VISIVEIS
+        self.notificacoes = []
+        self.cursor = None
+        self.esgotado = False
+    
+    def recarregar(self, status=None):
+        """Recomeça a listagem (opcionalmente com outro filtro de status)"""
+        if status is not None:
+            self.status = status
+        self.beginResetModel()
+        self.notificacoes = []
+        self.cursor = None
+        self.esgotado = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.notificacoes)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.esgotado
+    
+    def fetchMore(self, parent=QModelIndex()):
+        """Carrega a próxima página de notificações"""
+        if parent.isValid() or self.esgotado:
+            return
+        
+        pagina = Notificacao.buscar(
+            self.db_manager, self.usuario_id,
+            status=self.status or None,
+            apos=self.cursor,
+            limit=self.por_pagina
+        )
+        if len(pagina) < self.por_pagina:
+            self.esgotado = True
+        if not pagina:
+            return
+        
+        self.cursor = Notificacao.cursor_pagina(pagina)
+        inicio = len(self.notificacoes)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(pagina) - 1)
+        self.notificacoes.extend(pagina)
+        self.endInsertRows()
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.notificacoes):
+            return None
+        notificacao = self.notificacoes[index.row()]
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{notificacao.titulo} - {formatar_data(notificacao.data_criacao)}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return notificacao.mensagem
+        if role == Qt.ItemDataRole.UserRole:
+            return notificacao
+        return None
+    
+    def notificacao(self, index):
+        """Obtém a notificação de um índice da lista"""
+        if not index.isValid() or index.row() >= len(self.notificacoes):
+            return None
+        return self.notificacoes[index.row()]
+    
+    def atualizar_linha(self, row):
+        """Redesenha a linha após uma mudança de status"""
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+    
+    def remover_linha(self, row):
+        """Remove a linha da lista (ex.: arquivada fora do filtro atual)"""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.notificacoes[row]
+        self.endRemoveRows()
+
+
+class NotificacaoDelegate(QStyledItemDelegate):
+    """Desenha as notificações diretamente, sem um widget por linha"""
+    
+    ALTURA = 50
+    
+    CORES_TIPO = {
+        Notificacao.TIPO_ALERTA: QColor("#e67e22"),  # Laranja para alertas
+        Notificacao.TIPO_ERRO: QColor("#e74c3c"),    # Vermelho para erros
+    }
+    
+    def sizeHint(self, option, index):
+        return QSize(0, self.ALTURA)
+    
+    def paint(self, painter, option, index):
+        notificacao = index.data(Qt.ItemDataRole.UserRole)
+        if notificacao is None:
+            super().paint(painter, option, index)
+            return
+        
+        painter.save()
+        selecionado = option.state & QStyle.StateFlag.State_Selected
+        nao_lida = notificacao.status == Notificacao.STATUS_NAO_LIDA
+        
+        # Fundo (azul claro para destacar as não lidas)
+        if selecionado:
+            painter.fillRect(option.rect, option.palette.highlight())
+        elif nao_lida:
+            painter.fillRect(option.rect, QColor("#f0f8ff"))
+        
+        area = option.rect.adjusted(8, 4, -8, -4)
+        
+        # Data à direita
+        fonte = QFont(option.font)
+        painter.setFont(fonte)
+        data = formatar_data(notificacao.data_criacao)
+        largura_data = option.fontMetrics.horizontalAdvance(data) + 8
+        painter.setPen(option.palette.highlightedText().color() if selecionado else QColor("#7f8c8d"))
+        painter.drawText(area, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, data)
+        
+        # Título (negrito se não lida, cor conforme o tipo)
+        fonte.setBold(nao_lida)
+        painter.setFont(fonte)
+        if selecionado:
+            painter.setPen(option.palette.highlightedText().color())
         else:
-            self.setIcon(QIcon.fromTheme("mail-read", QIcon()))
-        
-        # Formatar data
-        data_formatada = self.notificacao.data_criacao
-        try:
-            data_dt = datetime.strptime(self.notificacao.data_criacao, "%Y-%m-%d %H:%M:%S")
-            data_formatada = data_dt.strftime("%d/%m/%Y %H:%M")
-        except:
-            pass
-        
-        # Texto para exibição
-        self.setText(f"{self.notificacao.titulo} - {data_formatada}")
-        
-        # Tooltip com a mensagem completa
-        self.setToolTip(self.notificacao.mensagem)
-        
-        # Definir cor conforme o tipo de notificação
-        if self.notificacao.tipo == Notificacao.TIPO_ALERTA:
-            self.setForeground(QColor("#e67e22"))  # Laranja para alertas
-        elif self.notificacao.tipo == Notificacao.TIPO_ERRO:
-            self.setForeground(QColor("#e74c3c"))  # Vermelho para erros
+            painter.setPen(self.CORES_TIPO.get(notificacao.tipo, option.palette.text().color()))
+        if notificacao.status == Notificacao.STATUS_ARQUIVADA:
+            painter.setOpacity(0.6)
+        area_titulo = QRect(area.left(), area.top(), area.width() - largura_data, area.height())
+        titulo = painter.fontMetrics().elidedText(notificacao.titulo, Qt.TextElideMode.ElideRight,
+                                                  area_titulo.width())
+        painter.drawText(area_titulo, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, titulo)
+        
+        painter.restore()
 
 
 class NotificacoesWidget(QWidget):
     """Widget para exibir e gerenciar notificações"""
     
+    # Emitido com o novo total de não lidas sempre que o contador é atualizado
+    nao_lidas_alteradas = Signal(int)
+    
+    # Filtros de status disponíveis (rótulo, status incluídos; vazio = todos)
+    FILTROS = [
+        ("Não lidas e lidas", Notificacao.STATUS_VISIVEIS),
+        ("Não lidas", (Notificacao.STATUS_NAO_LIDA,)),
+        ("Lidas", (Notificacao.STATUS_LIDA,)),
+        ("Arquivadas", (Notificacao.STATUS_ARQUIVADA,)),
+        ("Todas", ()),
+    ]
+    
     def __init__(self, db_manager, usuario_atual):
         super().__init__()
         self.db_manager = db_manager
         self.usuario_atual = usuario_atual
-        self.notificacoes = []
+        self.modelo = ModeloNotificacoes(db_manager, usuario_atual.id, parent=self)
         
         self.init_ui()
         self.load_data()
@@ -78,6 +198,13 @@ class NotificacoesWidget(QWidget):
         title_layout.addWidget(self.count_label)
         title_layout.addStretch()
         
+        # Filtro de status
+        self.status_filter = QComboBox()
+        for rotulo, status in self.FILTROS:
+            self.status_filter.addItem(rotulo, status)
+        self.status_filter.currentIndexChanged.connect(self.load_data)
+        title_layout.addWidget(self.status_filter)
+        
         # Botões de ação
         refresh_button = QPushButton()
         refresh_button.setIcon(QIcon.fromTheme("view-refresh", QIcon()))
@@ -99,65 +226,86 @@ class NotificacoesWidget(QWidget):
         separator.setFrameShadow(QFrame.Shadow.Sunken)
         layout.addWidget(separator)
         
-        # Lista de notificações
-        self.notificacoes_list = QListWidget()
+        # Lista de notificações (páginas carregadas conforme a rolagem)
+        self.notificacoes_list = QListView()
+        self.notificacoes_list.setModel(self.modelo)
+        self.notificacoes_list.setItemDelegate(NotificacaoDelegate(self.notificacoes_list))
+        self.notificacoes_list.setUniformItemSizes(True)
+        self.notificacoes_list.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
         self.notificacoes_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.notificacoes_list.customContextMenuRequested.connect(self.show_context_menu)
-        self.notificacoes_list.itemDoubleClicked.connect(self.ver_notificacao)
+        self.notificacoes_list.doubleClicked.connect(self.ver_notificacao)
         self.notificacoes_list.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         layout.addWidget(self.notificacoes_list)
+        
+        # Mensagem se não houver notificações
+        self.vazio_label = QLabel("Nenhuma notificação disponível.")
+        self.vazio_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.vazio_label.setStyleSheet("color: #7f8c8d;")
+        layout.addWidget(self.vazio_label)
     
     def load_data(self):
-        """Carrega as notificações do usuário"""
-        self.notificacoes = Notificacao.get_by_usuario(self.db_manager, self.usuario_atual.id)
+        """Carrega a primeira página de notificações do usuário"""
+        self.modelo.recarregar(self.status_filter.currentData())
         self.update_list()
     
     def update_list(self):
-        """Atualiza a lista de notificações"""
-        self.notificacoes_list.clear()
-        
+        """Atualiza o contador e a mensagem de lista vazia"""
         # Contador de não lidas
-        nao_lidas = sum(1 for n in self.notificacoes if n.status == Notificacao.STATUS_NAO_LIDA)
+        self.atualizar_contador()
+        self.vazio_label.setVisible(self.modelo.rowCount() == 0)
+    
+    def atualizar_contador(self):
+        """Atualiza o contador de não lidas e avisa quem estiver conectado"""
+        nao_lidas = Notificacao.contar_nao_lidas(self.db_manager, self.usuario_atual.id)
         self.count_label.setText(f"{nao_lidas} não lida(s)" if nao_lidas > 0 else "")
-        
-        # Adicionar itens à lista
-        for notificacao in self.notificacoes:
-            if notificacao.status != Notificacao.STATUS_ARQUIVADA:  # Não exibir arquivadas
-                item = NotificacaoItem(notificacao)
-                self.notificacoes_list.addItem(item)
-        
-        # Mensagem se não houver notificações
-        if self.notificacoes_list.count() == 0:
-            self.notificacoes_list.addItem("Nenhuma notificação disponível.")
+        self.nao_lidas_alteradas.emit(nao_lidas)
     
     def show_context_menu(self, position):
         """Exibe o menu de contexto para um item da lista"""
-        item = self.notificacoes_list.itemAt(position)
-        if item and hasattr(item, 'notificacao'):
+        index = self.notificacoes_list.indexAt(position)
+        notificacao = self.modelo.notificacao(index)
+        
+        # Com várias notificações selecionadas, as ações valem para todas
+        selecionadas = self.notificacoes_list.selectionModel().selectedIndexes()
+        if notificacao and len(selecionadas) > 1 and index in selecionadas:
+            ids = [self.modelo.notificacao(i).id for i in selecionadas]
+            menu = QMenu(self)
+            
+            ler_action = QAction(f"Marcar {len(ids)} como lidas", self)
+            ler_action.triggered.connect(lambda: self.alterar_status_selecionadas(ids, Notificacao.STATUS_LIDA))
+            menu.addAction(ler_action)
+            
+            arquivar_action = QAction(f"Arquivar {len(ids)} notificações", self)
+            arquivar_action.triggered.connect(lambda: self.alterar_status_selecionadas(ids, Notificacao.STATUS_ARQUIVADA))
+            menu.addAction(arquivar_action)
+            
+            menu.exec(self.notificacoes_list.mapToGlobal(position))
+        elif notificacao:
             menu = QMenu(self)
             
             ver_action = QAction("Ver detalhes", self)
-            ver_action.triggered.connect(lambda: self.ver_notificacao(item))
+            ver_action.triggered.connect(lambda: self.ver_notificacao(index))
             menu.addAction(ver_action)
             
-            if item.notificacao.status == Notificacao.STATUS_NAO_LIDA:
+            if notificacao.status == Notificacao.STATUS_NAO_LIDA:
                 ler_action = QAction("Marcar como lida", self)
-                ler_action.triggered.connect(lambda: self.marcar_como_lida(item))
+                ler_action.triggered.connect(lambda: self.marcar_como_lida(index))
                 menu.addAction(ler_action)
             
-            arquivar_action = QAction("Arquivar", self)
-            arquivar_action.triggered.connect(lambda: self.arquivar_notificacao(item))
-            menu.addAction(arquivar_action)
+            if notificacao.status != Notificacao.STATUS_ARQUIVADA:
+                arquivar_action = QAction("Arquivar", self)
+                arquivar_action.triggered.connect(lambda: self.arquivar_notificacao(index))
+                menu.addAction(arquivar_action)
             
             menu.exec(self.notificacoes_list.mapToGlobal(position))
     
-    def ver_notificacao(self, item):
+    def ver_notificacao(self, index):
         """Exibe os detalhes de uma notificação"""
-        if not hasattr(item, 'notificacao'):
+        notificacao = self.modelo.notificacao(index)
+        if not notificacao:
             return
         
-        notificacao = item.notificacao
-        
         # Criar diálogo para exibir detalhes
         dialog = QDialog(self)
         dialog.setWindowTitle(notificacao.titulo)
@@ -182,30 +330,36 @@ class NotificacoesWidget(QWidget):
         
         # Marcar como lida se ainda não foi lida
         if notificacao.status == Notificacao.STATUS_NAO_LIDA:
-            self.marcar_como_lida(item)
+            self.marcar_como_lida(index)
         
         dialog.exec()
     
-    def marcar_como_lida(self, item):
+    def marcar_como_lida(self, index):
         """Marca uma notificação como lida"""
-        if hasattr(item, 'notificacao'):
-            if item.notificacao.marcar_como_lida(self.db_manager):
-                item.update_display()
-                self.load_data()  # Atualizar contador
+        notificacao = self.modelo.notificacao(index)
+        if notificacao and notificacao.marcar_como_lida(self.db_manager):
+            self.atualizar_apos_mudanca(index.row(), notificacao)
     
-    def arquivar_notificacao(self, item):
+    def arquivar_notificacao(self, index):
         """Arquiva uma notificação"""
-        if hasattr(item, 'notificacao'):
-            if item.notificacao.arquivar(self.db_manager):
-                row = self.notificacoes_list.row(item)
-                self.notificacoes_list.takeItem(row)
-                self.load_data()  # Atualizar contador
+        notificacao = self.modelo.notificacao(index)
+        if notificacao and notificacao.arquivar(self.db_manager):
+            self.atualizar_apos_mudanca(index.row(), notificacao)
+    
+    def atualizar_apos_mudanca(self, row, notificacao):
+        """Atualiza a linha (ou a remove, se saiu do filtro) e o contador"""
+        status = self.modelo.status
+        if status and notificacao.status not in status:
+            self.modelo.remover_linha(row)
+        else:
+            self.modelo.atualizar_linha(row)
+        self.update_list()
     
     def marcar_todas_como_lidas(self):
         """Marca todas as notificações como lidas"""
         # Confirmar ação
         reply = QMessageBox.question(
-            self, 
+            self,
             "Confirmar",
             "Deseja marcar todas as notificações como lidas?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
@@ -213,10 +367,14 @@ class NotificacoesWidget(QWidget):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            for i in range(self.notificacoes_list.count()):
-                item = self.notificacoes_list.item(i)
-                if hasattr(item, 'notificacao') and item.notificacao.status == Notificacao.STATUS_NAO_LIDA:
-                    item.notificacao.marcar_como_lida(self.db_manager)
+            # Um único UPDATE para todas
+            Notificacao.marcar_todas_como_lidas(self.db_manager, self.usuario_atual.id)
             
             # Atualizar lista
-            self.load_data()
\ No newline at end of file
+            self.load_data()
+    
+    def alterar_status_selecionadas(self, ids, novo_status):
+        """Marca como lidas ou arquiva as notificações selecionadas de uma vez"""
+        if Notificacao.alterar_status_em_lote(self.db_manager, self.usuario_atual.id,
+                                              novo_status, ids) >= 0:
+            self.load_data()
@@ -6,16 +6,186 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QDialog, QFormLayout, QTextEdit,
                              QListWidget, QListWidgetItem, QCheckBox,
-                             QTabWidget, QDateEdit, QGridLayout, QScrollArea, QFrame)
-from PySide6.QtCore import Qt, Signal, Slot, QDate
-from PySide6.QtGui import QIcon, QFont, QColor
+                             QTabWidget, QDateEdit, QGridLayout, QScrollArea, QFrame,
+                             QSpinBox, QListView, QStyledItemDelegate, QStyle)
+from PySide6.QtCore import (Qt, Signal, Slot, QDate, QSize, QRect, QEvent,
+                            QAbstractListModel, QModelIndex)
+from PySide6.QtGui import QIcon, QFont, QColor, QPen, QPainter
 
 from models.imovel import Imovel
 from models.atendimento import Atendimento
 from models.designacao import DesignacaoPredioVila
+from models.territorio import Territorio
+from models.saida_campo import SaidaCampo
+from views.grade_unidades import GradeUnidades
 
 from datetime import datetime
 
+# Papel com o responsável pela designação ativa do imóvel (ou None)
+PAPEL_RESPONSAVEL = Qt.ItemDataRole.UserRole + 1
+
+
+class ModeloCardsImoveis(QAbstractListModel):
+    """Modelo com os prédios e vilas exibidos como cards"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.imoveis = []
+        self.responsaveis = {}  # imovel_id -> responsável da designação ativa
+    
+    def definir(self, imoveis, responsaveis):
+        """Substitui os imóveis exibidos"""
+        self.beginResetModel()
+        self.imoveis = list(imoveis)
+        self.responsaveis = responsaveis
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.imoveis)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.imoveis):
+            return None
+        imovel = self.imoveis[index.row()]
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            return imovel.nome or f"Nº {imovel.numero}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return imovel.observacoes
+        if role == Qt.ItemDataRole.UserRole:
+            return imovel
+        if role == PAPEL_RESPONSAVEL:
+            return self.responsaveis.get(imovel.id)
+        return None
+
+
+class CardImovelDelegate(QStyledItemDelegate):
+    """Desenha os cards dos prédios e vilas, sem widgets por card
+    
+    Só os cards visíveis são desenhados; o clique no botão "Ver Detalhes"
+    é detectado pela posição e sinalizado com detalhes_solicitados.
+    """
+    
+    detalhes_solicitados = Signal(QModelIndex)
+    
+    LARGURA = 300
+    ALTURA = 215
+    ALTURA_TITULO = 28
+    ALTURA_BOTAO = 28
+    
+    CORES_TIPO = {
+        'predio': QColor("#6f42c1"),
+        'vila': QColor("#fd7e14"),
+    }
+    
+    def sizeHint(self, option, index):
+        return QSize(self.LARGURA, self.ALTURA)
+    
+    def area_card(self, rect):
+        """Área do card dentro da célula (deixa uma margem entre os cards)"""
+        return rect.adjusted(4, 4, -4, -4)
+    
+    def area_botao(self, rect):
+        """Área do botão "Ver Detalhes" no rodapé do card"""
+        card = self.area_card(rect)
+        return QRect(card.left() + 10, card.bottom() - self.ALTURA_BOTAO - 8,
+                     card.width() - 20, self.ALTURA_BOTAO)
+    
+    def paint(self, painter, option, index):
+        imovel = index.data(Qt.ItemDataRole.UserRole)
+        if imovel is None:
+            super().paint(painter, option, index)
+            return
+        
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        cor = self.CORES_TIPO.get(imovel.tipo, QColor("#6f42c1"))
+        card = self.area_card(option.rect)
+        
+        # Moldura e faixa do título na cor do tipo
+        painter.setPen(QPen(cor, 1))
+        painter.setBrush(option.palette.base())
+        painter.drawRoundedRect(card, 5, 5)
+        titulo_rect = QRect(card.left(), card.top(), card.width(), self.ALTURA_TITULO)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(cor)
+        painter.drawRoundedRect(titulo_rect, 5, 5)
+        
+        fonte = QFont(option.font)
+        fonte.setBold(True)
+        painter.setFont(fonte)
+        painter.setPen(QColor("white"))
+        titulo = painter.fontMetrics().elidedText(index.data(), Qt.TextElideMode.ElideRight,
+                                                  titulo_rect.width() - 16)
+        painter.drawText(titulo_rect, Qt.AlignmentFlag.AlignCenter, titulo)
+        
+        # Linhas de informação
+        portaria = imovel.tipo_portaria.replace('-', ' ').capitalize() if imovel.tipo_portaria else "Não informado"
+        acesso = imovel.tipo_acesso.capitalize() if imovel.tipo_acesso else "Não informado"
+        linhas = [
+            ("Endereço:", f"{imovel.rua_nome}, {imovel.numero}"),
+            ("Tipo:", imovel.tipo.capitalize()),
+            ("Total de Unidades:", str(imovel.total_unidades or "Não informado")),
+            ("Portaria:", portaria),
+            ("Acesso:", acesso),
+        ]
+        if imovel.observacoes:
+            linhas.append(("Observações:", imovel.observacoes.replace("\n", " ")))
+        
+        fonte_normal = QFont(option.font)
+        metricas = painter.fontMetrics()
+        altura_linha = metricas.height() + 3
+        y = titulo_rect.bottom() + 8
+        limite = self.area_botao(option.rect).top() - altura_linha
+        responsavel = index.data(PAPEL_RESPONSAVEL)
+        if responsavel:
+            limite -= altura_linha
+        
+        for rotulo, valor in linhas:
+            if y > limite:
+                break
+            painter.setFont(fonte)
+            painter.setPen(option.palette.text().color())
+            largura_rotulo = painter.fontMetrics().horizontalAdvance(rotulo) + 4
+            linha_rect = QRect(card.left() + 10, y, card.width() - 20, altura_linha)
+            painter.drawText(linha_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, rotulo)
+            painter.setFont(fonte_normal)
+            valor_rect = linha_rect.adjusted(largura_rotulo, 0, 0, 0)
+            valor = painter.fontMetrics().elidedText(valor, Qt.TextElideMode.ElideRight, valor_rect.width())
+            painter.drawText(valor_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, valor)
+            y += altura_linha
+        
+        # Designação ativa
+        if responsavel:
+            painter.setFont(fonte)
+            painter.setPen(QColor("#4CAF50"))
+            linha_rect = QRect(card.left() + 10, y, card.width() - 20, altura_linha)
+            texto = painter.fontMetrics().elidedText(f"Designado para: {responsavel}",
+                                                     Qt.TextElideMode.ElideRight, linha_rect.width())
+            painter.drawText(linha_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, texto)
+        
+        # Botão "Ver Detalhes" (mais escuro sob o mouse)
+        botao = self.area_botao(option.rect)
+        sob_mouse = option.state & QStyle.StateFlag.State_MouseOver
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor("#0062cc") if sob_mouse else QColor("#007bff"))
+        painter.drawRoundedRect(botao, 3, 3)
+        painter.setFont(fonte_normal)
+        painter.setPen(QColor("white"))
+        painter.drawText(botao, Qt.AlignmentFlag.AlignCenter, "Ver Detalhes")
+        
+        painter.restore()
+    
+    def editorEvent(self, event, model, option, index):
+        """Detecta o clique no botão de detalhes"""
+        if (event.type() == QEvent.Type.MouseButtonRelease
+                and event.button() == Qt.MouseButton.LeftButton
+                and self.area_botao(option.rect).contains(event.position().toPoint())):
+            self.detalhes_solicitados.emit(index)
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
 class PrediosVilasWidget(QWidget):
     """Widget para gerenciamento de prédios e vilas"""
     
@@ -23,6 +193,7 @@ class PrediosVilasWidget(QWidget):
         super().__init__()
         self.db_manager = db_manager
         self.predios_vilas = []
+        self.responsaveis = {}  # imovel_id -> responsável da designação ativa
         self.current_imovel = None
         self.current_unidade = None
         self.filtro_predios = True
@@ -81,17 +252,23 @@ class PrediosVilasWidget(QWidget):
         
         lista_layout.addWidget(filtros_group)
         
-        # Grid de prédios e vilas
-        self.grid_layout = QGridLayout()
-        
-        # Usar QScrollArea para rolagem
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        lista_layout.addWidget(scroll)
-        
-        scroll_content = QWidget()
-        scroll.setWidget(scroll_content)
-        scroll_content.setLayout(self.grid_layout)
+        # Grade de cards (só os visíveis são desenhados)
+        self.cards_modelo = ModeloCardsImoveis(self)
+        self.cards_delegate = CardImovelDelegate(self)
+        self.cards_delegate.detalhes_solicitados.connect(self.abrir_card)
+        
+        self.cards_view = QListView()
+        self.cards_view.setViewMode(QListView.ViewMode.IconMode)
+        self.cards_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.cards_view.setMovement(QListView.Movement.Static)
+        self.cards_view.setUniformItemSizes(True)
+        self.cards_view.setSpacing(6)
+        self.cards_view.setMouseTracking(True)
+        self.cards_view.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.cards_view.setModel(self.cards_modelo)
+        self.cards_view.setItemDelegate(self.cards_delegate)
+        self.cards_view.activated.connect(self.abrir_card)
+        lista_layout.addWidget(self.cards_view)
         
         # Mensagem de carregamento ou sem dados
         self.loading_label = QLabel("Carregando prédios e vilas...")
@@ -133,6 +310,16 @@ class PrediosVilasWidget(QWidget):
         self.unidades_input.setPlaceholderText("Ex: 12")
         form_layout.addRow("Total de Unidades:", self.unidades_input)
         
+        # Organização das unidades (opcional): blocos e andares
+        self.blocos_input = QSpinBox()
+        self.blocos_input.setRange(1, 26)
+        form_layout.addRow("Blocos:", self.blocos_input)
+        
+        self.andares_input = QSpinBox()
+        self.andares_input.setRange(0, 200)
+        self.andares_input.setSpecialValueText("Numeração sequencial")
+        form_layout.addRow("Andares por bloco:", self.andares_input)
+        
         # Tipo de portaria
         self.portaria_select = QComboBox()
         self.portaria_select.addItems(["24 horas", "Eletrônica", "Diurna", "Sem Portaria", "Outro"])
@@ -167,10 +354,8 @@ class PrediosVilasWidget(QWidget):
         self.territorio_select.clear()
         self.territorio_select.addItem("Selecione um território...", None)
         
-        cursor = self.db_manager.execute("SELECT id, nome FROM territorios ORDER BY nome")
-        if cursor:
-            for row in cursor.fetchall():
-                self.territorio_select.addItem(row['nome'], row['id'])
+        for territorio in Territorio.get_all(self.db_manager):
+            self.territorio_select.addItem(territorio.nome, territorio.id)
     
     def on_territorio_changed(self, index):
         """Atualiza o combobox de ruas ao mudar o território"""
@@ -181,10 +366,7 @@ class PrediosVilasWidget(QWidget):
             self.rua_select.setEnabled(True)
             self.rua_select.addItem("Selecione uma rua...", None)
             
-            cursor = self.db_manager.execute(
-                "SELECT id, nome FROM ruas WHERE territorio_id = ? ORDER BY nome",
-                (territorio_id,)
-            )
+            cursor = self.db_manager.executar_consulta('ruas.nomes_por_territorio', (territorio_id,))
             if cursor:
                 for row in cursor.fetchall():
                     self.rua_select.addItem(row['nome'], row['id'])
@@ -196,16 +378,15 @@ class PrediosVilasWidget(QWidget):
         self.loading_label.setText("Carregando prédios e vilas...")
         self.loading_label.setVisible(True)
         
-        # Limpar grid existente
-        while self.grid_layout.count():
-            item = self.grid_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
-        # Carregar prédios e vilas
+        # Carregar prédios e vilas e, em uma única consulta, as designações ativas
         self.predios_vilas = Imovel.get_predios_vilas(self.db_manager)
+        self.responsaveis = {d.imovel_id: d.responsavel
+                             for d in DesignacaoPredioVila.get_ativas(self.db_manager)}
         
-        # Filtrar itens conforme os checkboxes
+        self.aplicar_filtros()
+    
+    def aplicar_filtros(self):
+        """Filtra em memória os prédios e vilas carregados conforme os checkboxes"""
         filtered_items = []
         
         for imovel in self.predios_vilas:
@@ -213,94 +394,29 @@ class PrediosVilasWidget(QWidget):
                      (imovel.tipo == 'vila' and self.filtro_vilas)
             
             # Verificar se tem designação ativa
-            if self.filtro_designados:
-                designacao = DesignacaoPredioVila.get_by_imovel(self.db_manager, imovel.id)
-                designado = designacao is not None
-                if not designado:
-                    continue
+            if self.filtro_designados and imovel.id not in self.responsaveis:
+                continue
             
             if tipo_ok:
                 filtered_items.append(imovel)
         
+        self.mostrar_cards(filtered_items)
         if filtered_items:
             self.loading_label.setVisible(False)
-            self.mostrar_cards(filtered_items)
         else:
             self.loading_label.setText("Nenhum prédio ou vila encontrado com os filtros selecionados.")
+            self.loading_label.setVisible(True)
     
     def mostrar_cards(self, items):
-        """Cria e exibe os cards dos prédios e vilas"""
-        row, col = 0, 0
-        max_columns = 3
-        
-        for imovel in items:
-            card = self.criar_card_imovel(imovel)
-            self.grid_layout.addWidget(card, row, col)
-            
-            # Avançar para a próxima coluna ou linha
-            col += 1
-            if col >= max_columns:
-                col = 0
-                row += 1
+        """Exibe os cards dos prédios e vilas"""
+        self.cards_modelo.definir(items, self.responsaveis)
     
-    def criar_card_imovel(self, imovel):
-        """Cria um card para exibir um prédio ou vila"""
-        card = QGroupBox(imovel.nome or f"Nº {imovel.numero}")
-        
-        # Cor de fundo do título conforme o tipo
-        if imovel.tipo == 'predio':
-            card.setStyleSheet("QGroupBox { border: 1px solid #6f42c1; border-radius: 5px; margin-top: 1.5em; font-weight: bold; } "
-                              "QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top center; "
-                              "padding: 5px 15px; background-color: #6f42c1; color: white; }")
-        else:  # vila
-            card.setStyleSheet("QGroupBox { border: 1px solid #fd7e14; border-radius: 5px; margin-top: 1.5em; font-weight: bold; } "
-                              "QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top center; "
-                              "padding: 5px 15px; background-color: #fd7e14; color: white; }")
-        
-        layout = QVBoxLayout(card)
-        
-        # Endereço
-        endereco_label = QLabel(f"<b>Endereço:</b> {imovel.rua_nome}, {imovel.numero}")
-        layout.addWidget(endereco_label)
-        
-        # Tipo
-        tipo_label = QLabel(f"<b>Tipo:</b> {imovel.tipo.capitalize()}")
-        layout.addWidget(tipo_label)
-        
-        # Total de unidades
-        unidades_label = QLabel(f"<b>Total de Unidades:</b> {imovel.total_unidades or 'Não informado'}")
-        layout.addWidget(unidades_label)
-        
-        # Portaria
-        portaria = imovel.tipo_portaria.replace('-', ' ').capitalize() if imovel.tipo_portaria else "Não informado"
-        portaria_label = QLabel(f"<b>Portaria:</b> {portaria}")
-        layout.addWidget(portaria_label)
-        
-        # Acesso
-        acesso = imovel.tipo_acesso.capitalize() if imovel.tipo_acesso else "Não informado"
-        acesso_label = QLabel(f"<b>Acesso:</b> {acesso}")
-        layout.addWidget(acesso_label)
-        
-        # Observações
-        if imovel.observacoes:
-            obs_label = QLabel(f"<b>Observações:</b> {imovel.observacoes}")
-            obs_label.setWordWrap(True)
-            layout.addWidget(obs_label)
-        
-        # Verificar se tem designação ativa
-        designacao = DesignacaoPredioVila.get_by_imovel(self.db_manager, imovel.id)
-        if designacao:
-            designacao_label = QLabel(f"<b>Designado para:</b> {designacao.responsavel}")
-            designacao_label.setStyleSheet("color: #4CAF50; font-weight: bold;")
-            layout.addWidget(designacao_label)
-        
-        # Botão para detalhes
-        btn_detalhes = QPushButton("Ver Detalhes")
-        btn_detalhes.setStyleSheet("background-color: #007bff; color: white;")
-        btn_detalhes.clicked.connect(lambda: self.ver_detalhes(imovel))
-        layout.addWidget(btn_detalhes)
-        
-        return card
+    @Slot(QModelIndex)
+    def abrir_card(self, index):
+        """Abre os detalhes do prédio/vila do card clicado"""
+        imovel = index.data(Qt.ItemDataRole.UserRole)
+        if imovel is not None:
+            self.ver_detalhes(imovel)
     
     def ver_detalhes(self, imovel):
         """Exibe a tela de detalhes do prédio/vila"""
@@ -334,7 +450,8 @@ class PrediosVilasWidget(QWidget):
         info_grid.addWidget(QLabel(imovel.tipo.capitalize()), 0, 1)
         
         info_grid.addWidget(QLabel("<b>Total de Unidades:</b>"), 0, 2)
-        info_grid.addWidget(QLabel(str(imovel.total_unidades or "Não informado")), 0, 3)
+        total_unidades = imovel.contar_unidades(self.db_manager) or imovel.total_unidades
+        info_grid.addWidget(QLabel(str(total_unidades or "Não informado")), 0, 3)
         
         portaria = imovel.tipo_portaria.replace('-', ' ').capitalize() if imovel.tipo_portaria else "Não informado"
         info_grid.addWidget(QLabel("<b>Portaria:</b>"), 1, 0)
@@ -361,16 +478,24 @@ class PrediosVilasWidget(QWidget):
         busca_input.setPlaceholderText("Digite o número...")
         unidades_layout.addWidget(busca_input)
         
-        # Grid de unidades
-        unidades_grid = QGridLayout()
-        unidades_layout.addLayout(unidades_grid)
+        # Grade de unidades
+        grade_unidades = GradeUnidades()
+        unidades_layout.addWidget(grade_unidades)
         
         # Carregar unidades
         unidades = imovel.get_unidades(self.db_manager)
-        self.mostrar_unidades(unidades, unidades_grid)
+        self.mostrar_unidades(unidades, grade_unidades)
+        
+        def on_unidade_clicada(indice):
+            if self.registrar_atendimento_unidade(unidades[indice]):
+                # Recarrega a grade no lugar, mantendo a busca atual
+                unidades[:] = imovel.get_unidades(self.db_manager)
+                self.mostrar_unidades(unidades, grade_unidades)
+        
+        grade_unidades.unidade_clicada.connect(on_unidade_clicada)
         
-        # Conectar busca
-        busca_input.textChanged.connect(lambda text: self.filtrar_unidades(text, unidades, unidades_grid))
+        # Conectar busca (filtra após uma breve pausa na digitação)
+        busca_input.textChanged.connect(grade_unidades.buscar)
         
         tabs.addTab(unidades_tab, "Unidades")
         
@@ -463,77 +588,31 @@ class PrediosVilasWidget(QWidget):
         
         dialog.exec()
     
-    def mostrar_unidades(self, unidades, grid_layout):
-        """Mostra as unidades do prédio/vila em um grid"""
-        # Limpar grid existente
-        while grid_layout.count():
-            item = grid_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
-        if not unidades:
-            grid_layout.addWidget(QLabel("Nenhuma unidade cadastrada."), 0, 0)
-            return
-        
-        # Configurar o grid
-        max_columns = 6
-        row, col = 0, 0
-        
-        for unidade in unidades:
-            btn = QPushButton(unidade['numero'])
-            btn.setMinimumSize(80, 40)
-            
-            # Verificar se tem atendimento
-            cursor = self.db_manager.execute(
-                "SELECT * FROM atendimentos WHERE unidade_id = ? ORDER BY data DESC LIMIT 1",
-                (unidade['id'],)
+    def mostrar_unidades(self, unidades, grade):
+        """Mostra as unidades do prédio/vila na grade"""
+        # Último atendimento de cada unidade gravada, em uma única consulta
+        ultimos_atendimentos = {}
+        if unidades:
+            cursor = self.db_manager.executar_consulta(
+                'atendimentos.ultima_data_por_unidade',
+                (unidades[0]['imovel_id'],)
             )
-            
-            atendido = False
             if cursor:
-                atendimento = cursor.fetchone()
-                if atendimento:
-                    atendido = True
-                    # Adicionar tooltip com data do atendimento
-                    data_formatada = QDate.fromString(atendimento['data'],
-                                               "yyyy-MM-dd").toString("dd/MM/yyyy")
-                    btn.setToolTip(f"Atendido em: {data_formatada}")
-                    
-                    # Mudar cor de fundo para indicar que foi atendido
-                    btn.setStyleSheet("background-color: #d4edda; color: #155724;")
-            
-            # ID da unidade como dado para quando o botão for clicado
-            btn.setProperty("unidade_id", unidade['id'])
-            btn.clicked.connect(lambda checked, u=unidade: self.registrar_atendimento_unidade(u))
-            
-            grid_layout.addWidget(btn, row, col)
-            
-            # Avançar para a próxima coluna ou linha
-            col += 1
-            if col >= max_columns:
-                col = 0
-                row += 1
-    
-    def filtrar_unidades(self, texto, unidades, grid_layout):
-        """Filtra as unidades pelo texto de busca"""
-        if not texto:
-            self.mostrar_unidades(unidades, grid_layout)
-            return
+                ultimos_atendimentos = {row['unidade_id']: row['data'] for row in cursor.fetchall()}
         
-        unidades_filtradas = [u for u in unidades if texto.lower() in u['numero'].lower()]
-        self.mostrar_unidades(unidades_filtradas, grid_layout)
+        grade.definir_unidades(unidades, ultimos_atendimentos)
     
     def registrar_atendimento_unidade(self, unidade):
-        """Registra um atendimento para uma unidade específica"""
-        # Verificar se já existe um atendimento para esta unidade
-        cursor = self.db_manager.execute(
-            "SELECT * FROM atendimentos WHERE unidade_id = ? ORDER BY data DESC LIMIT 1",
-            (unidade['id'],)
-        )
+        """Registra um atendimento para uma unidade específica
         
+        Retorna True se o atendimento foi gravado ou removido.
+        """
+        # Verificar se já existe um atendimento para esta unidade
         atendimento_existente = None
-        if cursor:
-            atendimento_existente = cursor.fetchone()
+        if unidade['id'] is not None:
+            cursor = self.db_manager.executar_consulta('atendimentos.ultimo_da_unidade', (unidade['id'],))
+            if cursor:
+                atendimento_existente = cursor.fetchone()
         
         # Criar diálogo para registrar atendimento
         dialog = QDialog(self)
@@ -612,46 +691,39 @@ class PrediosVilasWidget(QWidget):
             
             if atendimento_existente:
                 # Atualizar atendimento existente
-                cursor = self.db_manager.execute(
-                    "UPDATE atendimentos SET data = ?, resultado = ?, observacoes = ? WHERE id = ?",
+                cursor = self.db_manager.executar_consulta(
+                    'atendimentos.atualizar_visita',
                     (data, resultado, observacoes, atendimento_existente['id'])
                 )
             else:
-                # Criar novo atendimento
-                cursor = self.db_manager.execute(
-                    "INSERT INTO atendimentos (imovel_id, unidade_id, data, resultado, observacoes) VALUES (?, ?, ?, ?, ?)",
-                    (self.current_imovel.id, unidade['id'], data, resultado, observacoes)
-                )
+                # Criar novo atendimento (gravando antes a unidade, se ela só existia na faixa)
+                if unidade['id'] is None:
+                    unidade = self.current_imovel.materializar_unidade(self.db_manager, unidade['numero'])
+                cursor = None
+                if unidade:
+                    cursor = self.db_manager.executar_consulta(
+                        'atendimentos.inserir',
+                        (self.current_imovel.id, unidade['id'], data, resultado, observacoes)
+                    )
             
             if cursor:
                 self.db_manager.commit()
                 QMessageBox.information(self, "Sucesso", "Atendimento registrado com sucesso.")
-                
-                # Se ainda estamos vendo os detalhes do mesmo prédio/vila, recarregar
-                dialog = self.sender().parent()
-                if dialog:
-                    dialog.accept()
-                    self.ver_detalhes(self.current_imovel)
+                return True
             else:
                 QMessageBox.critical(self, "Erro", "Não foi possível registrar o atendimento.")
         
         elif result == 2 and atendimento_existente:  # Remover atendimento
-            cursor = self.db_manager.execute(
-                "DELETE FROM atendimentos WHERE id = ?",
-                (atendimento_existente['id'],)
-            )
+            cursor = self.db_manager.executar_consulta('atendimentos.excluir', (atendimento_existente['id'],))
             
             if cursor:
                 self.db_manager.commit()
                 QMessageBox.information(self, "Sucesso", "Atendimento removido com sucesso.")
-                
-                # Se ainda estamos vendo os detalhes do mesmo prédio/vila, recarregar
-                dialog = self.sender().parent()
-                if dialog:
-                    dialog.accept()
-                    self.ver_detalhes(self.current_imovel)
+                return True
             else:
                 QMessageBox.critical(self, "Erro", "Não foi possível remover o atendimento.")
+        
+        return False
     
     def adicionar_registro(self, imovel):
         """Adiciona um registro ao histórico do prédio/vila"""
@@ -712,10 +784,8 @@ class PrediosVilasWidget(QWidget):
         
         # Saída de campo
         saida_select = QComboBox()
-        cursor = self.db_manager.execute("SELECT id, nome FROM saidas_campo ORDER BY data DESC")
-        if cursor:
-            for row in cursor.fetchall():
-                saida_select.addItem(row['nome'], row['id'])
+        for saida in SaidaCampo.get_all(self.db_manager):
+            saida_select.addItem(saida.nome, saida.id)
         layout.addRow("Saída de Campo:", saida_select)
         
         # Responsável
@@ -783,7 +853,8 @@ class PrediosVilasWidget(QWidget):
                     # Se não, apenas atualizar a lista
                     self.load_data()
             else:
-                QMessageBox.critical(self, "Erro", "Não foi possível designar o prédio/vila.")
+                QMessageBox.critical(self, "Erro", "Não foi possível designar o prédio/vila. "
+                                     "Verifique se ele não foi designado por outro usuário.")
     
     def editar_designacao(self, designacao, parent_dialog=None):
         """Edita uma designação existente"""
@@ -795,12 +866,10 @@ class PrediosVilasWidget(QWidget):
         
         # Saída de campo
         saida_select = QComboBox()
-        cursor = self.db_manager.execute("SELECT id, nome FROM saidas_campo ORDER BY data DESC")
-        if cursor:
-            for row in cursor.fetchall():
-                saida_select.addItem(row['nome'], row['id'])
-                if row['id'] == designacao.saida_campo_id:
-                    saida_select.setCurrentText(row['nome'])
+        for saida in SaidaCampo.get_all(self.db_manager):
+            saida_select.addItem(saida.nome, saida.id)
+            if saida.id == designacao.saida_campo_id:
+                saida_select.setCurrentIndex(saida_select.count() - 1)
         layout.addRow("Saída de Campo:", saida_select)
         
         # Responsável
@@ -901,7 +970,10 @@ class PrediosVilasWidget(QWidget):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            if designacao.delete(self.db_manager):
+            nome_imovel = designacao.imovel_nome or f"Nº {designacao.imovel_numero}"
+            with self.db_manager.historico.acao(f"Excluir designação do {designacao.imovel_tipo} {nome_imovel}"):
+                excluida = designacao.delete(self.db_manager)
+            if excluida:
                 QMessageBox.information(self, "Sucesso", "Designação excluída com sucesso.")
                 
                 # Se há diálogo pai, fechá-lo para mostrar os detalhes atualizados
@@ -946,6 +1018,13 @@ class PrediosVilasWidget(QWidget):
             return
         
         total_unidades = int(unidades_text)
+        blocos = self.blocos_input.value()
+        andares = self.andares_input.value()
+        
+        if Imovel.montar_faixas(tipo, total_unidades, andares, blocos) is None:
+            QMessageBox.warning(self, "Atenção", "O total de unidades deve se dividir igualmente entre "
+                                "os blocos e andares (até 99 unidades por andar).")
+            return
         
         # Criar o imóvel
         imovel = Imovel(
@@ -958,6 +1037,8 @@ class PrediosVilasWidget(QWidget):
             tipo_acesso=acesso,
             observacoes=observacoes
         )
+        imovel.blocos = blocos
+        imovel.andares = andares
         
         if imovel.save(self.db_manager):
             QMessageBox.information(self, "Sucesso", f"{tipo.capitalize()} cadastrado com sucesso.")
@@ -969,6 +1050,8 @@ class PrediosVilasWidget(QWidget):
             self.tipo_select.setCurrentIndex(0)
             self.nome_input.clear()
             self.unidades_input.clear()
+            self.blocos_input.setValue(1)
+            self.andares_input.setValue(0)
             self.portaria_select.setCurrentIndex(0)
             self.acesso_select.setCurrentIndex(0)
             self.observacoes_input.clear()
@@ -986,4 +1069,4 @@ class PrediosVilasWidget(QWidget):
         self.filtro_concluidos = self.cb_concluidos.isChecked()
         self.filtro_designados = self.cb_designados.isChecked()
         
-        self.load_data()
\ No newline at end of file
+        self.aplicar_filtros()
\ No newline at end of file
@@ -5,12 +5,12 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QLabel, QPushButton, QLineEdit, QComboBox,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QDialog, QFormLayout,
-                             QDateEdit, QTimeEdit)
+                             QDateEdit, QTimeEdit, QSpinBox, QCheckBox)
 from PySide6.QtCore import Qt, Signal, Slot, QDate, QTime
 from PySide6.QtGui import QIcon, QFont
 
-from models.saida_campo import SaidaCampo
-from datetime import datetime
+from models.saida_campo import SaidaCampo, RegraSaidaCampo, DIAS_SEMANA
+from datetime import datetime, timedelta
 
 class SaidasCampoWidget(QWidget):
     """Widget para cadastro e gerenciamento de saídas de campo"""
@@ -19,6 +19,7 @@ class SaidasCampoWidget(QWidget):
         super().__init__()
         self.db_manager = db_manager
         self.saidas = []
+        self.regras = []
         self.init_ui()
         self.load_data()
     
@@ -98,8 +99,42 @@ class SaidasCampoWidget(QWidget):
         table_layout.addLayout(buttons_layout)
         main_layout.addWidget(table_group)
         
+        # Regras de saídas recorrentes
+        regras_group = QGroupBox("Saídas Recorrentes")
+        regras_layout = QVBoxLayout(regras_group)
+        
+        self.regras_table = QTableWidget(0, 6)  # 6 colunas: ID, Nome, Recorrência, Horário, Dirigente, Vigência
+        self.regras_table.setHorizontalHeaderLabels(["ID", "Nome", "Recorrência", "Horário", "Dirigente", "Vigência"])
+        self.regras_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.regras_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.regras_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.regras_table.setColumnHidden(0, True)  # Esconder coluna ID
+        self.regras_table.verticalHeader().setVisible(False)
+        regras_layout.addWidget(self.regras_table)
+        
+        regras_buttons_layout = QHBoxLayout()
+        
+        add_regra_button = QPushButton("Nova Regra")
+        add_regra_button.clicked.connect(self.add_regra)
+        regras_buttons_layout.addWidget(add_regra_button)
+        
+        self.cancelar_ocorrencia_button = QPushButton("Cancelar Ocorrência")
+        self.cancelar_ocorrencia_button.setEnabled(False)
+        self.cancelar_ocorrencia_button.clicked.connect(self.cancelar_ocorrencia)
+        regras_buttons_layout.addWidget(self.cancelar_ocorrencia_button)
+        
+        self.delete_regra_button = QPushButton("Excluir Regra")
+        self.delete_regra_button.setEnabled(False)
+        self.delete_regra_button.setStyleSheet("background-color: #f44336; color: white;")
+        self.delete_regra_button.clicked.connect(self.delete_regra)
+        regras_buttons_layout.addWidget(self.delete_regra_button)
+        
+        regras_layout.addLayout(regras_buttons_layout)
+        main_layout.addWidget(regras_group)
+        
         # Conectar sinais
         self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.regras_table.itemSelectionChanged.connect(self.on_regra_selection_changed)
         self.data_input.dateChanged.connect(self.update_dia_semana)
         
         # Preencher o dia da semana inicial
@@ -109,6 +144,8 @@ class SaidasCampoWidget(QWidget):
         """Carrega os dados das saídas de campo"""
         self.saidas = SaidaCampo.get_all(self.db_manager)
         self.update_table()
+        self.regras = RegraSaidaCampo.get_all(self.db_manager)
+        self.update_regras_table()
     
     def update_table(self):
         """Atualiza a tabela de saídas de campo"""
@@ -131,6 +168,216 @@ class SaidasCampoWidget(QWidget):
             self.table.setItem(row, 4, QTableWidgetItem(saida.horario))
             self.table.setItem(row, 5, QTableWidgetItem(saida.dirigente or "-"))
     
+    def update_regras_table(self):
+        """Atualiza a tabela de regras de saídas recorrentes"""
+        self.regras_table.setRowCount(0)
+        
+        for row, regra in enumerate(self.regras):
+            self.regras_table.insertRow(row)
+            
+            self.regras_table.setItem(row, 0, QTableWidgetItem(str(regra.id)))
+            self.regras_table.setItem(row, 1, QTableWidgetItem(regra.nome))
+            self.regras_table.setItem(row, 2, QTableWidgetItem(regra.descricao))
+            self.regras_table.setItem(row, 3, QTableWidgetItem(regra.horario))
+            self.regras_table.setItem(row, 4, QTableWidgetItem(regra.dirigente or "-"))
+            
+            inicio = QDate.fromString(regra.data_inicio, "yyyy-MM-dd").toString("dd/MM/yyyy")
+            if regra.data_fim:
+                fim = QDate.fromString(regra.data_fim, "yyyy-MM-dd").toString("dd/MM/yyyy")
+                vigencia = f"{inicio} a {fim}"
+            else:
+                vigencia = f"A partir de {inicio}"
+            self.regras_table.setItem(row, 5, QTableWidgetItem(vigencia))
+    
+    def regra_selecionada(self):
+        """Retorna a regra selecionada na tabela, ou None"""
+        selected_items = self.regras_table.selectedItems()
+        if not selected_items:
+            return None
+        regra_id = int(self.regras_table.item(selected_items[0].row(), 0).text())
+        for regra in self.regras:
+            if regra.id == regra_id:
+                return regra
+        return None
+    
+    @Slot()
+    def add_regra(self):
+        """Cadastra uma regra de saídas recorrentes"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Nova Saída Recorrente")
+        dialog.resize(400, 350)
+        
+        layout = QFormLayout(dialog)
+        
+        nome_input = QLineEdit()
+        nome_input.setPlaceholderText("Ex: Saída de Sábado")
+        layout.addRow("Nome:", nome_input)
+        
+        frequencia_select = QComboBox()
+        frequencia_select.addItem("Semanal", RegraSaidaCampo.FREQUENCIA_SEMANAL)
+        frequencia_select.addItem("Mensal", RegraSaidaCampo.FREQUENCIA_MENSAL)
+        layout.addRow("Frequência:", frequencia_select)
+        
+        dia_select = QComboBox()
+        for indice, dia in enumerate(DIAS_SEMANA):
+            dia_select.addItem(dia, indice)
+        layout.addRow("Dia da Semana:", dia_select)
+        
+        # Regras semanais: a cada quantas semanas
+        intervalo_input = QSpinBox()
+        intervalo_input.setRange(1, 8)
+        intervalo_input.setSuffix(" semana(s)")
+        layout.addRow("Repetir a cada:", intervalo_input)
+        
+        # Regras mensais: em qual semana do mês
+        semana_select = QComboBox()
+        for semana in range(1, 6):
+            semana_select.addItem(f"{semana}ª semana", semana)
+        semana_select.addItem("Última semana", -1)
+        semana_select.setEnabled(False)
+        layout.addRow("Semana do Mês:", semana_select)
+        
+        def update_frequencia():
+            mensal = frequencia_select.currentData() == RegraSaidaCampo.FREQUENCIA_MENSAL
+            semana_select.setEnabled(mensal)
+            intervalo_input.setEnabled(not mensal)
+        
+        frequencia_select.currentIndexChanged.connect(update_frequencia)
+        
+        horario_edit = QTimeEdit(QTime(9, 0))
+        horario_edit.setDisplayFormat("HH:mm")
+        layout.addRow("Horário:", horario_edit)
+        
+        dirigente_input = QLineEdit()
+        layout.addRow("Dirigente (opcional):", dirigente_input)
+        
+        inicio_edit = QDateEdit(QDate.currentDate())
+        inicio_edit.setCalendarPopup(True)
+        inicio_edit.setDisplayFormat("dd/MM/yyyy")
+        layout.addRow("Início:", inicio_edit)
+        
+        fim_check = QCheckBox("Definir data de término")
+        fim_edit = QDateEdit(QDate.currentDate().addMonths(6))
+        fim_edit.setCalendarPopup(True)
+        fim_edit.setDisplayFormat("dd/MM/yyyy")
+        fim_edit.setEnabled(False)
+        fim_check.toggled.connect(fim_edit.setEnabled)
+        layout.addRow(fim_check, fim_edit)
+        
+        buttons_layout = QHBoxLayout()
+        cancel_button = QPushButton("Cancelar")
+        cancel_button.clicked.connect(dialog.reject)
+        
+        save_button = QPushButton("Salvar")
+        save_button.setStyleSheet("background-color: #4CAF50; color: white;")
+        save_button.clicked.connect(dialog.accept)
+        
+        buttons_layout.addWidget(cancel_button)
+        buttons_layout.addWidget(save_button)
+        layout.addRow("", buttons_layout)
+        
+        if dialog.exec():
+            nome = nome_input.text().strip()
+            if not nome:
+                QMessageBox.warning(self, "Atenção", "O nome da saída de campo é obrigatório.")
+                return
+            
+            data_inicio = inicio_edit.date().toString("yyyy-MM-dd")
+            data_fim = fim_edit.date().toString("yyyy-MM-dd") if fim_check.isChecked() else None
+            if data_fim and data_fim < data_inicio:
+                QMessageBox.warning(self, "Atenção", "A data de término deve ser posterior ao início.")
+                return
+            
+            frequencia = frequencia_select.currentData()
+            mensal = frequencia == RegraSaidaCampo.FREQUENCIA_MENSAL
+            regra = RegraSaidaCampo(
+                nome=nome,
+                frequencia=frequencia,
+                dia_semana=dia_select.currentData(),
+                semana_do_mes=semana_select.currentData() if mensal else None,
+                intervalo=1 if mensal else intervalo_input.value(),
+                horario=horario_edit.time().toString("HH:mm"),
+                dirigente=dirigente_input.text().strip() or None,
+                data_inicio=data_inicio,
+                data_fim=data_fim
+            )
+            
+            if regra.save(self.db_manager):
+                QMessageBox.information(self, "Sucesso", "Saída recorrente cadastrada com sucesso.")
+                self.load_data()
+            else:
+                QMessageBox.critical(self, "Erro", "Não foi possível cadastrar a saída recorrente.")
+    
+    @Slot()
+    def cancelar_ocorrencia(self):
+        """Cancela uma ocorrência da regra selecionada (feriado, assembleia, etc.)"""
+        regra = self.regra_selecionada()
+        if not regra:
+            return
+        
+        # Oferece as próximas ocorrências da regra
+        hoje = datetime.now().date()
+        ocorrencias = regra.ocorrencias(hoje, hoje + timedelta(days=365))[:26]
+        if not ocorrencias:
+            QMessageBox.information(self, "Informação", "Esta regra não tem ocorrências futuras.")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Cancelar Ocorrência")
+        layout = QFormLayout(dialog)
+        
+        data_select = QComboBox()
+        for dia in ocorrencias:
+            data_select.addItem(dia.strftime("%d/%m/%Y"), dia.isoformat())
+        layout.addRow("Data:", data_select)
+        
+        buttons_layout = QHBoxLayout()
+        cancel_button = QPushButton("Voltar")
+        cancel_button.clicked.connect(dialog.reject)
+        
+        confirm_button = QPushButton("Cancelar Ocorrência")
+        confirm_button.setStyleSheet("background-color: #f44336; color: white;")
+        confirm_button.clicked.connect(dialog.accept)
+        
+        buttons_layout.addWidget(cancel_button)
+        buttons_layout.addWidget(confirm_button)
+        layout.addRow("", buttons_layout)
+        
+        if dialog.exec():
+            if regra.adicionar_excecao(self.db_manager, data_select.currentData()):
+                QMessageBox.information(self, "Sucesso", "Ocorrência cancelada com sucesso.")
+            else:
+                QMessageBox.critical(self, "Erro", "Não foi possível cancelar a ocorrência.")
+    
+    @Slot()
+    def delete_regra(self):
+        """Exclui a regra selecionada"""
+        regra = self.regra_selecionada()
+        if not regra:
+            return
+        
+        reply = QMessageBox.question(
+            self, "Confirmar Exclusão",
+            f"Tem certeza que deseja excluir a saída recorrente '{regra.nome}'?\n"
+            "As saídas já designadas serão mantidas.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            if regra.delete(self.db_manager):
+                QMessageBox.information(self, "Sucesso", "Saída recorrente excluída com sucesso.")
+                self.load_data()
+            else:
+                QMessageBox.critical(self, "Erro", "Não foi possível excluir a saída recorrente.")
+    
+    @Slot()
+    def on_regra_selection_changed(self):
+        """Atualiza o estado dos botões das regras quando a seleção muda"""
+        has_selection = len(self.regras_table.selectedItems()) > 0
+        self.cancelar_ocorrencia_button.setEnabled(has_selection)
+        self.delete_regra_button.setEnabled(has_selection)
+    
     @Slot()
     def update_dia_semana(self):
         """Atualiza o dia da semana com base na data selecionada"""
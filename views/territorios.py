@@ -6,11 +6,15 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QDialog, QFormLayout, QTextEdit,
                              QTreeWidget, QTreeWidgetItem, QSplitter, QFrame,
-                             QStackedWidget, QTabWidget, QListWidget, QListWidgetItem)
+                             QStackedWidget, QTabWidget, QListWidget, QListWidgetItem,
+                             QFileDialog, QInputDialog, QApplication, QSpinBox)
 from PySide6.QtCore import Qt, Signal, Slot
 from PySide6.QtGui import QIcon, QFont
 
 from models.territorio import Territorio
+from models.imovel import Imovel
+from utils.cartoes_territorio import GeradorCartoes, FORMATO_PDF, FORMATO_PNG
+from utils.tarefas import executar_em_segundo_plano
 
 class TerritoriosWidget(QWidget):
     """Widget para cadastro e gerenciamento de territórios"""
@@ -21,6 +25,7 @@ class TerritoriosWidget(QWidget):
         self.territorios = []
         self.current_territorio = None
         self.current_rua = None
+        self.tarefa_cartoes = None
         
         self.init_ui()
         self.load_data()
@@ -83,6 +88,11 @@ class TerritoriosWidget(QWidget):
         
         left_layout.addLayout(buttons_layout)
         
+        # Botão para gerar os cartões de território para impressão
+        cartoes_button = QPushButton("Gerar Cartões para Impressão")
+        cartoes_button.clicked.connect(self.gerar_cartoes)
+        left_layout.addWidget(cartoes_button)
+        
         # Painel direito: Detalhes do território selecionado
         right_panel = QWidget()
         self.right_layout = QVBoxLayout(right_panel)
@@ -204,6 +214,8 @@ class TerritoriosWidget(QWidget):
     def load_data(self):
         """Carrega os dados dos territórios"""
         self.territorios = Territorio.get_all(self.db_manager)
+        # Ruas de todos os territórios em uma única consulta
+        Territorio.carregar_ruas(self.db_manager, self.territorios)
         self.update_tree()
     
     def update_tree(self):
@@ -255,22 +267,16 @@ class TerritoriosWidget(QWidget):
         if not self.current_territorio:
             return
         
-        ruas = self.current_territorio.get_ruas(self.db_manager)
-        row = 0
-        
-        for rua in ruas:
-            cursor = self.db_manager.execute(
-                "SELECT * FROM imoveis WHERE rua_id = ? ORDER BY numero",
-                (rua['id'],)
-            )
-            if cursor:
-                for imovel in cursor.fetchall():
-                    self.imoveis_table.insertRow(row)
-                    self.imoveis_table.setItem(row, 0, QTableWidgetItem(str(imovel['id'])))
-                    self.imoveis_table.setItem(row, 1, QTableWidgetItem(imovel['numero']))
-                    self.imoveis_table.setItem(row, 2, QTableWidgetItem(imovel['tipo'].capitalize()))
-                    self.imoveis_table.setItem(row, 3, QTableWidgetItem(rua['nome']))
-                    row += 1
+        # Imóveis de todas as ruas do território em uma única consulta
+        cursor = self.db_manager.executar_consulta('imoveis.por_territorio', (self.current_territorio.id,))
+        if cursor:
+            imoveis = cursor.fetchall()
+            self.imoveis_table.setRowCount(len(imoveis))
+            for row, imovel in enumerate(imoveis):
+                self.imoveis_table.setItem(row, 0, QTableWidgetItem(str(imovel['id'])))
+                self.imoveis_table.setItem(row, 1, QTableWidgetItem(imovel['numero']))
+                self.imoveis_table.setItem(row, 2, QTableWidgetItem(imovel['tipo'].capitalize()))
+                self.imoveis_table.setItem(row, 3, QTableWidgetItem(imovel['rua_nome']))
     
     @Slot()
     def add_territorio(self):
@@ -350,13 +356,16 @@ class TerritoriosWidget(QWidget):
         reply = QMessageBox.question(
             self, "Confirmar Exclusão",
             f"Tem certeza que deseja excluir o território '{self.current_territorio.nome}'?\n"
-            f"Esta ação excluirá todas as ruas e imóveis associados.",
+            f"Esta ação excluirá todas as ruas e imóveis associados "
+            f"(pode ser desfeita com Ctrl+Z).",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            if self.current_territorio.delete(self.db_manager):
+            with self.db_manager.historico.acao(f"Excluir território '{self.current_territorio.nome}'"):
+                excluido = self.current_territorio.delete(self.db_manager)
+            if excluido:
                 QMessageBox.information(self, "Sucesso", "Território excluído com sucesso.")
                 self.current_territorio = None
                 self.current_rua = None
@@ -368,6 +377,59 @@ class TerritoriosWidget(QWidget):
             else:
                 QMessageBox.critical(self, "Erro", "Não foi possível excluir o território.")
     
+    @Slot()
+    def gerar_cartoes(self):
+        """Gera os cartões de território (PDF ou PNG) para impressão"""
+        if not self.territorios:
+            QMessageBox.warning(self, "Atenção", "Nenhum território cadastrado.")
+            return
+        if self.tarefa_cartoes is not None:
+            QMessageBox.information(self, "Gerar Cartões", "Os cartões ainda estão sendo gerados.")
+            return
+        
+        opcoes = ["Todos os territórios"]
+        if self.current_territorio:
+            opcoes.append(f"Apenas '{self.current_territorio.nome}'")
+        escopo, ok = QInputDialog.getItem(self, "Gerar Cartões", "Territórios:", opcoes, 0, False)
+        if not ok:
+            return
+        
+        formato, ok = QInputDialog.getItem(self, "Gerar Cartões", "Formato:", ["PDF", "PNG"], 0, False)
+        if not ok:
+            return
+        
+        pasta = QFileDialog.getExistingDirectory(self, "Pasta de destino dos cartões")
+        if not pasta:
+            return
+        
+        territorio_ids = None
+        if escopo != opcoes[0]:
+            territorio_ids = [self.current_territorio.id]
+        
+        # Os dados são lidos aqui (a conexão é desta thread); a renderização roda em segundo plano
+        gerador = GeradorCartoes(self.db_manager, pasta)
+        preparo = gerador.preparar(territorio_ids, FORMATO_PDF if formato == "PDF" else FORMATO_PNG)
+        self.tarefa_cartoes = executar_em_segundo_plano(
+            gerador.renderizar, preparo,
+            ao_concluir=self.cartoes_gerados,
+            ao_falhar=self.geracao_cartoes_falhou
+        )
+    
+    def cartoes_gerados(self, resultado):
+        """Mostra o resultado da geração feita em segundo plano"""
+        self.tarefa_cartoes = None
+        mensagem = (f"{len(resultado['gerados'])} cartão(ões) gerado(s), "
+                    f"{len(resultado['ignorados'])} sem alterações.")
+        if resultado['erros']:
+            QMessageBox.warning(self, "Atenção",
+                                f"{mensagem}\n{len(resultado['erros'])} cartão(ões) com erro.")
+        else:
+            QMessageBox.information(self, "Sucesso", mensagem)
+    
+    def geracao_cartoes_falhou(self, erro):
+        self.tarefa_cartoes = None
+        QMessageBox.critical(self, "Erro", f"Não foi possível gerar os cartões: {erro}")
+    
     @Slot()
     def add_rua(self):
         """Adiciona uma nova rua ao território selecionado"""
@@ -424,13 +486,7 @@ class TerritoriosWidget(QWidget):
                 QMessageBox.warning(self, "Atenção", "O nome da rua é obrigatório.")
                 return
             
-            cursor = self.db_manager.execute(
-                "UPDATE ruas SET nome = ? WHERE id = ?",
-                (nome, self.current_rua['id'])
-            )
-            
-            if cursor:
-                self.db_manager.commit()
+            if self.current_territorio.editar_rua(self.db_manager, self.current_rua['id'], nome):
                 QMessageBox.information(self, "Sucesso", "Rua atualizada com sucesso.")
                 self.update_ruas_list()
                 self.update_rua_select()
@@ -454,13 +510,7 @@ class TerritoriosWidget(QWidget):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            cursor = self.db_manager.execute(
-                "DELETE FROM ruas WHERE id = ?",
-                (self.current_rua['id'],)
-            )
-            
-            if cursor:
-                self.db_manager.commit()
+            if self.current_territorio.excluir_rua(self.db_manager, self.current_rua['id']):
                 QMessageBox.information(self, "Sucesso", "Rua excluída com sucesso.")
                 self.current_rua = None
                 self.edit_rua_button.setEnabled(False)
@@ -493,6 +543,8 @@ class TerritoriosWidget(QWidget):
         tipo_acesso = None
         nome = None
         observacoes = None
+        blocos = 1
+        andares = 0
         
         if tipo in ('prédio', 'vila'):
             dialog = QDialog(self)
@@ -509,6 +561,15 @@ class TerritoriosWidget(QWidget):
             unidades_input.setPlaceholderText("Ex: 12")
             layout.addRow("Total de Unidades:", unidades_input)
             
+            blocos_input = QSpinBox()
+            blocos_input.setRange(1, 26)
+            layout.addRow("Blocos:", blocos_input)
+            
+            andares_input = QSpinBox()
+            andares_input.setRange(0, 200)
+            andares_input.setSpecialValueText("Numeração sequencial")
+            layout.addRow("Andares por bloco:", andares_input)
+            
             portaria_select = QComboBox()
             portaria_select.addItems(["24 horas", "Eletrônica", "Diurna", "Sem Portaria", "Outro"])
             layout.addRow("Tipo de Portaria:", portaria_select)
@@ -545,33 +606,31 @@ class TerritoriosWidget(QWidget):
                     return
                 
                 total_unidades = int(total_unidades_text)
+                blocos = blocos_input.value()
+                andares = andares_input.value()
+                
+                if Imovel.montar_faixas(tipo, total_unidades, andares, blocos) is None:
+                    QMessageBox.warning(self, "Atenção", "O total de unidades deve se dividir igualmente entre "
+                                        "os blocos e andares (até 99 unidades por andar).")
+                    return
+            else:
+                return
         
-        # Inserir o imóvel
-        cursor = self.db_manager.execute(
-            "INSERT INTO imoveis (rua_id, numero, tipo, nome, total_unidades, "
-            "tipo_portaria, tipo_acesso, observacoes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (rua_id, numero, tipo, nome, total_unidades, tipo_portaria, tipo_acesso, observacoes)
+        # Inserir o imóvel (prédios e vilas ganham as faixas de unidades)
+        imovel = Imovel(
+            rua_id=rua_id,
+            numero=numero,
+            tipo=tipo,
+            nome=nome,
+            total_unidades=total_unidades,
+            tipo_portaria=tipo_portaria,
+            tipo_acesso=tipo_acesso,
+            observacoes=observacoes
         )
+        imovel.blocos = blocos
+        imovel.andares = andares
         
-        if cursor:
-            self.db_manager.commit()
-            
-            # Se for prédio ou vila, criar as unidades automaticamente
-            if tipo in ('prédio', 'vila') and total_unidades and total_unidades > 0:
-                imovel_id = cursor.lastrowid
-                
-                unidades = []
-                prefix = "Apto" if tipo == "prédio" else "Casa"
-                
-                for i in range(1, total_unidades + 1):
-                    unidades.append((imovel_id, f"{prefix} {i:02d}", None))
-                
-                self.db_manager.executemany(
-                    "INSERT INTO unidades (imovel_id, numero, observacoes) VALUES (?, ?, ?)",
-                    unidades
-                )
-                self.db_manager.commit()
-            
+        if imovel.save(self.db_manager):
             QMessageBox.information(self, "Sucesso", "Imóvel adicionado com sucesso.")
             self.imovel_numero_input.clear()
             self.update_imoveis_table()
@@ -589,10 +648,7 @@ class TerritoriosWidget(QWidget):
         imovel_id = int(self.imoveis_table.item(row, 0).text())
         
         # Buscar dados do imóvel
-        cursor = self.db_manager.execute(
-            "SELECT * FROM imoveis WHERE id = ?", 
-            (imovel_id,)
-        )
+        cursor = self.db_manager.executar_consulta('imoveis.por_id', (imovel_id,))
         if not cursor:
             QMessageBox.critical(self, "Erro", "Não foi possível carregar os dados do imóvel.")
             return
@@ -694,16 +750,26 @@ class TerritoriosWidget(QWidget):
                 total_unidades = int(total_unidades_text)
             
             # Atualizar o imóvel
-            cursor = self.db_manager.execute(
-                "UPDATE imoveis SET rua_id = ?, numero = ?, tipo = ?, nome = ?, "
-                "total_unidades = ?, tipo_portaria = ?, tipo_acesso = ?, observacoes = ? "
-                "WHERE id = ?",
-                (rua_id, numero, tipo, nome, total_unidades, tipo_portaria, 
-                 tipo_acesso, observacoes, imovel_id)
-            )
+            atualizado = Imovel.from_db_row(imovel)
+            atualizado.rua_id = rua_id
+            atualizado.numero = numero
+            atualizado.tipo = tipo
+            atualizado.nome = nome
+            atualizado.total_unidades = total_unidades
+            atualizado.tipo_portaria = tipo_portaria
+            atualizado.tipo_acesso = tipo_acesso
+            atualizado.observacoes = observacoes
             
-            if cursor:
-                self.db_manager.commit()
+            # O imóvel e as faixas de unidades vão numa só transação (os commits ficam para o fim da ação)
+            with self.db_manager.historico.acao(f"Editar imóvel Nº {numero}"):
+                sucesso = atualizado.save(self.db_manager)
+                # Ajustar as faixas de unidades se o total mudou
+                if sucesso and (total_unidades != imovel['total_unidades'] or imovel['tipo'] != tipo):
+                    sucesso = atualizado.redimensionar_unidades(self.db_manager, total_unidades or 0)
+                if not sucesso:
+                    self.db_manager.rollback()  # Nada de total novo sem as faixas correspondentes
+            
+            if sucesso:
                 QMessageBox.information(self, "Sucesso", "Imóvel atualizado com sucesso.")
                 self.update_imoveis_table()
             else:
@@ -724,19 +790,19 @@ class TerritoriosWidget(QWidget):
         reply = QMessageBox.question(
             self, "Confirmar Exclusão",
             f"Tem certeza que deseja excluir o imóvel Nº {numero} ({tipo})?\n"
-            f"Esta ação excluirá todos os dados associados a este imóvel.",
+            f"Esta ação excluirá todos os dados associados a este imóvel "
+            f"(pode ser desfeita com Ctrl+Z).",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            cursor = self.db_manager.execute(
-                "DELETE FROM imoveis WHERE id = ?",
-                (imovel_id,)
-            )
+            with self.db_manager.historico.acao(f"Excluir imóvel Nº {numero}"):
+                cursor = self.db_manager.executar_consulta('imoveis.excluir', (imovel_id,))
+                if cursor:
+                    self.db_manager.commit()
             
             if cursor:
-                self.db_manager.commit()
                 QMessageBox.information(self, "Sucesso", "Imóvel excluído com sucesso.")
                 self.edit_imovel_button.setEnabled(False)
                 self.delete_imovel_button.setEnabled(False)
@@ -782,12 +848,7 @@ class TerritoriosWidget(QWidget):
             
             if self.current_territorio:
                 # Recuperar a rua
-                cursor = self.db_manager.execute(
-                    "SELECT * FROM ruas WHERE id = ?",
-                    (rua_id,)
-                )
-                if cursor:
-                    self.current_rua = cursor.fetchone()
+                self.current_rua = self.current_territorio.get_rua(self.db_manager, rua_id)
                 
                 self.detail_title.setText(f"{self.current_territorio.nome} - {item.text(0)}")
                 self.tabs.setEnabled(True)
@@ -824,12 +885,9 @@ class TerritoriosWidget(QWidget):
         rua_id = item.data(Qt.ItemDataRole.UserRole)
         
         # Recuperar a rua
-        cursor = self.db_manager.execute(
-            "SELECT * FROM ruas WHERE id = ?",
-            (rua_id,)
-        )
-        if cursor:
-            self.current_rua = cursor.fetchone()
+        if self.current_territorio:
+            self.current_rua = self.current_territorio.get_rua(self.db_manager, rua_id)
+        if self.current_rua:
             self.edit_rua_button.setEnabled(True)
             self.delete_rua_button.setEnabled(True)
     
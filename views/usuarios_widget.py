@@ -5,8 +5,8 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QLabel, QPushButton, QLineEdit, QComboBox,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QDialog, QFormLayout, QTabWidget,
-                             QCheckBox)
-from PySide6.QtCore import Qt, Signal, Slot
+                             QCheckBox, QDateEdit)
+from PySide6.QtCore import Qt, Signal, Slot, QDate
 from PySide6.QtGui import QIcon, QFont
 
 from models.usuario import Usuario, LogAtividade
@@ -20,6 +20,11 @@ class UsuariosWidget(QWidget):
         self.usuario_atual = usuario_atual
         self.usuarios = []
         
+        # Paginação do registro de atividades
+        self.logs_por_pagina = 200
+        self.log_cursor = None
+        self.logs_esgotados = False
+        
         self.init_ui()
         self.load_data()
     
@@ -128,6 +133,47 @@ class UsuariosWidget(QWidget):
         # === Tab de Registro de Atividades ===
         log_layout = QVBoxLayout(log_tab)
         
+        # Filtros do registro de atividades
+        filtros_layout = QHBoxLayout()
+        
+        filtros_layout.addWidget(QLabel("Usuário:"))
+        self.log_usuario_filter = QComboBox()
+        self.log_usuario_filter.addItem("Todos", None)
+        filtros_layout.addWidget(self.log_usuario_filter)
+        
+        filtros_layout.addWidget(QLabel("Ação:"))
+        self.log_acao_filter = QComboBox()
+        self.log_acao_filter.addItem("Todas", None)
+        for acao in [LogAtividade.ACAO_LOGIN, LogAtividade.ACAO_LOGOUT, LogAtividade.ACAO_CRIAR,
+                     LogAtividade.ACAO_EDITAR, LogAtividade.ACAO_EXCLUIR, LogAtividade.ACAO_VISUALIZAR]:
+            self.log_acao_filter.addItem(acao.capitalize(), acao)
+        filtros_layout.addWidget(self.log_acao_filter)
+        
+        filtros_layout.addWidget(QLabel("Entidade:"))
+        self.log_entidade_filter = QLineEdit()
+        self.log_entidade_filter.setPlaceholderText("Ex: usuario")
+        filtros_layout.addWidget(self.log_entidade_filter)
+        
+        filtros_layout.addWidget(QLabel("De:"))
+        self.log_data_inicio = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.log_data_inicio.setCalendarPopup(True)
+        filtros_layout.addWidget(self.log_data_inicio)
+        
+        filtros_layout.addWidget(QLabel("Até:"))
+        self.log_data_fim = QDateEdit(QDate.currentDate())
+        self.log_data_fim.setCalendarPopup(True)
+        filtros_layout.addWidget(self.log_data_fim)
+        
+        self.log_arquivo_check = QCheckBox("Incluir arquivados")
+        self.log_arquivo_check.setToolTip("Inclui os registros antigos movidos para o banco de arquivo")
+        filtros_layout.addWidget(self.log_arquivo_check)
+        
+        filtrar_button = QPushButton("Filtrar")
+        filtrar_button.clicked.connect(self.load_logs)
+        filtros_layout.addWidget(filtrar_button)
+        
+        log_layout.addLayout(filtros_layout)
+        
         # Tabela de atividades
         self.log_table = QTableWidget(0, 5)  # ID, Usuário, Ação, Descrição, Data/Hora
         self.log_table.setHorizontalHeaderLabels(["ID", "Usuário", "Ação", "Descrição", "Data/Hora"])
@@ -136,19 +182,42 @@ class UsuariosWidget(QWidget):
         self.log_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         self.log_table.setColumnHidden(0, True)  # Esconder coluna ID
         self.log_table.verticalHeader().setVisible(False)
+        # Carrega a próxima página ao rolar até o fim da tabela
+        self.log_table.verticalScrollBar().valueChanged.connect(self.on_log_scroll)
         log_layout.addWidget(self.log_table)
         
-        # Botão para atualizar logs
+        # Botões para atualizar logs e carregar mais registros
+        log_buttons_layout = QHBoxLayout()
+        
         refresh_log_button = QPushButton("Atualizar Registros")
         refresh_log_button.clicked.connect(self.load_logs)
-        log_layout.addWidget(refresh_log_button)
+        log_buttons_layout.addWidget(refresh_log_button)
+        
+        self.mais_logs_button = QPushButton("Carregar Mais")
+        self.mais_logs_button.clicked.connect(self.load_more_logs)
+        log_buttons_layout.addWidget(self.mais_logs_button)
+        
+        log_layout.addLayout(log_buttons_layout)
     
     def load_data(self):
         """Carrega os dados dos usuários"""
         self.usuarios = Usuario.get_all(self.db_manager)
         self.update_table()
+        self.update_log_usuario_filter()
         self.load_logs()
     
+    def update_log_usuario_filter(self):
+        """Atualiza o filtro de usuários do registro de atividades"""
+        atual = self.log_usuario_filter.currentData()
+        self.log_usuario_filter.blockSignals(True)
+        self.log_usuario_filter.clear()
+        self.log_usuario_filter.addItem("Todos", None)
+        for usuario in self.usuarios:
+            self.log_usuario_filter.addItem(usuario.nome, usuario.id)
+            if usuario.id == atual:
+                self.log_usuario_filter.setCurrentIndex(self.log_usuario_filter.count() - 1)
+        self.log_usuario_filter.blockSignals(False)
+    
     def update_table(self):
         """Atualiza a tabela de usuários"""
         self.table.setRowCount(0)
@@ -173,21 +242,45 @@ class UsuariosWidget(QWidget):
             status_item = QTableWidgetItem("Sim" if usuario.ativo else "Não")
             self.table.setItem(row, 4, status_item)
     
+    @Slot()
     def load_logs(self):
-        """Carrega os registros de atividades"""
-        from models.usuario import LogAtividade
-        
-        logs = LogAtividade.get_all(self.db_manager)
+        """Carrega a primeira página dos registros de atividades"""
         self.log_table.setRowCount(0)
+        self.log_cursor = None
+        self.logs_esgotados = False
+        self.load_more_logs()
+    
+    @Slot()
+    def load_more_logs(self):
+        """Carrega a próxima página dos registros de atividades"""
+        if self.logs_esgotados:
+            return
         
-        for row, log in enumerate(logs):
-            self.log_table.insertRow(row)
-            
+        logs = LogAtividade.buscar(
+            self.db_manager,
+            usuario_id=self.log_usuario_filter.currentData(),
+            tipo_acao=self.log_acao_filter.currentData(),
+            entidade=self.log_entidade_filter.text().strip() or None,
+            data_inicio=self.log_data_inicio.date().toString("yyyy-MM-dd"),
+            data_fim=self.log_data_fim.date().toString("yyyy-MM-dd"),
+            apos=self.log_cursor,
+            limit=self.logs_por_pagina,
+            incluir_arquivo=self.log_arquivo_check.isChecked()
+        )
+        
+        if len(logs) < self.logs_por_pagina:
+            self.logs_esgotados = True
+        self.mais_logs_button.setEnabled(not self.logs_esgotados)
+        if logs:
+            self.log_cursor = LogAtividade.cursor_pagina(logs)
+        
+        row = self.log_table.rowCount()
+        self.log_table.setRowCount(row + len(logs))
+        for log in logs:
             self.log_table.setItem(row, 0, QTableWidgetItem(str(log.id)))
             
-            # Buscar nome do usuário
-            usuario = Usuario.get_by_id(self.db_manager, log.usuario_id)
-            nome_usuario = usuario.nome if usuario else "Usuário Desconhecido"
+            # Nome do usuário (já vem da consulta)
+            nome_usuario = log.usuario_nome or "Usuário Desconhecido"
             self.log_table.setItem(row, 1, QTableWidgetItem(nome_usuario))
             
             # Ação
@@ -199,6 +292,13 @@ class UsuariosWidget(QWidget):
             
             # Data/Hora
             self.log_table.setItem(row, 4, QTableWidgetItem(log.data_hora))
+            row += 1
+    
+    @Slot(int)
+    def on_log_scroll(self, value):
+        """Carrega mais registros ao chegar no fim da tabela"""
+        if value == self.log_table.verticalScrollBar().maximum():
+            self.load_more_logs()
     
     @Slot()
     def add_usuario(self):
@@ -125,6 +125,8 @@ class ViewTerritoriosWidget(QWidget):
     def load_data(self):
         """Carrega os dados dos territórios e atendimentos"""
         self.territorios = Territorio.get_all(self.db_manager)
+        # Ruas de todos os territórios em uma única consulta
+        Territorio.carregar_ruas(self.db_manager, self.territorios)
         self.carregar_atendimentos()
         self.update_tree()
         self.atualizar_progresso()
@@ -133,9 +135,7 @@ class ViewTerritoriosWidget(QWidget):
         """Carrega os atendimentos do banco de dados"""
         self.atendimentos = {}
         
-        cursor = self.db_manager.execute(
-            "SELECT imovel_id, id, data, observacoes FROM atendimentos WHERE unidade_id IS NULL"
-        )
+        cursor = self.db_manager.executar_consulta('atendimentos.das_casas')
         
         if cursor:
             for row in cursor.fetchall():
@@ -155,11 +155,7 @@ class ViewTerritoriosWidget(QWidget):
             ruas = territorio.get_ruas(self.db_manager)
             
             for rua in ruas:
-                cursor = self.db_manager.execute(
-                    "SELECT COUNT(*) as total FROM imoveis "
-                    "WHERE rua_id = ? AND tipo IN ('residencial', 'comercial')",
-                    (rua['id'],)
-                )
+                cursor = self.db_manager.executar_consulta('imoveis.total_casas_da_rua', (rua['id'],))
                 if cursor and cursor.fetchone()['total'] > 0:
                     tem_imoveis_validos = True
                     break
@@ -185,10 +181,7 @@ class ViewTerritoriosWidget(QWidget):
         for territorio in self.territorios:
             ruas = territorio.get_ruas(self.db_manager)
             for rua in ruas:
-                cursor = self.db_manager.execute(
-                    "SELECT id, tipo FROM imoveis WHERE rua_id = ? AND tipo IN ('residencial', 'comercial')",
-                    (rua['id'],)
-                )
+                cursor = self.db_manager.executar_consulta('imoveis.casas_da_rua', (rua['id'],))
                 if cursor:
                     for imovel in cursor.fetchall():
                         filtro_tipo = (imovel['tipo'] == 'residencial' and self.filtro_residencial) or \
@@ -217,37 +210,21 @@ class ViewTerritoriosWidget(QWidget):
         if not rua_id and not territorio_id:
             return
         
-        # Query base
-        query = "SELECT i.id, i.numero, i.tipo, r.nome as rua_nome, t.nome as territorio_nome "
-        query += "FROM imoveis i "
-        query += "JOIN ruas r ON i.rua_id = r.id "
-        query += "JOIN territorios t ON r.territorio_id = t.id "
-        query += "WHERE i.tipo IN ('residencial', 'comercial') "
-        
-        params = []
-        
-        # Filtro por rua ou território
-        if rua_id:
-            query += "AND i.rua_id = ? "
-            params.append(rua_id)
-        elif territorio_id:
-            query += "AND t.id = ? "
-            params.append(territorio_id)
-        
-        # Filtro por tipo de imóvel
+        # Filtro por tipo de imóvel (nenhum marcado mostra os dois)
         tipos = []
         if self.filtro_residencial:
-            tipos.append("'residencial'")
+            tipos.append('residencial')
         if self.filtro_comercial:
-            tipos.append("'comercial'")
-        
-        if tipos:
-            query += f"AND i.tipo IN ({','.join(tipos)}) "
-        
-        # Ordem
-        query += "ORDER BY r.nome, i.numero"
+            tipos.append('comercial')
+        if not tipos:
+            tipos = ['residencial', 'comercial']
         
-        cursor = self.db_manager.execute(query, params)
+        # Filtro por rua ou território; o comando recebe sempre dois tipos
+        if rua_id:
+            cursor = self.db_manager.executar_consulta('imoveis.casas_por_rua', (rua_id, tipos[0], tipos[-1]))
+        else:
+            cursor = self.db_manager.executar_consulta('imoveis.casas_por_territorio',
+                                                       (territorio_id, tipos[0], tipos[-1]))
         if not cursor:
             return
         
@@ -351,13 +328,7 @@ class ViewTerritoriosWidget(QWidget):
             return
         
         # Buscar dados do imóvel
-        cursor = self.db_manager.execute(
-            "SELECT i.numero, i.tipo, r.nome as rua_nome "
-            "FROM imoveis i "
-            "JOIN ruas r ON i.rua_id = r.id "
-            "WHERE i.id = ?",
-            (self.current_imovel,)
-        )
+        cursor = self.db_manager.executar_consulta('imoveis.descricao', (self.current_imovel,))
         
         if not cursor:
             QMessageBox.critical(self, "Erro", "Não foi possível carregar os dados do imóvel.")
@@ -434,14 +405,14 @@ class ViewTerritoriosWidget(QWidget):
             if atendimento_existente:
                 # Atualizar atendimento existente
                 atendimento_id = self.atendimentos[self.current_imovel]['id']
-                cursor = self.db_manager.execute(
-                    "UPDATE atendimentos SET data = ?, observacoes = ? WHERE id = ?",
+                cursor = self.db_manager.executar_consulta(
+                    'atendimentos.atualizar_observacoes',
                     (data, observacoes, atendimento_id)
                 )
             else:
                 # Criar novo atendimento
-                cursor = self.db_manager.execute(
-                    "INSERT INTO atendimentos (imovel_id, data, observacoes) VALUES (?, ?, ?)",
+                cursor = self.db_manager.executar_consulta(
+                    'atendimentos.inserir_casa',
                     (self.current_imovel, data, observacoes)
                 )
             
@@ -488,10 +459,7 @@ class ViewTerritoriosWidget(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             atendimento_id = self.atendimentos[self.current_imovel]['id']
             
-            cursor = self.db_manager.execute(
-                "DELETE FROM atendimentos WHERE id = ?",
-                (atendimento_id,)
-            )
+            cursor = self.db_manager.executar_consulta('atendimentos.excluir', (atendimento_id,))
             
             if cursor:
                 self.db_manager.commit()